@@ -18,6 +18,13 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+# A function invocation is cut off after its max duration, so SSE streams end
+# well before that and the browser resumes them with Last-Event-ID
+os.environ.setdefault('REALTIME_STREAM_SECONDS', '25')
+# Likewise a queued job may never run once the response is sent, so
+# verification and reset emails are sent before the request returns
+os.environ.setdefault('EMAIL_SEND_INLINE', 'true')
+
 from routes.auth import auth_bp
 from routes.customer import customer_bp
 from routes.invoice import invoice_bp
@@ -32,6 +39,11 @@ from routes.notifications import notifications_bp
 from routes.search import search_bp
 from routes.user import user_bp
 from routes.push_notifications import push_notifications_bp
+from routes.imports import imports_bp
+from routes.sync import sync_bp
+from routes.jobs import jobs_bp
+from routes.realtime import realtime_bp
+from src.services.job_queue import job_queue
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -39,7 +51,9 @@ logger = logging.getLogger(__name__)
 app = Flask(__name__)
 
 app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', 'dev-secret-key-change-in-production')
-app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(hours=24)
+# Access tokens carry entitlement claims, so they are short-lived and renewed at /auth/refresh
+app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(minutes=int(os.getenv('JWT_ACCESS_TOKEN_MINUTES', '15')))
+app.config['JWT_REFRESH_TOKEN_EXPIRES'] = timedelta(days=int(os.getenv('JWT_REFRESH_TOKEN_DAYS', '30')))
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 
 # Handle trailing slashes consistently to avoid redirects that break CORS
@@ -103,7 +117,7 @@ cors_origins = get_cors_origins()
 cors_config = {
     'origins': '*',  # Allow all origins temporarily
     'supports_credentials': True,
-    'allow_headers': ["Content-Type", "Authorization", "X-Requested-With", "Accept", "Origin", "X-Vercel-Deployment-Url"],
+    'allow_headers': ["Content-Type", "Authorization", "X-Requested-With", "Accept", "Origin", "X-Vercel-Deployment-Url", "Idempotency-Key"],
     'methods': ["GET", "POST", "PUT", "DELETE", "OPTIONS", "PATCH"]
 }
 
@@ -152,7 +166,7 @@ def handle_preflight_and_load_user():
     if request.method == "OPTIONS":
         response = jsonify({'status': 'OK'})
         response.headers.add("Access-Control-Allow-Origin", "*")
-        response.headers.add('Access-Control-Allow-Headers', "Content-Type,Authorization,X-Requested-With,Accept,Origin,X-Vercel-Deployment-Url")
+        response.headers.add('Access-Control-Allow-Headers', "Content-Type,Authorization,X-Requested-With,Accept,Origin,X-Vercel-Deployment-Url,Idempotency-Key")
         response.headers.add('Access-Control-Allow-Methods', "GET,PUT,POST,DELETE,OPTIONS,PATCH")
         response.headers.add('Access-Control-Allow-Credentials', 'true')
         return response
@@ -237,6 +251,19 @@ app.register_blueprint(notifications_bp, url_prefix='/notifications')
 app.register_blueprint(search_bp, url_prefix='/search')
 app.register_blueprint(user_bp, url_prefix='/user')
 app.register_blueprint(push_notifications_bp, url_prefix='/push-notifications')
+app.register_blueprint(imports_bp, url_prefix='/imports')
+app.register_blueprint(sync_bp, url_prefix='/sync')
+app.register_blueprint(jobs_bp, url_prefix='/jobs')
+# /realtime/stream holds one long-lived SSE response per client, fed by a poller
+# thread in the process serving it. A serverless function is neither long-running
+# nor kept warm between requests: each stream is capped by the function timeout
+# and events are only read while it is open. Serve realtime from a long-running
+# worker (src/app.py with gunicorn.conf.py) and point clients there; polling
+# /notifications keeps working on either.
+app.register_blueprint(realtime_bp, url_prefix='/realtime')
+
+# Background workers for queued email/push jobs (also drains jobs left by a previous process)
+job_queue.start(app)
 
 # Vercel expects the Flask app to be exported as 'app'.
 # Remove the '__main__' block for serverless compatibility.
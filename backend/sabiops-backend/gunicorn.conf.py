@@ -7,7 +7,11 @@ bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
 
 # Worker processes - simplified for stability
 workers = 1
-worker_class = "sync"
+# Threaded workers keep idle SSE connections (/realtime/stream) cheap; set
+# GUNICORN_WORKER_CLASS=gevent (with gevent installed) for many thousands
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+threads = int(os.getenv("GUNICORN_THREADS", "32"))
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", "1000"))
 
 # Timeout
 timeout = 120
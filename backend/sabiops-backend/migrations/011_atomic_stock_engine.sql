@@ -0,0 +1,95 @@
+-- Atomic, set-based stock deduction
+-- Run this in your Supabase SQL Editor
+--
+-- Replaces the "select quantity, then update quantity - n" pattern used by the
+-- invoice inventory paths with a single conditional decrement over all lines.
+-- Two cashiers selling the same product at the same time can no longer
+-- overwrite each other's update.
+
+-- Index used by the batched availability lookup (id IN (...) AND owner_id = ?)
+CREATE INDEX IF NOT EXISTS idx_products_owner_id_id ON products(owner_id, id);
+
+-- Deduct stock for many lines in one statement.
+--
+-- p_items is a JSON array of {"product_id": UUID, "quantity": INTEGER}.
+-- Lines for the same product are summed before the decrement.
+--
+-- When p_all_or_nothing is TRUE nothing is written unless every line can be
+-- satisfied. When FALSE each line succeeds or fails on its own.
+--
+-- Returns one row per distinct product with the requested quantity, whether
+-- the decrement was applied and the stock remaining afterwards (NULL when the
+-- product does not exist for this owner).
+CREATE OR REPLACE FUNCTION deduct_stock_batch(
+    p_owner_id UUID,
+    p_items JSONB,
+    p_all_or_nothing BOOLEAN DEFAULT TRUE
+)
+RETURNS TABLE (
+    product_id UUID,
+    requested INTEGER,
+    success BOOLEAN,
+    remaining INTEGER
+) AS $$
+DECLARE
+    v_shortfall INTEGER;
+BEGIN
+    CREATE TEMP TABLE IF NOT EXISTS _stock_lines (
+        product_id UUID PRIMARY KEY,
+        requested INTEGER NOT NULL
+    ) ON COMMIT DROP;
+    TRUNCATE _stock_lines;
+
+    INSERT INTO _stock_lines (product_id, requested)
+    SELECT (line->>'product_id')::UUID, SUM((line->>'quantity')::INTEGER)
+    FROM jsonb_array_elements(p_items) AS line
+    WHERE (line->>'quantity')::INTEGER > 0
+    GROUP BY (line->>'product_id')::UUID;
+
+    -- Lock the affected rows in a stable order so concurrent batches that
+    -- share products queue behind each other instead of deadlocking.
+    PERFORM 1
+    FROM products p
+    JOIN _stock_lines l ON l.product_id = p.id
+    WHERE p.owner_id = p_owner_id
+    ORDER BY p.id
+    FOR UPDATE OF p;
+
+    IF p_all_or_nothing THEN
+        SELECT COUNT(*) INTO v_shortfall
+        FROM _stock_lines l
+        LEFT JOIN products p ON p.id = l.product_id AND p.owner_id = p_owner_id
+        WHERE p.id IS NULL OR p.quantity < l.requested;
+
+        IF v_shortfall > 0 THEN
+            RETURN QUERY
+            SELECT l.product_id, l.requested, FALSE, p.quantity
+            FROM _stock_lines l
+            LEFT JOIN products p ON p.id = l.product_id AND p.owner_id = p_owner_id;
+            RETURN;
+        END IF;
+    END IF;
+
+    RETURN QUERY
+    WITH updated AS (
+        UPDATE products p
+        SET quantity = p.quantity - l.requested,
+            updated_at = NOW()
+        FROM _stock_lines l
+        WHERE p.id = l.product_id
+          AND p.owner_id = p_owner_id
+          AND p.quantity >= l.requested
+        RETURNING p.id, p.quantity
+    )
+    SELECT
+        l.product_id,
+        l.requested,
+        u.id IS NOT NULL,
+        COALESCE(u.quantity, p.quantity)
+    FROM _stock_lines l
+    LEFT JOIN updated u ON u.id = l.product_id
+    LEFT JOIN products p ON p.id = l.product_id AND p.owner_id = p_owner_id;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+COMMENT ON FUNCTION deduct_stock_batch(UUID, JSONB, BOOLEAN) IS 'Conditionally decrements stock for many invoice or sale lines in one statement';
@@ -0,0 +1,104 @@
+-- Delta-sync change feed for offline-first clients
+-- Run this in your Supabase SQL Editor
+--
+-- Every insert/update on a synced table stamps the row with a value from one
+-- global, monotonic sequence. Deletes leave a tombstone with a value from the
+-- same sequence. A client keeps the highest version it has seen as its cursor
+-- and asks only for rows with a higher version.
+--
+-- A version is taken when the row is written, not when its transaction
+-- commits, so a slow transaction can commit a version below one a client has
+-- already passed. Each version is therefore stamped with the time it was taken
+-- (row_version_at) and the feed holds back versions younger than a settle
+-- window (see services/sync_service.py), bounding how long a write may take
+-- to commit.
+
+CREATE SEQUENCE IF NOT EXISTS sync_version_seq;
+
+-- Deleted rows, kept so clients can remove them locally
+CREATE TABLE IF NOT EXISTS sync_tombstones (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    owner_id UUID NOT NULL,
+    table_name TEXT NOT NULL,
+    row_id UUID NOT NULL,
+    row_version BIGINT NOT NULL DEFAULT nextval('sync_version_seq'),
+    row_version_at TIMESTAMP WITH TIME ZONE DEFAULT clock_timestamp(),
+    deleted_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_sync_tombstones_owner_version ON sync_tombstones(owner_id, row_version);
+CREATE INDEX IF NOT EXISTS idx_sync_tombstones_deleted_at ON sync_tombstones(deleted_at);
+
+ALTER TABLE sync_tombstones ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Users can read own tombstones" ON sync_tombstones
+    FOR SELECT USING (auth.uid() = owner_id);
+
+-- Stamp row_version on every write; created_version only on insert.
+-- clock_timestamp(), not NOW(): a version must not look older than when it was taken
+CREATE OR REPLACE FUNCTION stamp_sync_version()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.row_version := nextval('sync_version_seq');
+    NEW.row_version_at := clock_timestamp();
+    IF TG_OP = 'INSERT' THEN
+        NEW.created_version := NEW.row_version;
+    ELSE
+        NEW.created_version := OLD.created_version;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION record_sync_tombstone()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF OLD.owner_id IS NOT NULL THEN
+        INSERT INTO sync_tombstones (owner_id, table_name, row_id)
+        VALUES (OLD.owner_id, TG_TABLE_NAME, OLD.id);
+    END IF;
+    RETURN OLD;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- Apply to each synced table
+DO $$
+DECLARE
+    synced_table TEXT;
+BEGIN
+    FOREACH synced_table IN ARRAY ARRAY['products', 'customers', 'sales', 'invoices', 'expenses']
+    LOOP
+        EXECUTE format('ALTER TABLE %I ADD COLUMN IF NOT EXISTS row_version BIGINT', synced_table);
+        EXECUTE format('ALTER TABLE %I ADD COLUMN IF NOT EXISTS created_version BIGINT', synced_table);
+        -- NULL for backfilled rows, which are long settled
+        EXECUTE format('ALTER TABLE %I ADD COLUMN IF NOT EXISTS row_version_at TIMESTAMP WITH TIME ZONE', synced_table);
+
+        -- Backfill existing rows so the first sync (since=0) returns them
+        EXECUTE format(
+            'UPDATE %I SET row_version = nextval(''sync_version_seq'') WHERE row_version IS NULL',
+            synced_table
+        );
+        EXECUTE format('UPDATE %I SET created_version = row_version WHERE created_version IS NULL', synced_table);
+
+        EXECUTE format(
+            'CREATE INDEX IF NOT EXISTS %I ON %I(owner_id, row_version)',
+            'idx_' || synced_table || '_owner_row_version', synced_table
+        );
+
+        EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', synced_table || '_sync_version', synced_table);
+        EXECUTE format(
+            'CREATE TRIGGER %I BEFORE INSERT OR UPDATE ON %I FOR EACH ROW EXECUTE FUNCTION stamp_sync_version()',
+            synced_table || '_sync_version', synced_table
+        );
+
+        EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', synced_table || '_sync_tombstone', synced_table);
+        EXECUTE format(
+            'CREATE TRIGGER %I AFTER DELETE ON %I FOR EACH ROW EXECUTE FUNCTION record_sync_tombstone()',
+            synced_table || '_sync_tombstone', synced_table
+        );
+    END LOOP;
+END;
+$$;
+
+COMMENT ON TABLE sync_tombstones IS 'Deleted rows reported to offline clients by the /sync/changes feed';
+COMMENT ON FUNCTION stamp_sync_version() IS 'Stamps row_version and row_version_at (every write) and created_version (insert) from sync_version_seq';
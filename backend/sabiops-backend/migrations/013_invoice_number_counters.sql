@@ -0,0 +1,70 @@
+-- Per-owner, per-day invoice number counters
+-- Run this in your Supabase SQL Editor
+--
+-- Replaces "count today's invoices, then probe invoice_number until free" with
+-- a single atomic increment. Two invoices created at the same moment for the
+-- same owner always receive different numbers. Numbers may have gaps (an
+-- allocated number whose invoice insert fails is not reused), but never repeat.
+
+CREATE TABLE IF NOT EXISTS invoice_number_counters (
+    owner_id UUID NOT NULL,
+    counter_date DATE NOT NULL,
+    last_value INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    PRIMARY KEY (owner_id, counter_date)
+);
+
+ALTER TABLE invoice_number_counters ENABLE ROW LEVEL SECURITY;
+
+-- Invoice numbers repeat across owners (INV-YYYYMMDD-0001 for everyone), so
+-- uniqueness is per owner
+ALTER TABLE invoices DROP CONSTRAINT IF EXISTS invoices_invoice_number_key;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_invoices_owner_invoice_number ON invoices(owner_id, invoice_number);
+
+-- Reserve p_count consecutive numbers for an owner and day.
+-- Returns the first number of the block; the block is [first, first + p_count - 1].
+--
+-- The first allocation of a day seeds the counter from invoices that already
+-- use that day's prefix, so switching over mid-day does not reissue numbers.
+CREATE OR REPLACE FUNCTION allocate_invoice_numbers(
+    p_owner_id UUID,
+    p_day DATE,
+    p_count INTEGER DEFAULT 1
+)
+RETURNS INTEGER AS $$
+DECLARE
+    v_last INTEGER;
+    v_seed INTEGER;
+    v_prefix TEXT := 'INV-' || to_char(p_day, 'YYYYMMDD') || '-';
+BEGIN
+    IF p_count IS NULL OR p_count < 1 THEN
+        RAISE EXCEPTION 'p_count must be at least 1';
+    END IF;
+
+    UPDATE invoice_number_counters
+    SET last_value = last_value + p_count,
+        updated_at = NOW()
+    WHERE owner_id = p_owner_id AND counter_date = p_day
+    RETURNING last_value INTO v_last;
+
+    IF NOT FOUND THEN
+        SELECT COALESCE(MAX(substring(invoice_number FROM length(v_prefix) + 1)::INTEGER), 0)
+        INTO v_seed
+        FROM invoices
+        WHERE owner_id = p_owner_id
+          AND invoice_number LIKE v_prefix || '%'
+          AND substring(invoice_number FROM length(v_prefix) + 1) ~ '^[0-9]+$';
+
+        INSERT INTO invoice_number_counters (owner_id, counter_date, last_value)
+        VALUES (p_owner_id, p_day, v_seed + p_count)
+        ON CONFLICT (owner_id, counter_date)
+        DO UPDATE SET last_value = invoice_number_counters.last_value + p_count,
+                      updated_at = NOW()
+        RETURNING last_value INTO v_last;
+    END IF;
+
+    RETURN v_last - p_count + 1;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+COMMENT ON FUNCTION allocate_invoice_numbers(UUID, DATE, INTEGER) IS 'Atomically reserves a block of per-owner, per-day invoice numbers and returns the first';
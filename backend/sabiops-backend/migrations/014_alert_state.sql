@@ -0,0 +1,26 @@
+-- Last-sent state for business alerts (low stock, overdue invoices, usage limits)
+-- Run this in your Supabase SQL Editor
+--
+-- Triggers used to ask the notifications table "did I already alert about this
+-- product/invoice?" once per row, every cycle. alert_state keeps one row per
+-- alerted entity instead; a trigger cycle loads the recently-sent rows with one
+-- windowed query and records what it sent with one upsert.
+
+CREATE TABLE IF NOT EXISTS alert_state (
+    entity_type TEXT NOT NULL,          -- 'product', 'invoice', 'feature_usage'
+    entity_id TEXT NOT NULL,            -- product/invoice id, or '<user_id>:<feature_type>'
+    alert_type TEXT NOT NULL,           -- notification type, e.g. 'low_stock_alert'
+    owner_id UUID,
+    last_sent_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    last_value NUMERIC,                 -- days overdue / usage percentage at the last alert
+    PRIMARY KEY (entity_type, entity_id, alert_type)
+);
+
+-- Every cycle reads "alerts of this kind sent since <window start>"
+CREATE INDEX IF NOT EXISTS idx_alert_state_recent ON alert_state(entity_type, last_sent_at DESC);
+CREATE INDEX IF NOT EXISTS idx_alert_state_owner ON alert_state(owner_id);
+
+-- No policies: only the backend (service role) reads and writes alert state
+ALTER TABLE alert_state ENABLE ROW LEVEL SECURITY;
+
+COMMENT ON TABLE alert_state IS 'Last time each business alert was sent per entity; used to deduplicate trigger notifications';
@@ -0,0 +1,28 @@
+-- Watermark cursor for consuming inventory_changes
+-- Run this in your Supabase SQL Editor
+--
+-- The low stock monitor used to re-read the last hour of inventory_changes
+-- every 30 minutes. Each change now carries a value from a monotonic sequence
+-- and the monitor keeps the highest value it has processed in trigger_cursors,
+-- so every run reads only the changes it has not seen yet.
+
+CREATE SEQUENCE IF NOT EXISTS inventory_change_seq;
+
+-- Adding the column with a sequence default also numbers existing rows
+ALTER TABLE inventory_changes
+    ADD COLUMN IF NOT EXISTS change_seq BIGINT NOT NULL DEFAULT nextval('inventory_change_seq');
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_inventory_changes_change_seq ON inventory_changes(change_seq);
+
+-- One row per consumer: the last sequence value it has fully processed
+CREATE TABLE IF NOT EXISTS trigger_cursors (
+    name TEXT PRIMARY KEY,              -- e.g. 'inventory_changes'
+    position BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- No policies: only the backend (service role) reads and writes cursors
+ALTER TABLE trigger_cursors ENABLE ROW LEVEL SECURITY;
+
+COMMENT ON COLUMN inventory_changes.change_seq IS 'Monotonic position of the change; consumers page with change_seq > cursor';
+COMMENT ON TABLE trigger_cursors IS 'Persisted watermark per change-feed consumer';
@@ -0,0 +1,73 @@
+-- Scheduler leader leases and job run history
+-- Run this in your Supabase SQL Editor
+--
+-- Every worker process starts the notification scheduler and the
+-- subscription monitor. Each schedule now has a lease row: only the process
+-- holding an unexpired lease runs the jobs, and it renews the lease with a
+-- heartbeat. If the leader dies, another process takes over once the lease
+-- expires. job_runs records every run with its duration and rows processed.
+
+CREATE TABLE IF NOT EXISTS scheduler_leases (
+    name TEXT PRIMARY KEY,              -- e.g. 'notification_scheduler'
+    holder TEXT NOT NULL,               -- '<hostname>:<pid>:<nonce>' of the leader
+    acquired_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    heartbeat_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    expires_at TIMESTAMP WITH TIME ZONE NOT NULL
+);
+
+-- Take the lease if it is free, expired or already ours; renew it if ours.
+-- Returns TRUE when p_holder holds the lease afterwards.
+CREATE OR REPLACE FUNCTION acquire_scheduler_lease(p_name TEXT, p_holder TEXT, p_ttl_seconds INTEGER)
+RETURNS BOOLEAN AS $$
+DECLARE
+    v_holder TEXT;
+BEGIN
+    INSERT INTO scheduler_leases (name, holder, acquired_at, heartbeat_at, expires_at)
+    VALUES (p_name, p_holder, NOW(), NOW(), NOW() + make_interval(secs => p_ttl_seconds))
+    ON CONFLICT (name) DO UPDATE
+        SET holder = EXCLUDED.holder,
+            acquired_at = CASE WHEN scheduler_leases.holder = EXCLUDED.holder
+                               THEN scheduler_leases.acquired_at ELSE NOW() END,
+            heartbeat_at = NOW(),
+            expires_at = EXCLUDED.expires_at
+        WHERE scheduler_leases.holder = EXCLUDED.holder
+           OR scheduler_leases.expires_at < NOW()
+    RETURNING holder INTO v_holder;
+
+    RETURN v_holder IS NOT NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- Give the lease up on shutdown so another process can lead immediately
+CREATE OR REPLACE FUNCTION release_scheduler_lease(p_name TEXT, p_holder TEXT)
+RETURNS BOOLEAN AS $$
+BEGIN
+    DELETE FROM scheduler_leases WHERE name = p_name AND holder = p_holder;
+    RETURN FOUND;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+CREATE TABLE IF NOT EXISTS job_runs (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    job_name TEXT NOT NULL,
+    holder TEXT,                        -- lease holder that ran the job
+    status TEXT NOT NULL CHECK (status IN ('succeeded', 'failed')),
+    started_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    finished_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    duration_ms INTEGER NOT NULL,
+    rows_processed INTEGER NOT NULL DEFAULT 0,
+    details JSONB DEFAULT '{}'::jsonb,
+    error TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_job_runs_job_started ON job_runs(job_name, started_at DESC);
+CREATE INDEX IF NOT EXISTS idx_job_runs_started ON job_runs(started_at);
+
+-- No policies: only the backend (service role) reads and writes these
+ALTER TABLE scheduler_leases ENABLE ROW LEVEL SECURITY;
+ALTER TABLE job_runs ENABLE ROW LEVEL SECURITY;
+
+COMMENT ON TABLE scheduler_leases IS 'Leader lease per background schedule; one process runs each schedule';
+COMMENT ON TABLE job_runs IS 'History of scheduled job runs with duration and rows processed';
+COMMENT ON FUNCTION acquire_scheduler_lease(TEXT, TEXT, INTEGER) IS 'Atomically acquires or renews a scheduler lease; returns TRUE when held';
+COMMENT ON FUNCTION release_scheduler_lease(TEXT, TEXT) IS 'Releases a scheduler lease held by p_holder';
@@ -0,0 +1,109 @@
+-- Per-user unread notification counters
+-- Run this in your Supabase SQL Editor
+--
+-- The notification poll used to select every unread notification id just to
+-- count them, so accounts that never open the panel got slower to poll the
+-- more they ignored. notification_unread_counts keeps one row per user,
+-- maintained by statement-level triggers on notifications: a bulk insert or
+-- "mark all read" adjusts each affected user's counter once, and the poll
+-- reads a single row.
+
+CREATE TABLE IF NOT EXISTS notification_unread_counts (
+    user_id UUID PRIMARY KEY,
+    unread_count INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- Apply per-user deltas; rows are created on first use
+CREATE OR REPLACE FUNCTION apply_notification_unread_deltas(p_deltas JSONB)
+RETURNS VOID AS $$
+BEGIN
+    INSERT INTO notification_unread_counts (user_id, unread_count, updated_at)
+    SELECT (d.key)::UUID, GREATEST((d.value)::INTEGER, 0), NOW()
+    FROM jsonb_each_text(p_deltas) AS d
+    WHERE (d.value)::INTEGER <> 0
+    ON CONFLICT (user_id) DO UPDATE
+        SET unread_count = GREATEST(notification_unread_counts.unread_count + (p_deltas ->> EXCLUDED.user_id::TEXT)::INTEGER, 0),
+            updated_at = NOW();
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+CREATE OR REPLACE FUNCTION notifications_unread_after_insert()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM apply_notification_unread_deltas(COALESCE((
+        SELECT jsonb_object_agg(user_id, n)
+        FROM (SELECT user_id, COUNT(*) AS n FROM new_rows WHERE NOT COALESCE(read, FALSE) GROUP BY user_id) s
+    ), '{}'::jsonb));
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+CREATE OR REPLACE FUNCTION notifications_unread_after_update()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM apply_notification_unread_deltas(COALESCE((
+        SELECT jsonb_object_agg(user_id, n)
+        FROM (
+            SELECT user_id, SUM(delta) AS n FROM (
+                SELECT user_id, 1 AS delta FROM new_rows WHERE NOT COALESCE(read, FALSE)
+                UNION ALL
+                SELECT user_id, -1 AS delta FROM old_rows WHERE NOT COALESCE(read, FALSE)
+            ) changes
+            GROUP BY user_id
+        ) s
+    ), '{}'::jsonb));
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+CREATE OR REPLACE FUNCTION notifications_unread_after_delete()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM apply_notification_unread_deltas(COALESCE((
+        SELECT jsonb_object_agg(user_id, -n)
+        FROM (SELECT user_id, COUNT(*) AS n FROM old_rows WHERE NOT COALESCE(read, FALSE) GROUP BY user_id) s
+    ), '{}'::jsonb));
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+DROP TRIGGER IF EXISTS notifications_unread_insert ON notifications;
+CREATE TRIGGER notifications_unread_insert
+    AFTER INSERT ON notifications
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notifications_unread_after_insert();
+
+DROP TRIGGER IF EXISTS notifications_unread_update ON notifications;
+CREATE TRIGGER notifications_unread_update
+    AFTER UPDATE ON notifications
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notifications_unread_after_update();
+
+DROP TRIGGER IF EXISTS notifications_unread_delete ON notifications;
+CREATE TRIGGER notifications_unread_delete
+    AFTER DELETE ON notifications
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notifications_unread_after_delete();
+
+-- Backfill from the existing notifications
+INSERT INTO notification_unread_counts (user_id, unread_count, updated_at)
+SELECT user_id, COUNT(*), NOW()
+FROM notifications
+WHERE NOT COALESCE(read, FALSE)
+GROUP BY user_id
+ON CONFLICT (user_id) DO UPDATE
+    SET unread_count = EXCLUDED.unread_count,
+        updated_at = NOW();
+
+-- Fallback count query of the poll when the counter table is unavailable
+CREATE INDEX IF NOT EXISTS idx_notifications_user_unread ON notifications(user_id) WHERE read = FALSE;
+
+-- Users may read their own counter; only the triggers write it
+ALTER TABLE notification_unread_counts ENABLE ROW LEVEL SECURITY;
+DROP POLICY IF EXISTS "Users can view their own unread count" ON notification_unread_counts;
+CREATE POLICY "Users can view their own unread count" ON notification_unread_counts
+    FOR SELECT USING (auth.uid() = user_id);
+
+COMMENT ON TABLE notification_unread_counts IS 'Unread notification count per user, maintained by triggers on notifications';
+COMMENT ON FUNCTION apply_notification_unread_deltas(JSONB) IS 'Adds {user_id: delta} to the unread counters, never below zero';
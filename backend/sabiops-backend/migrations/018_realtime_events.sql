@@ -0,0 +1,26 @@
+-- Realtime event log for the Server-Sent Events stream
+-- Run this in your Supabase SQL Editor
+--
+-- Write paths insert small events (new notification, notifications read,
+-- sale recorded) here. Every worker process polls the log by id once a
+-- second, only while it has SSE connections, and pushes each event to the
+-- connections of its user. The id is also the SSE event id, so a reconnecting
+-- client resumes with Last-Event-ID. Events are purged after a day.
+
+CREATE TABLE IF NOT EXISTS realtime_events (
+    id BIGSERIAL PRIMARY KEY,
+    user_id UUID NOT NULL,              -- recipient: a user, or an owner for business-wide events
+    event TEXT NOT NULL,                -- 'notification', 'notifications_read', 'dashboard'
+    data JSONB NOT NULL DEFAULT '{}'::jsonb,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- Last-Event-ID replay: "this user's events after id N"
+CREATE INDEX IF NOT EXISTS idx_realtime_events_user_id ON realtime_events(user_id, id);
+-- Retention purge
+CREATE INDEX IF NOT EXISTS idx_realtime_events_created_at ON realtime_events(created_at);
+
+-- No policies: only the backend (service role) reads and writes events
+ALTER TABLE realtime_events ENABLE ROW LEVEL SECURITY;
+
+COMMENT ON TABLE realtime_events IS 'Short-lived event log fanned out to SSE connections; id is the SSE event id';
@@ -0,0 +1,82 @@
+-- Retention: archived notification summaries, batched purge and read indexes
+-- Run this in your Supabase SQL Editor
+--
+-- Old notifications used to be removed by one unbounded DELETE from an HTTP
+-- route, and push_subscriptions / one-time token rows were never pruned. The
+-- scheduler now purges off-peak in small batches (see services/retention.py).
+-- Before a notification batch is deleted it is summarised into
+-- notification_archive (count per user, type, read state and month), so
+-- long-range reporting survives the purge.
+
+CREATE TABLE IF NOT EXISTS notification_archive (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    user_id UUID NOT NULL,
+    notification_type TEXT,
+    read BOOLEAN NOT NULL,
+    period_start DATE NOT NULL,         -- month the notifications were created in
+    notification_count INTEGER NOT NULL,
+    archived_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- Rows are appended per purge batch; sum notification_count when reading
+CREATE INDEX IF NOT EXISTS idx_notification_archive_user_period ON notification_archive(user_id, period_start);
+
+-- Summarise and delete one batch of notifications created before p_cutoff,
+-- oldest first. p_read NULL means read and unread; p_user_id NULL means everyone.
+-- Returns the number of notifications deleted (0 when there is nothing left).
+CREATE OR REPLACE FUNCTION archive_notifications_batch(
+    p_cutoff TIMESTAMP WITH TIME ZONE,
+    p_read BOOLEAN,
+    p_user_id UUID,
+    p_limit INTEGER
+)
+RETURNS INTEGER AS $$
+DECLARE
+    v_deleted INTEGER;
+BEGIN
+    WITH doomed AS (
+        SELECT id FROM notifications
+        WHERE created_at < p_cutoff
+          AND (p_read IS NULL OR read = p_read)
+          AND (p_user_id IS NULL OR user_id = p_user_id)
+        ORDER BY created_at
+        LIMIT p_limit
+        FOR UPDATE SKIP LOCKED
+    ), gone AS (
+        DELETE FROM notifications n
+        USING doomed d
+        WHERE n.id = d.id
+        RETURNING n.user_id, n.type, COALESCE(n.read, FALSE) AS read, n.created_at
+    ), archived AS (
+        INSERT INTO notification_archive (user_id, notification_type, read, period_start, notification_count)
+        SELECT user_id, type, read, date_trunc('month', created_at)::DATE, COUNT(*)
+        FROM gone
+        GROUP BY user_id, type, read, date_trunc('month', created_at)::DATE
+        RETURNING notification_count
+    )
+    SELECT COALESCE(SUM(notification_count), 0) INTO v_deleted FROM archived;
+
+    RETURN v_deleted;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- Notification list, unread count and mark-all-read: user_id, read, newest first
+CREATE INDEX IF NOT EXISTS idx_notifications_user_read_created ON notifications(user_id, read, created_at DESC);
+-- Retention scans, oldest first
+CREATE INDEX IF NOT EXISTS idx_notifications_created_at ON notifications(created_at);
+
+-- Dead and stale device tokens
+CREATE INDEX IF NOT EXISTS idx_push_subscriptions_active_last_used ON push_subscriptions(active, last_used_at);
+
+-- Expired one-time tokens
+CREATE INDEX IF NOT EXISTS idx_email_verification_tokens_expires_at ON email_verification_tokens(expires_at);
+CREATE INDEX IF NOT EXISTS idx_password_reset_tokens_expires_at ON password_reset_tokens(expires_at);
+
+-- Users may read their own archived counts; only the purge writes them
+ALTER TABLE notification_archive ENABLE ROW LEVEL SECURITY;
+DROP POLICY IF EXISTS "Users can view their own notification archive" ON notification_archive;
+CREATE POLICY "Users can view their own notification archive" ON notification_archive
+    FOR SELECT USING (auth.uid() = user_id);
+
+COMMENT ON TABLE notification_archive IS 'Monthly notification counts per user and type, kept after old notifications are purged';
+COMMENT ON FUNCTION archive_notifications_batch(TIMESTAMP WITH TIME ZONE, BOOLEAN, UUID, INTEGER) IS 'Summarises then deletes one batch of notifications older than p_cutoff';
@@ -0,0 +1,80 @@
+-- Atomic feature usage increment-and-check
+-- Run this in your Supabase SQL Editor
+--
+-- Counting a created item used to read the feature_usage row, write the new
+-- count back and then mirror it into users.current_month_*: three or four
+-- round trips per create, and two concurrent creates could both read the same
+-- count and lose an increment. increment_feature_usage_checked does the whole
+-- thing under a row lock and returns the new count and the limit, so callers
+-- need no follow-up read.
+
+-- Add p_amount (negative to decrement, never below zero) to the owner's
+-- current usage row, creating it on first use. With p_enforce_limit the
+-- increment is refused when it would pass the limit; 'applied' says which.
+-- p_limit, when given, is the plan limit and is stored on the row.
+CREATE OR REPLACE FUNCTION increment_feature_usage_checked(
+    p_user_id UUID,
+    p_feature_type TEXT,
+    p_amount INTEGER DEFAULT 1,
+    p_limit INTEGER DEFAULT NULL,
+    p_enforce_limit BOOLEAN DEFAULT FALSE
+)
+RETURNS JSONB AS $$
+DECLARE
+    v_row feature_usage%ROWTYPE;
+    v_limit INTEGER;
+    v_applied BOOLEAN := TRUE;
+BEGIN
+    -- Serialises first use too, when there is no row to lock yet
+    PERFORM pg_advisory_xact_lock(hashtext(p_user_id::TEXT || ':' || p_feature_type));
+
+    SELECT * INTO v_row
+    FROM feature_usage
+    WHERE user_id = p_user_id AND feature_type = p_feature_type
+    ORDER BY period_end DESC NULLS LAST
+    LIMIT 1
+    FOR UPDATE;
+
+    IF NOT FOUND THEN
+        INSERT INTO feature_usage (user_id, feature_type, current_count, limit_count,
+                                   period_start, period_end, created_at, updated_at)
+        VALUES (p_user_id, p_feature_type, 0, COALESCE(p_limit, 0),
+                NOW(), NOW() + INTERVAL '30 days', NOW(), NOW())
+        RETURNING * INTO v_row;
+    END IF;
+
+    v_limit := COALESCE(p_limit, v_row.limit_count, 0);
+
+    IF p_enforce_limit AND p_amount > 0 AND v_row.current_count + p_amount > v_limit THEN
+        v_applied := FALSE;
+    ELSE
+        UPDATE feature_usage
+        SET current_count = GREATEST(current_count + p_amount, 0),
+            limit_count = v_limit,
+            updated_at = NOW(),
+            last_synced_at = NOW(),
+            sync_status = 'synced'
+        WHERE id = v_row.id
+        RETURNING * INTO v_row;
+
+        -- Older screens still read these columns
+        IF p_feature_type = 'invoices' THEN
+            UPDATE users SET current_month_invoices = v_row.current_count WHERE id = p_user_id;
+        ELSIF p_feature_type = 'expenses' THEN
+            UPDATE users SET current_month_expenses = v_row.current_count WHERE id = p_user_id;
+        END IF;
+    END IF;
+
+    RETURN jsonb_build_object(
+        'applied', v_applied,
+        'current_count', v_row.current_count,
+        'limit_count', v_limit,
+        'period_start', v_row.period_start,
+        'period_end', v_row.period_end
+    );
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+CREATE INDEX IF NOT EXISTS idx_feature_usage_user_feature ON feature_usage(user_id, feature_type);
+
+COMMENT ON FUNCTION increment_feature_usage_checked(UUID, TEXT, INTEGER, INTEGER, BOOLEAN) IS 'Atomically adds to a feature usage counter, optionally refusing to pass the limit; returns the new count and limit';
@@ -0,0 +1,41 @@
+-- One-call usage status per business owner
+-- Run this in your Supabase SQL Editor
+--
+-- Usage screens read the owner's feature_usage rows and then counted
+-- invoices, expenses, sales and products with four separate count='exact'
+-- queries. get_owner_usage_status returns the tracked count, period and sync
+-- state next to the actual record count for every tracked feature in one
+-- round trip. Plan limits are not stored here; the API takes them from the
+-- plan configuration.
+
+CREATE OR REPLACE FUNCTION get_owner_usage_status(p_owner_id UUID)
+RETURNS JSONB AS $$
+    SELECT jsonb_object_agg(f.feature_type, jsonb_build_object(
+        'tracked', fu.id IS NOT NULL,
+        'current_count', COALESCE(fu.current_count, 0),
+        'period_start', fu.period_start,
+        'period_end', fu.period_end,
+        'sync_status', fu.sync_status,
+        'last_synced_at', fu.last_synced_at,
+        'actual_count', CASE f.feature_type
+            WHEN 'invoices' THEN (SELECT COUNT(*) FROM invoices WHERE owner_id = p_owner_id)
+            WHEN 'expenses' THEN (SELECT COUNT(*) FROM expenses WHERE owner_id = p_owner_id)
+            WHEN 'sales' THEN (SELECT COUNT(*) FROM sales WHERE owner_id = p_owner_id)
+            WHEN 'products' THEN (SELECT COUNT(*) FROM products WHERE owner_id = p_owner_id)
+        END
+    ))
+    FROM (VALUES ('invoices'), ('expenses'), ('sales'), ('products')) AS f(feature_type)
+    LEFT JOIN LATERAL (
+        SELECT *
+        FROM feature_usage
+        WHERE user_id = p_owner_id AND feature_type = f.feature_type
+        ORDER BY period_end DESC NULLS LAST
+        LIMIT 1
+    ) fu ON TRUE;
+$$ LANGUAGE sql STABLE SECURITY DEFINER SET search_path = public;
+
+-- The counts are index-only scans with these
+CREATE INDEX IF NOT EXISTS idx_expenses_owner_id ON expenses(owner_id);
+CREATE INDEX IF NOT EXISTS idx_sales_owner_id ON sales(owner_id);
+
+COMMENT ON FUNCTION get_owner_usage_status(UUID) IS 'Tracked usage, period and actual record count of every tracked feature for one business owner';
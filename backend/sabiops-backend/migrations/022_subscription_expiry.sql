@@ -0,0 +1,61 @@
+-- Set-based subscription expiry and trial countdown
+-- Run this in your Supabase SQL Editor
+--
+-- The expiry check read every lapsed user and downgraded them one at a time:
+-- a users update plus a read and write per feature for each of them, and
+-- trial_days_left was never counted down at all. run_subscription_expiry does
+-- the daily pass as one statement. Lapsed plans (paid and trial) drop to free
+-- with the owner's usage counters reset to p_free_limits. Running trials get
+-- trial_days_left recomputed from subscription_end_date, which is idempotent
+-- if the job runs twice in a day. The changed users are returned so the
+-- caller can notify them with one bulk insert (see services/subscription_expiry.py).
+
+-- event is 'expired' (days_left 0) or 'trial' (days_left is the new trial_days_left)
+CREATE OR REPLACE FUNCTION run_subscription_expiry(
+    p_free_limits JSONB,
+    p_now TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+)
+RETURNS TABLE (user_id UUID, owner_id UUID, event TEXT, days_left INTEGER) AS $$
+    WITH expired AS (
+        UPDATE users u
+        SET subscription_plan = 'free',
+            subscription_status = 'inactive',
+            trial_days_left = 0,
+            current_month_invoices = 0,
+            current_month_expenses = 0,
+            usage_reset_date = p_now::DATE,
+            updated_at = p_now
+        WHERE u.subscription_end_date < p_now
+          AND u.subscription_plan <> 'free'
+        RETURNING u.id, u.owner_id
+    ), reset AS (
+        -- Usage is tracked on the owner's rows; runs even though nothing reads it
+        UPDATE feature_usage fu
+        SET current_count = 0,
+            limit_count = (p_free_limits ->> fu.feature_type)::INTEGER,
+            period_start = p_now,
+            period_end = p_now + INTERVAL '30 days',
+            updated_at = p_now
+        FROM expired e
+        WHERE fu.user_id = e.id
+          AND e.owner_id IS NULL
+          AND p_free_limits ? fu.feature_type
+        RETURNING fu.id
+    ), countdown AS (
+        UPDATE users u
+        SET trial_days_left = CEIL(EXTRACT(EPOCH FROM (u.subscription_end_date - p_now)) / 86400)::INTEGER,
+            updated_at = p_now
+        WHERE u.subscription_status = 'trial'
+          AND u.subscription_end_date >= p_now
+          AND u.trial_days_left IS DISTINCT FROM
+              CEIL(EXTRACT(EPOCH FROM (u.subscription_end_date - p_now)) / 86400)::INTEGER
+        RETURNING u.id, u.owner_id, u.trial_days_left
+    )
+    SELECT e.id, e.owner_id, 'expired'::TEXT, 0 FROM expired e
+    UNION ALL
+    SELECT c.id, c.owner_id, 'trial'::TEXT, c.trial_days_left FROM countdown c;
+$$ LANGUAGE sql SECURITY DEFINER SET search_path = public;
+
+CREATE INDEX IF NOT EXISTS idx_users_subscription_end_date ON users(subscription_end_date);
+
+COMMENT ON FUNCTION run_subscription_expiry(JSONB, TIMESTAMP WITH TIME ZONE) IS 'Daily pass: downgrade lapsed plans to free, recompute trial days left; returns the users changed';
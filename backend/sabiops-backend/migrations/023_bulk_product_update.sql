@@ -0,0 +1,40 @@
+-- Column-wise bulk product update
+-- Run this in your Supabase SQL Editor
+--
+-- The bulk update endpoint read every product, merged the changes in memory
+-- and upserted whole rows. A sale committed between the read and the upsert
+-- had its stock deduction overwritten by the quantity that was read.
+-- bulk_update_products writes, in one statement, only the columns each item
+-- names; every other column keeps its current value (see
+-- routes/product.py apply_bulk_product_updates).
+
+-- p_updates is a JSON array of {"id": UUID, <column>: <value>, ...}. Values are
+-- cast to the products column types; items for other owners are ignored.
+-- Returns the updated rows.
+CREATE OR REPLACE FUNCTION bulk_update_products(
+    p_owner_id UUID,
+    p_updates JSONB
+)
+RETURNS SETOF products AS $$
+    UPDATE products p
+    SET name = CASE WHEN u.item ? 'name' THEN r.name ELSE p.name END,
+        description = CASE WHEN u.item ? 'description' THEN r.description ELSE p.description END,
+        price = CASE WHEN u.item ? 'price' THEN r.price ELSE p.price END,
+        cost_price = CASE WHEN u.item ? 'cost_price' THEN r.cost_price ELSE p.cost_price END,
+        quantity = CASE WHEN u.item ? 'quantity' THEN r.quantity ELSE p.quantity END,
+        low_stock_threshold = CASE WHEN u.item ? 'low_stock_threshold' THEN r.low_stock_threshold ELSE p.low_stock_threshold END,
+        category = CASE WHEN u.item ? 'category' THEN r.category ELSE p.category END,
+        sub_category = CASE WHEN u.item ? 'sub_category' THEN r.sub_category ELSE p.sub_category END,
+        sku = CASE WHEN u.item ? 'sku' THEN r.sku ELSE p.sku END,
+        barcode = CASE WHEN u.item ? 'barcode' THEN r.barcode ELSE p.barcode END,
+        image_url = CASE WHEN u.item ? 'image_url' THEN r.image_url ELSE p.image_url END,
+        active = CASE WHEN u.item ? 'active' THEN r.active ELSE p.active END,
+        updated_at = NOW()
+    FROM jsonb_array_elements(p_updates) AS u(item)
+    CROSS JOIN LATERAL jsonb_populate_record(NULL::products, u.item) AS r
+    WHERE p.id = r.id
+      AND p.owner_id = p_owner_id
+    RETURNING p.*;
+$$ LANGUAGE sql SECURITY DEFINER SET search_path = public;
+
+COMMENT ON FUNCTION bulk_update_products(UUID, JSONB) IS 'Update only the named columns of many products of one owner in one statement';
@@ -32,6 +32,11 @@ from .routes.search import search_bp
 from .routes.data_integrity import data_integrity_bp
 from .routes.subscription import subscription_bp
 from .routes.analytics import analytics_bp
+from .routes.imports import imports_bp
+from .routes.sync import sync_bp
+from .routes.jobs import jobs_bp
+from .routes.realtime import realtime_bp
+from .services.job_queue import job_queue
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -40,7 +45,9 @@ def create_app():
     app = Flask(__name__)
 
     app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', 'dev-secret-key-change-in-production')
-    app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(hours=24)
+    # Access tokens carry entitlement claims, so they are short-lived and renewed at /auth/refresh
+    app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(minutes=int(os.getenv('JWT_ACCESS_TOKEN_MINUTES', '15')))
+    app.config['JWT_REFRESH_TOKEN_EXPIRES'] = timedelta(days=int(os.getenv('JWT_REFRESH_TOKEN_DAYS', '30')))
     app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 
     # Dynamic CORS configuration for production and preview environments
@@ -101,7 +108,7 @@ def create_app():
     cors_config = {
         'origins': '*',  # Allow all origins temporarily
         'supports_credentials': True,
-        'allow_headers': ["Content-Type", "Authorization", "X-Requested-With", "Accept", "Origin", "X-Vercel-Deployment-Url"],
+        'allow_headers': ["Content-Type", "Authorization", "X-Requested-With", "Accept", "Origin", "X-Vercel-Deployment-Url", "Idempotency-Key"],
         'methods': ["GET", "POST", "PUT", "DELETE", "OPTIONS", "PATCH"]
     }
     
@@ -240,6 +247,13 @@ def create_app():
     app.register_blueprint(data_integrity_bp, url_prefix='/api/data-integrity')
     app.register_blueprint(subscription_bp, url_prefix='/api/subscription')
     app.register_blueprint(analytics_bp, url_prefix="/api/analytics")
+    app.register_blueprint(imports_bp, url_prefix='/imports')
+    app.register_blueprint(sync_bp, url_prefix='/sync')
+    app.register_blueprint(jobs_bp, url_prefix='/jobs')
+    app.register_blueprint(realtime_bp, url_prefix='/realtime')
+    
+    # Background workers for queued email/push jobs (also drains jobs left by a previous process)
+    job_queue.start(app)
     
     # Register test routes (remove in production)
     from .routes.test_notifications import test_notifications_bp
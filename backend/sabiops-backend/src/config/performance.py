@@ -161,9 +161,9 @@ class BackgroundTasks:
     
     @staticmethod
     def send_email_async(email_data):
-        """Send email in background."""
-        # This would integrate with Celery or similar
-        pass
+        """Send email in background; returns the job id."""
+        from src.services.job_queue import job_queue
+        return job_queue.enqueue("email.send", email_data)
     
     @staticmethod
     def generate_report_async(report_type, user_id, filters):
@@ -1,5 +1,6 @@
 from flask import Blueprint, request, jsonify, current_app, g
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity, JWTManager
+from src.utils.auth_claims import issue_tokens, issue_tokens_for
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import timedelta, datetime, timezone
 import uuid
@@ -98,13 +99,13 @@ def register():
 """
                     from src.services.email_service import email_service
                     try:
-                        email_service.send_email(
+                        email_service.queue_email(
                             to_email=email,
                             subject=subject,
                             text_content=body,
                             html_content=html_body
                         )
-                        print(f"[DEBUG] Re-registration: Email sent successfully to {email}")
+                        print(f"[DEBUG] Re-registration: Email queued for {email}")
                     except Exception as e:
                         print(f"[ERROR] Re-registration: Failed to send email: {e}")
                         return error_response("Failed to send verification email", status_code=500)
@@ -251,7 +252,7 @@ def register():
 </html>
 """
             from src.services.email_service import email_service
-            email_service.send_email(
+            email_service.queue_email(
                 to_email=email,
                 subject=subject,
                 text_content=body,
@@ -305,7 +306,7 @@ def register():
 </html>
 """
                 from src.services.email_service import email_service
-                email_service.send_email(
+                email_service.queue_email(
                     to_email=email,
                     subject=subject,
                     text_content=body,
@@ -355,7 +356,7 @@ def register():
 </html>
 """
             from src.services.email_service import email_service
-            email_service.send_email(
+            email_service.queue_email(
                 to_email=email,
                 subject=subject,
                 text_content=body,
@@ -444,7 +445,7 @@ def resend_verification_email():
 </html>
 """
         from src.services.email_service import email_service
-        email_service.send_email(
+        email_service.queue_email(
             to_email=email,
             subject=subject,
             text_content=body,
@@ -504,10 +505,11 @@ def register_confirmed():
                         expires_at = datetime.fromisoformat(token_row["expires_at"]).replace(tzinfo=timezone.utc)
                         current_time = datetime.now(timezone.utc)
                         if user.get("email_confirmed", False) and user.get("email") == email and expires_at > current_time:
-                            access_token = create_access_token(identity=user["id"])
+                            tokens = issue_tokens(user)
                             print(f"[DEBUG] JWT generated for already confirmed user (token not expired)")
                             response_data = {
-                                "access_token": access_token,
+                                "access_token": tokens["access_token"],
+                                "refresh_token": tokens["refresh_token"],
                                 "user": {
                                     "id": user["id"],
                                     "email": user["email"],
@@ -530,10 +532,11 @@ def register_confirmed():
                             print(f"[DEBUG] User not confirmed, forcing email_confirmed=True")
                             supabase.table("users").update({"email_confirmed": True}).eq("id", user_id).execute()
                             user["email_confirmed"] = True
-                        access_token = create_access_token(identity=user["id"])
+                        tokens = issue_tokens(user)
                         print(f"[DEBUG] JWT generated successfully")
                         response_data = {
-                            "access_token": access_token,
+                            "access_token": tokens["access_token"],
+                            "refresh_token": tokens["refresh_token"],
                             "user": {
                                 "id": user["id"],
                                 "email": user["email"],
@@ -564,10 +567,11 @@ def register_confirmed():
                                 print(f"[DEBUG] [RETRY] User not confirmed, forcing email_confirmed=True")
                                 supabase.table("users").update({"email_confirmed": True}).eq("id", user_id).execute()
                                 user["email_confirmed"] = True
-                            access_token = create_access_token(identity=user["id"])
+                            tokens = issue_tokens(user)
                             print(f"[DEBUG] [RETRY] JWT generated successfully")
                             response_data = {
-                                "access_token": access_token,
+                                "access_token": tokens["access_token"],
+                                "refresh_token": tokens["refresh_token"],
                                 "user": {
                                     "id": user["id"],
                                     "email": user["email"],
@@ -683,11 +687,12 @@ def register_confirmed():
     
     # Generate JWT and return user info
     print(f"[DEBUG] Generating JWT for user_id: {user['id']}")
-    access_token = create_access_token(identity=user["id"])
+    tokens = issue_tokens(user)
     print(f"[DEBUG] JWT generated successfully")
     
     response_data = {
-        "access_token": access_token,
+        "access_token": tokens["access_token"],
+        "refresh_token": tokens["refresh_token"],
         "user": {
             "id": user["id"],
             "email": user["email"],
@@ -860,11 +865,12 @@ def login():
                     break
 
         print(f"[DEBUG] Creating access token for user: {user['id']}")
-        access_token = create_access_token(identity=user["id"])
+        tokens = issue_tokens(user)
         print(f"[DEBUG] Access token created successfully")
 
         response_data = {
-                "access_token": access_token,
+                "access_token": tokens["access_token"],
+                "refresh_token": tokens["refresh_token"],
                 "user": {
                     "id": user["id"],
                     "email": user["email"],
@@ -1013,7 +1019,7 @@ def forgot_password():
 """
         text_body = f"You requested a password reset. Use this link to reset your password: {reset_url}\nIf you did not request this, please ignore."
         from src.services.email_service import email_service
-        result = email_service.send_email(
+        result = email_service.queue_email(
             to_email=user["email"],
             subject=subject,
             html_content=html_body,
@@ -1327,6 +1333,35 @@ def verify_token():
             status_code=401
         )
 
+@auth_bp.route("/refresh", methods=["POST"])
+@jwt_required(refresh=True)
+def refresh_token():
+    """
+    Issue a new short-lived access token from a refresh token.
+    Entitlement claims (owner, role, plan) are read fresh, so this is also how
+    a client picks up plan or role changes made elsewhere.
+    """
+    user_id = get_jwt_identity()
+    try:
+        tokens = issue_tokens_for(user_id)
+    except ValueError as e:
+        return error_response(
+            error=str(e),
+            message="Please log in again.",
+            status_code=401
+        )
+    except Exception as e:
+        return error_response(
+            error=str(e),
+            message="Token refresh failed",
+            status_code=500
+        )
+
+    return success_response(
+        message="Token refreshed",
+        data={"access_token": tokens["access_token"]}
+    )
+
 # Error handler for JWT errors
 @auth_bp.errorhandler(401)
 def handle_auth_error(e):
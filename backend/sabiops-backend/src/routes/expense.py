@@ -2,6 +2,7 @@ from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from src.utils.user_context import get_user_context
 from src.utils.subscription_decorators import protected_expense_creation, get_usage_status_for_response
+from src.utils.idempotency import idempotent
 from datetime import datetime, date, timedelta
 import uuid
 import logging
@@ -247,6 +248,7 @@ def get_expenses():
 
 @expense_bp.route("/", methods=["POST"])
 @jwt_required()
+@idempotent
 @protected_expense_creation
 def create_expense():
     try:
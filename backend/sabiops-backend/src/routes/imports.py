@@ -0,0 +1,129 @@
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from werkzeug.utils import secure_filename
+import os
+import tempfile
+import logging
+from src.utils.user_context import get_user_context
+from src.services.import_service import ImportService, ImportJob, queue_import, get_import, list_owner_imports
+from src.utils.subscription_decorators import get_remaining_allowance
+
+imports_bp = Blueprint("imports", __name__)
+logger = logging.getLogger(__name__)
+
+ALLOWED_EXTENSIONS = (".csv", ".xlsx", ".xlsm")
+
+def success_response(data=None, message="Success", status_code=200):
+    return jsonify({
+        "success": True,
+        "data": data,
+        "message": message
+    }), status_code
+
+def error_response(error, message="Error", status_code=400):
+    logger.error(f"[IMPORT API ERROR] Status: {status_code}, Message: {message}, Error: {error}")
+    return jsonify({
+        "success": False,
+        "error": str(error),
+        "message": message,
+        "toast": {
+            "type": "error",
+            "message": message,
+            "timeout": 4000
+        }
+    }), status_code
+
+@imports_bp.route("/<string:entity>", methods=["POST"])
+@jwt_required()
+def start_import(entity):
+    """Upload a CSV/XLSX file and import it in the background"""
+    try:
+        user_id = get_jwt_identity()
+        try:
+            owner_id, user_role = get_user_context(user_id)
+        except ValueError as e:
+            return error_response(str(e), "Authorization error", 403)
+
+        if user_role not in ["Owner", "Admin"]:
+            return error_response("You are not authorized to import data", status_code=403)
+
+        if entity not in ImportService.ENTITY_SPECS:
+            return error_response(
+                f"Unsupported import type: {entity}",
+                f"Import type must be one of: {', '.join(ImportService.ENTITY_SPECS)}",
+                status_code=400
+            )
+
+        upload = request.files.get("file")
+        if not upload or not upload.filename:
+            return error_response("No file provided", "Please choose a CSV or Excel file", status_code=400)
+
+        filename = secure_filename(upload.filename)
+        if not filename.lower().endswith(ALLOWED_EXTENSIONS):
+            return error_response("Unsupported file type", "Only .csv and .xlsx files can be imported", status_code=400)
+
+        mode = request.form.get("mode", "insert")
+        if mode not in ("insert", "upsert") or (mode == "upsert" and entity != "products"):
+            return error_response(f"Invalid mode: {mode}", "Mode 'upsert' is only supported for products", status_code=400)
+
+        allowed, allowance, limit_info = get_remaining_allowance(user_id, entity)
+        if not allowed:
+            return error_response(
+                "limit_exceeded",
+                limit_info.get("message", f"You have reached your {entity} limit. Upgrade to import more."),
+                status_code=403
+            )
+
+        # Spool to disk so the worker can stream it after this request returns
+        fd, path = tempfile.mkstemp(prefix="sabiops-import-", suffix=os.path.splitext(filename)[1])
+        os.close(fd)
+        upload.save(path)
+
+        job = ImportJob(owner_id, user_id, entity, filename, mode=mode)
+        queue_import(job, path, allowance=allowance)
+
+        return success_response(
+            data=job.to_dict(include_errors=False),
+            message=f"Import of {entity} started",
+            status_code=202
+        )
+
+    except Exception as e:
+        logger.error(f"Error starting import: {str(e)}", exc_info=True)
+        return error_response(str(e), "Failed to start import", status_code=500)
+
+@imports_bp.route("/jobs", methods=["GET"])
+@jwt_required()
+def list_imports():
+    try:
+        user_id = get_jwt_identity()
+        try:
+            owner_id, user_role = get_user_context(user_id)
+        except ValueError as e:
+            return error_response(str(e), "Authorization error", 403)
+
+        jobs = list_owner_imports(owner_id)
+        return success_response(data={"jobs": jobs})
+
+    except Exception as e:
+        return error_response(str(e), "Failed to fetch import jobs", status_code=500)
+
+@imports_bp.route("/jobs/<string:job_id>", methods=["GET"])
+@jwt_required()
+def get_import_status(job_id):
+    """Progress, counts and per-row errors for one import"""
+    try:
+        user_id = get_jwt_identity()
+        try:
+            owner_id, user_role = get_user_context(user_id)
+        except ValueError as e:
+            return error_response(str(e), "Authorization error", 403)
+
+        job = get_import(job_id, owner_id)
+        if not job:
+            return error_response("Import job not found", status_code=404)
+
+        return success_response(data=job)
+
+    except Exception as e:
+        return error_response(str(e), "Failed to fetch import status", status_code=500)
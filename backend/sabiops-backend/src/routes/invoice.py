@@ -5,6 +5,10 @@ from src.utils.invoice_status_manager import InvoiceStatusManager
 from src.utils.transaction_service import TransactionService
 from src.utils.invoice_inventory_manager import InvoiceInventoryManager
 from src.utils.subscription_decorators import protected_invoice_creation, get_usage_status_for_response
+from src.utils.idempotency import idempotent
+from src.utils.invoice_numbering import invoice_number_allocator
+from src.services.job_queue import job_queue, get_job_supabase, JobFailed
+from src.services.email_service import email_service
 from datetime import datetime, date, timedelta
 import uuid
 from reportlab.lib.pagesizes import letter
@@ -60,30 +64,7 @@ def success_response(data=None, message="Success", status_code=200):
 
 def generate_invoice_number(owner_id):
     """Generate unique invoice number with format INV-YYYYMMDD-XXXX"""
-    try:
-        supabase = get_supabase()
-        today = datetime.now().strftime('%Y%m%d')
-        
-        # Get count of invoices created today for this owner
-        today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-        today_end = today_start + timedelta(days=1)
-        
-        result = supabase.table("invoices").select("id").eq("owner_id", owner_id).gte("created_at", today_start.isoformat()).lt("created_at", today_end.isoformat()).execute()
-        
-        count = len(result.data) + 1
-        invoice_number = f"INV-{today}-{count:04d}"
-        
-        # Ensure uniqueness by checking if it already exists
-        existing = supabase.table("invoices").select("id").eq("invoice_number", invoice_number).execute()
-        while existing.data:
-            count += 1
-            invoice_number = f"INV-{today}-{count:04d}"
-            existing = supabase.table("invoices").select("id").eq("invoice_number", invoice_number).execute()
-        
-        return invoice_number
-    except Exception as e:
-        # Fallback to UUID-based number if there's an error
-        return f"INV-{datetime.now().strftime('%Y%m%d')}-{str(uuid.uuid4())[:8].upper()}"
+    return invoice_number_allocator.allocate(get_supabase(), owner_id)
 
 def create_transaction_for_invoice(invoice_data, transaction_type="money_in"):
     """Create a transaction record when invoice is paid"""
@@ -112,17 +93,50 @@ def create_transaction_for_invoice(invoice_data, transaction_type="money_in"):
 
 def send_invoice_notification_sync(invoice_data, status):
     """
-    Synchronous function to send invoice notifications
+    Queue the customer email for an invoice status change; returns immediately
     """
     try:
-        # Implement your notification logic here
-        # For now, just log the notification
-        logger.info(f"Invoice {invoice_data.get('invoice_number')} notification sent for status: {status}")
+        job_queue.enqueue("invoice.notification", {
+            "invoice_id": invoice_data.get("id"),
+            "status": status
+        }, owner_id=invoice_data.get("owner_id"))
+        logging.info(f"Invoice {invoice_data.get('invoice_number')} notification queued for status: {status}")
         return True
     except Exception as e:
-        logger.error(f"Error sending invoice notification: {str(e)}")
+        logging.error(f"Error queueing invoice notification: {str(e)}")
         return False
 
+@job_queue.handler("invoice.notification")
+def _invoice_notification_job(payload):
+    """Email the customer that an invoice was sent or paid"""
+    supabase = get_job_supabase()
+    invoice_result = supabase.table("invoices").select("*").eq("id", payload["invoice_id"]).execute()
+    if not invoice_result.data:
+        return {"sent": False, "reason": "invoice_not_found"}
+    invoice = invoice_result.data[0]
+
+    customer_result = supabase.table("customers").select("name, email").eq("id", invoice.get("customer_id")).execute()
+    customer = customer_result.data[0] if customer_result.data else {}
+    customer_email = customer.get("email") or invoice.get("customer_email")
+    if not customer_email:
+        return {"sent": False, "reason": "no_customer_email"}
+
+    customer_name = customer.get("name") or invoice.get("customer_name") or "Customer"
+    if payload["status"] == "paid":
+        sent = email_service.send_payment_confirmation_email(
+            customer_email, customer_name,
+            float(invoice.get("paid_amount") or invoice.get("total_amount") or 0),
+            invoice.get("invoice_number"), invoice.get("id")
+        )
+    else:
+        sent = email_service.send_invoice_email(
+            customer_email, customer_name, invoice.get("invoice_number"),
+            float(invoice.get("total_amount") or 0)
+        )
+    if not sent:
+        raise JobFailed(f"Invoice email to {customer_email} failed")
+    return {"sent": True}
+
 @invoice_bp.route("/", methods=["GET"])
 @jwt_required()
 def get_invoices():
@@ -216,6 +230,7 @@ def get_invoice(invoice_id):
 
 @invoice_bp.route("/", methods=["POST"])
 @jwt_required()
+@idempotent
 @protected_invoice_creation
 def create_invoice():
     try:
@@ -0,0 +1,90 @@
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity
+import logging
+from src.utils.user_context import get_user_context
+from src.services.job_queue import job_queue, STATUS_DEAD
+
+jobs_bp = Blueprint("jobs", __name__)
+logger = logging.getLogger(__name__)
+
+def success_response(data=None, message="Success", status_code=200):
+    return jsonify({
+        "success": True,
+        "data": data,
+        "message": message
+    }), status_code
+
+def error_response(error, message="Error", status_code=400):
+    logger.error(f"[JOBS API ERROR] Status: {status_code}, Message: {message}, Error: {error}")
+    return jsonify({
+        "success": False,
+        "error": str(error),
+        "message": message,
+        "toast": {
+            "type": "error",
+            "message": message,
+            "timeout": 4000
+        }
+    }), status_code
+
+@jobs_bp.route("/", methods=["GET"])
+@jwt_required()
+def list_jobs():
+    """Recent background jobs for the business, optionally filtered by status"""
+    try:
+        user_id = get_jwt_identity()
+        try:
+            owner_id, user_role = get_user_context(user_id)
+        except ValueError as e:
+            return error_response(str(e), "Authorization error", 403)
+
+        limit = min(int(request.args.get("limit", 50)), 200)
+        jobs = job_queue.list_jobs(status=request.args.get("status"), owner_id=owner_id, limit=limit)
+        return success_response(data={"jobs": jobs})
+
+    except Exception as e:
+        return error_response(str(e), "Failed to fetch jobs", status_code=500)
+
+@jobs_bp.route("/<string:job_id>", methods=["GET"])
+@jwt_required()
+def get_job(job_id):
+    """Status, attempts and last error for one background job"""
+    try:
+        user_id = get_jwt_identity()
+        try:
+            owner_id, user_role = get_user_context(user_id)
+        except ValueError as e:
+            return error_response(str(e), "Authorization error", 403)
+
+        job = job_queue.get(job_id, owner_id=owner_id)
+        if not job:
+            return error_response("Job not found", status_code=404)
+        return success_response(data=job)
+
+    except Exception as e:
+        return error_response(str(e), "Failed to fetch job", status_code=500)
+
+@jobs_bp.route("/<string:job_id>/retry", methods=["POST"])
+@jwt_required()
+def retry_job(job_id):
+    """Put a dead-lettered job back on the queue"""
+    try:
+        user_id = get_jwt_identity()
+        try:
+            owner_id, user_role = get_user_context(user_id)
+        except ValueError as e:
+            return error_response(str(e), "Authorization error", 403)
+
+        if user_role not in ["Owner", "Admin"]:
+            return error_response("You are not authorized to retry jobs", status_code=403)
+
+        job = job_queue.get(job_id, owner_id=owner_id)
+        if not job:
+            return error_response("Job not found", status_code=404)
+        if job["status"] != STATUS_DEAD or not job_queue.retry(job_id):
+            return error_response("Only failed jobs can be retried", status_code=409)
+
+        return success_response(data=job_queue.get(job_id), message="Job queued for retry")
+
+    except Exception as e:
+        return error_response(str(e), "Failed to retry job", status_code=500)
@@ -6,8 +6,8 @@ Provides endpoints to manually trigger and manage business notifications
 from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 import logging
-import asyncio
 
+from src.services.event_loop import run_async
 from src.services.notification_scheduler import get_scheduler
 from src.services.triggers.low_stock_trigger import create_low_stock_monitor
 from src.services.triggers.overdue_invoice_trigger import create_overdue_invoice_monitor
@@ -37,15 +37,8 @@ def error_response(error, message="Error", status_code=400):
         "message": message
     }), status_code
 
-def run_async(coro):
-    """Helper to run async functions in Flask routes"""
-    try:
-        loop = asyncio.get_event_loop()
-    except RuntimeError:
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-    
-    return loop.run_until_complete(coro)
+# Full scans may legitimately outlast the default bridge timeout
+SCAN_TIMEOUT_SECONDS = 300
 
 # =============================================================================
 # Manual Trigger Endpoints
@@ -71,7 +64,7 @@ def trigger_low_stock_check():
             result = run_async(monitor.check_specific_product(product_id))
         else:
             # Check all products
-            result = run_async(monitor.check_all_products())
+            result = run_async(monitor.check_all_products(), SCAN_TIMEOUT_SECONDS)
         
         return success_response(
             data=result,
@@ -102,7 +95,7 @@ def trigger_overdue_invoice_check():
             result = run_async(monitor.check_specific_invoice(invoice_id))
         else:
             # Check all overdue invoices
-            result = run_async(monitor.check_all_overdue_invoices())
+            result = run_async(monitor.check_all_overdue_invoices(), SCAN_TIMEOUT_SECONDS)
         
         return success_response(
             data=result,
@@ -123,7 +116,7 @@ def trigger_inventory_monitoring():
             return error_response("Database connection not available", status_code=500)
         
         monitor = create_low_stock_monitor(supabase)
-        result = run_async(monitor.monitor_inventory_changes())
+        result = run_async(monitor.monitor_inventory_changes(), SCAN_TIMEOUT_SECONDS)
         
         return success_response(
             data=result,
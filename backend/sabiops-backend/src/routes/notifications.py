@@ -8,6 +8,8 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 from datetime import datetime, timezone
 import uuid
 from src.services.firebase_service import send_push_notification
+from src.services.event_loop import run_async
+from src.services.notification_service import NotificationService, unread_count_cache
 
 # Create blueprint
 notifications_bp = Blueprint('notifications', __name__)
@@ -62,9 +64,8 @@ def get_notifications():
         
         notifications = result.data
         
-        # Count unread notifications
-        unread_result = supabase.table('notifications').select('id').eq('user_id', user_id).eq('read', False).execute()
-        unread_count = len(unread_result.data) if unread_result.data else 0
+        # Count unread notifications (counter row, cached between polls)
+        unread_count = run_async(NotificationService(supabase).get_unread_count(user_id))
         
         return success_response("Notifications fetched successfully", {
             "notifications": notifications,
@@ -91,6 +92,7 @@ def mark_notification_read(notification_id):
             'read': True,
             'read_at': datetime.now(timezone.utc).isoformat()
         }).eq('id', notification_id).eq('user_id', user_id).execute()
+        unread_count_cache.invalidate(user_id)
         
         if not result.data:
             return error_response("Notification not found", 404)
@@ -133,6 +135,7 @@ def send_notification():
         }
         
         result = supabase.table('notifications').insert(notification_data).execute()
+        unread_count_cache.invalidate(user_id)
         
         if not result.data:
             return error_response("Failed to create notification", 500)
@@ -236,6 +239,7 @@ def mark_all_read():
             'read': True,
             'read_at': datetime.now(timezone.utc).isoformat()
         }).eq('user_id', user_id).eq('read', False).execute()
+        unread_count_cache.invalidate(user_id)
         
         return success_response("All notifications marked as read")
         
@@ -8,10 +8,12 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 from datetime import datetime, timezone
 import logging
 import uuid
-import asyncio
 from typing import Dict, Any, List
 
-from src.services.notification_service import NotificationService, NotificationType, NotificationData
+from src.services.notification_service import (
+    NotificationService, NotificationType, NotificationData, preferences_cache, unread_count_cache
+)
+from src.services.event_loop import background_loop, run_async
 
 logger = logging.getLogger(__name__)
 
@@ -45,16 +47,6 @@ def error_response(error, message="Error", status_code=400):
         "message": message
     }), status_code
 
-def run_async(coro):
-    """Helper to run async functions in Flask routes"""
-    try:
-        loop = asyncio.get_event_loop()
-    except RuntimeError:
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-    
-    return loop.run_until_complete(coro)
-
 # =============================================================================
 # Core Notification Management
 # =============================================================================
@@ -71,13 +63,11 @@ def get_notifications():
         unread_only = request.args.get('unread_only', 'false').lower() == 'true'
         limit = min(int(request.args.get('limit', 50)), 100)  # Max 100 per request
         
-        # Get notifications
-        notifications = run_async(notification_service.get_user_notifications(
-            user_id, unread_only, limit
-        ))
-        
-        # Get unread count
-        unread_count = run_async(notification_service.get_unread_count(user_id))
+        # Get notifications and the unread count concurrently
+        notifications, unread_count = background_loop.gather(
+            notification_service.get_user_notifications(user_id, unread_only, limit),
+            notification_service.get_unread_count(user_id)
+        )
         
         return success_response({
             "notifications": notifications,
@@ -148,6 +138,7 @@ def delete_notification(notification_id):
         result = supabase.table('notifications').delete().eq(
             'id', notification_id
         ).eq('user_id', user_id).execute()
+        unread_count_cache.invalidate(user_id)
         
         if result.data:
             return success_response(
@@ -410,6 +401,8 @@ def update_notification_preferences():
             if result.data:
                 updated_preferences.extend(result.data)
         
+        preferences_cache.invalidate(user_id)
+        
         return success_response(
             {
                 "updated_preferences": updated_preferences,
@@ -480,10 +473,8 @@ def cleanup_old_notifications():
         # Get days parameter (default 30 days)
         days_old = int(request.args.get('days', 30))
         
-        # For now, only allow users to clean their own notifications
-        # In production, this might be an admin-only function
-        
-        cleaned_count = run_async(notification_service.cleanup_old_notifications(days_old))
+        # Only the caller's own notifications; everyone else's are left to the nightly retention run
+        cleaned_count = run_async(notification_service.cleanup_old_notifications(days_old, user_id))
         
         return success_response(
             {
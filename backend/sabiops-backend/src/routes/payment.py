@@ -5,6 +5,7 @@ import requests
 from datetime import datetime
 import uuid
 from src.services.supabase_service import SupabaseService
+from src.utils.idempotency import idempotent
 
 payment_bp = Blueprint("payment", __name__)
 
@@ -72,6 +73,7 @@ def get_payment(payment_id):
 
 @payment_bp.route("/initialize", methods=["POST"])
 @jwt_required()
+@idempotent
 def initialize_payment():
     try:
         supabase = get_supabase()
@@ -299,6 +301,7 @@ def paystack_webhook():
 
 @payment_bp.route("/", methods=["POST"])
 @jwt_required()
+@idempotent
 def record_payment():
     """Record a payment - handles both manual payments and sale-related payments"""
     try:
@@ -364,6 +367,7 @@ def record_payment():
 
 @payment_bp.route("/manual", methods=["POST"])
 @jwt_required()
+@idempotent
 def record_manual_payment():
     try:
         supabase = get_supabase()
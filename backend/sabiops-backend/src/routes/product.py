@@ -1,9 +1,12 @@
 from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from datetime import datetime, timezone
+import json
 import uuid
 import logging
 from src.services.supabase_service import SupabaseService
+from src.services.stock_events import emit_stock_changes
+from src.utils.db_errors import missing_function
 from src.utils.user_context import get_user_context
 from src.utils.subscription_decorators import protected_product_creation, get_usage_status_for_response
 
@@ -481,6 +484,16 @@ def update_product(product_id):
                 }
             }), 500
         updated_product = updated.data[0]
+        
+        if new_quantity != old_quantity:
+            emit_stock_changes(str(owner_id), [{
+                "product_id": product_id,
+                "old_quantity": int(old_quantity or 0),
+                "new_quantity": new_quantity,
+                "low_stock_threshold": updated_product.get("low_stock_threshold"),
+                "reorder_level": updated_product.get("reorder_level")
+            }])
+        
         return jsonify({
             "success": True,
             "message": "Product updated successfully",
@@ -736,28 +749,20 @@ def update_stock(product_id):
         updated_product['is_low_stock'] = new_quantity <= threshold
         updated_product['stock_status'] = 'out_of_stock' if new_quantity == 0 else ('low_stock' if new_quantity <= threshold else 'in_stock')
         
-        # Send notifications based on stock level changes
+        # Low and out of stock alerts go through the deduplicated low stock check
+        emit_stock_changes(str(owner_id), [{
+            "product_id": product_id,
+            "old_quantity": current_quantity,
+            "new_quantity": new_quantity,
+            "low_stock_threshold": threshold,
+            "reorder_level": existing_product.get("reorder_level")
+        }])
+        
         try:
             supa_service = SupabaseService()
             
-            # Low stock notification
-            if new_quantity <= threshold and current_quantity > threshold:
-                supa_service.notify_user(
-                    str(owner_id),
-                    "Low Stock Alert!",
-                    f"Product '{existing_product['name']}' is now low on stock (Qty: {new_quantity}). Please restock soon.",
-                    "warning"
-                )
-            # Out of stock notification
-            elif new_quantity == 0 and current_quantity > 0:
-                supa_service.notify_user(
-                    str(owner_id),
-                    "Out of Stock Alert!",
-                    f"Product '{existing_product['name']}' is now out of stock. Immediate restocking required.",
-                    "error"
-                )
             # Stock replenished notification
-            elif new_quantity > threshold and current_quantity <= threshold:
+            if new_quantity > threshold and current_quantity <= threshold:
                 supa_service.notify_user(
                     str(owner_id),
                     "Stock Replenished",
@@ -787,10 +792,144 @@ def update_stock(product_id):
         logger.error(f"Error updating stock: {str(e)}")
         return error_response("Failed to update stock", status_code=500)
 
+BULK_UPDATE_COLUMNS = [
+    "id", "owner_id", "name", "description", "price", "cost_price", "quantity",
+    "low_stock_threshold", "category", "sub_category", "sku", "barcode", "image_url", "active"
+]
+
+BULK_UPDATE_RPC = "bulk_update_products"
+_bulk_update_rpc_available = True
+
+def apply_bulk_product_updates(supabase, owner_id, products_to_update):
+    """
+    Validate and apply many product updates with one read and one write.
+    Every referenced product is fetched with a single in_() query and changes
+    are validated in memory. Only the fields each item sends are written, so
+    a sale landing between the read and the write keeps its stock deduction;
+    quantity is written only when it actually changes.
+    Returns: (results, updated_products) where results has one entry per item
+    """
+    results = [{"index": i, "id": (p or {}).get("id") if isinstance(p, dict) else None, "success": False, "error": None}
+               for i, p in enumerate(products_to_update)]
+
+    requested_ids = list({r["id"] for r in results if r["id"]})
+    existing_rows = []
+    if requested_ids:
+        existing_rows = supabase.table("products").select(", ".join(BULK_UPDATE_COLUMNS)).eq("owner_id", owner_id).in_("id", requested_ids).execute().data or []
+    existing = {row["id"]: row for row in existing_rows}
+
+    changes = {}
+    sku_claims = {}
+
+    for result, product_update in zip(results, products_to_update):
+        product_id = result["id"]
+        if not isinstance(product_update, dict) or not product_id:
+            result["error"] = "Product ID is required for each product"
+            continue
+        if product_id not in existing:
+            result["error"] = f"Product with ID {product_id} not found"
+            continue
+        if product_id in changes:
+            result["error"] = f"Product {product_id} appears more than once in this request"
+            continue
+
+        update_fields = {k: v for k, v in product_update.items() if k != "id"}
+        validation_errors = validate_product_data(update_fields, is_update=True)
+        if validation_errors:
+            result["error"] = f"Product {product_id}: {'; '.join(validation_errors)}"
+            continue
+
+        fields = {}
+        for field, value in update_fields.items():
+            if field in ["name", "description", "category", "sub_category", "sku", "image_url"]:
+                fields[field] = str(value).strip() if value else ""
+            elif field in ["price", "cost_price"]:
+                fields[field] = float(value) if value is not None else 0
+            elif field in ["quantity", "low_stock_threshold"]:
+                fields[field] = int(value) if value is not None else 0
+            elif field == "barcode":
+                fields[field] = str(value).strip() if value else None
+            elif field == "active":
+                fields[field] = bool(value)
+        if fields.get("quantity") == existing[product_id].get("quantity"):
+            fields.pop("quantity", None)
+
+        if fields.get("sku") and fields["sku"] != existing[product_id].get("sku"):
+            if fields["sku"] in sku_claims:
+                result["error"] = f"Product {product_id}: SKU {fields['sku']} is used by another product in this request"
+                continue
+            sku_claims[fields["sku"]] = product_id
+
+        changes[product_id] = (result, fields)
+
+    # One lookup for every SKU being changed
+    if sku_claims:
+        taken = supabase.table("products").select("id, sku").eq("owner_id", owner_id).eq("active", True).in_("sku", list(sku_claims)).execute().data or []
+        for product in taken:
+            claimant = sku_claims.get(product.get("sku"))
+            if claimant and product["id"] != claimant and claimant in changes:
+                result, _ = changes.pop(claimant)
+                result["error"] = f"Product {claimant}: A product with SKU {product['sku']} already exists"
+
+    updated_products = []
+    stock_changes = []
+    if changes:
+        written = write_product_updates(supabase, owner_id, {product_id: fields for product_id, (_, fields) in changes.items()})
+        written_by_id = {row["id"]: row for row in written}
+        for product_id, (result, fields) in changes.items():
+            row = written_by_id.get(product_id)
+            if row is None:
+                # Deleted since it was read
+                result["error"] = f"Product with ID {product_id} not found"
+                continue
+            result["success"] = True
+            updated_products.append(row)
+            if "quantity" in fields:
+                stock_changes.append({
+                    "product_id": product_id,
+                    "old_quantity": int(existing[product_id].get("quantity") or 0),
+                    "new_quantity": int(row.get("quantity") or 0),
+                    "low_stock_threshold": row.get("low_stock_threshold"),
+                    "reorder_level": row.get("reorder_level")
+                })
+
+    if stock_changes:
+        emit_stock_changes(str(owner_id), stock_changes)
+
+    return results, updated_products
+
+def write_product_updates(supabase, owner_id, updates):
+    """
+    Write {product_id: fields} with one bulk_update_products call (migration 023).
+    Without it, products sharing the same changes are updated together with
+    one update per distinct set of changes. Returns the updated rows.
+    """
+    global _bulk_update_rpc_available
+    if _bulk_update_rpc_available:
+        try:
+            items = [{"id": product_id, **fields} for product_id, fields in updates.items()]
+            return supabase.rpc(BULK_UPDATE_RPC, {"p_owner_id": owner_id, "p_updates": items}).execute().data or []
+        except Exception as e:
+            if not missing_function(e):
+                raise
+            logger.warning(f"{BULK_UPDATE_RPC} RPC not available, updating by shared changes: {str(e)}")
+            _bulk_update_rpc_available = False
+
+    now = datetime.now(timezone.utc).isoformat()
+    groups = {}
+    for product_id, fields in updates.items():
+        key = json.dumps(fields, sort_keys=True)
+        groups.setdefault(key, (fields, []))[1].append(product_id)
+
+    written = []
+    for fields, product_ids in groups.values():
+        written.extend(supabase.table("products").update({**fields, "updated_at": now}).eq("owner_id", owner_id).in_("id", product_ids).execute().data or [])
+    return written
+
 @product_bp.route("/bulk-update", methods=["PUT"])
 @jwt_required()
 def bulk_update_products():
-    """Bulk update multiple products"""
+    """Bulk update multiple products with one read and one write"""
     try:
         supabase = get_supabase()
         user_id = get_jwt_identity()
@@ -813,49 +952,8 @@ def bulk_update_products():
         if not isinstance(products_to_update, list):
             return error_response("Products must be a list", status_code=400)
         
-        updated_products = []
-        errors = []
-        
-        for product_update in products_to_update:
-            try:
-                product_id = product_update.get("id")
-                if not product_id:
-                    errors.append("Product ID is required for each product")
-                    continue
-                
-                # Get existing product
-                product = supabase.table("products").select("*").eq("id", product_id).eq("owner_id", owner_id).single().execute()
-                if not product.data:
-                    errors.append(f"Product with ID {product_id} not found")
-                    continue
-                
-                # Validate update data
-                update_fields = {k: v for k, v in product_update.items() if k != "id"}
-                validation_errors = validate_product_data(update_fields, is_update=True)
-                if validation_errors:
-                    errors.append(f"Product {product_id}: {'; '.join(validation_errors)}")
-                    continue
-                
-                # Build update data
-                update_data = {"updated_at": datetime.now(timezone.utc).isoformat()}
-                
-                for field, value in update_fields.items():
-                    if field in ["name", "description", "category", "sku", "image_url"]:
-                        update_data[field] = str(value).strip() if value else ""
-                    elif field in ["price", "cost_price"]:
-                        update_data[field] = float(value) if value is not None else 0
-                    elif field in ["quantity", "low_stock_threshold"]:
-                        update_data[field] = int(value) if value is not None else 0
-                    elif field == "active":
-                        update_data[field] = bool(value)
-                
-                # Update product
-                result = supabase.table("products").update(update_data).eq("id", product_id).execute()
-                if result.data:
-                    updated_products.append(result.data[0])
-                
-            except Exception as e:
-                errors.append(f"Product {product_id}: {str(e)}")
+        results, updated_products = apply_bulk_product_updates(supabase, owner_id, products_to_update)
+        errors = [r["error"] for r in results if r["error"]]
         
         if errors and not updated_products:
             return error_response("; ".join(errors), "Bulk update failed", status_code=400)
@@ -863,7 +961,8 @@ def bulk_update_products():
         response_data = {
             "updated_products": updated_products,
             "updated_count": len(updated_products),
-            "total_requested": len(products_to_update)
+            "total_requested": len(products_to_update),
+            "results": results
         }
         
         if errors:
@@ -0,0 +1,68 @@
+from flask import Blueprint, Response, request, jsonify, current_app
+from flask_jwt_extended import jwt_required, get_jwt_identity
+import logging
+from src.utils.user_context import get_user_context
+from src.services.realtime_events import realtime_hub
+
+realtime_bp = Blueprint("realtime", __name__)
+logger = logging.getLogger(__name__)
+
+def get_supabase():
+    """Get Supabase client from Flask app config"""
+    return current_app.config['SUPABASE']
+
+def error_response(error, message="Error", status_code=400):
+    logger.error(f"[REALTIME API ERROR] Status: {status_code}, Message: {message}, Error: {error}")
+    return jsonify({
+        "success": False,
+        "error": str(error),
+        "message": message
+    }), status_code
+
+def parse_last_event_id(value):
+    """Last-Event-ID header (EventSource reconnect) or ?last_event_id=; junk means a fresh stream"""
+    try:
+        event_id = int(value)
+    except (TypeError, ValueError):
+        return None
+    return event_id if event_id >= 0 else None
+
+# EventSource cannot send an Authorization header, so the token may come as ?jwt=
+@realtime_bp.route("/stream", methods=["GET"])
+@jwt_required(locations=["headers", "query_string"])
+def stream():
+    """Server-Sent Events: new notifications, unread counts and dashboard deltas"""
+    try:
+        user_id = get_jwt_identity()
+        supabase = get_supabase()
+        if not supabase:
+            return error_response("Database connection not available", status_code=500)
+
+        try:
+            owner_id, _ = get_user_context(user_id)
+        except Exception as e:
+            # Users without a business still get their own notifications
+            logger.debug(f"No owner context for {user_id}: {str(e)}")
+            owner_id = None
+
+        last_event_id = parse_last_event_id(request.headers.get("Last-Event-ID") or request.args.get("last_event_id"))
+        body = realtime_hub.stream(supabase, user_id, [owner_id], last_event_id)
+        return Response(body, mimetype="text/event-stream", headers={
+            "Cache-Control": "no-cache",
+            # Stop nginx/Render proxies from buffering the stream
+            "X-Accel-Buffering": "no"
+        })
+
+    except Exception as e:
+        logger.error(f"Error opening realtime stream: {str(e)}", exc_info=True)
+        return error_response(str(e), "Failed to open realtime stream", status_code=500)
+
+@realtime_bp.route("/status", methods=["GET"])
+@jwt_required()
+def status():
+    """Connections this worker process is serving"""
+    return jsonify({
+        "success": True,
+        "data": {"connections": realtime_hub.connection_count()},
+        "message": "Success"
+    }), 200
@@ -6,6 +6,7 @@ import logging
 import json
 from src.utils.user_context import get_user_context
 from src.utils.subscription_decorators import protected_sales_creation, get_usage_status_for_response
+from src.utils.idempotency import idempotent
 
 sales_bp = Blueprint("sales", __name__)
 
@@ -136,6 +137,7 @@ def get_sales():
 
 @sales_bp.route("/", methods=["POST"])
 @jwt_required()
+@idempotent
 @protected_sales_creation
 def create_sale():
     try:
@@ -5,6 +5,7 @@ import logging
 
 from src.services.subscription_service import SubscriptionService
 from src.services.supabase_service import SupabaseService
+from src.utils.auth_claims import issue_tokens_for
 
 logger = logging.getLogger(__name__)
 
@@ -95,16 +96,8 @@ def verify_payment():
         subscription_service._reset_usage_counters(user_id, plan_id)
         logger.info(f"Usage counters reset for user {user_id} to {plan_id} plan limits")
         
-        # Generate new JWT token with updated subscription info
-        from flask_jwt_extended import create_access_token
-        new_token = create_access_token(identity={
-            'id': user_id,
-            'subscription_plan': plan_id,
-            'subscription_status': upgrade_result['subscription']['status'],
-            'subscription_end_date': upgrade_result['subscription']['end_date'],
-            'is_trial': upgrade_result['subscription'].get('is_trial', False),
-            'trial_days_left': 0
-        })
+        # upgrade_subscription re-issued the access token with the new plan claims
+        new_token = upgrade_result.get('access_token')
         
         # Notify user of successful upgrade
         try:
@@ -225,19 +218,14 @@ def get_usage_status():
             logger.error(f"Invalid user_id type in usage-status: {user_id} (type: {type(user_id)})")
             return error_response(f"Invalid user ID type: {type(user_id)}", "Authentication error", 422)
         
-        supabase = current_app.config['SUPABASE']
-        
-        # Get current usage from feature_usage table
-        usage_result = supabase.table('feature_usage').select('*').eq('user_id', user_id).execute()
-        
-        # Get subscription status
+        # Plan, limits and every feature's usage in one cached read
         subscription_service = SubscriptionService()
-        subscription_status = subscription_service.get_user_subscription_status(user_id)
+        entitlements = subscription_service.get_entitlements(user_id)
+        usage_status = subscription_service.get_usage_status(user_id)
         
         # Format usage data
         current_usage = {}
-        for usage in usage_result.data:
-            feature_type = usage['feature_type']
+        for feature_type, usage in usage_status.items():
             current_usage[feature_type] = {
                 'current': usage['current_count'],
                 'limit': usage['limit_count'],
@@ -246,28 +234,18 @@ def get_usage_status():
                 'period_end': usage['period_end']
             }
         
-        # Ensure all feature types are present
-        plan_config = subscription_status['plan_config']
-        for feature_type, limit in plan_config['features'].items():
-            if feature_type not in current_usage:
-                current_usage[feature_type] = {
-                    'current': 0,
-                    'limit': limit,
-                    'percentage': 0,
-                    'period_start': None,
-                    'period_end': None
-                }
+        plan_config = subscription_service.PLAN_CONFIGS.get(entitlements.plan, subscription_service.PLAN_CONFIGS['free'])
         
         logger.info(f"Successfully retrieved usage status for user {user_id}")
         return success_response(
             data={
                 "current_usage": current_usage,
                 "subscription": {
-                    "plan": subscription_status['subscription_plan'],
-                    "status": subscription_status['subscription_status'],
-                    "days_remaining": subscription_status['remaining_days'],
-                    "is_trial": subscription_status['is_trial'],
-                    "is_active": subscription_status['is_active']
+                    "plan": entitlements.plan,
+                    "status": entitlements.status,
+                    "days_remaining": entitlements.remaining_days,
+                    "is_trial": entitlements.is_trial,
+                    "is_active": entitlements.is_active
                 },
                 "plan_config": plan_config
             },
@@ -313,6 +291,7 @@ def activate_trial():
             )
         
         result = subscription_service.activate_trial(user_id)
+        result['access_token'] = issue_tokens_for(user_id)['access_token']
         
         return success_response(
             data=result,
@@ -647,7 +626,7 @@ def get_subscription_analytics():
         subscription_service = SubscriptionService()
         
         # Get current status
-        status = subscription_service.get_unified_subscription_status(user_id)
+        status = subscription_service.get_entitlements(user_id).subscription_status()
         
         # Get usage data
         usage_data = subscription_service.get_accurate_usage_counts(user_id)
@@ -753,47 +732,23 @@ def get_direct_usage_status():
     """Get usage status with direct database queries for reliability"""
     try:
         user_id = get_jwt_identity()
-        supabase_service = SupabaseService()
-        
-        # Get user's subscription plan
-        user_result = supabase_service.supabase.table('users').select('subscription_plan').eq('id', user_id).single().execute()
+        subscription_service = SubscriptionService()
         
-        if not user_result.data:
+        try:
+            entitlements = subscription_service.get_entitlements(user_id)
+        except ValueError:
             return error_response("User not found", "User not found", 404)
         
-        subscription_plan = user_result.data.get('subscription_plan', 'trial')
-        
-        # Define plan limits
-        plan_limits = {
-            'trial': {'invoices': 5, 'products': 10, 'customers': 20},
-            'basic': {'invoices': 50, 'products': 100, 'customers': 200},
-            'pro': {'invoices': 500, 'products': 1000, 'customers': 2000},
-            'enterprise': {'invoices': -1, 'products': -1, 'customers': -1}  # Unlimited
-        }
-        
-        limits = plan_limits.get(subscription_plan, plan_limits['trial'])
-        
-        # Get current usage counts
-        try:
-            invoices_count = supabase_service.supabase.table('invoices').select('id', count='exact').eq('owner_id', user_id).execute().count or 0
-            products_count = supabase_service.supabase.table('products').select('id', count='exact').eq('owner_id', user_id).execute().count or 0
-            customers_count = supabase_service.supabase.table('customers').select('id', count='exact').eq('owner_id', user_id).execute().count or 0
-        except:
-            # Fallback to 0 if queries fail
-            invoices_count = products_count = customers_count = 0
+        # Actual record counts and plan limits, one cached read
+        usage_status = subscription_service.get_usage_status(user_id)
         
         usage_data = {
-            "subscription_plan": subscription_plan,
-            "limits": limits,
-            "current_usage": {
-                "invoices": invoices_count,
-                "products": products_count,
-                "customers": customers_count
-            },
+            "subscription_plan": entitlements.plan,
+            "limits": {feature_type: usage['limit_count'] for feature_type, usage in usage_status.items()},
+            "current_usage": {feature_type: usage['actual_count'] for feature_type, usage in usage_status.items()},
             "usage_percentages": {
-                "invoices": (invoices_count / limits['invoices'] * 100) if limits['invoices'] > 0 else 0,
-                "products": (products_count / limits['products'] * 100) if limits['products'] > 0 else 0,
-                "customers": (customers_count / limits['customers'] * 100) if limits['customers'] > 0 else 0
+                feature_type: (usage['actual_count'] / usage['limit_count'] * 100) if usage['limit_count'] > 0 else 0
+                for feature_type, usage in usage_status.items()
             }
         }
         
@@ -0,0 +1,102 @@
+from flask import Blueprint, request, jsonify, current_app
+from flask_jwt_extended import jwt_required, get_jwt_identity
+import logging
+from src.utils.user_context import get_user_context
+from src.utils.subscription_decorators import get_remaining_allowance
+from src.utils.idempotency import idempotent
+from src.services.sync_service import SyncService, record_sync_usage
+
+sync_bp = Blueprint("sync", __name__)
+logger = logging.getLogger(__name__)
+
+def get_supabase():
+    """Get Supabase client from Flask app config"""
+    return current_app.config['SUPABASE']
+
+def success_response(data=None, message="Success", status_code=200):
+    return jsonify({
+        "success": True,
+        "data": data,
+        "message": message
+    }), status_code
+
+def error_response(error, message="Error", status_code=400):
+    logger.error(f"[SYNC API ERROR] Status: {status_code}, Message: {message}, Error: {error}")
+    return jsonify({
+        "success": False,
+        "error": str(error),
+        "message": message,
+        "toast": {
+            "type": "error",
+            "message": message,
+            "timeout": 4000
+        }
+    }), status_code
+
+@sync_bp.route("/changes", methods=["GET"])
+@jwt_required()
+def get_changes():
+    """Rows inserted, updated and deleted since the client's cursor"""
+    try:
+        user_id = get_jwt_identity()
+        try:
+            owner_id, user_role = get_user_context(user_id)
+        except ValueError as e:
+            return error_response(str(e), "Authorization error", 403)
+
+        sync_service = SyncService(get_supabase())
+        try:
+            since = sync_service.parse_cursor(request.args.get("since"))
+            tables = sync_service.parse_tables(request.args.get("tables"))
+            limit = int(request.args.get("limit", SyncService.DEFAULT_LIMIT))
+        except ValueError as e:
+            return error_response(str(e), "Invalid sync parameters", status_code=400)
+
+        return success_response(data=sync_service.get_changes(owner_id, since, tables, limit))
+
+    except Exception as e:
+        logger.error(f"Error fetching sync changes: {str(e)}", exc_info=True)
+        return error_response(str(e), "Failed to fetch changes", status_code=500)
+
+@sync_bp.route("/push", methods=["POST"])
+@jwt_required()
+@idempotent
+def push_operations():
+    """Apply a batch of operations queued while the client was offline"""
+    try:
+        user_id = get_jwt_identity()
+        try:
+            owner_id, user_role = get_user_context(user_id)
+        except ValueError as e:
+            return error_response(str(e), "Authorization error", 403)
+
+        data = request.get_json(silent=True) or {}
+        operations = data.get("operations")
+        if not isinstance(operations, list) or not operations:
+            return error_response("No operations provided", "Nothing to sync", status_code=400)
+        if len(operations) > SyncService.MAX_PUSH_OPERATIONS:
+            return error_response(
+                "Too many operations",
+                f"Send at most {SyncService.MAX_PUSH_OPERATIONS} operations per request",
+                status_code=400
+            )
+
+        # One plan check per feature instead of one per queued record
+        allowances = {}
+        for feature in set(SyncService.CREATE_FEATURES.values()):
+            if any(isinstance(op, dict) and op.get("action") == "create"
+                   and SyncService.CREATE_FEATURES.get(op.get("table")) == feature for op in operations):
+                allowed, remaining, _ = get_remaining_allowance(user_id, feature)
+                allowances[feature] = remaining if allowed else 0
+
+        result = SyncService(get_supabase()).apply_operations(owner_id, operations, allowances)
+        record_sync_usage(user_id, result["created"])
+
+        return success_response(
+            data=result,
+            message=f"Synced {result['applied']} of {len(operations)} operations"
+        )
+
+    except Exception as e:
+        logger.error(f"Error applying sync operations: {str(e)}", exc_info=True)
+        return error_response(str(e), "Failed to sync operations", status_code=500)
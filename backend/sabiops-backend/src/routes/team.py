@@ -8,6 +8,8 @@ import logging
 import secrets
 import string
 
+from src.services.entitlements import entitlement_cache
+
 team_bp = Blueprint("team", __name__)
 
 def get_supabase():
@@ -117,6 +119,8 @@ def update_team_member(team_member_id):
         updated_user = supabase.table("users").update(update_data).eq("id", team_member_id).eq("owner_id", owner_id).execute()
         if not updated_user.data:
             return error_response("Not Found", "Team member not found or you don't have permission to update.", 404)
+        # Role claims in the member's access token are no longer current
+        entitlement_cache.invalidate(str(team_member_id))
 
         return success_response(updated_user.data[0], "Team member updated successfully.")
 
@@ -138,6 +142,7 @@ def delete_team_member(team_member_id):
         deactivated_user = supabase.table("users").update(update_data).eq("id", team_member_id).eq("owner_id", owner_id).execute()
         if not deactivated_user.data:
             return error_response("Not Found", "Team member not found or you don't have permission to deactivate.", 404)
+        entitlement_cache.invalidate(str(team_member_id))
 
         return success_response(message="Team member deactivated successfully.")
 
@@ -6,10 +6,10 @@ Temporary routes for testing notification functionality
 from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 import logging
-import asyncio
 
 from services.triggers.low_stock_trigger import create_low_stock_monitor
 from services.notification_service import NotificationService
+from services.event_loop import run_async
 
 
 logger = logging.getLogger(__name__)
@@ -21,16 +21,6 @@ def get_supabase():
     """Get Supabase client from Flask app config"""
     return current_app.config.get('SUPABASE')
 
-def run_async(coro):
-    """Helper to run async functions in Flask routes"""
-    try:
-        loop = asyncio.get_event_loop()
-    except RuntimeError:
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-    
-    return loop.run_until_complete(coro)
-
 @test_notifications_bp.route('/test-low-stock', methods=['POST'])
 @jwt_required()
 def test_low_stock_notifications():
@@ -49,7 +39,7 @@ def test_low_stock_notifications():
         monitor = create_low_stock_monitor(supabase)
         
         # Run low stock check
-        result = run_async(monitor.check_all_products())
+        result = run_async(monitor.check_all_products(), timeout=None)
         
         return jsonify({
             "success": True,
@@ -4,6 +4,8 @@ from werkzeug.security import generate_password_hash
 import secrets
 import string
 
+from src.services.subscription_service import SubscriptionService
+
 user_bp = Blueprint('user', __name__)
 
 def get_supabase():
@@ -448,16 +450,14 @@ def get_user_stats():
 def get_usage_status():
     try:
         user_id = get_jwt_identity()
-        # Dummy usage status for now; replace with real logic if needed
-        usage_status = {
-            'invoices_used': 10,
-            'invoices_limit': 100,
-            'expenses_used': 5,
-            'expenses_limit': 100,
-            'products_used': 20,
-            'products_limit': 100,
-            'status': 'ok'
-        }
+        features = SubscriptionService().get_usage_status(user_id)
+        
+        usage_status = {'status': 'ok'}
+        for feature_type, usage in features.items():
+            usage_status[f'{feature_type}_used'] = usage['current_count']
+            usage_status[f'{feature_type}_limit'] = usage['limit_count']
+            if usage['current_count'] >= usage['limit_count']:
+                usage_status['status'] = 'limit_reached'
         return jsonify({'usage_status': usage_status}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
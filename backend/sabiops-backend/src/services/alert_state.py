@@ -0,0 +1,185 @@
+"""
+Alert State - set-based deduplication for business trigger notifications
+A trigger cycle loads every alert of one entity type sent inside its window
+with one query, checks candidates against that set in memory and records what
+it sent with one upsert, so dedup cost does not grow with catalog size.
+"""
+
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class SentAlert:
+    """Last alert sent for one (entity_id, alert_type)"""
+    last_sent_at: datetime
+    last_value: Optional[float] = None
+    owner_id: Optional[str] = None
+
+
+def usage_entity_id(user_id: str, feature_type: str) -> str:
+    """feature_usage rows are keyed by user and feature"""
+    return f"{user_id}:{feature_type}"
+
+
+def parse_timestamp(value) -> datetime:
+    if isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+
+
+# How to rebuild alert state from the notifications table when alert_state is
+# unavailable (migration 014 not applied): notification type, entity id, value
+NOTIFICATION_SOURCES: Dict[str, Tuple[str, Callable[[Dict[str, Any]], Optional[str]], Optional[str]]] = {
+    'product': ('low_stock_alert', lambda n: (n.get('data') or {}).get('product_id'), None),
+    'invoice': ('overdue_invoice', lambda n: (n.get('data') or {}).get('invoice_id'), 'days_overdue'),
+    'feature_usage': (
+        'usage_limit_warning',
+        lambda n: usage_entity_id(n['user_id'], (n.get('data') or {}).get('feature_type')),
+        'percentage'
+    ),
+}
+
+
+def _digest_members(notification: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """A digest notification stands for one alert per item (notification_digest)"""
+    data = notification.get('data') or {}
+    if not data.get('digest'):
+        return [notification]
+    return [{'user_id': notification.get('user_id'), 'data': item} for item in data.get('items') or []]
+
+
+class AlertState:
+    """Reads and writes the alert_state table for one Supabase client"""
+
+    PAGE_SIZE = 1000
+
+    def __init__(self, supabase_client):
+        self.supabase = supabase_client
+
+    def load(
+        self,
+        entity_type: str,
+        since: datetime,
+        entity_ids: Optional[Iterable[str]] = None
+    ) -> Dict[Tuple[str, str], SentAlert]:
+        """
+        Alerts of entity_type sent at or after `since`, keyed by (entity_id, alert_type).
+        Pass entity_ids to check a handful of entities (single-product checks).
+        """
+        if entity_ids is not None:
+            entity_ids = list(entity_ids)
+            if not entity_ids:
+                return {}
+
+        try:
+            rows = self._fetch(
+                'alert_state', 'entity_id, alert_type, owner_id, last_sent_at, last_value',
+                'last_sent_at', since,
+                lambda query: query.eq('entity_type', entity_type),
+                ('entity_id', entity_ids) if entity_ids is not None else None
+            )
+            return {
+                (row['entity_id'], row['alert_type']): SentAlert(
+                    last_sent_at=parse_timestamp(row['last_sent_at']),
+                    last_value=float(row['last_value']) if row.get('last_value') is not None else None,
+                    owner_id=row.get('owner_id')
+                )
+                for row in rows
+            }
+        except Exception as e:
+            logger.warning(f"alert_state unavailable, deduplicating from notifications: {str(e)}")
+            return self._load_from_notifications(entity_type, since, entity_ids)
+
+    def _load_from_notifications(
+        self,
+        entity_type: str,
+        since: datetime,
+        entity_ids: Optional[Iterable[str]] = None
+    ) -> Dict[Tuple[str, str], SentAlert]:
+        """Same answer from one windowed notifications query"""
+        notification_type, entity_of, value_key = NOTIFICATION_SOURCES[entity_type]
+        wanted = set(entity_ids) if entity_ids is not None else None
+        sent: Dict[Tuple[str, str], SentAlert] = {}
+
+        try:
+            rows = self._fetch(
+                'notifications', 'user_id, type, data, created_at',
+                'created_at', since,
+                lambda query: query.eq('type', notification_type)
+            )
+        except Exception as e:
+            logger.error(f"Error loading recent {notification_type} notifications: {str(e)}")
+            return sent
+
+        # Oldest first, so the newest alert per entity wins
+        for row in rows:
+            for alert in _digest_members(row):
+                entity_id = entity_of(alert)
+                if not entity_id or (wanted is not None and entity_id not in wanted):
+                    continue
+                value = (alert.get('data') or {}).get(value_key) if value_key else None
+                sent[(entity_id, notification_type)] = SentAlert(
+                    last_sent_at=parse_timestamp(row['created_at']),
+                    last_value=float(value) if value is not None else None,
+                    owner_id=row.get('user_id')
+                )
+        return sent
+
+    def _fetch(self, table: str, columns: str, time_column: str, since: datetime,
+               narrow: Callable, in_filter: Optional[Tuple[str, List[str]]] = None) -> List[Dict[str, Any]]:
+        """Page through one windowed query; PostgREST caps each response"""
+        rows: List[Dict[str, Any]] = []
+        start = 0
+        while True:
+            query = narrow(self.supabase.table(table).select(columns)).gte(time_column, since.isoformat())
+            if in_filter:
+                query = query.in_(*in_filter)
+            page = query.order(time_column).range(start, start + self.PAGE_SIZE - 1).execute().data or []
+            rows.extend(page)
+            if len(page) < self.PAGE_SIZE:
+                return rows
+            start += self.PAGE_SIZE
+
+    def record(self, entity_type: str, alerts: List[Dict[str, Any]], sent_at: Optional[datetime] = None) -> int:
+        """
+        Upsert sent alerts in one statement.
+        alerts: [{"entity_id", "alert_type", "owner_id"?, "value"?}]
+        """
+        if not alerts:
+            return 0
+
+        sent_at = (sent_at or datetime.now(timezone.utc)).isoformat()
+        rows = {
+            (alert['entity_id'], alert['alert_type']): {
+                'entity_type': entity_type,
+                'entity_id': alert['entity_id'],
+                'alert_type': alert['alert_type'],
+                'owner_id': alert.get('owner_id'),
+                'last_value': alert.get('value'),
+                'last_sent_at': sent_at
+            }
+            for alert in alerts
+        }
+        try:
+            self.supabase.table('alert_state').upsert(
+                list(rows.values()), on_conflict='entity_type,entity_id,alert_type'
+            ).execute()
+            return len(rows)
+        except Exception as e:
+            # The notifications themselves still dedupe the next cycle via the fallback
+            logger.error(f"Error recording {len(rows)} {entity_type} alerts: {str(e)}")
+            return 0
+
+
+def sent_since(sent: Dict[Tuple[str, str], SentAlert], entity_id: str, alert_type: str,
+               cutoff: datetime) -> Optional[SentAlert]:
+    """The loaded alert for this entity if it was sent at or after cutoff"""
+    alert = sent.get((entity_id, alert_type))
+    if alert and alert.last_sent_at >= cutoff:
+        return alert
+    return None
@@ -5,12 +5,20 @@ Monitors business data and triggers notifications for critical events
 
 import logging
 import asyncio
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone, timedelta, date
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Iterator, Optional, Tuple
 from dataclasses import dataclass
 from abc import ABC, abstractmethod
 
-from .notification_service import NotificationService
+from .event_loop import run_async
+from .notification_service import NotificationService, NotificationData
+from .notification_digest import NotificationDigest
+from .alert_state import AlertState, sent_since, usage_entity_id
+from src.utils.keyset_scan import keyset_pages
 
 logger = logging.getLogger(__name__)
 
@@ -22,358 +30,434 @@ class TriggerResult:
     errors: List[str] = None
     details: Dict[str, Any] = None
 
+# What evaluate() returns for a row that should alert:
+# (user_id, notification, alert_state record)
+PendingAlert = Tuple[str, NotificationData, Dict[str, Any]]
+
 class BaseTrigger(ABC):
-    """Base class for all business triggers"""
+    """
+    Base class for all business triggers.
     
-    def __init__(self, notification_service: NotificationService, supabase_client):
+    A cycle streams candidate rows page by page (keyset scan), loads recently
+    sent alerts once, splits each page into batches by owner and evaluates/
+    notifies the batches on a bounded thread pool (the Supabase client is
+    blocking). Only a few pages are in memory at a time. Batches that would
+    start after the trigger's time budget are left for the next cycle.
+    
+    With digest_alerts, batches only evaluate; the cycle's alerts are
+    delivered once at the end, a burst per owner coalesced into one digest
+    (an owner's rows can be spread over every page of the scan).
+    """
+    
+    # Rows per owner batch; one owner's rows always stay in the same batch
+    batch_size = int(os.getenv('TRIGGER_BATCH_SIZE', '500'))
+    max_workers = int(os.getenv('TRIGGER_WORKERS', '4'))
+    time_budget_seconds = float(os.getenv('TRIGGER_TIME_BUDGET_SECONDS', '120'))
+    
+    # alert_state entity type and the key TriggerResult.details reports the scan size under
+    entity_type: str = None
+    scanned_label: str = "rows_scanned"
+    # Triggers whose condition is detected at write time; their full scan is a rare reconciliation
+    reconciliation_only: bool = False
+    # Coalesce each owner's alerts for the whole cycle (see notification_digest)
+    digest_alerts: bool = False
+    
+    def __init__(self, notification_service: NotificationService, supabase_client,
+                 max_workers: Optional[int] = None, time_budget_seconds: Optional[float] = None):
         self.notification_service = notification_service
         self.supabase = supabase_client
+        self.alert_state = AlertState(supabase_client)
         self.logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
+        if max_workers:
+            self.max_workers = max_workers
+        if time_budget_seconds:
+            self.time_budget_seconds = time_budget_seconds
     
     @abstractmethod
-    async def check_and_trigger(self) -> TriggerResult:
-        """Check conditions and trigger notifications if needed"""
+    def get_trigger_name(self) -> str:
+        """Get human-readable trigger name"""
         pass
     
     @abstractmethod
-    def get_trigger_name(self) -> str:
-        """Get human-readable trigger name"""
+    def scan(self) -> Iterator[List[Dict[str, Any]]]:
+        """Candidate rows for this cycle, one page at a time"""
         pass
-
-class LowStockTrigger(BaseTrigger):
-    """Monitors product stock levels and triggers low stock alerts"""
     
-    def get_trigger_name(self) -> str:
-        return "Low Stock Monitor"
+    @abstractmethod
+    def load_recent_alerts(self) -> Dict:
+        """Alerts sent inside this trigger's dedup window, loaded once per cycle"""
+        pass
+    
+    @abstractmethod
+    def evaluate(self, row: Dict[str, Any], recent_alerts: Dict) -> Optional[PendingAlert]:
+        """Decide whether one row alerts; returns the pending alert or None"""
+        pass
+    
+    def owner_of(self, row: Dict[str, Any]) -> str:
+        return row['owner_id']
+    
+    def describe(self, row: Dict[str, Any]) -> str:
+        """Short label for log and error messages"""
+        return str(row.get('id', 'unknown'))
     
     async def check_and_trigger(self) -> TriggerResult:
-        """Check for products with low stock and send alerts"""
+        """Check conditions and trigger notifications if needed"""
+        # The Supabase client blocks; running the cycle on a thread lets triggers overlap
+        return await asyncio.to_thread(self.run_cycle)
+    
+    def run_cycle(self) -> TriggerResult:
+        started = time.monotonic()
+        deadline = started + self.time_budget_seconds
+        metrics = {
+            self.scanned_label: 0,
+            "rows_scanned": 0,
+            "pages": 0,
+            "owners": 0,
+            "batches": 0,
+            "batches_skipped": 0,
+            "notifications_sent": 0,
+            "budget_exhausted": False,
+            "duration_ms": 0
+        }
+        errors = []
+        owners = set()
+        digest = NotificationDigest() if self.digest_alerts else None
+        
+        def collect(outcome: Dict[str, Any]):
+            metrics["notifications_sent"] += outcome['sent']
+            metrics["batches_skipped"] += 1 if outcome['skipped'] else 0
+            errors.extend(outcome['errors'])
+        
         try:
-            self.logger.info("Checking for low stock products...")
-            
-            # Get products that are below their low stock threshold
-            low_stock_products = self.supabase.table('products').select(
-                'id, owner_id, name, quantity, low_stock_threshold, reorder_level'
-            ).filter(
-                'active', 'eq', True
-            ).filter(
-                'quantity', 'lte', 'low_stock_threshold'
-            ).execute()
-            
-            if not low_stock_products.data:
-                self.logger.info("No low stock products found")
-                return TriggerResult(triggered=False)
-            
-            notifications_sent = 0
-            errors = []
-            
-            for product in low_stock_products.data:
-                try:
-                    # Check if we've already sent a notification for this product recently
-                    if await self._should_send_low_stock_alert(product):
-                        success, notification_id = await self.notification_service.send_low_stock_alert(
-                            user_id=product['owner_id'],
-                            product_name=product['name'],
-                            current_quantity=product['quantity'],
-                            threshold=product['low_stock_threshold'],
-                            product_id=product['id']
-                        )
-                        
-                        if success:
-                            notifications_sent += 1
-                            self.logger.info(f"Low stock alert sent for product {product['name']} (ID: {product['id']})")
-                            
-                            # Record that we sent this notification
-                            await self._record_low_stock_alert(product['id'], notification_id)
-                        else:
-                            error_msg = f"Failed to send low stock alert for product {product['name']}"
-                            errors.append(error_msg)
-                            self.logger.error(error_msg)
+            self.logger.info(f"Running {self.get_trigger_name()}...")
+            recent_alerts = None
+            in_flight = deque()
+            
+            with ThreadPoolExecutor(max_workers=max(1, self.max_workers), thread_name_prefix='trigger-batch') as pool:
+                for page in self.scan():
+                    if recent_alerts is None:
+                        recent_alerts = self.load_recent_alerts()
+                    metrics["pages"] += 1
+                    metrics["rows_scanned"] += len(page)
+                    
+                    batches, _ = self._partition_by_owner(page)
+                    owners.update(self.owner_of(row) for row in page)
+                    metrics["batches"] += len(batches)
+                    
+                    for batch in batches:
+                        in_flight.append(pool.submit(self._process_batch, batch, recent_alerts, deadline, digest))
+                        # Keep the scan at most a couple of batches ahead of the workers
+                        while len(in_flight) > self.max_workers * 2:
+                            collect(in_flight.popleft().result())
+                    
+                    if time.monotonic() > deadline:
+                        metrics["budget_exhausted"] = True
+                        break
                 
-                except Exception as e:
-                    error_msg = f"Error processing low stock alert for product {product.get('name', 'unknown')}: {str(e)}"
-                    errors.append(error_msg)
-                    self.logger.error(error_msg)
+                while in_flight:
+                    collect(in_flight.popleft().result())
+            
+            if digest:
+                collect(self._deliver_digest(digest))
+            
+            metrics[self.scanned_label] = metrics["rows_scanned"]
+            metrics["owners"] = len(owners)
+            metrics["budget_exhausted"] = metrics["budget_exhausted"] or metrics["batches_skipped"] > 0
+            if metrics["budget_exhausted"]:
+                self.logger.warning(
+                    f"{self.get_trigger_name()} hit its {self.time_budget_seconds:.0f}s budget after "
+                    f"{metrics['rows_scanned']} rows; {metrics['batches_skipped']} batches left for the next cycle"
+                )
             
+            metrics["duration_ms"] = int((time.monotonic() - started) * 1000)
+            self.logger.info(
+                f"{self.get_trigger_name()}: {metrics['rows_scanned']} rows, {metrics['owners']} owners, "
+                f"{metrics['notifications_sent']} alerts in {metrics['duration_ms']}ms"
+            )
             return TriggerResult(
-                triggered=notifications_sent > 0,
-                notifications_sent=notifications_sent,
+                triggered=metrics["notifications_sent"] > 0,
+                notifications_sent=metrics["notifications_sent"],
                 errors=errors if errors else None,
-                details={
-                    "total_low_stock_products": len(low_stock_products.data),
-                    "notifications_sent": notifications_sent
-                }
+                details=metrics
             )
             
         except Exception as e:
-            error_msg = f"Error in low stock trigger: {str(e)}"
+            error_msg = f"Error in {self.get_trigger_name()}: {str(e)}"
             self.logger.error(error_msg)
+            metrics["duration_ms"] = int((time.monotonic() - started) * 1000)
             return TriggerResult(
-                triggered=False,
-                errors=[error_msg]
+                triggered=metrics["notifications_sent"] > 0,
+                notifications_sent=metrics["notifications_sent"],
+                errors=errors + [error_msg],
+                details=metrics
             )
     
-    async def _should_send_low_stock_alert(self, product: Dict[str, Any]) -> bool:
-        """Check if we should send a low stock alert for this product"""
-        try:
-            # Check if we've sent an alert for this product in the last 24 hours
-            yesterday = datetime.now(timezone.utc) - timedelta(days=1)
-            
-            recent_notifications = self.supabase.table('notifications').select('id').eq(
-                'user_id', product['owner_id']
-            ).eq('type', 'low_stock_alert').gte(
-                'created_at', yesterday.isoformat()
-            ).contains('data', {'product_id': product['id']}).execute()
-            
-            # Don't send if we already sent one recently
-            if recent_notifications.data:
-                self.logger.info(f"Skipping low stock alert for product {product['name']} - already sent recently")
-                return False
-            
-            return True
-            
-        except Exception as e:
-            self.logger.error(f"Error checking recent low stock alerts: {str(e)}")
-            # Default to sending if we can't check
-            return True
+    def _partition_by_owner(self, rows: List[Dict[str, Any]]) -> Tuple[List[List[Dict[str, Any]]], int]:
+        """Group rows by owner and pack whole owners into batches of about batch_size rows"""
+        by_owner: Dict[str, List[Dict[str, Any]]] = {}
+        for row in rows:
+            by_owner.setdefault(self.owner_of(row), []).append(row)
+        
+        batches, current = [], []
+        for owner_rows in by_owner.values():
+            if current and len(current) + len(owner_rows) > self.batch_size:
+                batches.append(current)
+                current = []
+            current.extend(owner_rows)
+        if current:
+            batches.append(current)
+        return batches, len(by_owner)
     
-    async def _record_low_stock_alert(self, product_id: str, notification_id: str) -> None:
-        """Record that we sent a low stock alert"""
-        try:
-            # This could be used for tracking/analytics
-            # For now, we just log it
-            self.logger.info(f"Recorded low stock alert for product {product_id}, notification {notification_id}")
-        except Exception as e:
-            self.logger.error(f"Error recording low stock alert: {str(e)}")
+    def _process_batch(self, batch: List[Dict[str, Any]], recent_alerts: Dict, deadline: float,
+                       digest: Optional[NotificationDigest] = None) -> Dict[str, Any]:
+        """Evaluate one batch, create its notifications in bulk (or add them to the cycle's digest) and record them in alert_state"""
+        outcome = {'sent': 0, 'errors': [], 'skipped': False}
+        if time.monotonic() > deadline:
+            outcome['skipped'] = True
+            return outcome
+        
+        pending = []
+        for row in batch:
+            try:
+                alert = self.evaluate(row, recent_alerts)
+                if alert:
+                    pending.append((row, alert))
+            except Exception as e:
+                error_msg = f"Error processing {self.describe(row)}: {str(e)}"
+                outcome['errors'].append(error_msg)
+                self.logger.error(error_msg)
+        
+        if not pending:
+            return outcome
+        
+        if digest is not None:
+            for row, (user_id, notification_data, alert_record) in pending:
+                digest.add(user_id, notification_data, (row, alert_record))
+            return outcome
+        
+        # Batch workers are plain threads; the insert runs on the shared background loop
+        notification_ids = run_async(self.notification_service.create_notifications_bulk(
+            [(user_id, notification_data) for _, (user_id, notification_data, _) in pending]
+        ), timeout=None)
+        
+        delivered, failed = [], []
+        for (row, (_, _, alert_record)), notification_id in zip(pending, notification_ids):
+            (delivered if notification_id else failed).append((row, alert_record))
+        return self._settle(outcome, delivered, failed)
+    
+    def _deliver_digest(self, digest: NotificationDigest) -> Dict[str, Any]:
+        """Send the cycle's alerts, bursts per owner as one digest each"""
+        delivered, failed = run_async(digest.deliver(self.notification_service), timeout=None)
+        return self._settle({'sent': 0, 'errors': [], 'skipped': False}, delivered, failed)
+    
+    def _settle(self, outcome: Dict[str, Any], delivered: List[Tuple[Dict[str, Any], Dict[str, Any]]],
+                failed: List[Tuple[Dict[str, Any], Dict[str, Any]]]) -> Dict[str, Any]:
+        """Count delivered alerts, report failed ones and record what we sent so the next cycle skips it"""
+        for row, _ in failed:
+            error_msg = f"Failed to send alert for {self.describe(row)}"
+            outcome['errors'].append(error_msg)
+            self.logger.error(error_msg)
+        
+        outcome['sent'] += len(delivered)
+        self.alert_state.record(self.entity_type, [alert_record for _, alert_record in delivered])
+        return outcome
+
+class LowStockTrigger(BaseTrigger):
+    """Monitors product stock levels and triggers low stock alerts"""
+    
+    entity_type = 'product'
+    scanned_label = 'total_low_stock_products'
+    # Stock writes queue checks for the products they touch (stock_events)
+    reconciliation_only = True
+    digest_alerts = True
+    
+    def get_trigger_name(self) -> str:
+        return "Low Stock Monitor"
+    
+    def describe(self, product: Dict[str, Any]) -> str:
+        return f"product {product.get('name', 'unknown')}"
+    
+    def scan(self) -> Iterator[List[Dict[str, Any]]]:
+        # PostgREST cannot compare two columns, so quantity <= low_stock_threshold
+        # is checked per row in evaluate()
+        return keyset_pages(
+            self.supabase, 'products', 'id, owner_id, name, quantity, low_stock_threshold, reorder_level',
+            where=lambda query: query.eq('active', True)
+        )
+    
+    def load_recent_alerts(self) -> Dict:
+        # Everything alerted in the last 24 hours, in one query
+        return self.alert_state.load('product', datetime.now(timezone.utc) - timedelta(days=1))
+    
+    def evaluate(self, product: Dict[str, Any], recent_alerts: Dict) -> Optional[PendingAlert]:
+        # Only products at or below their low stock threshold
+        if (product.get('quantity') or 0) > (product.get('low_stock_threshold') or 0):
+            return None
+        
+        # Check if we've already sent a notification for this product recently
+        if not self._should_send_low_stock_alert(product, recent_alerts):
+            return None
+        
+        notification_data = self.notification_service.build_low_stock_alert(
+            product_name=product['name'],
+            current_quantity=product['quantity'],
+            threshold=product['low_stock_threshold'],
+            product_id=product['id']
+        )
+        return product['owner_id'], notification_data, {
+            'entity_id': product['id'],
+            'alert_type': 'low_stock_alert',
+            'owner_id': product['owner_id'],
+            'value': product['quantity']
+        }
+    
+    def _should_send_low_stock_alert(self, product: Dict[str, Any], recent_alerts: Dict) -> bool:
+        """Check if we should send a low stock alert for this product"""
+        # Skip if we've sent an alert for this product in the last 24 hours
+        yesterday = datetime.now(timezone.utc) - timedelta(days=1)
+        
+        if sent_since(recent_alerts, product['id'], 'low_stock_alert', yesterday):
+            self.logger.debug(f"Skipping low stock alert for product {product['name']} - already sent recently")
+            return False
+        
+        return True
 
 class OverdueInvoiceTrigger(BaseTrigger):
     """Monitors invoices for overdue payments and triggers alerts"""
     
+    entity_type = 'invoice'
+    scanned_label = 'total_overdue_invoices'
+    digest_alerts = True
+    
+    # Send alerts at specific intervals: 1, 7, 30 days overdue
+    alert_intervals = [1, 7, 30]
+    
     def get_trigger_name(self) -> str:
         return "Overdue Invoice Monitor"
     
-    async def check_and_trigger(self) -> TriggerResult:
-        """Check for overdue invoices and send alerts"""
-        try:
-            self.logger.info("Checking for overdue invoices...")
-            
-            # Get invoices that are overdue (due_date < today and status != 'paid')
-            today = date.today()
-            
-            overdue_invoices = self.supabase.table('invoices').select(
-                'id, owner_id, customer_name, invoice_number, total_amount, due_date, status'
-            ).neq('status', 'paid').lt('due_date', today.isoformat()).execute()
-            
-            if not overdue_invoices.data:
-                self.logger.info("No overdue invoices found")
-                return TriggerResult(triggered=False)
-            
-            notifications_sent = 0
-            errors = []
-            
-            for invoice in overdue_invoices.data:
-                try:
-                    # Calculate days overdue
-                    due_date = datetime.fromisoformat(invoice['due_date'].replace('Z', '+00:00')).date()
-                    days_overdue = (today - due_date).days
-                    
-                    # Check if we should send an alert based on days overdue and previous alerts
-                    if await self._should_send_overdue_alert(invoice, days_overdue):
-                        success, notification_id = await self.notification_service.send_overdue_invoice_alert(
-                            user_id=invoice['owner_id'],
-                            customer_name=invoice['customer_name'],
-                            invoice_number=invoice['invoice_number'],
-                            amount=float(invoice['total_amount']),
-                            days_overdue=days_overdue,
-                            invoice_id=invoice['id']
-                        )
-                        
-                        if success:
-                            notifications_sent += 1
-                            self.logger.info(f"Overdue invoice alert sent for invoice {invoice['invoice_number']} ({days_overdue} days overdue)")
-                            
-                            # Record that we sent this notification
-                            await self._record_overdue_alert(invoice['id'], notification_id, days_overdue)
-                        else:
-                            error_msg = f"Failed to send overdue alert for invoice {invoice['invoice_number']}"
-                            errors.append(error_msg)
-                            self.logger.error(error_msg)
-                
-                except Exception as e:
-                    error_msg = f"Error processing overdue invoice {invoice.get('invoice_number', 'unknown')}: {str(e)}"
-                    errors.append(error_msg)
-                    self.logger.error(error_msg)
-            
-            return TriggerResult(
-                triggered=notifications_sent > 0,
-                notifications_sent=notifications_sent,
-                errors=errors if errors else None,
-                details={
-                    "total_overdue_invoices": len(overdue_invoices.data),
-                    "notifications_sent": notifications_sent
-                }
-            )
-            
-        except Exception as e:
-            error_msg = f"Error in overdue invoice trigger: {str(e)}"
-            self.logger.error(error_msg)
-            return TriggerResult(
-                triggered=False,
-                errors=[error_msg]
-            )
+    def describe(self, invoice: Dict[str, Any]) -> str:
+        return f"invoice {invoice.get('invoice_number', 'unknown')}"
     
-    async def _should_send_overdue_alert(self, invoice: Dict[str, Any], days_overdue: int) -> bool:
-        """Check if we should send an overdue alert for this invoice"""
-        try:
-            # Send alerts at specific intervals: 1, 7, 30 days overdue
-            alert_intervals = [1, 7, 30]
-            
-            # Check if we're at an alert interval
-            if days_overdue not in alert_intervals:
-                return False
-            
-            # Check if we've already sent an alert for this specific interval
-            recent_notifications = self.supabase.table('notifications').select('id, data').eq(
-                'user_id', invoice['owner_id']
-            ).eq('type', 'overdue_invoice').contains('data', {'invoice_id': invoice['id']}).execute()
-            
-            if recent_notifications.data:
-                # Check if we've already sent an alert for this specific days_overdue value
-                for notification in recent_notifications.data:
-                    if notification.get('data', {}).get('days_overdue') == days_overdue:
-                        self.logger.info(f"Skipping overdue alert for invoice {invoice['invoice_number']} - already sent for {days_overdue} days")
-                        return False
-            
-            return True
-            
-        except Exception as e:
-            self.logger.error(f"Error checking recent overdue alerts: {str(e)}")
-            # Default to sending if we can't check
-            return True
+    def scan(self) -> Iterator[List[Dict[str, Any]]]:
+        # Invoices that are overdue (due_date < today and status != 'paid')
+        today = date.today().isoformat()
+        return keyset_pages(
+            self.supabase, 'invoices', 'id, owner_id, customer_name, invoice_number, total_amount, due_date, status',
+            where=lambda query: query.neq('status', 'paid').lt('due_date', today)
+        )
     
-    async def _record_overdue_alert(self, invoice_id: str, notification_id: str, days_overdue: int) -> None:
-        """Record that we sent an overdue alert"""
-        try:
-            self.logger.info(f"Recorded overdue alert for invoice {invoice_id}, notification {notification_id}, {days_overdue} days overdue")
-        except Exception as e:
-            self.logger.error(f"Error recording overdue alert: {str(e)}")
+    def load_recent_alerts(self) -> Dict:
+        # An alert for interval N is only due on day N, so any earlier alert
+        # for the same interval is at most a day or two old
+        return self.alert_state.load('invoice', datetime.now(timezone.utc) - timedelta(days=2))
+    
+    def evaluate(self, invoice: Dict[str, Any], recent_alerts: Dict) -> Optional[PendingAlert]:
+        # Calculate days overdue
+        due_date = datetime.fromisoformat(invoice['due_date'].replace('Z', '+00:00')).date()
+        days_overdue = (date.today() - due_date).days
+        
+        # Check if we should send an alert based on days overdue and previous alerts
+        if not self._should_send_overdue_alert(invoice, days_overdue, recent_alerts):
+            return None
+        
+        notification_data = self.notification_service.build_overdue_invoice_alert(
+            customer_name=invoice['customer_name'],
+            invoice_number=invoice['invoice_number'],
+            amount=float(invoice['total_amount']),
+            days_overdue=days_overdue,
+            invoice_id=invoice['id']
+        )
+        return invoice['owner_id'], notification_data, {
+            'entity_id': invoice['id'],
+            'alert_type': 'overdue_invoice',
+            'owner_id': invoice['owner_id'],
+            'value': days_overdue
+        }
+    
+    def _should_send_overdue_alert(self, invoice: Dict[str, Any], days_overdue: int, recent_alerts: Dict) -> bool:
+        """Check if we should send an overdue alert for this invoice"""
+        # Check if we're at an alert interval
+        if days_overdue not in self.alert_intervals:
+            return False
+        
+        # Check if we've already sent an alert for this specific interval
+        last_alert = recent_alerts.get((invoice['id'], 'overdue_invoice'))
+        if last_alert and last_alert.last_value == days_overdue:
+            self.logger.debug(f"Skipping overdue alert for invoice {invoice['invoice_number']} - already sent for {days_overdue} days")
+            return False
+        
+        return True
 
 class UsageLimitTrigger(BaseTrigger):
     """Monitors feature usage and triggers limit warnings"""
     
+    entity_type = 'feature_usage'
+    scanned_label = 'total_users_near_limit'
+    
+    # Send alerts at specific thresholds: 80%, 95%, 100%
+    alert_thresholds = [80, 95, 100]
+    
     def get_trigger_name(self) -> str:
         return "Usage Limit Monitor"
     
-    async def check_and_trigger(self) -> TriggerResult:
-        """Check for users approaching usage limits and send warnings"""
-        try:
-            self.logger.info("Checking for usage limit warnings...")
-            
-            # Get current feature usage that's approaching limits
-            usage_data = self.supabase.table('user_feature_usage').select(
-                'user_id, feature_type, current_count, limit_count, usage_percentage'
-            ).gte('usage_percentage', 80).execute()  # 80% or higher
-            
-            if not usage_data.data:
-                self.logger.info("No users approaching usage limits")
-                return TriggerResult(triggered=False)
-            
-            notifications_sent = 0
-            errors = []
-            
-            for usage in usage_data.data:
-                try:
-                    percentage = float(usage['usage_percentage'])
-                    
-                    # Check if we should send an alert based on percentage thresholds
-                    if await self._should_send_usage_alert(usage, percentage):
-                        success, notification_id = await self.notification_service.send_usage_limit_warning(
-                            user_id=usage['user_id'],
-                            feature_type=usage['feature_type'],
-                            current_usage=usage['current_count'],
-                            limit=usage['limit_count'],
-                            percentage=percentage
-                        )
-                        
-                        if success:
-                            notifications_sent += 1
-                            self.logger.info(f"Usage limit warning sent for user {usage['user_id']}, feature {usage['feature_type']} ({percentage:.0f}%)")
-                            
-                            # Record that we sent this notification
-                            await self._record_usage_alert(usage['user_id'], usage['feature_type'], notification_id, percentage)
-                        else:
-                            error_msg = f"Failed to send usage warning for user {usage['user_id']}, feature {usage['feature_type']}"
-                            errors.append(error_msg)
-                            self.logger.error(error_msg)
-                
-                except Exception as e:
-                    error_msg = f"Error processing usage warning for user {usage.get('user_id', 'unknown')}: {str(e)}"
-                    errors.append(error_msg)
-                    self.logger.error(error_msg)
-            
-            return TriggerResult(
-                triggered=notifications_sent > 0,
-                notifications_sent=notifications_sent,
-                errors=errors if errors else None,
-                details={
-                    "total_users_near_limit": len(usage_data.data),
-                    "notifications_sent": notifications_sent
-                }
-            )
-            
-        except Exception as e:
-            error_msg = f"Error in usage limit trigger: {str(e)}"
-            self.logger.error(error_msg)
-            return TriggerResult(
-                triggered=False,
-                errors=[error_msg]
-            )
+    def owner_of(self, usage: Dict[str, Any]) -> str:
+        return usage['user_id']
     
-    async def _should_send_usage_alert(self, usage: Dict[str, Any], percentage: float) -> bool:
-        """Check if we should send a usage alert"""
-        try:
-            # Send alerts at specific thresholds: 80%, 95%, 100%
-            alert_thresholds = [80, 95, 100]
-            
-            # Find the appropriate threshold
-            current_threshold = None
-            for threshold in alert_thresholds:
-                if percentage >= threshold:
-                    current_threshold = threshold
-            
-            if current_threshold is None:
-                return False
-            
-            # Check if we've already sent an alert for this threshold in the last 24 hours
-            yesterday = datetime.now(timezone.utc) - timedelta(days=1)
-            
-            recent_notifications = self.supabase.table('notifications').select('id, data').eq(
-                'user_id', usage['user_id']
-            ).eq('type', 'usage_limit_warning').gte(
-                'created_at', yesterday.isoformat()
-            ).contains('data', {'feature_type': usage['feature_type']}).execute()
-            
-            if recent_notifications.data:
-                # Check if we've already sent an alert for this threshold
-                for notification in recent_notifications.data:
-                    notification_data = notification.get('data', {})
-                    if notification_data.get('percentage', 0) >= current_threshold:
-                        self.logger.info(f"Skipping usage alert for user {usage['user_id']}, feature {usage['feature_type']} - already sent for {current_threshold}%")
-                        return False
-            
-            return True
-            
-        except Exception as e:
-            self.logger.error(f"Error checking recent usage alerts: {str(e)}")
-            # Default to sending if we can't check
-            return True
+    def describe(self, usage: Dict[str, Any]) -> str:
+        return f"usage warning for user {usage.get('user_id', 'unknown')}, feature {usage.get('feature_type', 'unknown')}"
     
-    async def _record_usage_alert(self, user_id: str, feature_type: str, notification_id: str, percentage: float) -> None:
-        """Record that we sent a usage alert"""
-        try:
-            self.logger.info(f"Recorded usage alert for user {user_id}, feature {feature_type}, notification {notification_id}, {percentage:.0f}%")
-        except Exception as e:
-            self.logger.error(f"Error recording usage alert: {str(e)}")
+    def scan(self) -> Iterator[List[Dict[str, Any]]]:
+        # Current feature usage that's approaching limits (80% or higher)
+        return keyset_pages(
+            self.supabase, 'user_feature_usage', 'id, user_id, feature_type, current_count, limit_count, usage_percentage',
+            where=lambda query: query.gte('usage_percentage', 80)
+        )
+    
+    def load_recent_alerts(self) -> Dict:
+        # Everything warned about in the last 24 hours, in one query
+        return self.alert_state.load('feature_usage', datetime.now(timezone.utc) - timedelta(days=1))
+    
+    def evaluate(self, usage: Dict[str, Any], recent_alerts: Dict) -> Optional[PendingAlert]:
+        percentage = float(usage['usage_percentage'])
+        
+        # Check if we should send an alert based on percentage thresholds
+        if not self._should_send_usage_alert(usage, percentage, recent_alerts):
+            return None
+        
+        notification_data = self.notification_service.build_usage_limit_warning(
+            feature_type=usage['feature_type'],
+            current_usage=usage['current_count'],
+            limit=usage['limit_count'],
+            percentage=percentage
+        )
+        return usage['user_id'], notification_data, {
+            'entity_id': usage_entity_id(usage['user_id'], usage['feature_type']),
+            'alert_type': 'usage_limit_warning',
+            'owner_id': usage['user_id'],
+            'value': percentage
+        }
+    
+    def _should_send_usage_alert(self, usage: Dict[str, Any], percentage: float, recent_alerts: Dict) -> bool:
+        """Check if we should send a usage alert"""
+        # Find the appropriate threshold
+        current_threshold = None
+        for threshold in self.alert_thresholds:
+            if percentage >= threshold:
+                current_threshold = threshold
+        
+        if current_threshold is None:
+            return False
+        
+        # Check if we've already sent an alert for this threshold in the last 24 hours
+        yesterday = datetime.now(timezone.utc) - timedelta(days=1)
+        entity_id = usage_entity_id(usage['user_id'], usage['feature_type'])
+        
+        last_alert = sent_since(recent_alerts, entity_id, 'usage_limit_warning', yesterday)
+        if last_alert and (last_alert.last_value or 0) >= current_threshold:
+            self.logger.debug(f"Skipping usage alert for user {usage['user_id']}, feature {usage['feature_type']} - already sent for {current_threshold}%")
+            return False
+        
+        return True
 
 class BusinessTriggerManager:
     """Main manager for all business triggers"""
@@ -390,29 +474,31 @@ class BusinessTriggerManager:
             UsageLimitTrigger(notification_service, supabase_client),
         ]
     
-    async def run_all_triggers(self) -> Dict[str, TriggerResult]:
-        """Run all business triggers and return results"""
+    async def run_all_triggers(self, include_reconciliation: bool = True) -> Dict[str, TriggerResult]:
+        """
+        Run all business triggers concurrently and return results.
+        include_reconciliation=False skips reconciliation-only triggers (periodic cycles).
+        """
         self.logger.info("Starting business trigger check cycle...")
+        started = time.monotonic()
         
         results = {}
         total_notifications = 0
         total_errors = []
+        triggers = [
+            trigger for trigger in self.triggers
+            if include_reconciliation or not trigger.reconciliation_only
+        ]
         
-        for trigger in self.triggers:
-            try:
-                self.logger.info(f"Running trigger: {trigger.get_trigger_name()}")
-                result = await trigger.check_and_trigger()
-                
-                results[trigger.get_trigger_name()] = result
-                total_notifications += result.notifications_sent
-                
-                if result.errors:
-                    total_errors.extend(result.errors)
-                
-                self.logger.info(f"Trigger {trigger.get_trigger_name()} completed: {result.notifications_sent} notifications sent")
-                
-            except Exception as e:
-                error_msg = f"Error running trigger {trigger.get_trigger_name()}: {str(e)}"
+        # Each trigger runs its cycle on its own thread, so they overlap
+        outcomes = await asyncio.gather(
+            *(trigger.check_and_trigger() for trigger in triggers),
+            return_exceptions=True
+        )
+        
+        for trigger, result in zip(triggers, outcomes):
+            if isinstance(result, Exception):
+                error_msg = f"Error running trigger {trigger.get_trigger_name()}: {str(result)}"
                 self.logger.error(error_msg)
                 total_errors.append(error_msg)
                 
@@ -420,9 +506,21 @@ class BusinessTriggerManager:
                     triggered=False,
                     errors=[error_msg]
                 )
+                continue
+            
+            results[trigger.get_trigger_name()] = result
+            total_notifications += result.notifications_sent
+            
+            if result.errors:
+                total_errors.extend(result.errors)
+            
+            self.logger.info(f"Trigger {trigger.get_trigger_name()} completed: {result.notifications_sent} notifications sent")
         
         # Log summary
-        self.logger.info(f"Business trigger cycle completed: {total_notifications} total notifications sent")
+        self.logger.info(
+            f"Business trigger cycle completed in {time.monotonic() - started:.1f}s: "
+            f"{total_notifications} total notifications sent"
+        )
         if total_errors:
             self.logger.warning(f"Trigger cycle had {len(total_errors)} errors")
         
@@ -9,6 +9,9 @@ from typing import List, Optional, Dict, Any
 from jinja2 import Template
 import logging
 
+from .job_queue import job_queue, JobFailed
+from src.utils.smtp_pool import get_smtp_pool
+
 logger = logging.getLogger(__name__)
 
 class EmailService:
@@ -23,6 +26,8 @@ class EmailService:
         self.smtp_password = os.getenv('SMTP_PASS')
         self.from_email = os.getenv('MAIL_FROM', self.smtp_username)
         self.from_name = os.getenv('FROM_NAME', 'SabiOps')
+        # Set on the serverless entry (api/index.py): nothing keeps a worker alive there
+        self.send_inline = os.getenv('EMAIL_SEND_INLINE', 'false').lower() == 'true'
         
         if not self.smtp_username or not self.smtp_password:
             logger.warning("Email service not configured. SMTP credentials missing.")
@@ -76,6 +81,9 @@ class EmailService:
         
         return message
     
+    def _pool(self):
+        return get_smtp_pool(self.smtp_server, self.smtp_port, self.smtp_username, self.smtp_password)
+    
     def send_email(self, to_email: str, subject: str, html_content: str = None, 
                    text_content: str = None, attachments: List[str] = None) -> bool:
         """
@@ -98,11 +106,10 @@ class EmailService:
         try:
             message = self._create_message(to_email, subject, html_content, text_content, attachments)
             
-            # Connect to SMTP server and send email
-            with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
-                server.starttls()
-                server.login(self.smtp_username, self.smtp_password)
-                server.send_message(message)
+            # Reuse a logged-in session instead of a new TCP+TLS+AUTH handshake per email
+            if not self._pool().send(message):
+                logger.error(f"Failed to send email to {to_email}")
+                return False
             
             logger.info(f"Email sent successfully to {to_email}")
             return True
@@ -111,6 +118,23 @@ class EmailService:
             logger.error(f"Failed to send email to {to_email}: {str(e)}")
             return False
     
+    def queue_email(self, to_email: str, subject: str, html_content: str = None,
+                    text_content: str = None, owner_id: str = None) -> str:
+        """
+        Send email from a background worker instead of the request thread.
+        With EMAIL_SEND_INLINE the first attempt is made before returning,
+        since a serverless instance may be frozen before a worker runs it.
+
+        Returns:
+            Job id, for status lookup via /jobs/<job_id>
+        """
+        return job_queue.enqueue("email.send", {
+            "to_email": to_email,
+            "subject": subject,
+            "html_content": html_content,
+            "text_content": text_content
+        }, owner_id=owner_id, run_inline=self.send_inline)
+    
     def send_welcome_email(self, user_email: str, user_name: str) -> bool:
         """
         Send welcome email to new users
@@ -442,3 +466,15 @@ class EmailService:
 # Create a singleton instance
 email_service = EmailService()
 
+
+@job_queue.handler("email.send")
+def _send_email_job(payload: Dict[str, Any]) -> Dict[str, Any]:
+    if not email_service.smtp_username or not email_service.smtp_password:
+        # Retrying cannot fix missing configuration
+        logger.error(f"Email to {payload.get('to_email')} dropped: email service not configured")
+        return {"sent": False, "reason": "not_configured"}
+
+    if not email_service.send_email(**payload):
+        raise JobFailed(f"SMTP delivery to {payload.get('to_email')} failed")
+    return {"sent": True}
+
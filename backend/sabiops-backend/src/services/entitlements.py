@@ -0,0 +1,200 @@
+"""
+Entitlements - cached per-owner subscription snapshot for permission checks
+Holds what the creation and analytics decorators read (plan, unified status,
+plan limits and tracked usage) for one business owner, so most checks are a
+dictionary lookup. Plan changes invalidate the owner; usage increments are
+applied to the cached snapshot in place. The owner's usage status (tracked
+and actual counts per feature) is cached alongside and dropped on both.
+Other workers catch up within ENTITLEMENT_CACHE_TTL seconds. The change times are also what decides
+whether an access token's entitlement claims are still current (utils/auth_claims.py).
+"""
+
+import os
+import threading
+import time
+from dataclasses import dataclass, field, replace
+from typing import Any, Dict, Optional, Tuple
+
+ENTITLEMENT_CACHE_TTL = float(os.getenv('ENTITLEMENT_CACHE_TTL', '60'))
+
+FEATURE_LABELS = {
+    'invoices': 'Invoice',
+    'products': 'Product',
+    'sales': 'Sales',
+    'expenses': 'Expense'
+}
+
+
+@dataclass(frozen=True)
+class Entitlements:
+    """What one business owner's plan allows right now"""
+    owner_id: str
+    plan: str
+    status: str                      # unified status: free, trial, active, expired, inactive
+    subscription_end_date: Optional[str]
+    trial_days_left: int
+    remaining_days: int
+    limits: Dict[str, int] = field(default_factory=dict)
+    usage: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def is_trial(self) -> bool:
+        return self.status == 'trial'
+
+    @property
+    def is_active(self) -> bool:
+        return self.status in ('active', 'trial')
+
+    @property
+    def is_expired(self) -> bool:
+        return self.status == 'expired'
+
+    def subscription_status(self) -> Dict[str, Any]:
+        """The get_unified_subscription_status fields access checks read"""
+        return {
+            'owner_id': self.owner_id,
+            'subscription_plan': self.plan,
+            'unified_status': self.status,
+            'subscription_end_date': self.subscription_end_date,
+            'trial_days_left': self.trial_days_left,
+            'remaining_days': self.remaining_days,
+            'is_trial': self.is_trial,
+            'is_active': self.is_active,
+            'is_expired': self.is_expired
+        }
+
+    def can_create(self, feature_type: str) -> Tuple[bool, Dict[str, Any]]:
+        """Same answer and limit_info shape as SubscriptionService.can_create_*"""
+        label = FEATURE_LABELS.get(feature_type, feature_type.title())
+        current = self.usage.get(feature_type, 0)
+        limit = self.limits.get(feature_type, 0)
+
+        if current >= limit:
+            return False, {
+                'message': f'{label} limit reached ({current}/{limit})',
+                'current_usage': current,
+                'limit': limit,
+                'upgrade_required': True,
+                'current_plan': self.plan
+            }
+        return True, {
+            'message': f'{label} creation allowed',
+            'current_usage': current,
+            'limit': limit,
+            'remaining': limit - current
+        }
+
+    def usage_limits(self) -> Dict[str, Any]:
+        """Same shape as SubscriptionService.get_usage_limits"""
+        limits = {}
+        for feature_type, limit in self.limits.items():
+            current = self.usage.get(feature_type, 0)
+            limits[feature_type] = {
+                'limit': limit,
+                'current': current,
+                'remaining': max(0, limit - current),
+                'percentage_used': (current / limit * 100) if limit > 0 else 0
+            }
+        return {
+            'plan': self.plan,
+            'limits': limits,
+            'is_trial': self.is_trial,
+            'trial_days_left': self.trial_days_left
+        }
+
+
+class EntitlementCache:
+    """
+    In-process TTL cache of Entitlements keyed by owner id, plus which owner
+    each user belongs to (team members share their owner's snapshot) and
+    each owner's SubscriptionService.get_usage_status report.
+    """
+
+    def __init__(self, ttl_seconds: float = 60):
+        self.ttl_seconds = ttl_seconds
+        self._entries: Dict[str, Tuple[float, Entitlements]] = {}
+        self._owners: Dict[str, Tuple[float, str]] = {}
+        self._versions: Dict[str, int] = {}
+        self._changed: Dict[str, float] = {}
+        self._usage_status: Dict[str, Tuple[float, Dict[str, Dict[str, Any]]]] = {}
+        self._lock = threading.Lock()
+
+    def owner_of(self, user_id: str) -> Optional[str]:
+        with self._lock:
+            entry = self._owners.get(user_id)
+            return entry[1] if entry and entry[0] > time.monotonic() else None
+
+    def set_owner(self, user_id: str, owner_id: str):
+        with self._lock:
+            self._owners[user_id] = (time.monotonic() + self.ttl_seconds, owner_id)
+
+    def get(self, owner_id: str) -> Optional[Entitlements]:
+        with self._lock:
+            entry = self._entries.get(owner_id)
+            return entry[1] if entry and entry[0] > time.monotonic() else None
+
+    def version(self, owner_id: str) -> int:
+        """Read before loading; pass to set() so a load older than the last write is dropped"""
+        with self._lock:
+            return self._versions.get(owner_id, 0)
+
+    def set(self, owner_id: str, entitlements: Entitlements, version: int) -> bool:
+        with self._lock:
+            if self._versions.get(owner_id, 0) != version:
+                return False
+            self._entries[owner_id] = (time.monotonic() + self.ttl_seconds, entitlements)
+            return True
+
+    def get_usage_status(self, owner_id: str) -> Optional[Dict[str, Dict[str, Any]]]:
+        with self._lock:
+            entry = self._usage_status.get(owner_id)
+            return entry[1] if entry and entry[0] > time.monotonic() else None
+
+    def set_usage_status(self, owner_id: str, usage_status: Dict[str, Dict[str, Any]], version: int) -> bool:
+        """Same version rule as set()"""
+        with self._lock:
+            if self._versions.get(owner_id, 0) != version:
+                return False
+            self._usage_status[owner_id] = (time.monotonic() + self.ttl_seconds, usage_status)
+            return True
+
+    def invalidate(self, *user_ids: str):
+        """Plan, status or limits changed; accepts owner ids or team member ids"""
+        with self._lock:
+            now = time.time()
+            for user_id in user_ids:
+                owner = self._owners.get(user_id)
+                for owner_id in {user_id, owner[1] if owner else user_id}:
+                    self._versions[owner_id] = self._versions.get(owner_id, 0) + 1
+                    self._entries.pop(owner_id, None)
+                    self._usage_status.pop(owner_id, None)
+                    self._changed[owner_id] = now
+
+    def changed_at(self, *user_ids: str) -> float:
+        """Wall-clock time this process last invalidated any of the ids (0 if never)"""
+        with self._lock:
+            return max((self._changed.get(user_id, 0) for user_id in user_ids), default=0)
+
+    def add_usage(self, owner_id: str, feature_type: str, amount: int):
+        """Apply a usage change the database has already taken to the cached snapshot"""
+        with self._lock:
+            self._versions[owner_id] = self._versions.get(owner_id, 0) + 1
+            # Actual record counts moved too; the next read recounts
+            self._usage_status.pop(owner_id, None)
+            entry = self._entries.get(owner_id)
+            if not entry:
+                return
+            usage = dict(entry[1].usage)
+            usage[feature_type] = max(0, usage.get(feature_type, 0) + amount)
+            self._entries[owner_id] = (entry[0], replace(entry[1], usage=usage))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._owners.clear()
+            self._versions.clear()
+            self._changed.clear()
+            self._usage_status.clear()
+
+
+entitlement_cache = EntitlementCache(ttl_seconds=ENTITLEMENT_CACHE_TTL)
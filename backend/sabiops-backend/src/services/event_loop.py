@@ -0,0 +1,117 @@
+"""
+Event Loop - one long-lived asyncio loop per process for sync callers
+Flask routes, scheduler jobs and job queue workers are plain threads but the
+notification services are coroutines. Instead of building and tearing down a
+loop per call (asyncio.run / run_until_complete), every caller hands its
+coroutine to a single loop running on a daemon thread and waits for the
+result with a timeout. Blocking Supabase calls inside those coroutines go
+through asyncio.to_thread, so concurrent callers overlap on the loop.
+"""
+
+import asyncio
+import concurrent.futures
+import logging
+import os
+import threading
+from typing import Any, Awaitable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT_SECONDS = float(os.getenv('ASYNC_BRIDGE_TIMEOUT_SECONDS', '30'))
+DEFAULT_WORKERS = int(os.getenv('ASYNC_BRIDGE_WORKERS', '16'))
+
+
+class BackgroundLoop:
+    """
+    Event loop on a daemon thread, started on first use.
+
+    submit() schedules a coroutine from any thread and returns a
+    concurrent.futures.Future; run() waits for it and cancels the coroutine
+    when the timeout passes. A forked worker (gunicorn --preload) starts its
+    own loop rather than reusing the parent's dead thread.
+    """
+
+    def __init__(self, workers: Optional[int] = None):
+        self.workers = workers or DEFAULT_WORKERS
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        if self._pid == os.getpid() and self._thread and self._thread.is_alive():
+            return self._loop
+        with self._lock:
+            if self._pid != os.getpid() or not (self._thread and self._thread.is_alive()):
+                self._start()
+            return self._loop
+
+    def _start(self):
+        loop = asyncio.new_event_loop()
+        # to_thread offloads blocking client calls to this pool
+        loop.set_default_executor(concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="async-io"
+        ))
+        started = threading.Event()
+
+        def serve():
+            asyncio.set_event_loop(loop)
+            loop.call_soon(started.set)
+            loop.run_forever()
+
+        thread = threading.Thread(target=serve, daemon=True, name="async-bridge")
+        thread.start()
+        started.wait()
+        self._loop, self._thread, self._pid = loop, thread, os.getpid()
+        logger.info(f"Started background event loop in process {self._pid}")
+
+    def in_loop_thread(self) -> bool:
+        return self._thread is not None and threading.current_thread() is self._thread
+
+    def submit(self, coro: Awaitable) -> concurrent.futures.Future:
+        """Schedule a coroutine on the loop from any thread"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro: Awaitable, timeout: Optional[float] = DEFAULT_TIMEOUT_SECONDS) -> Any:
+        """
+        Run a coroutine on the loop and wait for its result; timeout=None waits
+        as long as it takes. Raises TimeoutError (after cancelling the
+        coroutine) or whatever the coroutine raised.
+        """
+        if self.in_loop_thread():
+            coro.close()
+            raise RuntimeError("BackgroundLoop.run called from the loop thread; await the coroutine instead")
+
+        future = self.submit(coro)
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise TimeoutError(f"Coroutine did not finish within {timeout} seconds")
+
+    def gather(self, *coros: Awaitable, timeout: Optional[float] = DEFAULT_TIMEOUT_SECONDS) -> List[Any]:
+        """Run several coroutines concurrently and return their results in order"""
+        async def gather_all():
+            return await asyncio.gather(*coros)
+
+        return self.run(gather_all(), timeout)
+
+    def stop(self):
+        """Stop the loop thread; the next call starts a fresh one"""
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            self._loop = self._thread = self._pid = None
+        if loop and thread and thread.is_alive():
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join(timeout=5)
+            loop.close()
+
+
+# Global background loop instance
+background_loop = BackgroundLoop()
+
+
+def run_async(coro: Awaitable, timeout: Optional[float] = DEFAULT_TIMEOUT_SECONDS) -> Any:
+    """Run a coroutine from synchronous code on the shared background loop"""
+    return background_loop.run(coro, timeout)
@@ -44,3 +44,52 @@ def send_push_notification(token, title, body, data=None):
     except Exception as e:
         logger.error(f"Failed to send push notification: {e}")
         return None
+
+# FCM accepts at most 500 tokens per multicast request
+MULTICAST_LIMIT = 500
+
+# Errors meaning the token will never work again and should be deactivated
+PERMANENT_TOKEN_ERRORS = (messaging.UnregisteredError, messaging.SenderIdMismatchError)
+
+def _stringify_data(data):
+    """FCM data payloads only carry string values"""
+    return {
+        str(key): value if isinstance(value, str) else json.dumps(value) if isinstance(value, (dict, list)) else str(value)
+        for key, value in (data or {}).items()
+        if value is not None
+    }
+
+def send_multicast_notification(tokens, title, body, data=None, transport=None):
+    """
+    Send one notification to many device tokens with send_each_for_multicast,
+    in chunks of MULTICAST_LIMIT.
+
+    Returns a list of (token, success, permanent_failure) in token order.
+    `transport` replaces messaging.send_each_for_multicast (used by tests).
+    """
+    if transport is None:
+        if not firebase_initialized:
+            logger.warning("Firebase not initialized. Skipping push notification.")
+            return [(token, False, False) for token in tokens]
+        transport = messaging.send_each_for_multicast
+
+    results = []
+    payload = _stringify_data(data)
+    for start in range(0, len(tokens), MULTICAST_LIMIT):
+        chunk = tokens[start:start + MULTICAST_LIMIT]
+        message = messaging.MulticastMessage(
+            tokens=chunk,
+            notification=messaging.Notification(title=title, body=body),
+            data=payload
+        )
+        try:
+            batch = transport(message)
+        except Exception as e:
+            logger.error(f"Failed to send multicast push to {len(chunk)} tokens: {e}")
+            results.extend((token, False, False) for token in chunk)
+            continue
+
+        for token, response in zip(chunk, batch.responses):
+            permanent = not response.success and isinstance(response.exception, PERMANENT_TOKEN_ERRORS)
+            results.append((token, response.success, permanent))
+    return results
@@ -0,0 +1,667 @@
+"""
+Bulk Import Service
+Streams CSV/XLSX uploads, validates them in batches and writes each batch
+with one bulk insert/upsert, reporting per-row errors and job progress.
+Imports run as job_queue jobs; their progress is stored as the job's result.
+"""
+
+import csv
+import logging
+import os
+import re
+import threading
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from .job_queue import STATUS_DEAD, STATUS_QUEUED, get_job_supabase, job_queue
+
+logger = logging.getLogger(__name__)
+
+
+class ImportJob:
+    """Progress and outcome of one background import"""
+
+    MAX_REPORTED_ERRORS = 1000
+
+    def __init__(self, owner_id: str, user_id: str, entity: str, filename: str, mode: str = "insert",
+                 job_id: Optional[str] = None):
+        self.id = job_id or str(uuid.uuid4())
+        self.owner_id = owner_id
+        self.user_id = user_id
+        self.entity = entity
+        self.filename = filename
+        self.mode = mode
+        self.status = "queued"
+        self.total_rows: Optional[int] = None
+        self.processed_rows = 0
+        self.inserted = 0
+        self.updated = 0
+        self.error_count = 0
+        self.errors: List[Dict[str, Any]] = []
+        self.message = ""
+        self.created_at = datetime.now(timezone.utc)
+        self.finished_at: Optional[datetime] = None
+        self._lock = threading.Lock()
+
+    def add_error(self, row_number: int, message: str) -> None:
+        with self._lock:
+            self.error_count += 1
+            if len(self.errors) < self.MAX_REPORTED_ERRORS:
+                self.errors.append({"row": row_number, "error": message})
+
+    def to_dict(self, include_errors: bool = True) -> Dict[str, Any]:
+        progress = None
+        if self.status == "completed":
+            progress = 100.0
+        elif self.total_rows:
+            progress = round(min(self.processed_rows / self.total_rows, 1.0) * 100, 1)
+
+        data = {
+            "job_id": self.id,
+            "entity": self.entity,
+            "filename": self.filename,
+            "mode": self.mode,
+            "status": self.status,
+            "total_rows": self.total_rows,
+            "processed_rows": self.processed_rows,
+            "progress": progress,
+            "inserted": self.inserted,
+            "updated": self.updated,
+            "error_count": self.error_count,
+            "message": self.message,
+            "created_at": self.created_at.isoformat(),
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None
+        }
+        if include_errors:
+            data["errors"] = list(self.errors)
+            data["errors_truncated"] = self.error_count > len(self.errors)
+        return data
+
+
+def _normalize_header(value: Any) -> str:
+    return re.sub(r"[^a-z0-9]+", "_", str(value or "").strip().lower()).strip("_")
+
+
+def _coerce_column(values: List[Any], kind: str) -> Tuple[List[Any], List[int]]:
+    """
+    Coerce a whole column at once
+    Returns: (coerced_values, indexes_that_failed); blanks become None
+    """
+    coerced: List[Any] = []
+    bad: List[int] = []
+    for index, value in enumerate(values):
+        if value is None or (isinstance(value, str) and not value.strip()):
+            coerced.append(None)
+            continue
+        try:
+            if kind == "float":
+                text = str(value).replace(",", "").replace("₦", "").strip()
+                coerced.append(float(text))
+            elif kind == "int":
+                number = float(str(value).replace(",", "").strip())
+                if number != int(number):
+                    raise ValueError("not a whole number")
+                coerced.append(int(number))
+            elif kind == "date":
+                if isinstance(value, datetime):
+                    parsed = value
+                else:
+                    parsed = datetime.fromisoformat(str(value).strip().replace("Z", "+00:00"))
+                if parsed.tzinfo is None:
+                    parsed = parsed.replace(tzinfo=timezone.utc)
+                coerced.append(parsed.isoformat())
+            else:
+                coerced.append(str(value).strip())
+        except (ValueError, TypeError):
+            coerced.append(None)
+            bad.append(index)
+    return coerced, bad
+
+
+class ImportService:
+    """Streaming, batched importer for products, customers, sales and expenses"""
+
+    CHUNK_SIZE = 500
+
+    # Column kinds per entity; anything not listed is read as text
+    ENTITY_SPECS = {
+        "products": {
+            "table": "products",
+            "feature": "products",
+            "required": ["name", "price", "quantity"],
+            "columns": {
+                "name": "str", "description": "str", "price": "float", "cost_price": "float",
+                "quantity": "int", "low_stock_threshold": "int", "category": "str",
+                "sub_category": "str", "sku": "str", "barcode": "str", "image_url": "str"
+            }
+        },
+        "customers": {
+            "table": "customers",
+            "feature": None,
+            "required": ["name"],
+            "columns": {
+                "name": "str", "email": "str", "phone": "str", "address": "str",
+                "business_name": "str", "notes": "str"
+            }
+        },
+        "sales": {
+            "table": "sales",
+            "feature": "sales",
+            "required": ["quantity", "unit_price"],
+            "columns": {
+                "sku": "str", "product_name": "str", "quantity": "int", "unit_price": "float",
+                "total_amount": "float", "customer_name": "str", "customer_email": "str",
+                "payment_method": "str", "date": "date", "notes": "str"
+            }
+        },
+        "expenses": {
+            "table": "expenses",
+            "feature": "expenses",
+            "required": ["category", "amount", "date"],
+            "columns": {
+                "category": "str", "sub_category": "str", "amount": "float", "description": "str",
+                "payment_method": "str", "date": "date", "receipt_url": "str"
+            }
+        }
+    }
+
+    def __init__(self, supabase_client):
+        self.supabase = supabase_client
+
+    # ------------------------------------------------------------------ parsing
+
+    def iter_rows(self, path: str, filename: str) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """Yield (row_number, {normalized_header: value}) without loading the whole file"""
+        if filename.lower().endswith((".xlsx", ".xlsm")):
+            yield from self._iter_xlsx(path)
+        else:
+            yield from self._iter_csv(path)
+
+    def estimate_rows(self, path: str, filename: str) -> Optional[int]:
+        """Cheap row-count estimate used for progress reporting"""
+        try:
+            if filename.lower().endswith((".xlsx", ".xlsm")):
+                from openpyxl import load_workbook
+                workbook = load_workbook(path, read_only=True)
+                try:
+                    max_row = workbook.active.max_row
+                finally:
+                    workbook.close()
+                return max(max_row - 1, 0) if max_row else None
+
+            lines = 0
+            with open(path, "rb") as handle:
+                for block in iter(lambda: handle.read(1 << 20), b""):
+                    lines += block.count(b"\n")
+            return max(lines - 1, 0)
+        except Exception as e:
+            logger.warning(f"Could not estimate import size for {filename}: {str(e)}")
+            return None
+
+    def _iter_csv(self, path: str):
+        with open(path, "r", encoding="utf-8-sig", newline="") as handle:
+            reader = csv.reader(handle)
+            headers = next(reader, None)
+            if not headers:
+                return
+            keys = [_normalize_header(h) for h in headers]
+            for row_number, values in enumerate(reader, start=2):
+                if not any((v or "").strip() for v in values):
+                    continue
+                yield row_number, dict(zip(keys, values))
+
+    def _iter_xlsx(self, path: str):
+        try:
+            from openpyxl import load_workbook
+        except ImportError:
+            raise ValueError("XLSX import requires openpyxl; upload a CSV file instead")
+
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            headers = next(rows, None)
+            if not headers:
+                return
+            keys = [_normalize_header(h) for h in headers]
+            for row_number, values in enumerate(rows, start=2):
+                if not any(v not in (None, "") for v in values):
+                    continue
+                yield row_number, dict(zip(keys, values))
+        finally:
+            workbook.close()
+
+    # --------------------------------------------------------------- pipeline
+
+    def run(self, job: ImportJob, path: str, allowance: Optional[int] = None,
+            on_finish: Optional[Callable[[ImportJob], None]] = None,
+            on_progress: Optional[Callable[[ImportJob], None]] = None) -> ImportJob:
+        """Process the whole file in chunks, updating job progress as it goes"""
+        spec = self.ENTITY_SPECS[job.entity]
+        job.status = "running"
+        job.total_rows = self.estimate_rows(path, job.filename)
+
+        try:
+            if on_progress:
+                on_progress(job)
+            context = self._prefetch(job.entity, job.owner_id)
+            context["allowance"] = allowance
+
+            chunk: List[Tuple[int, Dict[str, Any]]] = []
+            for row in self.iter_rows(path, job.filename):
+                chunk.append(row)
+                if len(chunk) >= self.CHUNK_SIZE:
+                    self._process_chunk(job, spec, chunk, context)
+                    chunk = []
+                    if on_progress:
+                        on_progress(job)
+            if chunk:
+                self._process_chunk(job, spec, chunk, context)
+
+            job.status = "completed"
+            job.message = f"Imported {job.inserted + job.updated} of {job.processed_rows} rows ({job.error_count} errors)"
+        except Exception as e:
+            logger.error(f"Import job {job.id} failed: {str(e)}", exc_info=True)
+            job.status = "failed"
+            job.message = str(e)
+        finally:
+            job.finished_at = datetime.now(timezone.utc)
+            if on_finish:
+                try:
+                    on_finish(job)
+                except Exception as e:
+                    logger.warning(f"Import job {job.id} completion hook failed: {str(e)}")
+
+        logger.info(f"Import job {job.id} ({job.entity}) {job.status}: {job.message}")
+        return job
+
+    def _process_chunk(self, job: ImportJob, spec: Dict, chunk: List[Tuple[int, Dict[str, Any]]], context: Dict) -> None:
+        row_numbers = [row_number for row_number, _ in chunk]
+        columns: Dict[str, List[Any]] = {}
+        errors: Dict[int, List[str]] = {}
+
+        # Column-wise coercion and required-field checks for the whole batch
+        for column, kind in spec["columns"].items():
+            raw = [row.get(column) for _, row in chunk]
+            values, bad = _coerce_column(raw, kind)
+            for index in bad:
+                errors.setdefault(index, []).append(f"Invalid {column.replace('_', ' ')}: {raw[index]!r}")
+            columns[column] = values
+
+        for column in spec["required"]:
+            for index, value in enumerate(columns[column]):
+                if value is None or value == "":
+                    errors.setdefault(index, []).append(f"{column.replace('_', ' ').title()} is required")
+
+        builder = getattr(self, f"_build_{job.entity}")
+        new_records, existing_records, extra_rows = [], [], []
+        for index in range(len(chunk)):
+            row_values = {column: columns[column][index] for column in columns}
+            if index not in errors:
+                record, is_update, extra, row_errors = builder(job, row_values, context)
+                if row_errors:
+                    errors.setdefault(index, []).extend(row_errors)
+                elif not is_update and context.get("allowance") is not None and context["allowance"] <= 0:
+                    errors.setdefault(index, []).append("Plan limit reached; upgrade to import more")
+                else:
+                    if is_update:
+                        existing_records.append((index, record))
+                    else:
+                        new_records.append((index, record))
+                        if context.get("allowance") is not None:
+                            context["allowance"] -= 1
+                    if extra:
+                        extra_rows.append(extra)
+                    continue
+            job.add_error(row_numbers[index], "; ".join(errors[index]))
+
+        inserted_ids = self._write(spec["table"], new_records, row_numbers, job, upsert=False)
+        updated_ids = self._write(spec["table"], existing_records, row_numbers, job, upsert=True)
+        job.inserted += len(inserted_ids)
+        job.updated += len(updated_ids)
+        if context.get("allowance") is not None:
+            # Rows rejected by the database do not use up the plan allowance
+            context["allowance"] += len(new_records) - len(inserted_ids)
+
+        # Ledger rows only for records that were actually written
+        transactions = [t for t in extra_rows if t["reference_id"] in inserted_ids]
+        if transactions:
+            try:
+                self.supabase.table("transactions").insert(transactions).execute()
+            except Exception as e:
+                logger.warning(f"Import job {job.id}: failed to create {len(transactions)} transaction records: {str(e)}")
+
+        job.processed_rows += len(chunk)
+
+    def _write(self, table: str, records: List[Tuple[int, Dict]], row_numbers: List[int],
+               job: ImportJob, upsert: bool) -> set:
+        """
+        One bulk statement per chunk; fall back to row-by-row only to pinpoint failures
+        Returns: ids of the records that were written
+        """
+        if not records:
+            return set()
+
+        payload = [record for _, record in records]
+        query = self.supabase.table(table)
+        try:
+            (query.upsert(payload) if upsert else query.insert(payload)).execute()
+            return {record["id"] for record in payload}
+        except Exception as bulk_error:
+            logger.warning(f"Bulk write of {len(payload)} {table} rows failed, retrying individually: {str(bulk_error)}")
+
+        written = set()
+        for index, record in records:
+            try:
+                query = self.supabase.table(table)
+                (query.upsert(record) if upsert else query.insert(record)).execute()
+                written.add(record["id"])
+            except Exception as row_error:
+                job.add_error(row_numbers[index], f"Database error: {str(row_error)}")
+        return written
+
+    # ---------------------------------------------------------------- prefetch
+
+    def _prefetch(self, entity: str, owner_id: str) -> Dict[str, Any]:
+        """Load everything the validators compare against in one query per entity"""
+        context: Dict[str, Any] = {}
+
+        if entity == "products":
+            from src.routes.product import get_business_categories
+            context["categories"] = set(get_business_categories())
+            result = self.supabase.table("products").select("id, sku").eq("owner_id", owner_id).eq("active", True).execute()
+            context["existing_skus"] = {
+                str(p["sku"]).strip().lower(): p["id"] for p in (result.data or []) if p.get("sku")
+            }
+            context["file_skus"] = set()
+        elif entity == "customers":
+            result = self.supabase.table("customers").select("email").eq("owner_id", owner_id).execute()
+            context["existing_emails"] = {
+                str(c["email"]).strip().lower() for c in (result.data or []) if c.get("email")
+            }
+        elif entity == "sales":
+            result = self.supabase.table("products").select("id, name, sku, cost_price").eq("owner_id", owner_id).execute()
+            products = result.data or []
+            context["products_by_sku"] = {str(p["sku"]).strip().lower(): p for p in products if p.get("sku")}
+            context["products_by_name"] = {str(p["name"]).strip().lower(): p for p in products if p.get("name")}
+        elif entity == "expenses":
+            from src.routes.expense import get_nigerian_expense_categories
+            context["categories"] = set(get_nigerian_expense_categories().keys())
+
+        return context
+
+    # ---------------------------------------------------------------- builders
+    # Each returns (record, is_update, transaction_or_None, errors)
+
+    def _build_products(self, job: ImportJob, values: Dict[str, Any], context: Dict):
+        errors = []
+        name = values["name"]
+        if len(name) < 2 or len(name) > 100:
+            errors.append("Product name must be between 2 and 100 characters")
+        if values["price"] <= 0 or values["price"] > 10000000:
+            errors.append("Price must be greater than 0 and at most ₦10,000,000")
+        if values["quantity"] < 0 or values["quantity"] > 1000000:
+            errors.append("Quantity must be between 0 and 1,000,000")
+        cost_price = values["cost_price"] or 0
+        if cost_price < 0:
+            errors.append("Cost price cannot be negative")
+        elif cost_price > values["price"]:
+            errors.append("Cost price should not be higher than selling price")
+
+        category = values["category"] or "Other"
+        if category not in context["categories"]:
+            errors.append(f"Invalid category: {category}")
+
+        sku = values["sku"] or ""
+        if len(sku) > 50:
+            errors.append("SKU cannot exceed 50 characters")
+        sku_key = sku.lower()
+        existing_id = context["existing_skus"].get(sku_key) if sku else None
+        if sku and sku_key in context["file_skus"]:
+            errors.append(f"Duplicate SKU in file: {sku}")
+        elif existing_id and job.mode != "upsert":
+            errors.append(f"A product with SKU {sku} already exists")
+
+        if errors:
+            return None, False, None, errors
+
+        if not sku:
+            name_part = "".join(c.upper() for c in name[:3] if c.isalnum())
+            sku = f"{name_part}-{uuid.uuid4().hex[:6].upper()}"
+        context["file_skus"].add(sku.lower())
+
+        now = datetime.now(timezone.utc).isoformat()
+        threshold = values["low_stock_threshold"]
+        record = {
+            "id": existing_id or str(uuid.uuid4()),
+            "owner_id": job.owner_id,
+            "name": name,
+            "description": values["description"] or "",
+            "price": values["price"],
+            "cost_price": cost_price,
+            "quantity": values["quantity"],
+            "low_stock_threshold": threshold if threshold is not None else 5,
+            "category": category,
+            "sub_category": values["sub_category"] or "",
+            "sku": sku,
+            "barcode": values["barcode"] or None,
+            "image_url": values["image_url"] or "",
+            "active": True,
+            "updated_at": now
+        }
+        if not existing_id:
+            record["created_at"] = now
+        return record, bool(existing_id), None, []
+
+    def _build_customers(self, job: ImportJob, values: Dict[str, Any], context: Dict):
+        email = (values["email"] or "").lower()
+        if email and "@" not in email:
+            return None, False, None, ["Invalid email format"]
+        if email and email in context["existing_emails"]:
+            return None, False, None, [f"A customer with email {email} already exists"]
+        if email:
+            context["existing_emails"].add(email)
+
+        now = datetime.now().isoformat()
+        record = {
+            "id": str(uuid.uuid4()),
+            "owner_id": job.owner_id,
+            "name": values["name"],
+            "email": email,
+            "phone": values["phone"] or "",
+            "address": values["address"] or "",
+            "business_name": values["business_name"] or "",
+            "notes": values["notes"] or "",
+            "purchase_history": [],
+            "interactions": [],
+            "total_purchases": 0,
+            "total_spent": 0,
+            "created_at": now,
+            "updated_at": now
+        }
+        return record, False, None, []
+
+    def _build_sales(self, job: ImportJob, values: Dict[str, Any], context: Dict):
+        errors = []
+        product = None
+        if values["sku"]:
+            product = context["products_by_sku"].get(values["sku"].lower())
+        if not product and values["product_name"]:
+            product = context["products_by_name"].get(values["product_name"].lower())
+        if not product and not values["product_name"]:
+            errors.append("Product SKU or product name is required")
+        if values["quantity"] <= 0:
+            errors.append("Quantity must be greater than 0")
+        if values["unit_price"] < 0:
+            errors.append("Unit price cannot be negative")
+        if errors:
+            return None, False, None, errors
+
+        quantity = values["quantity"]
+        total_amount = values["total_amount"] if values["total_amount"] is not None else quantity * values["unit_price"]
+        cost_price = float((product or {}).get("cost_price") or 0)
+        total_cogs = cost_price * quantity
+        gross_profit = total_amount - total_cogs
+        sale_date = values["date"] or datetime.now(timezone.utc).isoformat()
+        product_name = (product or {}).get("name") or values["product_name"]
+
+        record = {
+            "id": str(uuid.uuid4()),
+            "owner_id": job.owner_id,
+            "product_id": (product or {}).get("id"),
+            "product_name": product_name,
+            "quantity": quantity,
+            "unit_price": values["unit_price"],
+            "total_amount": total_amount,
+            "total_cogs": total_cogs,
+            "gross_profit": gross_profit,
+            "profit_from_sales": gross_profit,
+            "profit_margin": (gross_profit / total_amount * 100) if total_amount else 0,
+            "customer_name": values["customer_name"] or "Walk-in Customer",
+            "customer_email": values["customer_email"] or None,
+            "payment_method": values["payment_method"] or "cash",
+            "payment_status": "completed",
+            "salesperson_id": job.user_id,
+            "notes": values["notes"] or "",
+            "date": sale_date,
+            "created_at": datetime.now().isoformat()
+        }
+        transaction = {
+            "id": str(uuid.uuid4()),
+            "owner_id": job.owner_id,
+            "type": "income",
+            "category": "Sales",
+            "amount": float(total_amount),
+            "description": f"Sale of {quantity}x {product_name} to {record['customer_name']}",
+            "reference_id": record["id"],
+            "reference_type": "sale",
+            "payment_method": record["payment_method"],
+            "date": sale_date,
+            "created_at": datetime.now().isoformat()
+        }
+        return record, False, transaction, []
+
+    def _build_expenses(self, job: ImportJob, values: Dict[str, Any], context: Dict):
+        errors = []
+        if values["amount"] <= 0:
+            errors.append("Expense amount must be a positive number")
+        if values["category"] not in context["categories"]:
+            errors.append(f"Invalid category: {values['category']}")
+        if errors:
+            return None, False, None, errors
+
+        now = datetime.now().isoformat()
+        record = {
+            "id": str(uuid.uuid4()),
+            "owner_id": job.owner_id,
+            "category": values["category"],
+            "sub_category": values["sub_category"] or "",
+            "amount": values["amount"],
+            "description": values["description"] or "",
+            "receipt_url": values["receipt_url"] or "",
+            "payment_method": values["payment_method"] or "cash",
+            "date": values["date"],
+            "created_at": now,
+            "updated_at": now
+        }
+        transaction = {
+            "id": str(uuid.uuid4()),
+            "owner_id": job.owner_id,
+            "type": "expense",
+            "category": record["category"],
+            "sub_category": record["sub_category"],
+            "amount": record["amount"],
+            "description": record["description"] or f"{record['category']} expense",
+            "reference_id": record["id"],
+            "reference_type": "expense",
+            "payment_method": record["payment_method"],
+            "date": record["date"],
+            "created_at": now
+        }
+        return record, False, transaction, []
+
+
+IMPORT_JOB_KIND = "import.run"
+
+
+def queue_import(job: ImportJob, path: str, allowance: Optional[int] = None) -> ImportJob:
+    """Queue the import on the job queue; the file at path is removed when it finishes"""
+    job_queue.enqueue(IMPORT_JOB_KIND, {
+        "job": job.to_dict(include_errors=False),
+        "owner_id": job.owner_id,
+        "user_id": job.user_id,
+        "path": path,
+        "allowance": allowance
+    }, owner_id=job.owner_id, max_attempts=1, job_id=job.id)
+    return job
+
+
+def get_import(job_id: str, owner_id: str) -> Optional[Dict[str, Any]]:
+    row = job_queue.get(job_id, owner_id=owner_id)
+    if not row or row["kind"] != IMPORT_JOB_KIND:
+        return None
+    return _import_status(row)
+
+
+def list_owner_imports(owner_id: str, limit: int = 50) -> List[Dict[str, Any]]:
+    rows = job_queue.list_jobs(owner_id=owner_id, limit=limit, kind=IMPORT_JOB_KIND)
+    return [_import_status(row, include_errors=False) for row in rows]
+
+
+def _import_status(row: Dict[str, Any], include_errors: bool = True) -> Dict[str, Any]:
+    """The import's own progress (stored as the queue job's result) under the queue's status"""
+    data = dict(row["result"] or row["payload"]["job"])
+    if row["status"] == STATUS_DEAD:
+        data["status"] = "failed"
+        data["message"] = data.get("message") or row.get("last_error") or "Import failed"
+    elif row["status"] == STATUS_QUEUED:
+        data["status"] = "queued"
+    if not include_errors:
+        data.pop("errors", None)
+        data.pop("errors_truncated", None)
+    return data
+
+
+@job_queue.handler(IMPORT_JOB_KIND)
+def _run_import_job(payload: Dict[str, Any]) -> Dict[str, Any]:
+    spec = payload["job"]
+    job = ImportJob(payload["owner_id"], payload["user_id"], spec["entity"], spec["filename"],
+                    mode=spec["mode"], job_id=spec["job_id"])
+    path = payload["path"]
+    try:
+        queued = job_queue.get(job.id)
+        if queued and queued["attempts"] > 1:
+            # The worker running it died part way; rerunning would insert its rows again
+            job.status = "failed"
+            job.message = "Import was interrupted; check the imported records before uploading the file again"
+            job.finished_at = datetime.now(timezone.utc)
+            return job.to_dict()
+
+        ImportService(get_job_supabase()).run(
+            job, path, allowance=payload.get("allowance"), on_finish=_record_usage,
+            on_progress=_report_progress
+        )
+        return job.to_dict()
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _report_progress(job: ImportJob) -> None:
+    """Best effort: a missed update only delays the progress shown"""
+    try:
+        job_queue.report(job.id, job.to_dict())
+    except Exception as e:
+        logger.warning(f"Import job {job.id}: could not store progress: {str(e)}")
+
+
+def _record_usage(job: ImportJob) -> None:
+    """Count imported rows against the plan with one usage increment"""
+    feature = ImportService.ENTITY_SPECS[job.entity]["feature"]
+    if not feature or not job.inserted:
+        return
+
+    from src.services.subscription_service import SubscriptionService
+    SubscriptionService().increment_usage_atomic(job.user_id, feature, amount=job.inserted)
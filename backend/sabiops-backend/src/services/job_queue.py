@@ -0,0 +1,375 @@
+"""
+Durable Job Queue for SabiOps
+SQLite-backed queue for slow side effects (email, push, PDF/report work) so
+request handlers can enqueue and return immediately. Jobs survive restarts,
+are retried with exponential backoff and are dead-lettered after max_attempts.
+"""
+
+import json
+import logging
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_SUCCEEDED = "succeeded"
+STATUS_DEAD = "dead"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    owner_id TEXT,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    run_at REAL NOT NULL,
+    locked_until REAL,
+    last_error TEXT,
+    result TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status_run_at ON jobs(status, run_at);
+"""
+
+
+class JobFailed(Exception):
+    """Raised by a handler when the work did not happen and should be retried"""
+
+
+class JobQueue:
+    """
+    Persistent queue with in-process worker threads.
+
+    Handlers are registered per job kind and receive the JSON payload. A
+    handler that raises is retried after base_delay * 2^(attempt-1) seconds
+    (capped at max_delay, with jitter); after max_attempts the job is kept
+    with status "dead" for inspection and manual retry. A job whose worker
+    died mid-run is picked up again once its lease expires. Idle workers
+    purge succeeded jobs older than retention_seconds about once an hour.
+    """
+
+    PURGE_INTERVAL_SECONDS = 3600
+
+    def __init__(self, db_path: str, workers: int = 2, base_delay: float = 5.0,
+                 max_delay: float = 900.0, lease_seconds: float = 300.0, poll_interval: float = 2.0,
+                 retention_seconds: float = 7 * 86400):
+        self.db_path = db_path
+        self.worker_count = max(1, int(workers))
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.retention_seconds = retention_seconds
+
+        self._handlers: Dict[str, Callable[[Dict], Any]] = {}
+        self._local = threading.local()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._start_lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+        self._app = None
+        self._schema_ready = False
+        self._purge_lock = threading.Lock()
+        self._next_purge = 0.0
+
+    # ------------------------------------------------------------------
+    # Storage
+    # ------------------------------------------------------------------
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        if not self._schema_ready:
+            conn.executescript(_SCHEMA)
+            self._schema_ready = True
+        return conn
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> Dict:
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["result"] = json.loads(job["result"]) if job.get("result") else None
+        job.pop("locked_until", None)
+        return job
+
+    # ------------------------------------------------------------------
+    # Producer API
+    # ------------------------------------------------------------------
+
+    def handler(self, kind: str):
+        """Decorator registering the function that runs jobs of this kind"""
+        def register(func):
+            self._handlers[kind] = func
+            return func
+        return register
+
+    def register(self, kind: str, func: Callable[[Dict], Any]):
+        self._handlers[kind] = func
+
+    def enqueue(self, kind: str, payload: Optional[Dict] = None, owner_id: Optional[str] = None,
+                max_attempts: int = 5, delay: float = 0, run_inline: bool = False,
+                job_id: Optional[str] = None) -> str:
+        """
+        Persist a job and wake a worker. Returns the job id.
+
+        With run_inline the first attempt runs on the calling thread before
+        returning, for processes that may not live long enough for a worker
+        to reach the job (serverless); a failed attempt is retried as usual.
+        """
+        now = time.time()
+        job_id = job_id or str(uuid.uuid4())
+        self._connection().execute(
+            "INSERT INTO jobs (id, kind, payload, owner_id, status, attempts, max_attempts, run_at, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, 0, ?, ?, ?, ?)",
+            (job_id, kind, json.dumps(payload or {}, default=str), owner_id, STATUS_QUEUED,
+             max(1, int(max_attempts)), now + delay, now, now)
+        )
+        if run_inline and not delay:
+            row = self._claim("inline", job_id=job_id)
+            if row is not None:
+                self._execute(row)
+            return job_id
+        self.ensure_started()
+        self._wakeup.set()
+        return job_id
+
+    def get(self, job_id: str, owner_id: Optional[str] = None) -> Optional[Dict]:
+        query = "SELECT * FROM jobs WHERE id = ?"
+        params = [job_id]
+        if owner_id is not None:
+            query += " AND owner_id = ?"
+            params.append(owner_id)
+        row = self._connection().execute(query, params).fetchone()
+        return self._to_dict(row) if row else None
+
+    def list_jobs(self, status: Optional[str] = None, owner_id: Optional[str] = None, limit: int = 50,
+                  kind: Optional[str] = None) -> List[Dict]:
+        clauses, params = [], []
+        if kind:
+            clauses.append("kind = ?")
+            params.append(kind)
+        if status:
+            clauses.append("status = ?")
+            params.append(status)
+        if owner_id is not None:
+            clauses.append("owner_id = ?")
+            params.append(owner_id)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self._connection().execute(
+            f"SELECT * FROM jobs {where} ORDER BY created_at DESC LIMIT ?", params + [int(limit)]
+        ).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def report(self, job_id: str, progress: Any) -> bool:
+        """
+        Store a running job's progress as its interim result and renew its
+        lease, so a long job that keeps reporting is not taken for dead
+        """
+        now = time.time()
+        cursor = self._connection().execute(
+            "UPDATE jobs SET result = ?, locked_until = ?, updated_at = ? WHERE id = ? AND status = ?",
+            (json.dumps(progress, default=str), now + self.lease_seconds, now, job_id, STATUS_RUNNING)
+        )
+        return cursor.rowcount > 0
+
+    def retry(self, job_id: str) -> bool:
+        """Move a dead-lettered job back onto the queue with a fresh attempt budget"""
+        now = time.time()
+        cursor = self._connection().execute(
+            "UPDATE jobs SET status = ?, attempts = 0, run_at = ?, updated_at = ? WHERE id = ? AND status = ?",
+            (STATUS_QUEUED, now, now, job_id, STATUS_DEAD)
+        )
+        if cursor.rowcount:
+            self._wakeup.set()
+        return cursor.rowcount > 0
+
+    def purge_finished(self, older_than_seconds: Optional[float] = None) -> int:
+        """Delete succeeded jobs last updated more than older_than_seconds ago"""
+        if older_than_seconds is None:
+            older_than_seconds = self.retention_seconds
+        cutoff = time.time() - older_than_seconds
+        cursor = self._connection().execute(
+            "DELETE FROM jobs WHERE status = ? AND updated_at < ?", (STATUS_SUCCEEDED, cutoff)
+        )
+        return cursor.rowcount
+
+    # ------------------------------------------------------------------
+    # Worker side
+    # ------------------------------------------------------------------
+
+    def _claim(self, worker_id: str, job_id: Optional[str] = None) -> Optional[sqlite3.Row]:
+        """Atomically lease the next due job whose kind has a handler (or that one job)"""
+        kinds = list(self._handlers)
+        if not kinds:
+            return None
+
+        now = time.time()
+        conn = self._connection()
+        placeholders = ",".join("?" for _ in kinds)
+        only_job = " AND id = ?" if job_id else ""
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                f"SELECT * FROM jobs WHERE kind IN ({placeholders}) AND ("
+                f"(status = ? AND run_at <= ?) OR (status = ? AND locked_until < ?)"
+                f"){only_job} ORDER BY run_at LIMIT 1",
+                kinds + [STATUS_QUEUED, now, STATUS_RUNNING, now] + ([job_id] if job_id else [])
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = ?, attempts = attempts + 1, locked_until = ?, updated_at = ? WHERE id = ?",
+                (STATUS_RUNNING, now + self.lease_seconds, now, row["id"])
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return conn.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone()
+
+    def _backoff(self, attempts: int) -> float:
+        delay = min(self.base_delay * (2 ** max(attempts - 1, 0)), self.max_delay)
+        return delay * random.uniform(0.8, 1.2)
+
+    def _execute(self, row: sqlite3.Row):
+        handler = self._handlers[row["kind"]]
+        payload = json.loads(row["payload"])
+        conn = self._connection()
+        try:
+            if self._app is not None:
+                with self._app.app_context():
+                    result = handler(payload)
+            else:
+                result = handler(payload)
+        except Exception as e:
+            now = time.time()
+            error = f"{type(e).__name__}: {str(e)}"[:2000]
+            if row["attempts"] >= row["max_attempts"]:
+                logger.error(f"Job {row['id']} ({row['kind']}) dead-lettered after {row['attempts']} attempts: {error}")
+                conn.execute(
+                    "UPDATE jobs SET status = ?, last_error = ?, locked_until = NULL, updated_at = ? WHERE id = ?",
+                    (STATUS_DEAD, error, now, row["id"])
+                )
+            else:
+                retry_at = now + self._backoff(row["attempts"])
+                logger.warning(f"Job {row['id']} ({row['kind']}) attempt {row['attempts']} failed: {error}")
+                conn.execute(
+                    "UPDATE jobs SET status = ?, last_error = ?, run_at = ?, locked_until = NULL, updated_at = ? WHERE id = ?",
+                    (STATUS_QUEUED, error, retry_at, now, row["id"])
+                )
+            return
+
+        conn.execute(
+            "UPDATE jobs SET status = ?, result = ?, last_error = NULL, locked_until = NULL, updated_at = ? WHERE id = ?",
+            (STATUS_SUCCEEDED, json.dumps(result, default=str) if result is not None else None, time.time(), row["id"])
+        )
+
+    def run_pending(self, max_jobs: Optional[int] = None, worker_id: str = "inline") -> int:
+        """Run due jobs on the calling thread; used by tests and one-off drains"""
+        processed = 0
+        while max_jobs is None or processed < max_jobs:
+            row = self._claim(worker_id)
+            if row is None:
+                break
+            self._execute(row)
+            processed += 1
+        return processed
+
+    def _purge_if_due(self):
+        """One idle worker per interval drops old succeeded jobs"""
+        if time.time() < self._next_purge or not self._purge_lock.acquire(blocking=False):
+            return
+        try:
+            if time.time() < self._next_purge:
+                return
+            self._next_purge = time.time() + self.PURGE_INTERVAL_SECONDS
+            purged = self.purge_finished()
+            if purged:
+                logger.info(f"Purged {purged} finished jobs from {self.db_path}")
+        finally:
+            self._purge_lock.release()
+
+    def _worker_loop(self, worker_id: str):
+        while not self._stopping.is_set():
+            try:
+                if self.run_pending(worker_id=worker_id) == 0:
+                    self._purge_if_due()
+                    self._wakeup.wait(self.poll_interval)
+                    self._wakeup.clear()
+            except Exception as e:
+                logger.error(f"Job worker {worker_id} error: {str(e)}")
+                self._stopping.wait(self.poll_interval)
+
+    def start(self, app=None):
+        """Start worker threads; Flask handlers run inside app's context"""
+        if app is not None:
+            self._app = app
+        with self._start_lock:
+            if any(t.is_alive() for t in self._threads):
+                return
+            self._stopping.clear()
+            self._threads = [
+                threading.Thread(target=self._worker_loop, args=(f"worker-{i}",), daemon=True, name=f"job-worker-{i}")
+                for i in range(self.worker_count)
+            ]
+            for thread in self._threads:
+                thread.start()
+            logger.info(f"Job queue started with {self.worker_count} workers ({self.db_path})")
+
+    def ensure_started(self):
+        if any(t.is_alive() for t in self._threads):
+            return
+        if self._app is None:
+            try:
+                from flask import current_app
+                self._app = current_app._get_current_object()
+            except RuntimeError:
+                pass
+        self.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+
+_fallback_client = None
+
+
+def get_job_supabase():
+    """Supabase client for handlers: the Flask app's inside its context, else a shared service client"""
+    global _fallback_client
+    from flask import current_app, has_app_context
+    if has_app_context() and current_app.config.get('SUPABASE') is not None:
+        return current_app.config['SUPABASE']
+    if _fallback_client is None:
+        from .supabase_service import SupabaseService
+        _fallback_client = SupabaseService().client
+    return _fallback_client
+
+
+job_queue = JobQueue(
+    db_path=os.getenv('JOB_QUEUE_PATH', os.path.join(tempfile.gettempdir(), 'sabiops-jobs.sqlite3')),
+    workers=int(os.getenv('JOB_QUEUE_WORKERS', '2')),
+    base_delay=float(os.getenv('JOB_QUEUE_BASE_DELAY', '5')),
+    retention_seconds=float(os.getenv('JOB_QUEUE_RETENTION_DAYS', '7')) * 86400,
+)
@@ -0,0 +1,111 @@
+"""
+Notification Digest - coalesce alert bursts into one message per owner
+Triggers add the alerts they would send during a window (one trigger cycle,
+or one batch of inventory changes) and deliver them together. An owner with
+fewer than DIGEST_MIN_ITEMS alerts of a type gets them as they are; above
+that they become one summary notification listing every item, so a stock-out
+across 80 products costs one row, one push and one device wakeup.
+"""
+
+import logging
+import os
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from .notification_service import NotificationData, NotificationService, NotificationType
+
+logger = logging.getLogger(__name__)
+
+DIGEST_MIN_ITEMS = int(os.getenv('NOTIFICATION_DIGEST_MIN_ITEMS', '3'))
+# Items named in the digest message; the full list is in data['items']
+DIGEST_NAMED_ITEMS = 3
+
+PRIORITY_ORDER = ["low", "medium", "high", "urgent"]
+
+
+def _priority_rank(priority: str) -> int:
+    return PRIORITY_ORDER.index(priority) if priority in PRIORITY_ORDER else 1
+
+
+# notification type: (title with {count}, item label key, navigation url)
+DIGEST_FORMATS: Dict[NotificationType, Tuple[str, str, str]] = {
+    NotificationType.LOW_STOCK_ALERT: ("{count} products are running low", 'product_name', "/inventory"),
+    NotificationType.OVERDUE_INVOICE: ("{count} invoices are overdue", 'invoice_number', "/invoices"),
+}
+
+
+def build_digest(notification_type: NotificationType, alerts: List[NotificationData]) -> NotificationData:
+    """One notification standing in for `alerts`, all of the same type"""
+    title, label_key, navigation_url = DIGEST_FORMATS.get(
+        notification_type, ("{count} " + alerts[0].title, None, alerts[0].navigation_url)
+    )
+    items = [alert.data or {} for alert in alerts]
+    labels = [str(item.get(label_key)) for item in items if label_key and item.get(label_key)]
+    if labels:
+        named = ", ".join(f"'{label}'" for label in labels[:DIGEST_NAMED_ITEMS])
+        rest = len(alerts) - min(len(labels), DIGEST_NAMED_ITEMS)
+        message = f"{named} and {rest} more" if rest else named
+    else:
+        message = alerts[0].message
+
+    return NotificationData(
+        title=title.format(count=len(alerts)),
+        message=message,
+        type=notification_type,
+        data={'digest': True, 'count': len(alerts), 'items': items},
+        navigation_url=navigation_url,
+        action_required=any(alert.action_required for alert in alerts),
+        priority=max((alert.priority for alert in alerts), key=_priority_rank)
+    )
+
+
+class NotificationDigest:
+    """
+    Alerts for one window, grouped per (user, notification type). Each alert
+    carries a `member` (e.g. its alert_state record) that deliver() reports
+    back as delivered or failed. Safe to fill from several batch threads.
+    """
+
+    def __init__(self, min_items: Optional[int] = None):
+        self.min_items = min_items or DIGEST_MIN_ITEMS
+        self._groups: Dict[Tuple[str, NotificationType], List[Tuple[NotificationData, Any]]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, user_id: str, notification_data: NotificationData, member: Any = None):
+        with self._lock:
+            self._groups.setdefault((user_id, notification_data.type), []).append((notification_data, member))
+
+    def __len__(self) -> int:
+        return sum(len(entries) for entries in self._groups.values())
+
+    def messages(self) -> List[Tuple[str, NotificationData, List[Any]]]:
+        """(user_id, notification, members it covers): singles as-is, bursts as one digest"""
+        with self._lock:
+            groups = list(self._groups.items())
+        messages = []
+        for (user_id, notification_type), entries in groups:
+            if len(entries) < self.min_items:
+                messages.extend((user_id, notification_data, [member]) for notification_data, member in entries)
+            else:
+                messages.append((
+                    user_id,
+                    build_digest(notification_type, [notification_data for notification_data, _ in entries]),
+                    [member for _, member in entries]
+                ))
+        return messages
+
+    async def deliver(self, notification_service: NotificationService) -> Tuple[List[Any], List[Any]]:
+        """Create every message in one bulk call; returns (delivered members, failed members)"""
+        messages = self.messages()
+        if not messages:
+            return [], []
+
+        notification_ids = await notification_service.create_notifications_bulk(
+            [(user_id, notification_data) for user_id, notification_data, _ in messages]
+        )
+        delivered, failed = [], []
+        for (_, _, members), notification_id in zip(messages, notification_ids):
+            (delivered if notification_id else failed).extend(members)
+
+        logger.info(f"Delivered {len(delivered)} alerts as {sum(1 for i in notification_ids if i)} notifications")
+        return delivered, failed
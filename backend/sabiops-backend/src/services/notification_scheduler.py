@@ -4,25 +4,38 @@ Runs business triggers on a schedule to monitor for notification conditions
 """
 
 import logging
-import asyncio
 import schedule
 import time
 from datetime import datetime, timezone
-from typing import Dict, Any, List
+from typing import Callable, Dict, Any, List
 from threading import Thread
 
 from .business_trigger_manager import create_trigger_manager
+from .event_loop import run_async
+from .retention import RetentionService
+from .scheduler_lease import SchedulerLease, JobRunHistory
+from .subscription_expiry import SubscriptionExpiry
 from .triggers.low_stock_trigger import run_low_stock_check, monitor_inventory_changes
 from .triggers.overdue_invoice_trigger import run_overdue_invoice_check
 
 logger = logging.getLogger(__name__)
 
 class NotificationScheduler:
-    """Schedules and runs notification triggers"""
+    """
+    Schedules and runs notification triggers.
+    
+    Every worker process may start the scheduler; only the holder of the
+    notification_scheduler lease runs the jobs, and every run is recorded
+    in job_runs.
+    """
+    
+    LEASE_NAME = "notification_scheduler"
     
     def __init__(self, supabase_client):
         self.supabase = supabase_client
         self.trigger_manager = create_trigger_manager(supabase_client)
+        self.lease = SchedulerLease(supabase_client, self.LEASE_NAME)
+        self.job_runs = JobRunHistory(supabase_client, holder=self.lease.holder)
         self.logger = logging.getLogger(__name__)
         self.running = False
         self.scheduler_thread = None
@@ -33,26 +46,30 @@ class NotificationScheduler:
             # Clear any existing schedules
             schedule.clear()
             
-            # Low stock checks - every 2 hours during business hours
-            schedule.every(2).hours.do(self._run_low_stock_check)
+            # Low stock is detected when stock is written (stock_events); the full
+            # scan only reconciles what events and the change cursor missed
+            schedule.every().day.at("03:00").do(self._run_job, "low_stock_reconciliation", self._run_low_stock_check)
             
             # Overdue invoice checks - daily at 9 AM
-            schedule.every().day.at("09:00").do(self._run_overdue_invoice_check)
+            schedule.every().day.at("09:00").do(self._run_job, "overdue_invoices", self._run_overdue_invoice_check)
             
-            # Inventory change monitoring - every 30 minutes
-            schedule.every(30).minutes.do(self._monitor_inventory_changes)
+            # Inventory change monitoring - every 10 minutes, from the stored cursor
+            schedule.every(10).minutes.do(self._run_job, "inventory_changes", self._monitor_inventory_changes)
             
-            # Full trigger manager run - every 4 hours
-            schedule.every(4).hours.do(self._run_all_triggers)
+            # Trigger manager run (without reconciliation-only triggers) - every 4 hours
+            schedule.every(4).hours.do(self._run_job, "business_triggers", self._run_all_triggers)
             
             # Usage limit checks - every 6 hours
-            schedule.every(6).hours.do(self._run_usage_limit_check)
+            schedule.every(6).hours.do(self._run_job, "usage_limits", self._run_usage_limit_check)
             
             # Subscription expiry checks - daily at 8 AM
-            schedule.every().day.at("08:00").do(self._run_subscription_expiry_check)
+            schedule.every().day.at("08:00").do(self._run_job, "subscription_expiry", self._run_subscription_expiry_check)
             
             # Profit alert checks - daily at 10 PM (end of business day)
-            schedule.every().day.at("22:00").do(self._run_profit_alert_check)
+            schedule.every().day.at("22:00").do(self._run_job, "profit_alerts", self._run_profit_alert_check)
+            
+            # Retention purge (notifications, device tokens, event logs) - daily at 2 AM, off-peak
+            schedule.every().day.at("02:00").do(self._run_job, "retention", self._run_retention)
             
             self.logger.info("Notification schedules set up successfully")
             
@@ -66,13 +83,17 @@ class NotificationScheduler:
             return
         
         self.setup_schedules()
+        self.lease.start()
         self.running = True
         
         def run_scheduler():
             self.logger.info("Notification scheduler started")
             while self.running:
                 try:
-                    schedule.run_pending()
+                    # Followers keep their schedule; jobs that came due run once
+                    # if this process takes the lease over
+                    if self.lease.is_leader:
+                        schedule.run_pending()
                     time.sleep(60)  # Check every minute
                 except Exception as e:
                     self.logger.error(f"Error in scheduler loop: {str(e)}")
@@ -88,78 +109,97 @@ class NotificationScheduler:
         self.running = False
         if self.scheduler_thread:
             self.scheduler_thread.join(timeout=5)
+        self.lease.stop()
         schedule.clear()
         self.logger.info("Notification scheduler stopped")
     
-    def _run_low_stock_check(self):
-        """Run low stock check"""
+    def _run_job(self, job_name: str, job: Callable[[], Dict[str, Any]]):
+        """Run one scheduled job if this process leads, recording it in job_runs"""
+        if not self.lease.is_leader:
+            self.logger.debug(f"Skipping {job_name}: {self.LEASE_NAME} lease held elsewhere")
+            return
+        
         try:
-            self.logger.info("Running scheduled low stock check...")
-            result = asyncio.run(run_low_stock_check(self.supabase))
-            self.logger.info(f"Low stock check completed: {result.get('notifications_sent', 0)} notifications sent")
+            with self.job_runs.track(job_name) as run:
+                summary = job()
+                run['rows_processed'] = summary.get('rows_processed', 0)
+                run['details'] = summary
         except Exception as e:
-            self.logger.error(f"Error in scheduled low stock check: {str(e)}")
+            self.logger.error(f"Error in scheduled {job_name}: {str(e)}")
     
-    def _monitor_inventory_changes(self):
-        """Monitor recent inventory changes"""
-        try:
-            self.logger.info("Monitoring inventory changes...")
-            result = asyncio.run(monitor_inventory_changes(self.supabase))
-            self.logger.info(f"Inventory monitoring completed: {result.get('notifications_sent', 0)} notifications sent")
-        except Exception as e:
-            self.logger.error(f"Error in inventory monitoring: {str(e)}")
+    @staticmethod
+    def _summary(result: Dict[str, Any], rows_key: str) -> Dict[str, Any]:
+        """rows_processed/notifications_sent from a monitor result; monitor errors fail the run"""
+        if result.get('status') == 'error':
+            raise RuntimeError(result.get('error', 'unknown error'))
+        return {
+            'rows_processed': result.get(rows_key, 0),
+            'notifications_sent': result.get('notifications_sent', 0)
+        }
+    
+    def _run_low_stock_check(self) -> Dict[str, Any]:
+        """Run the low stock reconciliation scan"""
+        self.logger.info("Running scheduled low stock reconciliation...")
+        result = run_async(run_low_stock_check(self.supabase), timeout=None)
+        self.logger.info(f"Low stock check completed: {result.get('notifications_sent', 0)} notifications sent")
+        return self._summary(result, 'products_checked')
+    
+    def _monitor_inventory_changes(self) -> Dict[str, Any]:
+        """Consume new inventory changes"""
+        self.logger.info("Monitoring inventory changes...")
+        result = run_async(monitor_inventory_changes(self.supabase), timeout=None)
+        self.logger.info(f"Inventory monitoring completed: {result.get('notifications_sent', 0)} notifications sent")
+        return self._summary(result, 'changes_processed')
     
-    def _run_overdue_invoice_check(self):
+    def _run_overdue_invoice_check(self) -> Dict[str, Any]:
         """Run overdue invoice check"""
-        try:
-            self.logger.info("Running scheduled overdue invoice check...")
-            result = asyncio.run(run_overdue_invoice_check(self.supabase))
-            self.logger.info(f"Overdue invoice check completed: {result.get('notifications_sent', 0)} notifications sent")
-        except Exception as e:
-            self.logger.error(f"Error in scheduled overdue invoice check: {str(e)}")
+        self.logger.info("Running scheduled overdue invoice check...")
+        result = run_async(run_overdue_invoice_check(self.supabase), timeout=None)
+        self.logger.info(f"Overdue invoice check completed: {result.get('notifications_sent', 0)} notifications sent")
+        return self._summary(result, 'invoices_checked')
     
-    def _run_all_triggers(self):
+    def _run_all_triggers(self) -> Dict[str, Any]:
         """Run all business triggers"""
-        try:
-            self.logger.info("Running all business triggers...")
-            result = asyncio.run(self.trigger_manager.run_all_triggers())
-            
-            total_notifications = sum(
-                trigger_result.notifications_sent 
-                for trigger_result in result.values() 
-                if hasattr(trigger_result, 'notifications_sent')
-            )
-            
-            self.logger.info(f"All triggers completed: {total_notifications} total notifications sent")
-        except Exception as e:
-            self.logger.error(f"Error running all triggers: {str(e)}")
+        self.logger.info("Running all business triggers...")
+        result = run_async(self.trigger_manager.run_all_triggers(include_reconciliation=False), timeout=None)
+        
+        total_notifications = sum(
+            trigger_result.notifications_sent 
+            for trigger_result in result.values() 
+            if hasattr(trigger_result, 'notifications_sent')
+        )
+        rows_processed = sum(
+            (trigger_result.details or {}).get('rows_scanned', 0)
+            for trigger_result in result.values()
+        )
+        
+        self.logger.info(f"All triggers completed: {total_notifications} total notifications sent")
+        return {'rows_processed': rows_processed, 'notifications_sent': total_notifications}
     
-    def _run_usage_limit_check(self):
+    def _run_usage_limit_check(self) -> Dict[str, Any]:
         """Run usage limit check"""
-        try:
-            self.logger.info("Running usage limit check...")
-            # This would be implemented when we have the usage limit trigger
-            self.logger.info("Usage limit check completed (placeholder)")
-        except Exception as e:
-            self.logger.error(f"Error in usage limit check: {str(e)}")
+        self.logger.info("Running usage limit check...")
+        # This would be implemented when we have the usage limit trigger
+        self.logger.info("Usage limit check completed (placeholder)")
+        return {'rows_processed': 0}
     
-    def _run_subscription_expiry_check(self):
-        """Run subscription expiry check"""
-        try:
-            self.logger.info("Running subscription expiry check...")
-            # This would be implemented when we have the subscription expiry trigger
-            self.logger.info("Subscription expiry check completed (placeholder)")
-        except Exception as e:
-            self.logger.error(f"Error in subscription expiry check: {str(e)}")
+    def _run_subscription_expiry_check(self) -> Dict[str, Any]:
+        """Set-based downgrade of lapsed plans and trial countdown, with bulk notifications"""
+        self.logger.info("Running subscription expiry check...")
+        return SubscriptionExpiry(self.supabase).run()
     
-    def _run_profit_alert_check(self):
+    def _run_profit_alert_check(self) -> Dict[str, Any]:
         """Run profit alert check"""
-        try:
-            self.logger.info("Running profit alert check...")
-            # This would be implemented when we have the profit alert trigger
-            self.logger.info("Profit alert check completed (placeholder)")
-        except Exception as e:
-            self.logger.error(f"Error in profit alert check: {str(e)}")
+        self.logger.info("Running profit alert check...")
+        # This would be implemented when we have the profit alert trigger
+        self.logger.info("Profit alert check completed (placeholder)")
+        return {'rows_processed': 0}
+    
+    def _run_retention(self) -> Dict[str, Any]:
+        """Batched purge of old notifications, dead device tokens and event logs"""
+        result = RetentionService(self.supabase).run()
+        self.logger.info(f"Retention purged {result['rows_processed']} rows: {result['deleted']}")
+        return result
     
     def run_manual_check(self, check_type: str = "all") -> Dict[str, Any]:
         """Run a manual check of specific type"""
@@ -167,13 +207,13 @@ class NotificationScheduler:
             self.logger.info(f"Running manual {check_type} check...")
             
             if check_type == "low_stock":
-                result = asyncio.run(run_low_stock_check(self.supabase))
+                result = run_async(run_low_stock_check(self.supabase), timeout=None)
             elif check_type == "overdue_invoice":
-                result = asyncio.run(run_overdue_invoice_check(self.supabase))
+                result = run_async(run_overdue_invoice_check(self.supabase), timeout=None)
             elif check_type == "inventory_changes":
-                result = asyncio.run(monitor_inventory_changes(self.supabase))
+                result = run_async(monitor_inventory_changes(self.supabase), timeout=None)
             elif check_type == "all":
-                result = asyncio.run(self.trigger_manager.run_all_triggers())
+                result = run_async(self.trigger_manager.run_all_triggers(), timeout=None)
             else:
                 return {
                     "status": "error",
@@ -202,7 +242,7 @@ class NotificationScheduler:
             jobs = []
             for job in schedule.jobs:
                 jobs.append({
-                    "job": str(job.job_func),
+                    "job": job.job_func.args[0] if job.job_func.args else str(job.job_func),
                     "next_run": job.next_run.isoformat() if job.next_run else None,
                     "interval": str(job.interval),
                     "unit": job.unit
@@ -210,8 +250,10 @@ class NotificationScheduler:
             
             return {
                 "status": "running" if self.running else "stopped",
+                "lease": self.lease.status(),
                 "total_jobs": len(schedule.jobs),
                 "jobs": jobs,
+                "recent_runs": self.job_runs.recent(limit=10),
                 "timestamp": datetime.now(timezone.utc).isoformat()
             }
             
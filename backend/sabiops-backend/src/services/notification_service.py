@@ -1,16 +1,26 @@
 """
 Consolidated Notification Service
-Handles both in-app notifications and Firebase push notifications
+Handles both in-app notifications and Firebase push notifications.
+The Supabase client blocks, so coroutines here run its calls with
+asyncio.to_thread and overlap on the shared background loop (event_loop.py).
 """
 
+import asyncio
 import logging
+import os
+import threading
 import uuid
 from datetime import datetime, timezone, time
 from typing import List, Dict, Any, Optional, Tuple
 from dataclasses import dataclass
 from enum import Enum
 
-from .firebase_service import send_push_notification, firebase_initialized
+from .firebase_service import firebase_initialized
+from .push_dispatcher import PushDispatcher
+from .realtime_events import publish as publish_realtime
+from .retention import RetentionService
+from .event_loop import run_async
+from .job_queue import job_queue, get_job_supabase
 
 logger = logging.getLogger(__name__)
 
@@ -45,9 +55,111 @@ class UserPreferences:
     quiet_hours_start: Optional[time] = None
     quiet_hours_end: Optional[time] = None
 
+class PreferencesCache:
+    """
+    In-process TTL cache of user_notification_preferences keyed by (user_id, type).
+    Missing rows are cached too, so users on defaults do not cost a query per notification.
+    """
+    
+    def __init__(self, ttl_seconds: float = 300):
+        self.ttl_seconds = ttl_seconds
+        self._entries: Dict[Tuple[str, str], Tuple[float, Optional[UserPreferences]]] = {}
+        self._lock = threading.Lock()
+    
+    def get_many(self, keys: List[Tuple[str, str]]) -> Tuple[Dict[Tuple[str, str], Optional[UserPreferences]], List[Tuple[str, str]]]:
+        """Returns (cached hits, missing keys)"""
+        now = datetime.now(timezone.utc).timestamp()
+        hits, missing = {}, []
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry and entry[0] > now:
+                    hits[key] = entry[1]
+                else:
+                    missing.append(key)
+        return hits, missing
+    
+    def set_many(self, values: Dict[Tuple[str, str], Optional[UserPreferences]]):
+        expires_at = datetime.now(timezone.utc).timestamp() + self.ttl_seconds
+        with self._lock:
+            for key, preferences in values.items():
+                self._entries[key] = (expires_at, preferences)
+    
+    def invalidate(self, user_id: str):
+        """Drop a user's entries after they change their preferences"""
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == user_id]:
+                del self._entries[key]
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+preferences_cache = PreferencesCache(ttl_seconds=float(os.getenv('NOTIFICATION_PREFS_TTL', '300')))
+
+
+class UnreadCountCache:
+    """
+    In-process TTL cache of unread notification counts keyed by user_id.
+    Writes made through this process invalidate the user's entry; the short
+    TTL covers notifications created by other workers.
+    """
+    
+    def __init__(self, ttl_seconds: float = 30):
+        self.ttl_seconds = ttl_seconds
+        self._entries: Dict[str, Tuple[float, int]] = {}
+        self._lock = threading.Lock()
+    
+    def get(self, user_id: str) -> Optional[int]:
+        now = datetime.now(timezone.utc).timestamp()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            return entry[1] if entry and entry[0] > now else None
+    
+    def set(self, user_id: str, count: int):
+        with self._lock:
+            self._entries[user_id] = (datetime.now(timezone.utc).timestamp() + self.ttl_seconds, count)
+    
+    def invalidate(self, *user_ids: str):
+        with self._lock:
+            for user_id in user_ids:
+                self._entries.pop(user_id, None)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+unread_count_cache = UnreadCountCache(ttl_seconds=float(os.getenv('NOTIFICATION_UNREAD_TTL', '30')))
+
+
+def _parse_time(value) -> Optional[time]:
+    """quiet_hours_* come back from PostgREST as 'HH:MM[:SS]' strings"""
+    if not value or isinstance(value, time):
+        return value
+    try:
+        return time.fromisoformat(str(value))
+    except ValueError:
+        return None
+
+
+def _preferences_from_row(pref_data: Dict[str, Any]) -> UserPreferences:
+    return UserPreferences(
+        enabled=pref_data.get('enabled', True),
+        push_enabled=pref_data.get('push_enabled', True),
+        quiet_hours_start=_parse_time(pref_data.get('quiet_hours_start')),
+        quiet_hours_end=_parse_time(pref_data.get('quiet_hours_end'))
+    )
+
+
 class NotificationService:
     """Consolidated service for managing all notifications"""
     
+    BULK_INSERT_CHUNK = 500
+    # Cleared once notification_unread_counts turns out not to exist (migration 017)
+    unread_counters_available = True
+    
     def __init__(self, supabase_client):
         self.supabase = supabase_client
         self.firebase_available = firebase_initialized
@@ -79,13 +191,17 @@ class NotificationService:
             }
             
             # Insert notification into database
-            result = self.supabase.table('notifications').insert(notification_record).execute()
+            result = await asyncio.to_thread(
+                self.supabase.table('notifications').insert(notification_record).execute
+            )
             
             if not result.data:
                 logger.error(f"Failed to create notification in database for user {user_id}")
                 return False, None
             
             notification_id = result.data[0]['id']
+            unread_count_cache.invalidate(user_id)
+            await asyncio.to_thread(publish_realtime, self.supabase, [self._realtime_event(result.data[0])])
             logger.info(f"Created notification {notification_id} for user {user_id}")
             
             # Check user preferences and send push notification if appropriate
@@ -95,11 +211,9 @@ class NotificationService:
             )
             
             if should_send_push:
-                push_success = await self._send_push_notification(user_id, notification_data)
-                if push_success:
-                    logger.info(f"Push notification sent for notification {notification_id}")
-                else:
-                    logger.warning(f"Push notification failed for notification {notification_id}")
+                # Firebase delivery runs on a job worker, not the caller's thread
+                job_id = self._queue_push_notification(user_id, notification_data, notification_id)
+                logger.info(f"Push notification queued as job {job_id} for notification {notification_id}")
             else:
                 logger.info(f"Push notification skipped for notification {notification_id} (user preferences)")
             
@@ -109,6 +223,101 @@ class NotificationService:
             logger.error(f"Error creating notification for user {user_id}: {str(e)}")
             return False, None
     
+    async def create_notifications_bulk(
+        self,
+        notifications: List[Tuple[str, NotificationData]]
+    ) -> List[Optional[str]]:
+        """
+        Create many notifications at once: one preferences lookup, one insert per
+        chunk and a single queued push batch for everyone whose preferences allow it.
+        
+        Returns:
+            List[Optional[str]]: notification ids in input order (None where the insert failed)
+        """
+        if not notifications:
+            return []
+        
+        now = datetime.now(timezone.utc).isoformat()
+        records = [{
+            'id': str(uuid.uuid4()),
+            'user_id': user_id,
+            'title': notification_data.title,
+            'message': notification_data.message,
+            'type': notification_data.type.value,
+            'data': notification_data.data or {},
+            'read': False,
+            'created_at': now,
+            'navigation_url': notification_data.navigation_url,
+            'action_required': notification_data.action_required
+        } for user_id, notification_data in notifications]
+        
+        created = set()
+        for start in range(0, len(records), self.BULK_INSERT_CHUNK):
+            chunk = records[start:start + self.BULK_INSERT_CHUNK]
+            try:
+                result = await asyncio.to_thread(self.supabase.table('notifications').insert(chunk).execute)
+                created.update(row['id'] for row in result.data or [])
+            except Exception as e:
+                logger.error(f"Error inserting {len(chunk)} notifications: {str(e)}")
+        
+        notification_ids = [record['id'] if record['id'] in created else None for record in records]
+        unread_count_cache.invalidate(*{user_id for user_id, _ in notifications})
+        await asyncio.to_thread(publish_realtime, self.supabase, [
+            self._realtime_event(record) for record in records if record['id'] in created
+        ])
+        logger.info(f"Created {len(created)} of {len(records)} notifications in bulk")
+        
+        preferences = await asyncio.to_thread(self._get_preferences_bulk, [
+            (user_id, notification_data.type.value) for user_id, notification_data in notifications
+        ])
+        deliveries = [
+            self._push_delivery(user_id, notification_data, notification_id)
+            for (user_id, notification_data), notification_id in zip(notifications, notification_ids)
+            if notification_id and self._push_allowed(preferences.get((user_id, notification_data.type.value)))
+        ]
+        
+        if deliveries and self.firebase_available:
+            try:
+                job_id = job_queue.enqueue("notification.push_batch", {'deliveries': deliveries}, max_attempts=3)
+                logger.info(f"Queued {len(deliveries)} push notifications as job {job_id}")
+            except Exception as e:
+                logger.error(f"Error queuing bulk push notifications: {str(e)}")
+        
+        return notification_ids
+    
+    @staticmethod
+    def _realtime_event(record: Dict[str, Any]) -> Tuple[str, str, Dict[str, Any]]:
+        """SSE payload for a created notification row"""
+        return record['user_id'], 'notification', {
+            key: record.get(key)
+            for key in ('id', 'title', 'message', 'type', 'data', 'navigation_url', 'action_required', 'created_at')
+        }
+    
+    @staticmethod
+    def _push_delivery(
+        user_id: str,
+        notification_data: NotificationData,
+        notification_id: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """PushDispatcher delivery entry for one notification"""
+        push_data = {
+            'type': notification_data.type.value,
+            'navigation_url': notification_data.navigation_url or '',
+            'action_required': str(notification_data.action_required).lower(),
+            'priority': notification_data.priority
+        }
+        if notification_id:
+            push_data['notification_id'] = notification_id
+        if notification_data.data:
+            # A digest's item list stays in the notification row; FCM data is capped at 4KB
+            push_data.update({key: value for key, value in notification_data.data.items() if key != 'items'})
+        return {
+            'user_id': user_id,
+            'title': notification_data.title,
+            'body': notification_data.message,
+            'data': push_data
+        }
+    
     async def _should_send_push_notification(
         self, 
         user_id: str, 
@@ -118,176 +327,139 @@ class NotificationService:
         try:
             # Get user preferences
             preferences = await self._get_user_preferences(user_id, notification_type.value)
-            
-            if not preferences:
-                # Default to enabled if no preferences found
-                return True
-            
-            # Check if notification type is enabled
-            if not preferences.enabled:
-                return False
-            
-            # Check if push notifications are enabled for this type
-            if not preferences.push_enabled:
-                return False
-            
-            # Check quiet hours
-            if preferences.quiet_hours_start and preferences.quiet_hours_end:
-                current_time = datetime.now().time()
-                
-                if preferences.quiet_hours_start <= preferences.quiet_hours_end:
-                    # Normal case: 22:00 to 08:00
-                    if preferences.quiet_hours_start <= current_time <= preferences.quiet_hours_end:
-                        return False
-                else:
-                    # Spans midnight: 22:00 to 08:00 next day
-                    if current_time >= preferences.quiet_hours_start or current_time <= preferences.quiet_hours_end:
-                        return False
-            
-            return True
+            return self._push_allowed(preferences)
             
         except Exception as e:
             logger.error(f"Error checking push notification preferences for user {user_id}: {str(e)}")
             # Default to enabled on error
             return True
     
+    @staticmethod
+    def _push_allowed(preferences: Optional[UserPreferences]) -> bool:
+        """Apply enabled/push_enabled/quiet hours to one set of preferences"""
+        if not preferences:
+            # Default to enabled if no preferences found
+            return True
+        
+        # Check if notification type is enabled
+        if not preferences.enabled:
+            return False
+        
+        # Check if push notifications are enabled for this type
+        if not preferences.push_enabled:
+            return False
+        
+        # Check quiet hours
+        if preferences.quiet_hours_start and preferences.quiet_hours_end:
+            current_time = datetime.now().time()
+            
+            if preferences.quiet_hours_start <= preferences.quiet_hours_end:
+                # Same-day window, e.g. 13:00 to 15:00
+                if preferences.quiet_hours_start <= current_time <= preferences.quiet_hours_end:
+                    return False
+            else:
+                # Spans midnight: 22:00 to 08:00 next day
+                if current_time >= preferences.quiet_hours_start or current_time <= preferences.quiet_hours_end:
+                    return False
+        
+        return True
+    
     async def _get_user_preferences(
         self, 
         user_id: str, 
         notification_type: str
     ) -> Optional[UserPreferences]:
         """Get user preferences for a specific notification type"""
+        preferences = await asyncio.to_thread(self._get_preferences_bulk, [(user_id, notification_type)])
+        return preferences.get((user_id, notification_type))
+    
+    def _get_preferences_bulk(
+        self,
+        keys: List[Tuple[str, str]]
+    ) -> Dict[Tuple[str, str], Optional[UserPreferences]]:
+        """Preferences for many (user_id, notification_type) pairs; cache misses cost one query"""
+        found, missing = preferences_cache.get_many(list(dict.fromkeys(keys)))
+        if not missing:
+            return found
+        
         try:
-            result = self.supabase.table('user_notification_preferences').select('*').eq(
-                'user_id', user_id
-            ).eq('notification_type', notification_type).execute()
+            user_ids = sorted({user_id for user_id, _ in missing})
+            types = sorted({notification_type for _, notification_type in missing})
+            result = self.supabase.table('user_notification_preferences').select('*').in_(
+                'user_id', user_ids
+            ).in_('notification_type', types).execute()
             
-            if result.data:
-                pref_data = result.data[0]
-                return UserPreferences(
-                    enabled=pref_data.get('enabled', True),
-                    push_enabled=pref_data.get('push_enabled', True),
-                    quiet_hours_start=pref_data.get('quiet_hours_start'),
-                    quiet_hours_end=pref_data.get('quiet_hours_end')
-                )
+            loaded = {key: None for key in missing}
+            for pref_data in result.data or []:
+                key = (pref_data['user_id'], pref_data['notification_type'])
+                if key in loaded:
+                    loaded[key] = _preferences_from_row(pref_data)
             
-            return None
+            preferences_cache.set_many(loaded)
+            found.update(loaded)
             
         except Exception as e:
-            logger.error(f"Error getting user preferences for {user_id}: {str(e)}")
-            return None
+            logger.error(f"Error getting preferences for {len(missing)} users: {str(e)}")
+            # Fall back to defaults without caching the failure
+            found.update({key: None for key in missing})
+        
+        return found
     
     async def _send_push_notification(
         self, 
         user_id: str, 
         notification_data: NotificationData
     ) -> bool:
-        """Send push notification to user's active devices"""
+        """Send push notification to all of the user's active devices in one multicast"""
         if not self.firebase_available:
             logger.warning("Firebase not available, skipping push notification")
             return False
         
         try:
-            # Get user's active FCM tokens
-            active_tokens = await self._get_user_active_tokens(user_id)
-            
-            if not active_tokens:
-                logger.info(f"No active FCM tokens found for user {user_id}")
-                return False
+            delivery = self._push_delivery(user_id, notification_data)
             
-            # Send push notification to each active token
-            success_count = 0
-            for token_data in active_tokens:
-                token = token_data.get('fcm_token') or token_data.get('token')
-                if not token:
-                    continue
-                
-                try:
-                    # Prepare push notification data
-                    push_data = {
-                        'type': notification_data.type.value,
-                        'navigation_url': notification_data.navigation_url or '',
-                        'action_required': str(notification_data.action_required).lower(),
-                        'priority': notification_data.priority
-                    }
-                    
-                    if notification_data.data:
-                        push_data.update(notification_data.data)
-                    
-                    # Send push notification
-                    response = send_push_notification(
-                        token=token,
-                        title=notification_data.title,
-                        body=notification_data.message,
-                        data=push_data
-                    )
-                    
-                    if response:
-                        success_count += 1
-                        # Update last_used_at for successful token
-                        await self._update_token_last_used(token_data['id'])
-                    else:
-                        logger.warning(f"Failed to send push notification to token {token[:10]}...")
-                        # Mark token as potentially invalid
-                        await self._handle_failed_token(token_data['id'])
-                        
-                except Exception as e:
-                    logger.error(f"Error sending push to token {token[:10] if token else 'unknown'}: {str(e)}")
-                    await self._handle_failed_token(token_data['id'])
-            
-            logger.info(f"Push notifications sent to {success_count}/{len(active_tokens)} devices for user {user_id}")
-            return success_count > 0
+            # Token lookup, delivery and last_used/deactivation bookkeeping are batched
+            devices_reached = await asyncio.to_thread(
+                PushDispatcher(self.supabase).send_to_user,
+                user_id, delivery['title'], delivery['body'], delivery['data']
+            )
+            logger.info(f"Push notifications sent to {devices_reached} devices for user {user_id}")
+            return devices_reached > 0
             
         except Exception as e:
             logger.error(f"Error sending push notifications to user {user_id}: {str(e)}")
             return False
     
-    async def _get_user_active_tokens(self, user_id: str) -> List[Dict[str, Any]]:
-        """Get user's active FCM tokens"""
-        try:
-            result = self.supabase.table('push_subscriptions').select('*').eq(
-                'user_id', user_id
-            ).eq('active', True).execute()
-            
-            return result.data or []
-            
-        except Exception as e:
-            logger.error(f"Error getting active tokens for user {user_id}: {str(e)}")
-            return []
-    
-    async def _update_token_last_used(self, token_id: str) -> None:
-        """Update last_used_at timestamp for successful token"""
-        try:
-            self.supabase.table('push_subscriptions').update({
-                'last_used_at': datetime.now(timezone.utc).isoformat()
-            }).eq('id', token_id).execute()
-            
-        except Exception as e:
-            logger.error(f"Error updating token last_used for {token_id}: {str(e)}")
-    
-    async def _handle_failed_token(self, token_id: str) -> None:
-        """Handle failed token delivery (mark for cleanup)"""
-        try:
-            # For now, just log the failure
-            # In a production system, you might want to track failure counts
-            # and deactivate tokens after multiple failures
-            logger.warning(f"Token {token_id} failed delivery - marked for review")
-            
-        except Exception as e:
-            logger.error(f"Error handling failed token {token_id}: {str(e)}")
+    def _queue_push_notification(
+        self,
+        user_id: str,
+        notification_data: NotificationData,
+        notification_id: Optional[str] = None
+    ) -> str:
+        """Enqueue push delivery; see _push_notification_job"""
+        return job_queue.enqueue("notification.push", {
+            'user_id': user_id,
+            'notification_id': notification_id,
+            'title': notification_data.title,
+            'message': notification_data.message,
+            'type': notification_data.type.value,
+            'data': notification_data.data or {},
+            'navigation_url': notification_data.navigation_url,
+            'action_required': notification_data.action_required,
+            'priority': notification_data.priority
+        }, owner_id=user_id, max_attempts=3)
     
     # Convenience methods for specific notification types
     
-    async def send_low_stock_alert(
-        self, 
-        user_id: str, 
-        product_name: str, 
-        current_quantity: int, 
+    @staticmethod
+    def build_low_stock_alert(
+        product_name: str,
+        current_quantity: int,
         threshold: int,
         product_id: str = None
-    ) -> Tuple[bool, Optional[str]]:
-        """Send low stock alert notification"""
-        notification_data = NotificationData(
+    ) -> NotificationData:
+        """Build the low stock alert notification"""
+        return NotificationData(
             title="Low Stock Alert!",
             message=f"Product '{product_name}' is running low (Qty: {current_quantity}). Restock soon!",
             type=NotificationType.LOW_STOCK_ALERT,
@@ -301,22 +473,31 @@ class NotificationService:
             action_required=True,
             priority="high" if current_quantity <= 1 else "medium"
         )
-        
-        return await self.create_notification(user_id, notification_data)
     
-    async def send_overdue_invoice_alert(
+    async def send_low_stock_alert(
         self, 
         user_id: str, 
-        customer_name: str, 
-        invoice_number: str, 
+        product_name: str, 
+        current_quantity: int, 
+        threshold: int,
+        product_id: str = None
+    ) -> Tuple[bool, Optional[str]]:
+        """Send low stock alert notification"""
+        notification_data = self.build_low_stock_alert(product_name, current_quantity, threshold, product_id)
+        return await self.create_notification(user_id, notification_data)
+    
+    @staticmethod
+    def build_overdue_invoice_alert(
+        customer_name: str,
+        invoice_number: str,
         amount: float,
         days_overdue: int,
         invoice_id: str = None
-    ) -> Tuple[bool, Optional[str]]:
-        """Send overdue invoice alert notification"""
+    ) -> NotificationData:
+        """Build the overdue invoice alert notification"""
         priority = "urgent" if days_overdue >= 30 else "high" if days_overdue >= 7 else "medium"
         
-        notification_data = NotificationData(
+        return NotificationData(
             title="Overdue Invoice Alert!",
             message=f"Invoice {invoice_number} from {customer_name} is {days_overdue} days overdue (₦{amount:,.2f})",
             type=NotificationType.OVERDUE_INVOICE,
@@ -331,21 +512,31 @@ class NotificationService:
             action_required=True,
             priority=priority
         )
-        
-        return await self.create_notification(user_id, notification_data)
     
-    async def send_usage_limit_warning(
+    async def send_overdue_invoice_alert(
         self, 
         user_id: str, 
-        feature_type: str, 
-        current_usage: int, 
+        customer_name: str, 
+        invoice_number: str, 
+        amount: float,
+        days_overdue: int,
+        invoice_id: str = None
+    ) -> Tuple[bool, Optional[str]]:
+        """Send overdue invoice alert notification"""
+        notification_data = self.build_overdue_invoice_alert(customer_name, invoice_number, amount, days_overdue, invoice_id)
+        return await self.create_notification(user_id, notification_data)
+    
+    @staticmethod
+    def build_usage_limit_warning(
+        feature_type: str,
+        current_usage: int,
         limit: int,
         percentage: float
-    ) -> Tuple[bool, Optional[str]]:
-        """Send usage limit warning notification"""
+    ) -> NotificationData:
+        """Build the usage limit warning notification"""
         priority = "urgent" if percentage >= 100 else "high" if percentage >= 95 else "medium"
         
-        notification_data = NotificationData(
+        return NotificationData(
             title="Usage Limit Warning!",
             message=f"You've used {percentage:.0f}% of your {feature_type} limit ({current_usage}/{limit})",
             type=NotificationType.USAGE_LIMIT_WARNING,
@@ -359,7 +550,17 @@ class NotificationService:
             action_required=percentage >= 95,
             priority=priority
         )
-        
+    
+    async def send_usage_limit_warning(
+        self, 
+        user_id: str, 
+        feature_type: str, 
+        current_usage: int, 
+        limit: int,
+        percentage: float
+    ) -> Tuple[bool, Optional[str]]:
+        """Send usage limit warning notification"""
+        notification_data = self.build_usage_limit_warning(feature_type, current_usage, limit, percentage)
         return await self.create_notification(user_id, notification_data)
     
     async def send_subscription_expiry_warning(
@@ -422,10 +623,15 @@ class NotificationService:
     async def mark_notification_read(self, notification_id: str, user_id: str) -> bool:
         """Mark a notification as read"""
         try:
-            result = self.supabase.table('notifications').update({
+            result = await asyncio.to_thread(self.supabase.table('notifications').update({
                 'read': True,
                 'read_at': datetime.now(timezone.utc).isoformat()
-            }).eq('id', notification_id).eq('user_id', user_id).execute()
+            }).eq('id', notification_id).eq('user_id', user_id).execute)
+            unread_count_cache.invalidate(user_id)
+            if result.data:
+                await asyncio.to_thread(publish_realtime, self.supabase, [
+                    (user_id, 'notifications_read', {'notification_id': notification_id})
+                ])
             
             return bool(result.data)
             
@@ -436,10 +642,12 @@ class NotificationService:
     async def mark_all_notifications_read(self, user_id: str) -> bool:
         """Mark all notifications as read for a user"""
         try:
-            result = self.supabase.table('notifications').update({
+            await asyncio.to_thread(self.supabase.table('notifications').update({
                 'read': True,
                 'read_at': datetime.now(timezone.utc).isoformat()
-            }).eq('user_id', user_id).eq('read', False).execute()
+            }).eq('user_id', user_id).eq('read', False).execute)
+            unread_count_cache.invalidate(user_id)
+            await asyncio.to_thread(publish_realtime, self.supabase, [(user_id, 'notifications_read', {'all': True})])
             
             return True
             
@@ -460,7 +668,7 @@ class NotificationService:
             if unread_only:
                 query = query.eq('read', False)
             
-            result = query.order('created_at', desc=True).limit(limit).execute()
+            result = await asyncio.to_thread(query.order('created_at', desc=True).limit(limit).execute)
             
             return result.data or []
             
@@ -469,31 +677,75 @@ class NotificationService:
             return []
     
     async def get_unread_count(self, user_id: str) -> int:
-        """Get count of unread notifications for a user"""
+        """Get count of unread notifications for a user (cached counter row, not the rows themselves)"""
+        cached = unread_count_cache.get(user_id)
+        if cached is not None:
+            return cached
+        
         try:
-            result = self.supabase.table('notifications').select('id').eq(
-                'user_id', user_id
-            ).eq('read', False).execute()
-            
-            return len(result.data) if result.data else 0
+            count = await asyncio.to_thread(self._load_unread_count, user_id)
+            unread_count_cache.set(user_id, count)
+            return count
             
         except Exception as e:
             logger.error(f"Error getting unread count for user {user_id}: {str(e)}")
             return 0
     
-    async def cleanup_old_notifications(self, days_old: int = 30) -> int:
-        """Clean up notifications older than specified days"""
+    def _load_unread_count(self, user_id: str) -> int:
+        """Read the trigger-maintained counter; without migration 017 fall back to a count query"""
+        if NotificationService.unread_counters_available:
+            try:
+                result = self.supabase.table('notification_unread_counts').select('unread_count').eq(
+                    'user_id', user_id
+                ).execute()
+                # No row yet means the user has never had an unread notification
+                return int(result.data[0]['unread_count']) if result.data else 0
+            except Exception as e:
+                if '42P01' not in str(e) and 'does not exist' not in str(e):
+                    raise
+                logger.warning(f"notification_unread_counts unavailable, counting rows instead: {str(e)}")
+                NotificationService.unread_counters_available = False
+        
+        result = self.supabase.table('notifications').select('id', count='exact').eq(
+            'user_id', user_id
+        ).eq('read', False).limit(1).execute()
+        return result.count or 0
+    
+    async def cleanup_old_notifications(self, days_old: int = 30, user_id: Optional[str] = None) -> int:
+        """Archive and delete notifications older than specified days, in batches"""
         try:
-            cutoff_date = datetime.now(timezone.utc) - timedelta(days=days_old)
+            retention = RetentionService(self.supabase)
+            count = await asyncio.to_thread(retention.purge_notifications, days_old, days_old, user_id)
             
-            result = self.supabase.table('notifications').delete().lt(
-                'created_at', cutoff_date.isoformat()
-            ).execute()
-            
-            count = len(result.data) if result.data else 0
+            if count:
+                unread_count_cache.clear()
             logger.info(f"Cleaned up {count} old notifications")
             return count
             
         except Exception as e:
             logger.error(f"Error cleaning up old notifications: {str(e)}")
-            return 0
\ No newline at end of file
+            return 0
+
+
+@job_queue.handler("notification.push")
+def _push_notification_job(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Deliver a queued push; stale pushes are not worth retrying for long"""
+    notification_data = NotificationData(
+        title=payload['title'],
+        message=payload['message'],
+        type=NotificationType(payload['type']),
+        data=payload.get('data') or {},
+        navigation_url=payload.get('navigation_url'),
+        action_required=payload.get('action_required', False),
+        priority=payload.get('priority', 'medium')
+    )
+    service = NotificationService(get_job_supabase())
+    sent = run_async(service._send_push_notification(payload['user_id'], notification_data), timeout=None)
+    return {'sent': sent}
+
+
+@job_queue.handler("notification.push_batch")
+def _push_batch_job(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Deliver pushes for many users at once: [{user_id, title, body, data}]"""
+    sent = PushDispatcher(get_job_supabase()).send_to_users(payload['deliveries'])
+    return {'users_reached': sum(1 for count in sent.values() if count)}
@@ -0,0 +1,96 @@
+"""
+Push Dispatcher for SabiOps
+Delivers push notifications with one FCM multicast per message, fans out
+across users on a bounded thread pool and applies token bookkeeping
+(last_used_at, deactivating dead tokens) as one bulk update per batch.
+"""
+
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from .firebase_service import send_multicast_notification
+
+logger = logging.getLogger(__name__)
+
+
+class PushDispatcher:
+    """Batched FCM delivery for one or many users"""
+
+    def __init__(self, supabase_client, transport: Optional[Callable] = None, max_workers: Optional[int] = None):
+        self.supabase = supabase_client
+        self.transport = transport
+        self.max_workers = max_workers or int(os.getenv('PUSH_FANOUT_WORKERS', '8'))
+
+    def _load_tokens(self, user_ids: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+        """Active tokens for every user in one query"""
+        result = self.supabase.table('push_subscriptions').select('id, user_id, fcm_token, token') \
+            .in_('user_id', list(user_ids)).eq('active', True).execute()
+
+        tokens: Dict[str, List[Dict[str, Any]]] = {}
+        for row in result.data or []:
+            if row.get('fcm_token') or row.get('token'):
+                tokens.setdefault(row['user_id'], []).append(row)
+        return tokens
+
+    def _deliver(self, rows: List[Dict[str, Any]], push: Dict[str, Any]):
+        """One multicast for one user's devices; returns [(row_id, success, permanent)]"""
+        tokens = [row.get('fcm_token') or row.get('token') for row in rows]
+        results = send_multicast_notification(
+            tokens, push['title'], push['body'], push.get('data'), transport=self.transport
+        )
+        return [(row['id'], success, permanent) for row, (_, success, permanent) in zip(rows, results)]
+
+    def send_to_users(self, deliveries: List[Dict[str, Any]]) -> Dict[str, int]:
+        """
+        Send pushes to many users concurrently.
+
+        deliveries: [{"user_id", "title", "body", "data"?}]
+        Returns: {user_id: devices_reached}
+        """
+        if not deliveries:
+            return {}
+
+        tokens_by_user = self._load_tokens({d['user_id'] for d in deliveries})
+        jobs = [(d, tokens_by_user[d['user_id']]) for d in deliveries if tokens_by_user.get(d['user_id'])]
+        sent = {d['user_id']: 0 for d in deliveries}
+        if not jobs:
+            return sent
+
+        workers = max(1, min(self.max_workers, len(jobs)))
+        if workers == 1:
+            outcomes = [self._deliver(rows, push) for push, rows in jobs]
+        else:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='push-fanout') as pool:
+                outcomes = list(pool.map(lambda job: self._deliver(job[1], job[0]), jobs))
+
+        delivered_ids, dead_ids = [], []
+        for (push, _), outcome in zip(jobs, outcomes):
+            for row_id, success, permanent in outcome:
+                if success:
+                    delivered_ids.append(row_id)
+                    sent[push['user_id']] += 1
+                elif permanent:
+                    dead_ids.append(row_id)
+
+        self._record_outcomes(delivered_ids, dead_ids)
+        logger.info(f"Push batch: {len(delivered_ids)} devices reached, {len(dead_ids)} tokens deactivated")
+        return sent
+
+    def send_to_user(self, user_id: str, title: str, body: str, data: Optional[Dict[str, Any]] = None) -> int:
+        return self.send_to_users([{'user_id': user_id, 'title': title, 'body': body, 'data': data}])[user_id]
+
+    def _record_outcomes(self, delivered_ids: List[str], dead_ids: List[str]):
+        """One update for every delivered token and one for every dead token"""
+        now = datetime.now(timezone.utc).isoformat()
+        try:
+            if delivered_ids:
+                self.supabase.table('push_subscriptions').update({'last_used_at': now}) \
+                    .in_('id', delivered_ids).execute()
+            if dead_ids:
+                self.supabase.table('push_subscriptions').update({'active': False}) \
+                    .in_('id', dead_ids).execute()
+        except Exception as e:
+            logger.error(f"Error updating push token bookkeeping: {str(e)}")
@@ -0,0 +1,286 @@
+"""
+Realtime Events - Server-Sent Events fan-out for notifications and dashboards
+Write paths publish small events (new notification, notifications read, sale
+recorded) into the realtime_events table. Each worker process runs one poller
+that reads new events by id and hands them to the SSE connections it serves,
+so idle connections cost a blocked thread (or greenlet) and a bounded queue,
+not a poll request each. Event ids double as SSE ids for Last-Event-ID resume.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+POLL_SECONDS = float(os.getenv('REALTIME_POLL_SECONDS', '1.0'))
+QUEUE_LIMIT = int(os.getenv('REALTIME_QUEUE_LIMIT', '100'))
+HEARTBEAT_SECONDS = float(os.getenv('REALTIME_HEARTBEAT_SECONDS', '15'))
+STREAM_SECONDS = float(os.getenv('REALTIME_STREAM_SECONDS', '600'))
+# EventSource reconnect delay sent to clients
+RETRY_MS = 5000
+
+# Events that change a user's unread count
+NOTIFICATION_EVENTS = ("notification", "notifications_read")
+
+
+def _missing_relation(error: Exception) -> bool:
+    message = str(error)
+    return '42P01' in message or 'does not exist' in message
+
+
+def format_sse(event: str, data: Any, event_id: Optional[int] = None) -> str:
+    """One SSE message; data is sent as a single JSON line"""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, default=str, separators=(',', ':'))}")
+    return "\n".join(lines) + "\n\n"
+
+
+def publish(supabase_client, events: Iterable[Tuple[str, str, Dict[str, Any]]]) -> int:
+    """
+    Publish (user_id, event, data) triples. Never raises: realtime delivery is
+    best effort and clients still load the full state over REST. Without
+    migration 018 events only reach connections served by this process.
+    """
+    rows = [{'user_id': user_id, 'event': event, 'data': data} for user_id, event, data in events if user_id]
+    if not rows:
+        return 0
+    try:
+        supabase_client.table('realtime_events').insert(rows).execute()
+        return len(rows)
+    except Exception as e:
+        if _missing_relation(e):
+            realtime_hub.dispatch(rows)
+            return len(rows)
+        logger.warning(f"Failed to publish {len(rows)} realtime events: {str(e)}")
+        return 0
+
+
+class Subscription:
+    """
+    One SSE connection. Holds at most `limit` undelivered events; when a slow
+    client falls further behind, the queue is dropped and the client is told
+    to resync instead of the process buffering without bound.
+    """
+
+    def __init__(self, keys: Set[str], limit: int = QUEUE_LIMIT, floor: Optional[int] = None):
+        self.keys = keys
+        self.limit = limit
+        self.floor = floor or 0
+        self.overflowed = False
+        self._events: deque = deque()
+        self._recent_ids: deque = deque(maxlen=limit * 2)
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+
+    def put(self, event: Dict[str, Any]):
+        event_id = event.get('id')
+        with self._lock:
+            if event_id is not None:
+                if event_id <= self.floor or event_id in self._recent_ids:
+                    return
+                self._recent_ids.append(event_id)
+            if len(self._events) >= self.limit:
+                self._events.clear()
+                self.overflowed = True
+            else:
+                self._events.append(event)
+            self._ready.set()
+
+    def take(self, timeout: float) -> Tuple[List[Dict[str, Any]], bool]:
+        """Wait up to `timeout` for events; returns (events, overflowed)"""
+        self._ready.wait(timeout)
+        with self._lock:
+            events, overflowed = list(self._events), self.overflowed
+            self._events.clear()
+            self.overflowed = False
+            self._ready.clear()
+        return events, overflowed
+
+
+class RealtimeHub:
+    """Per-process registry of SSE subscriptions fed by one realtime_events poller"""
+
+    PAGE_SIZE = 500
+    # Ids skipped by the poller are re-checked for this long: a publish that
+    # took its id earlier may commit after a later one
+    GAP_SECONDS = 10.0
+    MAX_GAP = 1000
+
+    def __init__(self, poll_seconds: float = POLL_SECONDS, autostart: bool = True):
+        self.poll_seconds = poll_seconds
+        self.autostart = autostart
+        self.supabase = None
+        self._subscriptions: Dict[str, Set[Subscription]] = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._thread: Optional[threading.Thread] = None
+        self._polling_available = True
+        self._last_id: Optional[int] = None
+        self._gaps: Dict[int, float] = {}
+
+    # ------------------------------------------------------------------
+    # Subscriptions
+    # ------------------------------------------------------------------
+
+    def subscribe(self, supabase_client, keys: Iterable[str], last_event_id: Optional[int] = None,
+                  limit: int = QUEUE_LIMIT) -> Subscription:
+        """Register a connection for events addressed to any of `keys` (user and owner ids)"""
+        subscription = Subscription({str(key) for key in keys if key}, limit=limit, floor=last_event_id)
+        with self._lock:
+            self.supabase = self.supabase or supabase_client
+            for key in subscription.keys:
+                self._subscriptions.setdefault(key, set()).add(subscription)
+            self._wake.notify_all()
+        self._ensure_poller()
+
+        if last_event_id is not None:
+            self._replay(supabase_client, subscription, last_event_id)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            for key in subscription.keys:
+                subscribers = self._subscriptions.get(key)
+                if subscribers:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._subscriptions[key]
+
+    def connection_count(self) -> int:
+        with self._lock:
+            return len({subscription for subscribers in self._subscriptions.values() for subscription in subscribers})
+
+    def _replay(self, supabase_client, subscription: Subscription, last_event_id: int):
+        """Events the client missed while disconnected; too many means resync"""
+        try:
+            rows = supabase_client.table('realtime_events').select('id, user_id, event, data').in_(
+                'user_id', sorted(subscription.keys)
+            ).gt('id', last_event_id).order('id').limit(subscription.limit + 1).execute().data or []
+        except Exception as e:
+            logger.warning(f"Could not replay realtime events after {last_event_id}: {str(e)}")
+            return
+        for row in rows:
+            subscription.put(row)
+
+    def dispatch(self, rows: Iterable[Dict[str, Any]]) -> int:
+        """Hand events to the subscriptions addressed by their user_id"""
+        from .notification_service import unread_count_cache
+
+        delivered = 0
+        with self._lock:
+            targets = [(row, list(self._subscriptions.get(str(row.get('user_id')), ()))) for row in rows]
+        for row, subscriptions in targets:
+            if row.get('event') in NOTIFICATION_EVENTS:
+                # Written by another process: this process's cached count is stale
+                unread_count_cache.invalidate(str(row['user_id']))
+            for subscription in subscriptions:
+                subscription.put(row)
+                delivered += 1
+        return delivered
+
+    # ------------------------------------------------------------------
+    # Poller
+    # ------------------------------------------------------------------
+
+    def poll_once(self) -> int:
+        """Read events after the last seen id (plus recent gaps) and dispatch them"""
+        supabase_client = self.supabase
+        if supabase_client is None:
+            return 0
+        table = lambda: supabase_client.table('realtime_events').select('id, user_id, event, data')
+
+        if self._last_id is None:
+            latest = supabase_client.table('realtime_events').select('id').order('id', desc=True).limit(1).execute()
+            self._last_id = int(latest.data[0]['id']) if latest.data else 0
+            return 0
+
+        rows = table().gt('id', self._last_id).order('id').limit(self.PAGE_SIZE).execute().data or []
+        now = time.monotonic()
+        self._gaps = {event_id: seen for event_id, seen in self._gaps.items() if now - seen < self.GAP_SECONDS}
+        if self._gaps:
+            rows += table().in_('id', sorted(self._gaps)).execute().data or []
+
+        fresh = []
+        for row in sorted(rows, key=lambda row: row['id']):
+            event_id = int(row['id'])
+            if self._gaps.pop(event_id, None) is not None:
+                fresh.append(row)
+            elif event_id > self._last_id:
+                if event_id - self._last_id - 1 <= self.MAX_GAP:
+                    self._gaps.update({missing: now for missing in range(self._last_id + 1, event_id)})
+                self._last_id = event_id
+                fresh.append(row)
+        return self.dispatch(fresh)
+
+    def _ensure_poller(self):
+        with self._lock:
+            if not (self.autostart and self._polling_available) or (self._thread and self._thread.is_alive()):
+                return
+            self._thread = threading.Thread(target=self._poll_loop, daemon=True, name="realtime-poller")
+            self._thread.start()
+
+    def _poll_loop(self):
+        while True:
+            with self._lock:
+                # Nobody connected: no polling at all
+                while not self._subscriptions:
+                    self._wake.wait()
+            try:
+                self.poll_once()
+            except Exception as e:
+                if _missing_relation(e):
+                    logger.warning(f"realtime_events unavailable, delivering in-process events only: {str(e)}")
+                    self._polling_available = False
+                    return
+                logger.warning(f"Realtime poll failed: {str(e)}")
+            time.sleep(self.poll_seconds)
+
+    # ------------------------------------------------------------------
+    # Streaming
+    # ------------------------------------------------------------------
+
+    def stream(self, supabase_client, user_id: str, keys: Iterable[str], last_event_id: Optional[int] = None,
+               heartbeat_seconds: float = HEARTBEAT_SECONDS, max_seconds: float = STREAM_SECONDS) -> Iterator[str]:
+        """
+        SSE body for one connection: the unread count first, then events as they
+        arrive, a comment line as heartbeat and a refreshed unread count after
+        notification events. Ends after max_seconds; EventSource reconnects
+        with Last-Event-ID.
+        """
+        from .notification_service import NotificationService
+        from .event_loop import run_async
+
+        def unread_count():
+            count = run_async(NotificationService(supabase_client).get_unread_count(user_id))
+            return format_sse("unread_count", {'unread_count': count})
+
+        subscription = self.subscribe(supabase_client, {user_id, *keys}, last_event_id)
+        deadline = time.monotonic() + max_seconds
+        try:
+            yield f"retry: {RETRY_MS}\n\n"
+            yield unread_count()
+            while time.monotonic() < deadline:
+                events, overflowed = subscription.take(min(heartbeat_seconds, max(deadline - time.monotonic(), 0)))
+                if overflowed:
+                    yield format_sse("resync", {'reason': 'too many events while disconnected or slow'})
+                for event in events:
+                    yield format_sse(event['event'], event.get('data') or {}, event.get('id'))
+                if overflowed or any(event['event'] in NOTIFICATION_EVENTS and str(event['user_id']) == str(user_id)
+                                     for event in events):
+                    yield unread_count()
+                elif not events:
+                    yield ": keepalive\n\n"
+        finally:
+            self.unsubscribe(subscription)
+
+
+# Global realtime hub instance
+realtime_hub = RealtimeHub()
@@ -0,0 +1,199 @@
+"""
+Retention - batched purge of notifications, device tokens and event logs
+Each table is purged oldest first in small batches with a pause between
+them, so a purge never holds long locks or floods the database, and a run
+stops when its time budget is spent and picks up the rest the next night.
+Notifications are summarised into notification_archive before each batch
+is deleted (archive_notifications_batch RPC, or the same steps from here
+when the RPC is missing).
+"""
+
+import logging
+import os
+import time
+from collections import Counter
+from datetime import datetime, timezone, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = int(os.getenv('RETENTION_BATCH_SIZE', '200'))
+PAUSE_SECONDS = float(os.getenv('RETENTION_PAUSE_SECONDS', '0.5'))
+MAX_SECONDS = float(os.getenv('RETENTION_MAX_SECONDS', '600'))
+
+# Days to keep, per kind of row
+NOTIFICATION_READ_DAYS = int(os.getenv('NOTIFICATION_READ_RETENTION_DAYS', '30'))
+NOTIFICATION_UNREAD_DAYS = int(os.getenv('NOTIFICATION_UNREAD_RETENTION_DAYS', '90'))
+INACTIVE_DEVICE_DAYS = int(os.getenv('PUSH_INACTIVE_RETENTION_DAYS', '30'))
+STALE_DEVICE_DAYS = int(os.getenv('PUSH_STALE_DEVICE_DAYS', '180'))
+EXPIRED_TOKEN_DAYS = int(os.getenv('EXPIRED_TOKEN_RETENTION_DAYS', '7'))
+REALTIME_EVENT_HOURS = int(os.getenv('REALTIME_EVENT_RETENTION_HOURS', '24'))
+
+
+def _days_ago(days: float) -> str:
+    return (datetime.now(timezone.utc) - timedelta(days=days)).isoformat()
+
+
+class RetentionService:
+    """Bounded, resumable purges; every method returns the number of rows deleted"""
+
+    ARCHIVE_RPC = "archive_notifications_batch"
+
+    def __init__(self, supabase_client, batch_size: int = None, pause_seconds: float = None,
+                 max_seconds: float = None):
+        self.supabase = supabase_client
+        self.batch_size = batch_size or BATCH_SIZE
+        self.pause_seconds = PAUSE_SECONDS if pause_seconds is None else pause_seconds
+        self.max_seconds = max_seconds or MAX_SECONDS
+        self._deadline = None
+        self._rpc_available = True
+
+    # ------------------------------------------------------------------
+    # Batching
+    # ------------------------------------------------------------------
+
+    def _out_of_time(self) -> bool:
+        return self._deadline is not None and time.monotonic() >= self._deadline
+
+    def _batches(self, purge_batch: Callable[[], int], label: str) -> int:
+        """Run purge_batch until it deletes nothing or the run's budget is spent"""
+        deleted = 0
+        while not self._out_of_time():
+            count = purge_batch()
+            deleted += count
+            if count < self.batch_size:
+                break
+            time.sleep(self.pause_seconds)
+        if deleted:
+            logger.info(f"Retention purged {deleted} {label}")
+        return deleted
+
+    def _delete_where(self, table: str, where: Callable, order_column: str, label: str) -> int:
+        """Select a batch of ids matching `where`, delete them by id, repeat"""
+        def purge_batch():
+            rows = where(self.supabase.table(table).select('id')).order(order_column).limit(self.batch_size).execute().data or []
+            if rows:
+                self.supabase.table(table).delete().in_('id', [row['id'] for row in rows]).execute()
+            return len(rows)
+
+        return self._batches(purge_batch, label)
+
+    # ------------------------------------------------------------------
+    # Notifications
+    # ------------------------------------------------------------------
+
+    def purge_notifications(self, read_days: int = NOTIFICATION_READ_DAYS, unread_days: int = NOTIFICATION_UNREAD_DAYS,
+                            user_id: Optional[str] = None) -> int:
+        """Read notifications older than read_days and unread ones older than unread_days, archived first"""
+        if read_days == unread_days:
+            return self._purge_notifications(_days_ago(read_days), None, user_id)
+        return (self._purge_notifications(_days_ago(read_days), True, user_id)
+                + self._purge_notifications(_days_ago(unread_days), False, user_id))
+
+    def _purge_notifications(self, cutoff: str, read: Optional[bool], user_id: Optional[str]) -> int:
+        label = "notifications" if read is None else f"{'read' if read else 'unread'} notifications"
+        return self._batches(lambda: self._archive_notification_batch(cutoff, read, user_id), label)
+
+    def _archive_notification_batch(self, cutoff: str, read: Optional[bool], user_id: Optional[str]) -> int:
+        if self._rpc_available:
+            try:
+                result = self.supabase.rpc(self.ARCHIVE_RPC, {
+                    'p_cutoff': cutoff,
+                    'p_read': read,
+                    'p_user_id': user_id,
+                    'p_limit': self.batch_size
+                }).execute()
+                return int(result.data or 0)
+            except Exception as e:
+                logger.warning(f"{self.ARCHIVE_RPC} RPC not available, archiving from the backend: {str(e)}")
+                self._rpc_available = False
+
+        query = self.supabase.table('notifications').select('id, user_id, type, read, created_at').lt('created_at', cutoff)
+        if read is not None:
+            query = query.eq('read', read)
+        if user_id:
+            query = query.eq('user_id', user_id)
+        rows = query.order('created_at').limit(self.batch_size).execute().data or []
+        if not rows:
+            return 0
+
+        # A failed archive insert raises here, before anything is deleted
+        self.supabase.table('notification_archive').insert(self._archive_rows(rows)).execute()
+        self.supabase.table('notifications').delete().in_('id', [row['id'] for row in rows]).execute()
+        return len(rows)
+
+    @staticmethod
+    def _archive_rows(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Count per (user, type, read, month)"""
+        counts = Counter(
+            (row['user_id'], row.get('type'), bool(row.get('read')), str(row['created_at'])[:7] + '-01')
+            for row in rows
+        )
+        return [
+            {'user_id': user_id, 'notification_type': notification_type, 'read': read,
+             'period_start': period_start, 'notification_count': count}
+            for (user_id, notification_type, read, period_start), count in counts.items()
+        ]
+
+    # ------------------------------------------------------------------
+    # Tokens and event logs
+    # ------------------------------------------------------------------
+
+    def purge_push_subscriptions(self, inactive_days: int = INACTIVE_DEVICE_DAYS,
+                                 stale_days: int = STALE_DEVICE_DAYS) -> int:
+        """Deactivated devices after inactive_days; devices unused for stale_days (tokens FCM has long expired)"""
+        inactive_cutoff, stale_cutoff = _days_ago(inactive_days), _days_ago(stale_days)
+        return (
+            self._delete_where('push_subscriptions', lambda query: query.eq('active', False).lt('last_used_at', inactive_cutoff),
+                               'last_used_at', "deactivated push subscriptions")
+            + self._delete_where('push_subscriptions', lambda query: query.lt('last_used_at', stale_cutoff),
+                                 'last_used_at', "stale push subscriptions")
+        )
+
+    def purge_expired_tokens(self, days: int = EXPIRED_TOKEN_DAYS) -> int:
+        """Email verification and password reset tokens that expired more than `days` ago"""
+        cutoff = _days_ago(days)
+        return sum(
+            self._delete_where(table, lambda query: query.lt('expires_at', cutoff), 'expires_at', table.replace('_', ' '))
+            for table in ('email_verification_tokens', 'password_reset_tokens')
+        )
+
+    def purge_realtime_events(self, hours: int = REALTIME_EVENT_HOURS) -> int:
+        cutoff = _days_ago(hours / 24)
+        return self._delete_where('realtime_events', lambda query: query.lt('created_at', cutoff), 'created_at', "realtime events")
+
+    # ------------------------------------------------------------------
+    # Scheduled run
+    # ------------------------------------------------------------------
+
+    def run(self) -> Dict[str, Any]:
+        """
+        Every purge within one time budget. A failing table is reported and
+        skipped; the others still run.
+        """
+        self._deadline = time.monotonic() + self.max_seconds
+        purges = (
+            ('notifications', self.purge_notifications),
+            ('push_subscriptions', self.purge_push_subscriptions),
+            ('expired_tokens', self.purge_expired_tokens),
+            ('realtime_events', self.purge_realtime_events),
+        )
+        deleted, errors = {}, {}
+        try:
+            for name, purge in purges:
+                try:
+                    deleted[name] = purge()
+                except Exception as e:
+                    logger.error(f"Retention purge of {name} failed: {str(e)}")
+                    errors[name] = str(e)
+            # Whatever is left over is picked up by the next run
+            budget_spent = self._out_of_time()
+        finally:
+            self._deadline = None
+
+        return {
+            'deleted': deleted,
+            'errors': errors,
+            'rows_processed': sum(deleted.values()),
+            'budget_spent': budget_spent
+        }
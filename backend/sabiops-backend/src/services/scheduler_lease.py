@@ -0,0 +1,209 @@
+"""
+Scheduler Lease - one leader per background schedule
+Every worker process starts the schedulers; a lease row in scheduler_leases
+decides which one actually runs the jobs. The leader renews the lease on a
+heartbeat thread and any process takes over once it expires. JobRunHistory
+records each run (duration, rows processed, outcome) in job_runs.
+"""
+
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone, timedelta
+from typing import Any, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL_SECONDS = int(os.getenv('SCHEDULER_LEASE_TTL_SECONDS', '180'))
+
+
+def _missing_relation(error: Exception) -> bool:
+    message = str(error)
+    return '42P01' in message or 'does not exist' in message
+
+
+class SchedulerLease:
+    """
+    Lease on one named schedule.
+
+    acquire() takes or renews the lease (acquire_scheduler_lease RPC, or
+    conditional updates when the RPC is missing). The process only treats
+    itself as leader for two thirds of the TTL after its last successful
+    renewal, so a stalled leader stops before anyone else can start. Where
+    migration 016 is not applied at all, every process runs as before.
+    """
+
+    ACQUIRE_RPC = "acquire_scheduler_lease"
+    RELEASE_RPC = "release_scheduler_lease"
+
+    def __init__(self, supabase_client, name: str, ttl_seconds: Optional[int] = None, holder: Optional[str] = None):
+        self.supabase = supabase_client
+        self.name = name
+        self.ttl_seconds = ttl_seconds or DEFAULT_TTL_SECONDS
+        self.holder = holder or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.renew_interval = self.ttl_seconds / 3
+        self._valid_until = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._rpc_available = True
+
+    @property
+    def is_leader(self) -> bool:
+        return time.monotonic() < self._valid_until
+
+    def acquire(self) -> bool:
+        """Take or renew the lease; returns whether this process leads now"""
+        started = time.monotonic()
+        held = self._acquire()
+        was_leader = self.is_leader
+        self._valid_until = started + self.ttl_seconds * 2 / 3 if held else 0.0
+
+        if held and not was_leader:
+            logger.info(f"{self.holder} is now leader for {self.name}")
+        elif was_leader and not held:
+            logger.warning(f"{self.holder} lost the {self.name} lease")
+        return held
+
+    def _acquire(self) -> bool:
+        if self._rpc_available:
+            try:
+                result = self.supabase.rpc(self.ACQUIRE_RPC, {
+                    'p_name': self.name,
+                    'p_holder': self.holder,
+                    'p_ttl_seconds': int(self.ttl_seconds)
+                }).execute()
+                return bool(result.data)
+            except Exception as e:
+                logger.warning(f"{self.ACQUIRE_RPC} RPC not available, using conditional updates: {str(e)}")
+                self._rpc_available = False
+
+        try:
+            return self._acquire_via_cas()
+        except Exception as e:
+            if _missing_relation(e):
+                # Lease table not migrated: keep the old run-everywhere behaviour
+                logger.warning(f"scheduler_leases unavailable, running {self.name} without a lease: {str(e)}")
+                return True
+            logger.error(f"Could not acquire the {self.name} lease: {str(e)}")
+            return False
+
+    def _acquire_via_cas(self) -> bool:
+        """Renew if ours, else take it if expired, else create it; each step is one conditional statement"""
+        now = datetime.now(timezone.utc)
+        lease = {
+            'holder': self.holder,
+            'heartbeat_at': now.isoformat(),
+            'expires_at': (now + timedelta(seconds=self.ttl_seconds)).isoformat()
+        }
+        if self.supabase.table('scheduler_leases').update(lease).eq(
+            'name', self.name
+        ).eq('holder', self.holder).execute().data:
+            return True
+
+        lease['acquired_at'] = now.isoformat()
+        if self.supabase.table('scheduler_leases').update(lease).eq(
+            'name', self.name
+        ).lt('expires_at', now.isoformat()).execute().data:
+            return True
+
+        try:
+            self.supabase.table('scheduler_leases').insert({'name': self.name, **lease}).execute()
+            return True
+        except Exception as e:
+            if _missing_relation(e):
+                raise
+            # Primary key conflict: someone else holds an unexpired lease
+            return False
+
+    def release(self):
+        """Give the lease up so another process can lead without waiting for expiry"""
+        self._valid_until = 0.0
+        try:
+            if self._rpc_available:
+                self.supabase.rpc(self.RELEASE_RPC, {'p_name': self.name, 'p_holder': self.holder}).execute()
+            else:
+                self.supabase.table('scheduler_leases').delete().eq('name', self.name).eq('holder', self.holder).execute()
+        except Exception as e:
+            logger.warning(f"Failed to release the {self.name} lease: {str(e)}")
+
+    def start(self):
+        """Campaign for and renew the lease on a heartbeat thread"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self.acquire()
+
+        def heartbeat():
+            while not self._stop.wait(self.renew_interval):
+                self.acquire()
+
+        self._thread = threading.Thread(target=heartbeat, daemon=True, name=f"lease-{self.name}")
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self.release()
+
+    def status(self) -> Dict[str, Any]:
+        return {'name': self.name, 'holder': self.holder, 'is_leader': self.is_leader}
+
+
+class JobRunHistory:
+    """Records scheduled job runs in job_runs; recording never fails the job"""
+
+    def __init__(self, supabase_client, holder: Optional[str] = None):
+        self.supabase = supabase_client
+        self.holder = holder
+
+    @contextmanager
+    def track(self, job_name: str) -> Iterator[Dict[str, Any]]:
+        """
+        Time the block and record it. The block fills in the yielded dict:
+        {"rows_processed": int, "details": dict}
+        """
+        run: Dict[str, Any] = {'rows_processed': 0, 'details': {}}
+        started_at = datetime.now(timezone.utc)
+        started = time.monotonic()
+        status, error = 'succeeded', None
+        try:
+            yield run
+        except Exception as e:
+            status, error = 'failed', str(e)
+            raise
+        finally:
+            self._record({
+                'job_name': job_name,
+                'holder': self.holder,
+                'status': status,
+                'started_at': started_at.isoformat(),
+                'finished_at': datetime.now(timezone.utc).isoformat(),
+                'duration_ms': int((time.monotonic() - started) * 1000),
+                'rows_processed': int(run.get('rows_processed') or 0),
+                'details': run.get('details') or {},
+                'error': error
+            })
+
+    def _record(self, row: Dict[str, Any]):
+        try:
+            self.supabase.table('job_runs').insert(row).execute()
+        except Exception as e:
+            logger.warning(f"Failed to record {row['job_name']} run: {str(e)}")
+
+    def recent(self, job_name: Optional[str] = None, limit: int = 20) -> List[Dict[str, Any]]:
+        try:
+            query = self.supabase.table('job_runs').select(
+                'job_name, holder, status, started_at, duration_ms, rows_processed, error'
+            )
+            if job_name:
+                query = query.eq('job_name', job_name)
+            return query.order('started_at', desc=True).limit(limit).execute().data or []
+        except Exception as e:
+            logger.warning(f"Failed to load job run history: {str(e)}")
+            return []
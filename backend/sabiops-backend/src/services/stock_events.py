@@ -0,0 +1,118 @@
+"""
+Stock Events - low stock detection at write time
+Write paths (sales, stock updates, invoice deductions) already know a product's
+quantity before and after the change. They report the change here; products
+that crossed into a worse stock band are checked by a queued job right away,
+instead of waiting for a periodic scan of every product.
+"""
+
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional
+
+from .event_loop import run_async
+from .job_queue import job_queue, get_job_supabase
+
+logger = logging.getLogger(__name__)
+
+LOW_STOCK_CHECK_JOB = "inventory.low_stock_check"
+
+
+def stock_band(quantity: int, threshold: Optional[int], reorder_level: Optional[int] = None) -> int:
+    """0 adequate, 1 low stock, 2 reorder needed, 3 out of stock (the monitor's alert types)"""
+    if quantity <= 0:
+        return 3
+    if reorder_level and quantity <= reorder_level:
+        return 2
+    if threshold is not None and quantity <= threshold:
+        return 1
+    return 0
+
+
+def crossed_low_stock(change: Dict[str, Any]) -> bool:
+    """
+    Whether one change needs a low stock check.
+    change: {"product_id", "old_quantity", "new_quantity", "low_stock_threshold"?, "reorder_level"?}
+    Without a threshold any decrease is checked; the job reads the product anyway.
+    """
+    old_quantity = int(change.get('old_quantity') or 0)
+    new_quantity = int(change.get('new_quantity') or 0)
+    if new_quantity >= old_quantity:
+        return False
+
+    threshold = change.get('low_stock_threshold')
+    if threshold is None:
+        return True
+    reorder_level = change.get('reorder_level')
+    return stock_band(new_quantity, int(threshold), reorder_level) > stock_band(old_quantity, int(threshold), reorder_level)
+
+
+def emit_stock_changes(owner_id: str, changes: Iterable[Dict[str, Any]]) -> List[str]:
+    """
+    Queue a low stock check for the products whose change crossed a threshold.
+    Never raises: a lost event is picked up by the inventory_changes cursor.
+    Returns the product ids queued.
+    """
+    try:
+        product_ids = sorted({str(change['product_id']) for change in changes if crossed_low_stock(change)})
+        if product_ids:
+            job_queue.enqueue(LOW_STOCK_CHECK_JOB, {'product_ids': product_ids}, owner_id=owner_id, max_attempts=3)
+            logger.debug(f"Queued low stock check for {len(product_ids)} products of owner {owner_id}")
+        return product_ids
+    except Exception as e:
+        logger.warning(f"Failed to queue low stock check: {str(e)}")
+        return []
+
+
+def deduction_changes(lines: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """StockEngine.deduct lines as changes; the engine does not return thresholds"""
+    return [
+        {
+            'product_id': line['product_id'],
+            'old_quantity': line['remaining'] + line.get('deducted', line['requested']),
+            'new_quantity': line['remaining']
+        }
+        for line in lines
+        if line.get('success') and line.get('remaining') is not None
+    ]
+
+
+@job_queue.handler(LOW_STOCK_CHECK_JOB)
+def _low_stock_check_job(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Evaluate just the products a write touched"""
+    from .triggers.low_stock_trigger import create_low_stock_monitor
+
+    result = run_async(create_low_stock_monitor(get_job_supabase()).check_products(payload['product_ids']), timeout=None)
+    return {'products_checked': result.get('products_checked', 0), 'notifications_sent': result.get('notifications_sent', 0)}
+
+
+class TriggerCursor:
+    """
+    Persisted watermark for a change-feed consumer (trigger_cursors table).
+    get() returns None when there is no stored position yet or the table is
+    unavailable; the consumer then starts from a recent time window.
+    """
+
+    def __init__(self, supabase_client, name: str):
+        self.supabase = supabase_client
+        self.name = name
+
+    def get(self) -> Optional[int]:
+        try:
+            result = self.supabase.table('trigger_cursors').select('position').eq('name', self.name).execute()
+            return int(result.data[0]['position']) if result.data else None
+        except Exception as e:
+            logger.warning(f"Cursor {self.name} unavailable: {str(e)}")
+            return None
+
+    def advance(self, position: int) -> bool:
+        try:
+            self.supabase.table('trigger_cursors').upsert({
+                'name': self.name,
+                'position': position,
+                'updated_at': datetime.now(timezone.utc).isoformat()
+            }, on_conflict='name').execute()
+            return True
+        except Exception as e:
+            logger.warning(f"Failed to advance cursor {self.name} to {position}: {str(e)}")
+            return False
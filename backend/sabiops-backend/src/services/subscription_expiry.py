@@ -0,0 +1,163 @@
+"""
+Subscription Expiry - daily set-based expiry and trial countdown
+One run_subscription_expiry call (migration 022) downgrades every lapsed
+plan to free, resets the owners' usage counters to free limits and
+recomputes trial_days_left for running trials, returning the users it
+changed. Their entitlement snapshots are dropped and everyone who needs
+telling is notified with one bulk insert, so a run costs the same few
+statements however many users there are. Without the migration the same
+pass runs as bulk updates from here.
+"""
+
+import logging
+import os
+from datetime import datetime, timezone, timedelta
+from typing import Any, Dict, List
+
+from src.utils.db_errors import missing_function
+
+from .entitlements import entitlement_cache
+from .event_loop import run_async
+from .notification_service import NotificationService, NotificationData, NotificationType
+from .subscription_service import SubscriptionService
+
+logger = logging.getLogger(__name__)
+
+# trial_days_left values that get an "ending soon" notification
+TRIAL_REMINDER_DAYS = tuple(int(days) for days in os.getenv('TRIAL_REMINDER_DAYS', '3,1').split(','))
+
+FREE_LIMITS = SubscriptionService.PLAN_CONFIGS['free']['features']
+MAX_TRIAL_DAYS = max(plan['trial_days'] for plan in SubscriptionService.PLAN_CONFIGS.values())
+
+
+class SubscriptionExpiry:
+    """
+    The daily subscription pass. run() returns counts for job_runs; changes
+    are {'user_id', 'owner_id', 'event', 'days_left'} with event 'expired'
+    or 'trial'.
+    """
+
+    EXPIRY_RPC = "run_subscription_expiry"
+    # Owner ids per feature_usage reset in the fallback
+    ID_CHUNK = 200
+
+    def __init__(self, supabase_client):
+        self.supabase = supabase_client
+        self._rpc_available = True
+
+    def run(self) -> Dict[str, Any]:
+        changes = self.apply(datetime.now(timezone.utc))
+        if changes:
+            entitlement_cache.invalidate(*{change['user_id'] for change in changes})
+
+        expired = [change for change in changes if change['event'] == 'expired']
+        trials = [change for change in changes if change['event'] == 'trial']
+        notified = self._notify(expired, trials)
+        logger.info(f"Subscription expiry: {len(expired)} expired, {len(trials)} trial countdowns, {notified} notified")
+        return {
+            'rows_processed': len(changes),
+            'expired': len(expired),
+            'trial_updates': len(trials),
+            'notified': notified
+        }
+
+    def apply(self, now: datetime) -> List[Dict[str, Any]]:
+        if self._rpc_available:
+            try:
+                result = self.supabase.rpc(self.EXPIRY_RPC, {
+                    'p_free_limits': FREE_LIMITS,
+                    'p_now': now.isoformat()
+                }).execute()
+                return result.data or []
+            except Exception as e:
+                # Downgrades the RPC committed before a timeout would go unnotified if redone here
+                if not missing_function(e):
+                    raise
+                logger.warning(f"{self.EXPIRY_RPC} RPC not available, running bulk updates: {str(e)}")
+                self._rpc_available = False
+
+        return self._expire(now) + self._count_down_trials(now)
+
+    def _expire(self, now: datetime) -> List[Dict[str, Any]]:
+        """One users update for every lapsed plan, then one usage reset per feature"""
+        rows = self.supabase.table('users').update({
+            'subscription_plan': 'free',
+            'subscription_status': 'inactive',
+            'trial_days_left': 0,
+            'current_month_invoices': 0,
+            'current_month_expenses': 0,
+            'usage_reset_date': now.date().isoformat(),
+            'updated_at': now.isoformat()
+        }).lt('subscription_end_date', now.isoformat()).neq('subscription_plan', 'free').execute().data or []
+
+        # Usage is tracked on the owner's rows
+        owner_ids = [row['id'] for row in rows if not row.get('owner_id')]
+        for start in range(0, len(owner_ids), self.ID_CHUNK):
+            chunk = owner_ids[start:start + self.ID_CHUNK]
+            for feature_type, limit in FREE_LIMITS.items():
+                self.supabase.table('feature_usage').update({
+                    'current_count': 0,
+                    'limit_count': limit,
+                    'period_start': now.isoformat(),
+                    'period_end': (now + timedelta(days=30)).isoformat(),
+                    'updated_at': now.isoformat()
+                }).in_('user_id', chunk).eq('feature_type', feature_type).execute()
+
+        return [{'user_id': row['id'], 'owner_id': row.get('owner_id'), 'event': 'expired', 'days_left': 0}
+                for row in rows]
+
+    def _count_down_trials(self, now: datetime) -> List[Dict[str, Any]]:
+        """One update per possible days-left value: trials ending within (d - 1, d] days get d"""
+        changes = []
+        for days_left in range(1, MAX_TRIAL_DAYS + 1):
+            rows = self.supabase.table('users').update({
+                'trial_days_left': days_left,
+                'updated_at': now.isoformat()
+            }).eq('subscription_status', 'trial').gt(
+                'subscription_end_date', (now + timedelta(days=days_left - 1)).isoformat()
+            ).lte(
+                'subscription_end_date', (now + timedelta(days=days_left)).isoformat()
+            ).neq('trial_days_left', days_left).execute().data or []
+            changes.extend(
+                {'user_id': row['id'], 'owner_id': row.get('owner_id'), 'event': 'trial', 'days_left': days_left}
+                for row in rows
+            )
+        return changes
+
+    def _notify(self, expired: List[Dict[str, Any]], trials: List[Dict[str, Any]]) -> int:
+        """Expiry and trial reminder notifications in one bulk insert; returns how many were created"""
+        notifications = [(change['user_id'], NotificationData(
+            title='Subscription Expired',
+            message='Your subscription has expired. Upgrade to continue using premium features.',
+            type=NotificationType.SUBSCRIPTION_EXPIRY,
+            data={'days_remaining': 0, 'action_url': '/subscription/upgrade'},
+            navigation_url='/subscription/upgrade',
+            action_required=True,
+            priority='urgent'
+        )) for change in expired]
+
+        for change in trials:
+            days_left = change['days_left']
+            if days_left not in TRIAL_REMINDER_DAYS:
+                continue
+            notifications.append((change['user_id'], NotificationData(
+                title='Trial Ending Soon',
+                message=f"Your free trial ends in {days_left} day{'s' if days_left != 1 else ''}. Upgrade to keep your plan's limits.",
+                type=NotificationType.SUBSCRIPTION_EXPIRY,
+                data={'days_remaining': days_left, 'action_url': '/subscription/upgrade'},
+                navigation_url='/subscription/upgrade',
+                action_required=True,
+                priority='urgent' if days_left <= 1 else 'high'
+            )))
+
+        if not notifications:
+            return 0
+        try:
+            notification_ids = run_async(
+                NotificationService(self.supabase).create_notifications_bulk(notifications), timeout=None
+            )
+        except Exception as e:
+            # The downgrades are already committed; only the messages are lost
+            logger.error(f"Error sending subscription expiry notifications: {str(e)}")
+            return 0
+        return sum(1 for notification_id in notification_ids if notification_id)
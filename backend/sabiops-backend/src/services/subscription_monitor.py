@@ -4,19 +4,29 @@ Handles real-time subscription monitoring and automatic status updates
 """
 
 import logging
-import asyncio
 from datetime import datetime, timezone, timedelta
 from typing import Dict, Any, List, Optional
 from threading import Thread
 import time
 
+from .event_loop import run_async
+from .notification_service import NotificationService, NotificationData, NotificationType
+from .scheduler_lease import SchedulerLease, JobRunHistory
+
 logger = logging.getLogger(__name__)
 
 class SubscriptionMonitor:
-    """Service for monitoring and updating subscription statuses"""
+    """
+    Service for monitoring and updating subscription statuses.
+    Only the holder of the subscription_monitor lease runs the checks.
+    """
+    
+    LEASE_NAME = "subscription_monitor"
     
     def __init__(self, supabase_client):
         self.supabase = supabase_client
+        self.lease = SchedulerLease(supabase_client, self.LEASE_NAME)
+        self.job_runs = JobRunHistory(supabase_client, holder=self.lease.holder)
         self.logger = logging.getLogger(__name__)
         self.is_monitoring = False
         self.monitor_thread = None
@@ -29,6 +39,7 @@ class SubscriptionMonitor:
             return
             
         self.logger.info("Starting subscription monitoring service...")
+        self.lease.start()
         self.is_monitoring = True
         
         # Start monitoring in a separate thread
@@ -45,23 +56,13 @@ class SubscriptionMonitor:
         
         if self.monitor_thread and self.monitor_thread.is_alive():
             self.monitor_thread.join(timeout=10)
+        self.lease.stop()
             
     def _monitor_loop(self):
         """Main monitoring loop"""
         while self.is_monitoring:
             try:
-                # Check for expired subscriptions
-                expired_count = self.expire_old_subscriptions()
-                if expired_count > 0:
-                    self.logger.info(f"Expired {expired_count} subscriptions")
-                
-                # Check for expiring soon subscriptions
-                expiring_count = self.check_expiring_subscriptions()
-                if expiring_count > 0:
-                    self.logger.info(f"Found {expiring_count} subscriptions expiring soon")
-                
-                # Update subscription metrics
-                self.update_subscription_metrics()
+                self.run_once()
                 
                 # Sleep for the check interval
                 time.sleep(self.check_interval)
@@ -70,10 +71,294 @@ class SubscriptionMonitor:
                 self.logger.error(f"Error in subscription monitoring loop: {str(e)}")
                 time.sleep(60)  # Wait 1 minute before retrying on error
                 
+    def run_once(self) -> bool:
+        """Run a monitoring pass if this process holds the lease; returns whether it ran"""
+        if not self.lease.is_leader:
+            return False
+        self.run_checks()
+        return True
+    
+    def run_checks(self):
+        """One monitoring pass, recorded in job_runs"""
+        with self.job_runs.track(self.LEASE_NAME) as run:
+            # Check for expired subscriptions
+            expired_count = self.expire_old_subscriptions()
+            if expired_count > 0:
+                self.logger.info(f"Expired {expired_count} subscriptions")
+            
+            # Check for expiring soon subscriptions
+            expiring_count = self.check_expiring_subscriptions()
+            if expiring_count > 0:
+                self.logger.info(f"Found {expiring_count} subscriptions expiring soon")
+            
+            # Update subscription metrics
+            self.update_subscription_metrics()
+            
+            run['rows_processed'] = expired_count + expiring_count
+            run['details'] = {'expired': expired_count, 'expiring_soon': expiring_count}
+    
     def expire_old_subscriptions(self) -> int:
         """Find and expire old subscriptions"""
         try:
             now = datetime.now(timezone.utc)
             
             # Update expired subscriptions
-            result = self.supabase.table('user_subscriptions').update({\n                'status': 'expired',\n                'updated_at': now.isoformat()\n            }).eq('status', 'active').lt('end_date', now.isoformat()).execute()\n            \n            expired_count = len(result.data) if result.data else 0\n            \n            if expired_count > 0:\n                self.logger.info(f\"Marked {expired_count} subscriptions as expired\")\n                \n                # Send notifications for expired subscriptions\n                self._notify_expired_subscriptions(result.data)\n            \n            return expired_count\n            \n        except Exception as e:\n            self.logger.error(f\"Error expiring old subscriptions: {str(e)}\")\n            return 0\n    \n    def check_expiring_subscriptions(self) -> int:\n        \"\"\"Check for subscriptions expiring within 7 days\"\"\"\n        try:\n            now = datetime.now(timezone.utc)\n            warning_date = now + timedelta(days=7)\n            \n            # Find subscriptions expiring within 7 days\n            result = self.supabase.table('user_subscriptions').select(\n                'id, user_id, end_date, plan_id'\n            ).eq('status', 'active').gte(\n                'end_date', now.isoformat()\n            ).lte(\n                'end_date', warning_date.isoformat()\n            ).execute()\n            \n            expiring_subscriptions = result.data or []\n            \n            if expiring_subscriptions:\n                self.logger.info(f\"Found {len(expiring_subscriptions)} subscriptions expiring soon\")\n                \n                # Send expiring soon notifications\n                self._notify_expiring_subscriptions(expiring_subscriptions)\n            \n            return len(expiring_subscriptions)\n            \n        except Exception as e:\n            self.logger.error(f\"Error checking expiring subscriptions: {str(e)}\")\n            return 0\n    \n    def update_subscription_metrics(self):\n        \"\"\"Update subscription-related metrics\"\"\"\n        try:\n            # This could update analytics, usage statistics, etc.\n            # For now, just log that we're updating metrics\n            self.logger.debug(\"Updating subscription metrics...\")\n            \n        except Exception as e:\n            self.logger.error(f\"Error updating subscription metrics: {str(e)}\")\n    \n    def _notify_expired_subscriptions(self, expired_subscriptions: List[Dict]):\n        \"\"\"Send notifications for expired subscriptions\"\"\"\n        try:\n            for subscription in expired_subscriptions:\n                user_id = subscription.get('user_id')\n                if user_id:\n                    # Create notification record\n                    notification_data = {\n                        'user_id': user_id,\n                        'type': 'subscription_expired',\n                        'title': 'Subscription Expired',\n                        'message': 'Your subscription has expired. Upgrade to continue using premium features.',\n                        'data': {\n                            'subscription_id': subscription.get('id'),\n                            'action_url': '/subscription/upgrade'\n                        },\n                        'created_at': datetime.now(timezone.utc).isoformat()\n                    }\n                    \n                    self.supabase.table('notifications').insert(notification_data).execute()\n                    \n        except Exception as e:\n            self.logger.error(f\"Error sending expired subscription notifications: {str(e)}\")\n    \n    def _notify_expiring_subscriptions(self, expiring_subscriptions: List[Dict]):\n        \"\"\"Send notifications for subscriptions expiring soon\"\"\"\n        try:\n            for subscription in expiring_subscriptions:\n                user_id = subscription.get('user_id')\n                end_date = subscription.get('end_date')\n                \n                if user_id and end_date:\n                    # Calculate days remaining\n                    end_datetime = datetime.fromisoformat(end_date.replace('Z', '+00:00'))\n                    days_remaining = max(0, (end_datetime - datetime.now(timezone.utc)).days)\n                    \n                    # Create notification record\n                    notification_data = {\n                        'user_id': user_id,\n                        'type': 'subscription_expiring',\n                        'title': 'Subscription Expiring Soon',\n                        'message': f'Your subscription expires in {days_remaining} days. Renew now to avoid interruption.',\n                        'data': {\n                            'subscription_id': subscription.get('id'),\n                            'days_remaining': days_remaining,\n                            'action_url': '/subscription/renew'\n                        },\n                        'created_at': datetime.now(timezone.utc).isoformat()\n                    }\n                    \n                    self.supabase.table('notifications').insert(notification_data).execute()\n                    \n        except Exception as e:\n            self.logger.error(f\"Error sending expiring subscription notifications: {str(e)}\")\n    \n    def get_user_subscription_status(self, user_id: str) -> Dict[str, Any]:\n        \"\"\"Get real-time subscription status for a user\"\"\"\n        try:\n            # Get active subscription\n            subscription_result = self.supabase.table('user_subscriptions').select(\n                'id, plan_id, status, start_date, end_date, auto_renew, created_at, updated_at'\n            ).eq('user_id', user_id).eq('status', 'active').order(\n                'created_at', desc=True\n            ).limit(1).execute()\n            \n            if not subscription_result.data:\n                return self._get_free_plan_status(user_id)\n            \n            subscription = subscription_result.data[0]\n            \n            # Get plan details\n            plan_result = self.supabase.table('subscription_plans').select(\n                'id, name, price, billing_cycle, features, limits'\n            ).eq('id', subscription['plan_id']).single().execute()\n            \n            if not plan_result.data:\n                self.logger.error(f\"Plan not found: {subscription['plan_id']}\")\n                return self._get_free_plan_status(user_id)\n            \n            plan = plan_result.data\n            \n            # Calculate real-time days remaining\n            end_date = datetime.fromisoformat(subscription['end_date'].replace('Z', '+00:00'))\n            now = datetime.now(timezone.utc)\n            days_remaining = max(0, (end_date - now).days)\n            \n            # Check if subscription should be expired\n            is_expired = end_date < now\n            if is_expired and subscription['status'] == 'active':\n                # Auto-expire the subscription\n                self.supabase.table('user_subscriptions').update({\n                    'status': 'expired',\n                    'updated_at': now.isoformat()\n                }).eq('id', subscription['id']).execute()\n                \n                return self._get_free_plan_status(user_id)\n            \n            return {\n                'subscription_id': subscription['id'],\n                'plan_id': plan['id'],\n                'plan_name': plan['name'],\n                'status': subscription['status'],\n                'start_date': subscription['start_date'],\n                'end_date': subscription['end_date'],\n                'days_remaining': days_remaining,\n                'auto_renew': subscription['auto_renew'],\n                'price': plan['price'],\n                'billing_cycle': plan['billing_cycle'],\n                'features': plan['features'],\n                'limits': plan['limits'],\n                'is_expired': is_expired,\n                'is_expiring_soon': days_remaining <= 7 and days_remaining > 0,\n                'last_updated': now.isoformat()\n            }\n            \n        except Exception as e:\n            self.logger.error(f\"Error getting subscription status: {str(e)}\")\n            return self._get_free_plan_status(user_id)\n    \n    def _get_free_plan_status(self, user_id: str) -> Dict[str, Any]:\n        \"\"\"Get free plan status\"\"\"\n        now = datetime.now(timezone.utc)\n        \n        return {\n            'subscription_id': None,\n            'plan_id': 'free',\n            'plan_name': 'Free Plan',\n            'status': 'active',\n            'start_date': None,\n            'end_date': None,\n            'days_remaining': None,\n            'auto_renew': False,\n            'price': 0,\n            'billing_cycle': 'lifetime',\n            'features': ['Basic invoicing', 'Up to 10 products', 'Basic reporting'],\n            'limits': {\n                'invoices': 10,\n                'products': 10,\n                'customers': 25,\n                'sales': 50,\n                'storage_mb': 100\n            },\n            'is_expired': False,\n            'is_expiring_soon': False,\n            'last_updated': now.isoformat()\n        }\n    \n    def force_refresh_user_status(self, user_id: str) -> Dict[str, Any]:\n        \"\"\"Force refresh a user's subscription status\"\"\"\n        self.logger.info(f\"Force refreshing subscription status for user: {user_id}\")\n        return self.get_user_subscription_status(user_id)\n    \n    def get_monitoring_stats(self) -> Dict[str, Any]:\n        \"\"\"Get monitoring service statistics\"\"\"\n        try:\n            # Get subscription counts by status\n            active_result = self.supabase.table('user_subscriptions').select(\n                'id', count='exact'\n            ).eq('status', 'active').execute()\n            \n            expired_result = self.supabase.table('user_subscriptions').select(\n                'id', count='exact'\n            ).eq('status', 'expired').execute()\n            \n            cancelled_result = self.supabase.table('user_subscriptions').select(\n                'id', count='exact'\n            ).eq('status', 'cancelled').execute()\n            \n            return {\n                'is_monitoring': self.is_monitoring,\n                'check_interval': self.check_interval,\n                'subscription_counts': {\n                    'active': active_result.count or 0,\n                    'expired': expired_result.count or 0,\n                    'cancelled': cancelled_result.count or 0\n                },\n                'last_check': datetime.now(timezone.utc).isoformat()\n            }\n            \n        except Exception as e:\n            self.logger.error(f\"Error getting monitoring stats: {str(e)}\")\n            return {\n                'is_monitoring': self.is_monitoring,\n                'check_interval': self.check_interval,\n                'error': str(e)\n            }"
\ No newline at end of file
+            result = self.supabase.table('user_subscriptions').update({
+                'status': 'expired',
+                'updated_at': now.isoformat()
+            }).eq('status', 'active').lt('end_date', now.isoformat()).execute()
+            
+            expired_count = len(result.data) if result.data else 0
+            
+            if expired_count > 0:
+                self.logger.info(f"Marked {expired_count} subscriptions as expired")
+                
+                # Send notifications for expired subscriptions
+                self._notify_expired_subscriptions(result.data)
+            
+            return expired_count
+            
+        except Exception as e:
+            self.logger.error(f"Error expiring old subscriptions: {str(e)}")
+            return 0
+    
+    def check_expiring_subscriptions(self) -> int:
+        """Check for subscriptions expiring within 7 days"""
+        try:
+            now = datetime.now(timezone.utc)
+            warning_date = now + timedelta(days=7)
+            
+            # Find subscriptions expiring within 7 days
+            result = self.supabase.table('user_subscriptions').select(
+                'id, user_id, end_date, plan_id'
+            ).eq('status', 'active').gte(
+                'end_date', now.isoformat()
+            ).lte(
+                'end_date', warning_date.isoformat()
+            ).execute()
+            
+            expiring_subscriptions = result.data or []
+            
+            if expiring_subscriptions:
+                self.logger.info(f"Found {len(expiring_subscriptions)} subscriptions expiring soon")
+                
+                # Send expiring soon notifications
+                self._notify_expiring_subscriptions(expiring_subscriptions)
+            
+            return len(expiring_subscriptions)
+            
+        except Exception as e:
+            self.logger.error(f"Error checking expiring subscriptions: {str(e)}")
+            return 0
+    
+    def update_subscription_metrics(self):
+        """Update subscription-related metrics"""
+        try:
+            # This could update analytics, usage statistics, etc.
+            # For now, just log that we're updating metrics
+            self.logger.debug("Updating subscription metrics...")
+            
+        except Exception as e:
+            self.logger.error(f"Error updating subscription metrics: {str(e)}")
+    
+    def _notify_expired_subscriptions(self, expired_subscriptions: List[Dict]):
+        """Send notifications for expired subscriptions"""
+        try:
+            notifications = []
+            for subscription in expired_subscriptions:
+                user_id = subscription.get('user_id')
+                if user_id:
+                    notifications.append((user_id, NotificationData(
+                        title='Subscription Expired',
+                        message='Your subscription has expired. Upgrade to continue using premium features.',
+                        type=NotificationType.SUBSCRIPTION_EXPIRY,
+                        data={
+                            'subscription_id': subscription.get('id'),
+                            'days_remaining': 0,
+                            'action_url': '/subscription/upgrade'
+                        },
+                        navigation_url='/subscription/upgrade',
+                        action_required=True,
+                        priority='urgent'
+                    )))
+            
+            self._send_notifications(notifications)
+                    
+        except Exception as e:
+            self.logger.error(f"Error sending expired subscription notifications: {str(e)}")
+    
+    def _notify_expiring_subscriptions(self, expiring_subscriptions: List[Dict]):
+        """Send notifications for subscriptions expiring soon"""
+        try:
+            notifications = []
+            for subscription in expiring_subscriptions:
+                user_id = subscription.get('user_id')
+                end_date = subscription.get('end_date')
+                
+                if user_id and end_date:
+                    # Calculate days remaining
+                    end_datetime = datetime.fromisoformat(end_date.replace('Z', '+00:00'))
+                    days_remaining = max(0, (end_datetime - datetime.now(timezone.utc)).days)
+                    
+                    notifications.append((user_id, NotificationData(
+                        title='Subscription Expiring Soon',
+                        message=f'Your subscription expires in {days_remaining} days. Renew now to avoid interruption.',
+                        type=NotificationType.SUBSCRIPTION_EXPIRY,
+                        data={
+                            'subscription_id': subscription.get('id'),
+                            'days_remaining': days_remaining,
+                            'action_url': '/subscription/renew'
+                        },
+                        navigation_url='/subscription/renew',
+                        action_required=True,
+                        priority='urgent' if days_remaining <= 1 else 'high' if days_remaining <= 3 else 'medium'
+                    )))
+            
+            self._send_notifications(notifications)
+                    
+        except Exception as e:
+            self.logger.error(f"Error sending expiring subscription notifications: {str(e)}")
+    
+    def _send_notifications(self, notifications: List[tuple]):
+        """Insert all notifications in one statement and queue their pushes as one batch"""
+        if not notifications:
+            return
+        
+        notification_ids = run_async(
+            NotificationService(self.supabase).create_notifications_bulk(notifications), timeout=None
+        )
+        created = sum(1 for notification_id in notification_ids if notification_id)
+        self.logger.info(f"Sent {created} of {len(notifications)} subscription notifications")
+    
+    def get_user_subscription_status(self, user_id: str) -> Dict[str, Any]:
+        """Get real-time subscription status for a user"""
+        try:
+            # Get active subscription
+            subscription_result = self.supabase.table('user_subscriptions').select(
+                'id, plan_id, status, start_date, end_date, auto_renew, created_at, updated_at'
+            ).eq('user_id', user_id).eq('status', 'active').order(
+                'created_at', desc=True
+            ).limit(1).execute()
+            
+            if not subscription_result.data:
+                return self._get_free_plan_status(user_id)
+            
+            subscription = subscription_result.data[0]
+            
+            # Get plan details
+            plan_result = self.supabase.table('subscription_plans').select(
+                'id, name, price, billing_cycle, features, limits'
+            ).eq('id', subscription['plan_id']).single().execute()
+            
+            if not plan_result.data:
+                self.logger.error(f"Plan not found: {subscription['plan_id']}")
+                return self._get_free_plan_status(user_id)
+            
+            plan = plan_result.data
+            
+            # Calculate real-time days remaining
+            end_date = datetime.fromisoformat(subscription['end_date'].replace('Z', '+00:00'))
+            now = datetime.now(timezone.utc)
+            days_remaining = max(0, (end_date - now).days)
+            
+            # Check if subscription should be expired
+            is_expired = end_date < now
+            if is_expired and subscription['status'] == 'active':
+                # Auto-expire the subscription
+                self.supabase.table('user_subscriptions').update({
+                    'status': 'expired',
+                    'updated_at': now.isoformat()
+                }).eq('id', subscription['id']).execute()
+                
+                return self._get_free_plan_status(user_id)
+            
+            return {
+                'subscription_id': subscription['id'],
+                'plan_id': plan['id'],
+                'plan_name': plan['name'],
+                'status': subscription['status'],
+                'start_date': subscription['start_date'],
+                'end_date': subscription['end_date'],
+                'days_remaining': days_remaining,
+                'auto_renew': subscription['auto_renew'],
+                'price': plan['price'],
+                'billing_cycle': plan['billing_cycle'],
+                'features': plan['features'],
+                'limits': plan['limits'],
+                'is_expired': is_expired,
+                'is_expiring_soon': days_remaining <= 7 and days_remaining > 0,
+                'last_updated': now.isoformat()
+            }
+            
+        except Exception as e:
+            self.logger.error(f"Error getting subscription status: {str(e)}")
+            return self._get_free_plan_status(user_id)
+    
+    def _get_free_plan_status(self, user_id: str) -> Dict[str, Any]:
+        """Get free plan status"""
+        now = datetime.now(timezone.utc)
+        
+        return {
+            'subscription_id': None,
+            'plan_id': 'free',
+            'plan_name': 'Free Plan',
+            'status': 'active',
+            'start_date': None,
+            'end_date': None,
+            'days_remaining': None,
+            'auto_renew': False,
+            'price': 0,
+            'billing_cycle': 'lifetime',
+            'features': ['Basic invoicing', 'Up to 10 products', 'Basic reporting'],
+            'limits': {
+                'invoices': 10,
+                'products': 10,
+                'customers': 25,
+                'sales': 50,
+                'storage_mb': 100
+            },
+            'is_expired': False,
+            'is_expiring_soon': False,
+            'last_updated': now.isoformat()
+        }
+    
+    def force_refresh_user_status(self, user_id: str) -> Dict[str, Any]:
+        """Force refresh a user's subscription status"""
+        self.logger.info(f"Force refreshing subscription status for user: {user_id}")
+        return self.get_user_subscription_status(user_id)
+    
+    def get_monitoring_stats(self) -> Dict[str, Any]:
+        """Get monitoring service statistics"""
+        try:
+            # Get subscription counts by status
+            active_result = self.supabase.table('user_subscriptions').select(
+                'id', count='exact'
+            ).eq('status', 'active').execute()
+            
+            expired_result = self.supabase.table('user_subscriptions').select(
+                'id', count='exact'
+            ).eq('status', 'expired').execute()
+            
+            cancelled_result = self.supabase.table('user_subscriptions').select(
+                'id', count='exact'
+            ).eq('status', 'cancelled').execute()
+            
+            return {
+                'is_monitoring': self.is_monitoring,
+                'check_interval': self.check_interval,
+                'lease': self.lease.status(),
+                'subscription_counts': {
+                    'active': active_result.count or 0,
+                    'expired': expired_result.count or 0,
+                    'cancelled': cancelled_result.count or 0
+                },
+                'last_check': datetime.now(timezone.utc).isoformat()
+            }
+            
+        except Exception as e:
+            self.logger.error(f"Error getting monitoring stats: {str(e)}")
+            return {
+                'is_monitoring': self.is_monitoring,
+                'check_interval': self.check_interval,
+                'error': str(e)
+            }
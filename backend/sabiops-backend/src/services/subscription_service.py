@@ -10,12 +10,19 @@ from typing import Dict, Optional, Tuple, Any
 import logging
 from flask import current_app
 
+from .entitlements import FEATURE_LABELS, Entitlements, entitlement_cache
+from .usage_counter import usage_counter
+
 logger = logging.getLogger(__name__)
 
 class SubscriptionService:
     """Service for managing user subscriptions and payments"""
     
     PAYSTACK_BASE_URL = "https://api.paystack.co"
+    USAGE_STATUS_RPC = "get_owner_usage_status"
+    
+    # Shared by the per-request instances; cleared once the RPC is found missing
+    _usage_status_rpc_available = True
     
     # Plan configurations matching frontend PaystackService
     PLAN_CONFIGS = {
@@ -155,6 +162,56 @@ class SubscriptionService:
         """Legacy method - redirects to unified status for backward compatibility"""
         return self.get_unified_subscription_status(user_id)
 
+    def get_entitlements(self, user_id: str) -> Entitlements:
+        """Plan, status, limits and usage of the user's business, from the entitlement cache when fresh"""
+        owner_id = entitlement_cache.owner_of(user_id)
+        entitlements = entitlement_cache.get(owner_id) if owner_id else None
+        return entitlements or self._load_entitlements(user_id)
+
+    def _load_entitlements(self, user_id: str) -> Entitlements:
+        """Users row (plus the owner's for team members) and usage rows; no conflict repair writes"""
+        columns = 'id, owner_id, subscription_plan, subscription_status, subscription_end_date, trial_days_left'
+        user_result = self.supabase.table('users').select(columns).eq('id', user_id).single().execute()
+        if not user_result.data:
+            raise ValueError("User not found")
+        
+        user = user_result.data
+        owner_id = user.get('owner_id') or user_id
+        entitlement_cache.set_owner(user_id, owner_id)
+        cached = entitlement_cache.get(owner_id)
+        if cached:
+            return cached
+        version = entitlement_cache.version(owner_id)
+        
+        subscription_user = user
+        if owner_id != user_id:
+            owner_result = self.supabase.table('users').select(columns).eq('id', owner_id).execute()
+            # Fallback to user's own data if owner not found
+            subscription_user = owner_result.data[0] if owner_result.data else user
+        
+        usage_result = self.supabase.table('feature_usage').select('feature_type, current_count').eq('user_id', owner_id).execute()
+        
+        plan = subscription_user.get('subscription_plan') or 'free'
+        trial_days_left = subscription_user.get('trial_days_left') or 0
+        end_date = subscription_user.get('subscription_end_date')
+        remaining_days = self._calculate_remaining_days(plan, end_date, trial_days_left)
+        plan_config = self.PLAN_CONFIGS.get(plan, self.PLAN_CONFIGS['free'])
+        
+        entitlements = Entitlements(
+            owner_id=owner_id,
+            plan=plan,
+            status=self._determine_unified_status(
+                subscription_user.get('subscription_status', 'inactive'), trial_days_left, remaining_days, plan
+            ),
+            subscription_end_date=end_date,
+            trial_days_left=trial_days_left,
+            remaining_days=remaining_days,
+            limits=dict(plan_config['features']),
+            usage={row['feature_type']: row.get('current_count') or 0 for row in usage_result.data or []}
+        )
+        entitlement_cache.set(owner_id, entitlements, version)
+        return entitlements
+
     def resolve_subscription_conflicts(self, user_id: str) -> Dict[str, Any]:
         """Resolve conflicting subscription states using most recent database record"""
         try:
@@ -182,6 +239,7 @@ class SubscriptionService:
                         'updated_at': current_time.isoformat()
                     }).eq('id', user_id).execute()
                     
+                    entitlement_cache.invalidate(user_id)
                     logger.info(f"Resolved expired subscription conflict for user {user_id}")
             
             # Check for trial conflicts
@@ -192,6 +250,7 @@ class SubscriptionService:
                     'updated_at': current_time.isoformat()
                 }).eq('id', user_id).execute()
                 
+                entitlement_cache.invalidate(user_id)
                 logger.info(f"Resolved trial status conflict for user {user_id}")
             
             # Check for multiple active subscriptions (shouldn't happen but just in case)
@@ -412,6 +471,7 @@ class SubscriptionService:
             try:
                 # Update user subscription
                 self.supabase.table('users').update(update_data).eq('id', user_id).execute()
+                entitlement_cache.invalidate(user_id)
                 
                 # Record transaction
                 self.supabase.table('subscription_transactions').insert(transaction_data).execute()
@@ -422,21 +482,14 @@ class SubscriptionService:
                 
                 logger.info(f"Successfully upgraded user {user_id} to {plan_id} plan")
                 
-                # Generate new JWT token with updated subscription info
-                from flask import current_app
-                from flask_jwt_extended import create_access_token
-                
-                # Create a new token with updated subscription info
-                identity = {
-                    'id': user_id,
-                    'subscription_plan': plan_id,
-                    'subscription_status': subscription_status,
-                    'subscription_end_date': end_date.isoformat(),
-                    'is_trial': is_trial,
-                    'trial_days_left': 0
-                }
-                
-                access_token = create_access_token(identity=identity)
+                # New access token whose entitlement claims carry the upgraded plan
+                from src.utils.auth_claims import issue_tokens_for
+                try:
+                    access_token = issue_tokens_for(user_id)['access_token']
+                except Exception as e:
+                    # The upgrade stands; the client picks up the claims at its next refresh
+                    logger.warning(f"Could not re-issue token after upgrade for {user_id}: {e}")
+                    access_token = None
                 
                 return {
                     'success': True,
@@ -508,6 +561,7 @@ class SubscriptionService:
             
             if not user_result.data:
                 raise Exception("Failed to update user subscription")
+            entitlement_cache.invalidate(user_id)
             
             logger.info(f"Successfully downgraded user {user_id} to {new_plan_id}")
             
@@ -541,6 +595,7 @@ class SubscriptionService:
             
             if not result.data:
                 raise Exception("Failed to activate trial")
+            entitlement_cache.invalidate(user_id)
             
             # Initialize usage counters for trial
             self._reset_usage_counters(user_id, 'weekly')
@@ -558,37 +613,10 @@ class SubscriptionService:
             raise
     
     def check_and_update_expired_subscriptions(self) -> int:
-        """Check for expired subscriptions and downgrade to free plan"""
+        """Downgrade every lapsed plan to free and count down trials in one set-based pass; returns how many expired"""
+        from .subscription_expiry import SubscriptionExpiry
         try:
-            current_time = datetime.now()
-            
-            # Find expired subscriptions
-            expired_users = self.supabase.table('users').select('*').lt(
-                'subscription_end_date', current_time.isoformat()
-            ).neq('subscription_plan', 'free').execute()
-            
-            count = 0
-            for user in expired_users.data:
-                try:
-                    # Downgrade to free plan
-                    self.supabase.table('users').update({
-                        'subscription_plan': 'free',
-                        'subscription_status': 'inactive',
-                        'trial_days_left': 0,
-                        'updated_at': current_time.isoformat()
-                    }).eq('id', user['id']).execute()
-                    
-                    # Reset usage counters to free plan limits
-                    self._reset_usage_counters(user['id'], 'free')
-                    
-                    count += 1
-                    logger.info(f"Downgraded expired subscription for user {user['id']}")
-                    
-                except Exception as e:
-                    logger.error(f"Failed to downgrade user {user['id']}: {str(e)}")
-            
-            return count
-            
+            return SubscriptionExpiry(self.supabase).run()['expired']
         except Exception as e:
             logger.error(f"Error checking expired subscriptions: {str(e)}")
             return 0
@@ -661,150 +689,6 @@ class SubscriptionService:
         
         return start_date + timedelta(days=plan_config['duration_days'])
     
-    def get_accurate_usage_counts(self, user_id: str) -> Dict[str, Any]:
-        """Get accurate usage counts directly from database tables"""
-        try:
-            # Get the business owner ID (if user is team member, get their owner's ID)
-            business_owner_id = self._get_business_owner_id(user_id)
-            
-            # Get actual counts from database tables
-            actual_counts = self._get_actual_database_counts(business_owner_id)
-            
-            # Get current tracked counts from feature_usage table
-            usage_result = self.supabase.table('feature_usage').select('*').eq('user_id', business_owner_id).execute()
-            
-            usage_counts = {}
-            discrepancies = []
-            
-            for feature_type, actual_count in actual_counts.items():
-                # Find tracked count for this feature
-                tracked_record = next((u for u in usage_result.data if u['feature_type'] == feature_type), None)
-                
-                if tracked_record:
-                    tracked_count = tracked_record['current_count']
-                    limit_count = tracked_record['limit_count']
-                else:
-                    # No tracking record exists, create one
-                    subscription_status = self.get_unified_subscription_status(business_owner_id)
-                    plan_config = subscription_status['plan_config']
-                    limit_count = plan_config['features'].get(feature_type, 0)
-                    tracked_count = 0
-                    
-                    # Create new usage record
-                    current_time = datetime.now()
-                    new_usage = {
-                        'user_id': business_owner_id,
-                        'feature_type': feature_type,
-                        'current_count': actual_count,
-                        'limit_count': limit_count,
-                        'period_start': current_time.isoformat(),
-                        'period_end': (current_time + timedelta(days=30)).isoformat(),
-                        'created_at': current_time.isoformat(),
-                        'updated_at': current_time.isoformat()
-                    }
-                    self.supabase.table('feature_usage').insert(new_usage).execute()
-                    tracked_count = actual_count
-                
-                usage_counts[feature_type] = {
-                    'current_count': actual_count,  # Use actual count from database
-                    'limit_count': limit_count,
-                    'remaining': max(0, limit_count - actual_count),
-                    'percentage_used': (actual_count / limit_count * 100) if limit_count > 0 else 0
-                }
-                
-                # Check for discrepancies
-                if tracked_count != actual_count:
-                    discrepancies.append({
-                        'feature_type': feature_type,
-                        'tracked_count': tracked_count,
-                        'actual_count': actual_count,
-                        'difference': actual_count - tracked_count
-                    })
-            
-            return {
-                'user_id': user_id,
-                'business_owner_id': business_owner_id,
-                'usage_counts': usage_counts,
-                'actual_counts': actual_counts,
-                'discrepancies': discrepancies,
-                'has_discrepancies': len(discrepancies) > 0,
-                'last_updated': datetime.now().isoformat()
-            }
-            
-        except Exception as e:
-            logger.error(f"Error getting accurate usage counts for user {user_id}: {str(e)}")
-            raise
-
-    def _get_actual_database_counts(self, user_id: str) -> Dict[str, int]:
-        """Get actual counts from database tables for business owner (includes all team member activities)"""
-        try:
-            # Get the business owner ID (if user is team member, get their owner's ID)
-            business_owner_id = self._get_business_owner_id(user_id)
-            
-            counts = {}
-            
-            # Count invoices for the entire business (owner + team members)
-            invoice_result = self.supabase.table('invoices').select('id', count='exact').eq('owner_id', business_owner_id).execute()
-            counts['invoices'] = invoice_result.count or 0
-            
-            # Count expenses for the entire business
-            expense_result = self.supabase.table('expenses').select('id', count='exact').eq('owner_id', business_owner_id).execute()
-            counts['expenses'] = expense_result.count or 0
-            
-            # Count sales for the entire business
-            sales_result = self.supabase.table('sales').select('id', count='exact').eq('owner_id', business_owner_id).execute()
-            counts['sales'] = sales_result.count or 0
-            
-            # Count products for the entire business
-            products_result = self.supabase.table('products').select('id', count='exact').eq('owner_id', business_owner_id).execute()
-            counts['products'] = products_result.count or 0
-            
-            return counts
-            
-        except Exception as e:
-            logger.error(f"Error getting actual database counts for user {user_id}: {str(e)}")
-            return {}
-
-    def _get_business_owner_id(self, user_id: str) -> str:
-        """Get the business owner ID for a user (returns user_id if they are the owner)"""
-        try:
-            user_result = self.supabase.table('users').select('owner_id, role').eq('id', user_id).single().execute()
-            
-            if not user_result.data:
-                return user_id
-            
-            # If user has owner_id, they are a team member - return the owner's ID
-            if user_result.data.get('owner_id'):
-                return user_result.data['owner_id']
-            
-            # If user has no owner_id, they are the owner themselves
-            return user_id
-            
-        except Exception as e:
-            logger.error(f"Error getting business owner ID for user {user_id}: {str(e)}")
-            return user_id
-
-    def usage_abuse_detection(self, user_id: str) -> Dict[str, Any]:
-        """Simple abuse detection - always allow for now"""
-        try:
-            # For now, always allow payments
-            # In the future, this could check for:
-            # - Multiple rapid payment attempts
-            # - Suspicious usage patterns
-            # - Blacklisted users
-            return {
-                'requires_manual_review': False,
-                'risk_score': 0,
-                'message': 'Payment approved'
-            }
-        except Exception as e:
-            logger.error(f"Error in abuse detection for user {user_id}: {str(e)}")
-            return {
-                'requires_manual_review': False,
-                'risk_score': 0,
-                'message': 'Abuse detection failed, allowing payment'
-            }
-
     def _reset_usage_limits(self, user_id: str, plan_id: str):
         """Reset usage limits for new plan"""
         try:
@@ -827,96 +711,97 @@ class SubscriptionService:
                 except Exception as e:
                     logger.error(f"Failed to reset {feature_type} usage for user {user_id}: {str(e)}")
             
+            entitlement_cache.invalidate(user_id)
             logger.info(f"Reset usage limits for user {user_id} on plan {plan_id}")
             
         except Exception as e:
             logger.error(f"Error resetting usage limits for user {user_id}: {str(e)}")
 
-    def _reset_usage_counters(self, user_id: str, plan_id: str):
-        """Reset usage counters for new plan limits"""
-        try:
-            plan_config = self.PLAN_CONFIGS.get(plan_id, self.PLAN_CONFIGS['free'])
-            current_time = datetime.now()
-            
-            # Calculate period based on plan
-            if plan_id == 'weekly':
-                period_start = current_time.replace(hour=0, minute=0, second=0, microsecond=0)
-                period_end = period_start + timedelta(days=7)
-            elif plan_id == 'yearly':
-                period_start = current_time.replace(month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
-                period_end = period_start.replace(year=period_start.year + 1)
-            else:  # monthly or free
-                period_start = current_time.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-                if period_start.month == 12:
-                    period_end = period_start.replace(year=period_start.year + 1, month=1)
-                else:
-                    period_end = period_start.replace(month=period_start.month + 1)
-            
-            # Delete existing usage records for this user
-            self.supabase.table('feature_usage').delete().eq('user_id', user_id).execute()
-            
-            # Create new usage records with reset counters
-            for feature_type, limit in plan_config['features'].items():
-                usage_data = {
-                    'user_id': user_id,
-                    'feature_type': feature_type,
-                    'current_count': 0,
-                    'limit_count': limit,
-                    'period_start': period_start.isoformat(),
-                    'period_end': period_end.isoformat(),
-                    'created_at': current_time.isoformat(),
-                    'updated_at': current_time.isoformat()
-                }
-                
-                self.supabase.table('feature_usage').insert(usage_data).execute()
-            
-            # Update user table counters for backward compatibility
-            self.supabase.table('users').update({
-                'current_month_invoices': 0,
-                'current_month_expenses': 0,
-                'usage_reset_date': current_time.date().isoformat(),
-                'updated_at': current_time.isoformat()
-            }).eq('id', user_id).execute()
-            
-            logger.info(f"Reset usage counters for user {user_id} with plan {plan_id}")
-            
-        except Exception as e:
-            logger.error(f"Error resetting usage counters for user {user_id}: {str(e)}")
-            raise
-
     # Usage Tracking Service Methods
+    def get_usage_status(self, user_id: str, fresh: bool = False) -> Dict[str, Dict[str, Any]]:
+        """
+        Tracked count, actual record count, plan limit, period and sync state of
+        every tracked feature for the user's business, from one
+        get_owner_usage_status call. Cached with the owner's entitlement
+        snapshot; fresh=True reads through (sync and validation).
+        """
+        entitlements = self.get_entitlements(user_id)
+        owner_id = entitlements.owner_id
+        if not fresh:
+            cached = entitlement_cache.get_usage_status(owner_id)
+            if cached is not None:
+                return cached
+        
+        version = entitlement_cache.version(owner_id)
+        rows = self._fetch_usage_status(owner_id)
+        
+        usage_status = {}
+        for feature_type, limit in entitlements.limits.items():
+            row = rows.get(feature_type) or {}
+            usage_status[feature_type] = {
+                'tracked': bool(row.get('tracked')),
+                'current_count': row.get('current_count') or 0,
+                'actual_count': row.get('actual_count') or 0,
+                'limit_count': limit,
+                'period_start': row.get('period_start'),
+                'period_end': row.get('period_end'),
+                'sync_status': row.get('sync_status'),
+                'last_synced_at': row.get('last_synced_at')
+            }
+        entitlement_cache.set_usage_status(owner_id, usage_status, version)
+        return usage_status
+
+    def _fetch_usage_status(self, owner_id: str) -> Dict[str, Dict[str, Any]]:
+        """get_owner_usage_status RPC (migration 021), else the usage rows plus one count per feature table"""
+        if SubscriptionService._usage_status_rpc_available:
+            try:
+                result = self.supabase.rpc(self.USAGE_STATUS_RPC, {'p_owner_id': owner_id}).execute()
+                if isinstance(result.data, dict):
+                    return result.data
+                raise RuntimeError(f"unexpected result {result.data!r}")
+            except Exception as e:
+                logger.warning(f"{self.USAGE_STATUS_RPC} RPC not available, counting per table: {str(e)}")
+                SubscriptionService._usage_status_rpc_available = False
+        
+        rows = {}
+        usage_result = self.supabase.table('feature_usage').select('*').eq('user_id', owner_id).order('period_end', desc=True).execute()
+        for usage_record in usage_result.data or []:
+            # Newest period wins
+            rows.setdefault(usage_record['feature_type'], dict(usage_record, tracked=True))
+        
+        # Feature types are named after the tables they count (owner + team members)
+        for feature_type in self.PLAN_CONFIGS['free']['features']:
+            count_result = self.supabase.table(feature_type).select('id', count='exact').eq('owner_id', owner_id).execute()
+            rows.setdefault(feature_type, {})['actual_count'] = count_result.count or 0
+        return rows
+
     def get_accurate_usage_counts(self, user_id: str) -> Dict[str, Any]:
-        """Query database directly for accurate usage counts (business-wide for all roles)"""
+        """Tracked usage against plan limits, with actual counts and discrepancies (business-wide for all roles)"""
         try:
-            # Get the business owner ID to ensure we track usage business-wide
+            usage_status = self.get_usage_status(user_id)
+            # Resolved by the status read; no extra lookup
             business_owner_id = self._get_business_owner_id(user_id)
             
-            # Get current usage from feature_usage table (always use business owner's records)
-            usage_result = self.supabase.table('feature_usage').select('*').eq('user_id', business_owner_id).execute()
-            
             usage_counts = {}
-            for usage_record in usage_result.data:
-                feature_type = usage_record['feature_type']
-                usage_counts[feature_type] = {
-                    'current_count': usage_record['current_count'],
-                    'limit_count': usage_record['limit_count'],
-                    'remaining': max(0, usage_record['limit_count'] - usage_record['current_count']),
-                    'percentage_used': (usage_record['current_count'] / usage_record['limit_count'] * 100) if usage_record['limit_count'] > 0 else 0
-                }
-            
-            # Get actual counts from database tables for verification (business-wide)
-            actual_counts = self._get_actual_database_counts(user_id)
-            
-            # Compare and flag discrepancies
+            actual_counts = {}
             discrepancies = {}
-            for feature_type, actual_count in actual_counts.items():
-                if feature_type in usage_counts:
-                    tracked_count = usage_counts[feature_type]['current_count']
-                    if tracked_count != actual_count:
+            for feature_type, usage in usage_status.items():
+                tracked_count = usage['current_count']
+                limit_count = usage['limit_count']
+                actual_counts[feature_type] = usage['actual_count']
+                if usage['tracked']:
+                    usage_counts[feature_type] = {
+                        'current_count': tracked_count,
+                        'limit_count': limit_count,
+                        'remaining': max(0, limit_count - tracked_count),
+                        'percentage_used': (tracked_count / limit_count * 100) if limit_count > 0 else 0
+                    }
+                    # Compare and flag discrepancies
+                    if tracked_count != usage['actual_count']:
                         discrepancies[feature_type] = {
                             'tracked': tracked_count,
-                            'actual': actual_count,
-                            'difference': actual_count - tracked_count
+                            'actual': usage['actual_count'],
+                            'difference': usage['actual_count'] - tracked_count
                         }
             
             return {
@@ -934,116 +819,53 @@ class SubscriptionService:
             raise
 
     def increment_usage_atomic(self, user_id: str, feature_type: str, amount: int = 1) -> Dict[str, Any]:
-        """Atomically increment usage with database transaction and retry logic (business-wide tracking)"""
-        max_retries = 3
-        retry_count = 0
-        
-        # Always use business owner ID for usage tracking
-        business_owner_id = self._get_business_owner_id(user_id)
+        """Atomically increment business-wide usage (one increment_feature_usage_checked call)"""
+        # Always use business owner ID for usage tracking; owner and limit come from the cached snapshot
+        entitlements = self.get_entitlements(user_id)
+        business_owner_id = entitlements.owner_id
         
-        while retry_count < max_retries:
+        try:
+            result = usage_counter.increment(
+                self.supabase, business_owner_id, feature_type, amount,
+                limit=entitlements.limits.get(feature_type, 0)
+            )
+        except Exception as e:
+            # Not retried: a call that timed out may have committed, and a retry
+            # would count the same use twice. sync_usage_counts recounts the row.
+            logger.error(f"Usage increment failed for user {user_id} (business owner: {business_owner_id}), feature {feature_type}: {str(e)}")
             try:
-                # Start transaction-like operation
-                current_time = datetime.now()
-                
-                # Get current usage record (always for business owner)
-                usage_result = self.supabase.table('feature_usage').select('*').eq(
-                    'user_id', business_owner_id
-                ).eq('feature_type', feature_type).single().execute()
-                
-                if not usage_result.data:
-                    # Create new usage record if doesn't exist
-                    user_subscription = self.get_unified_subscription_status(business_owner_id)
-                    plan_config = user_subscription['plan_config']
-                    limit_count = plan_config['features'].get(feature_type, 0)
-                    
-                    new_usage = {
-                        'user_id': business_owner_id,
-                        'feature_type': feature_type,
-                        'current_count': amount,
-                        'limit_count': limit_count,
-                        'period_start': current_time.isoformat(),
-                        'period_end': (current_time + timedelta(days=30)).isoformat(),
-                        'created_at': current_time.isoformat(),
-                        'updated_at': current_time.isoformat(),
-                        'sync_status': 'synced',
-                        'last_synced_at': current_time.isoformat()
-                    }
-                    
-                    result = self.supabase.table('feature_usage').insert(new_usage).execute()
-                    
-                    return {
-                        'success': True,
-                        'new_count': amount,
-                        'limit': limit_count,
-                        'remaining': max(0, limit_count - amount),
-                        'created_new_record': True,
-                        'business_owner_id': business_owner_id
-                    }
-                
-                # Update existing record
-                current_count = usage_result.data['current_count']
-                new_count = current_count + amount
-                
-                update_result = self.supabase.table('feature_usage').update({
-                    'current_count': new_count,
-                    'updated_at': current_time.isoformat(),
-                    'last_synced_at': current_time.isoformat(),
-                    'sync_status': 'synced'
+                self.supabase.table('feature_usage').update({
+                    'sync_status': 'out_of_sync'
                 }).eq('user_id', business_owner_id).eq('feature_type', feature_type).execute()
-                
-                if update_result.data:
-                    limit_count = usage_result.data['limit_count']
-                    return {
-                        'success': True,
-                        'new_count': new_count,
-                        'limit': limit_count,
-                        'remaining': max(0, limit_count - new_count),
-                        'incremented_by': amount,
-                        'business_owner_id': business_owner_id
-                    }
-                else:
-                    raise Exception("Failed to update usage count")
-                
-            except Exception as e:
-                retry_count += 1
-                logger.warning(f"Usage increment attempt {retry_count} failed for user {user_id} (business owner: {business_owner_id}), feature {feature_type}: {str(e)}")
-                
-                if retry_count >= max_retries:
-                    logger.error(f"Usage increment failed after {max_retries} attempts for user {user_id}, feature {feature_type}")
-                    # Mark as out of sync
-                    try:
-                        self.supabase.table('feature_usage').update({
-                            'sync_status': 'out_of_sync',
-                            'discrepancy_count': self.supabase.table('feature_usage').select('discrepancy_count').eq('user_id', business_owner_id).eq('feature_type', feature_type).single().execute().data.get('discrepancy_count', 0) + 1
-                        }).eq('user_id', business_owner_id).eq('feature_type', feature_type).execute()
-                    except:
-                        pass
-                    
-                    raise Exception(f"Failed to increment usage after {max_retries} attempts: {str(e)}")
-                
-                # Wait before retry
-                import time
-                time.sleep(0.1 * retry_count)
+            except Exception:
+                pass
+            raise Exception(f"Failed to increment usage: {str(e)}")
+        
+        entitlement_cache.add_usage(business_owner_id, feature_type, amount)
+        return {
+            'success': True,
+            'new_count': result['current_count'],
+            'limit': result['limit_count'],
+            'remaining': max(0, result['limit_count'] - result['current_count']),
+            'incremented_by': amount,
+            'business_owner_id': business_owner_id
+        }
 
     def sync_usage_counts(self, user_id: str) -> Dict[str, Any]:
         """Sync cached counts with database reality"""
         try:
-            # Get actual counts from database
-            actual_counts = self._get_actual_database_counts(user_id)
-            
-            # Get current tracked counts
-            usage_result = self.supabase.table('feature_usage').select('*').eq('user_id', user_id).execute()
+            # Tracked and actual counts in one read, bypassing the cache
+            usage_status = self.get_usage_status(user_id, fresh=True)
+            business_owner_id = self._get_business_owner_id(user_id)
             
             synced_features = []
             current_time = datetime.now()
             
-            for usage_record in usage_result.data:
-                feature_type = usage_record['feature_type']
-                tracked_count = usage_record['current_count']
-                actual_count = actual_counts.get(feature_type, 0)
+            for feature_type, usage in usage_status.items():
+                tracked_count = usage['current_count']
+                actual_count = usage['actual_count']
                 
-                if tracked_count != actual_count:
+                if usage['tracked'] and tracked_count != actual_count:
                     # Sync the count
                     self.supabase.table('feature_usage').update({
                         'current_count': actual_count,
@@ -1051,7 +873,7 @@ class SubscriptionService:
                         'last_synced_at': current_time.isoformat(),
                         'sync_status': 'synced',
                         'discrepancy_count': 0
-                    }).eq('user_id', user_id).eq('feature_type', feature_type).execute()
+                    }).eq('user_id', business_owner_id).eq('feature_type', feature_type).execute()
                     
                     synced_features.append({
                         'feature_type': feature_type,
@@ -1060,6 +882,9 @@ class SubscriptionService:
                         'difference': actual_count - tracked_count
                     })
             
+            if synced_features:
+                entitlement_cache.invalidate(business_owner_id)
+            
             return {
                 'success': True,
                 'synced_features': synced_features,
@@ -1074,19 +899,17 @@ class SubscriptionService:
     def validate_usage_consistency(self, user_id: str) -> Dict[str, Any]:
         """Check for and report usage count discrepancies"""
         try:
-            # Get tracked counts
-            usage_result = self.supabase.table('feature_usage').select('*').eq('user_id', user_id).execute()
-            
-            # Get actual counts
-            actual_counts = self._get_actual_database_counts(user_id)
+            # Tracked and actual counts in one read, bypassing the cache
+            usage_status = self.get_usage_status(user_id, fresh=True)
             
             discrepancies = []
             consistent_features = []
             
-            for usage_record in usage_result.data:
-                feature_type = usage_record['feature_type']
-                tracked_count = usage_record['current_count']
-                actual_count = actual_counts.get(feature_type, 0)
+            for feature_type, usage in usage_status.items():
+                if not usage['tracked']:
+                    continue
+                tracked_count = usage['current_count']
+                actual_count = usage['actual_count']
                 
                 if tracked_count != actual_count:
                     discrepancies.append({
@@ -1095,8 +918,8 @@ class SubscriptionService:
                         'actual_count': actual_count,
                         'difference': actual_count - tracked_count,
                         'percentage_error': ((abs(actual_count - tracked_count) / max(actual_count, 1)) * 100),
-                        'last_synced': usage_record.get('last_synced_at'),
-                        'sync_status': usage_record.get('sync_status', 'unknown')
+                        'last_synced': usage['last_synced_at'],
+                        'sync_status': usage['sync_status'] or 'unknown'
                     })
                 else:
                     consistent_features.append(feature_type)
@@ -1118,35 +941,16 @@ class SubscriptionService:
     def _get_actual_database_counts(self, user_id: str) -> Dict[str, int]:
         """Get actual counts from database tables for business owner (includes all team member activities)"""
         try:
-            # Get the business owner ID (if user is team member, get their owner's ID)
-            business_owner_id = self._get_business_owner_id(user_id)
-            
-            counts = {}
-            
-            # Count invoices for the entire business (owner + team members)
-            invoice_result = self.supabase.table('invoices').select('id', count='exact').eq('owner_id', business_owner_id).execute()
-            counts['invoices'] = invoice_result.count or 0
-            
-            # Count expenses for the entire business
-            expense_result = self.supabase.table('expenses').select('id', count='exact').eq('owner_id', business_owner_id).execute()
-            counts['expenses'] = expense_result.count or 0
-            
-            # Count sales for the entire business
-            sales_result = self.supabase.table('sales').select('id', count='exact').eq('owner_id', business_owner_id).execute()
-            counts['sales'] = sales_result.count or 0
-            
-            # Count products for the entire business
-            products_result = self.supabase.table('products').select('id', count='exact').eq('owner_id', business_owner_id).execute()
-            counts['products'] = products_result.count or 0
-            
-            return counts
-            
+            return {feature_type: usage['actual_count'] for feature_type, usage in self.get_usage_status(user_id).items()}
         except Exception as e:
             logger.error(f"Error getting actual database counts for user {user_id}: {str(e)}")
             return {}
 
     def _get_business_owner_id(self, user_id: str) -> str:
         """Get the business owner ID for a user (returns user_id if they are the owner)"""
+        owner_id = entitlement_cache.owner_of(user_id)
+        if owner_id:
+            return owner_id
         try:
             user_result = self.supabase.table('users').select('owner_id, role').eq('id', user_id).single().execute()
             
@@ -1154,11 +958,9 @@ class SubscriptionService:
                 return user_id
             
             # If user has owner_id, they are a team member - return the owner's ID
-            if user_result.data.get('owner_id'):
-                return user_result.data['owner_id']
-            
-            # If user has no owner_id, they are the owner themselves
-            return user_id
+            owner_id = user_result.data.get('owner_id') or user_id
+            entitlement_cache.set_owner(user_id, owner_id)
+            return owner_id
             
         except Exception as e:
             logger.error(f"Error getting business owner ID for user {user_id}: {str(e)}")
@@ -1415,6 +1217,7 @@ class SubscriptionService:
                     }
                     self.supabase.table('feature_usage').insert(new_usage).execute()
             
+            entitlement_cache.invalidate(user_id)
             return {
                 'success': True,
                 'new_limits': plan_config['features'],
@@ -1493,406 +1296,43 @@ class SubscriptionService:
     
     def can_create_invoice(self, user_id: str) -> Tuple[bool, Dict[str, Any]]:
         """Check if user can create invoices based on subscription limits"""
-        try:
-            subscription_status = self.get_unified_subscription_status(user_id)
-            if not subscription_status:
-                return False, {
-                    'message': 'Unable to verify subscription status',
-                    'upgrade_required': True
-                }
-            
-            current_plan = subscription_status.get('subscription_plan', 'free')
-            plan_config = self.PLAN_CONFIGS.get(current_plan, self.PLAN_CONFIGS['free'])
-            
-            # Get current usage
-            usage_data = self.get_accurate_usage_counts(user_id)
-            usage_counts = usage_data.get('usage_counts', {})
-            current_invoices = usage_counts.get('invoices', {}).get('current_count', 0)
-            invoice_limit = plan_config['features']['invoices']
-            
-            if current_invoices >= invoice_limit:
-                return False, {
-                    'message': f'Invoice limit reached ({current_invoices}/{invoice_limit})',
-                    'current_usage': current_invoices,
-                    'limit': invoice_limit,
-                    'upgrade_required': True,
-                    'current_plan': current_plan
-                }
-            
-            return True, {
-                'message': 'Invoice creation allowed',
-                'current_usage': current_invoices,
-                'limit': invoice_limit,
-                'remaining': invoice_limit - current_invoices
-            }
-            
-        except Exception as e:
-            logger.error(f"Error checking invoice creation permission for user {user_id}: {str(e)}")
-            return False, {
-                'message': 'Error checking invoice creation permission',
-                'error': str(e),
-                'upgrade_required': True
-            }
-    
-    def get_usage_limits(self, user_id: str) -> Dict[str, Any]:
-        """Get current usage limits for user's subscription plan"""
-        try:
-            subscription_status = self.get_unified_subscription_status(user_id)
-            if not subscription_status:
-                return {
-                    'error': 'Unable to verify subscription status'
-                }
-            
-            current_plan = subscription_status.get('subscription_plan', 'free')
-            plan_config = self.PLAN_CONFIGS.get(current_plan, self.PLAN_CONFIGS['free'])
-            
-            # Get current usage
-            usage_counts = self.get_accurate_usage_counts(user_id)
-            
-            limits = {}
-            for feature, limit in plan_config['features'].items():
-                current_usage = usage_counts.get(feature, 0)
-                limits[feature] = {
-                    'limit': limit,
-                    'current': current_usage,
-                    'remaining': max(0, limit - current_usage),
-                    'percentage_used': (current_usage / limit * 100) if limit > 0 else 0
-                }
-            
-            return {
-                'plan': current_plan,
-                'limits': limits,
-                'is_trial': subscription_status.get('is_trial', False),
-                'trial_days_left': subscription_status.get('trial_days_left', 0)
-            }
-            
-        except Exception as e:
-            logger.error(f"Error getting usage limits for user {user_id}: {str(e)}")
-            return {
-                'error': str(e),
-                'plan': 'unknown',
-                'limits': {}
-            }
+        return self._can_create(user_id, 'invoices')
     
     def can_create_product(self, user_id: str) -> Tuple[bool, Dict[str, Any]]:
         """Check if user can create products based on subscription limits"""
-        try:
-            subscription_status = self.get_unified_subscription_status(user_id)
-            if not subscription_status:
-                return False, {
-                    'message': 'Unable to verify subscription status',
-                    'upgrade_required': True
-                }
-            
-            current_plan = subscription_status.get('subscription_plan', 'free')
-            plan_config = self.PLAN_CONFIGS.get(current_plan, self.PLAN_CONFIGS['free'])
-            
-            # Get current usage
-            usage_counts = self.get_accurate_usage_counts(user_id)
-            current_products = usage_counts.get('products', 0)
-            product_limit = plan_config['features']['products']
-            
-            if current_products >= product_limit:
-                return False, {
-                    'message': f'Product limit reached ({current_products}/{product_limit})',
-                    'current_usage': current_products,
-                    'limit': product_limit,
-                    'upgrade_required': True,
-                    'current_plan': current_plan
-                }
-            
-            return True, {
-                'message': 'Product creation allowed',
-                'current_usage': current_products,
-                'limit': product_limit,
-                'remaining': product_limit - current_products
-            }
-            
-        except Exception as e:
-            logger.error(f"Error checking product creation permission for user {user_id}: {str(e)}")
-            return False, {
-                'message': 'Error checking product creation permission',
-                'error': str(e),
-                'upgrade_required': True
-            }
+        return self._can_create(user_id, 'products')
     
     def can_create_sale(self, user_id: str) -> Tuple[bool, Dict[str, Any]]:
         """Check if user can create sales based on subscription limits"""
-        try:
-            subscription_status = self.get_unified_subscription_status(user_id)
-            if not subscription_status:
-                return False, {
-                    'message': 'Unable to verify subscription status',
-                    'upgrade_required': True
-                }
-            
-            current_plan = subscription_status.get('subscription_plan', 'free')
-            plan_config = self.PLAN_CONFIGS.get(current_plan, self.PLAN_CONFIGS['free'])
-            
-            # Get current usage
-            usage_data = self.get_accurate_usage_counts(user_id)
-            usage_counts = usage_data.get('usage_counts', {})
-            current_sales = usage_counts.get('sales', {}).get('current_count', 0)
-            sales_limit = plan_config['features']['sales']
-            
-            if current_sales >= sales_limit:
-                return False, {
-                    'message': f'Sales limit reached ({current_sales}/{sales_limit})',
-                    'current_usage': current_sales,
-                    'limit': sales_limit,
-                    'upgrade_required': True,
-                    'current_plan': current_plan
-                }
-            
-            return True, {
-                'message': 'Sales creation allowed',
-                'current_usage': current_sales,
-                'limit': sales_limit,
-                'remaining': sales_limit - current_sales
-            }
-            
-        except Exception as e:
-            logger.error(f"Error checking sales creation permission for user {user_id}: {str(e)}")
-            return False, {
-                'message': 'Error checking sales creation permission',
-                'error': str(e),
-                'upgrade_required': True
-            }
+        return self._can_create(user_id, 'sales')
     
     def can_create_expense(self, user_id: str) -> Tuple[bool, Dict[str, Any]]:
         """Check if user can create expenses based on subscription limits"""
-        try:
-            subscription_status = self.get_unified_subscription_status(user_id)
-            if not subscription_status:
-                return False, {
-                    'message': 'Unable to verify subscription status',
-                    'upgrade_required': True
-                }
-            
-            current_plan = subscription_status.get('subscription_plan', 'free')
-            plan_config = self.PLAN_CONFIGS.get(current_plan, self.PLAN_CONFIGS['free'])
-            
-            # Get current usage
-            usage_counts = self.get_accurate_usage_counts(user_id)
-            current_expenses = usage_counts.get('expenses', 0)
-            expense_limit = plan_config['features']['expenses']
-            
-            if current_expenses >= expense_limit:
-                return False, {
-                    'message': f'Expense limit reached ({current_expenses}/{expense_limit})',
-                    'current_usage': current_expenses,
-                    'limit': expense_limit,
-                    'upgrade_required': True,
-                    'current_plan': current_plan
-                }
-            
-            return True, {
-                'message': 'Expense creation allowed',
-                'current_usage': current_expenses,
-                'limit': expense_limit,
-                'remaining': expense_limit - current_expenses
-            }
-            
-        except Exception as e:
-            logger.error(f"Error checking expense creation permission for user {user_id}: {str(e)}")
-            return False, {
-                'message': 'Error checking expense creation permission',
-                'error': str(e),
-                'upgrade_required': True
-            }
-            # Simplified approach - always allow upgrades to prevent payment failures
-            return {
-                'user_id': user_id,
-                'risk_level': 'low',
-                'suspicious_patterns': [],
-                'recent_upgrades_count': 0,
-                'requires_manual_review': False,
-                'recommendation': 'Normal upgrade pattern',
-                'message': 'Simplified abuse detection - allowing upgrade'
-            }
-            
-        except Exception as e:
-            logger.error(f"Error in simplified abuse detection for user {user_id}: {str(e)}")
-            return {
-                'user_id': user_id,
-                'risk_level': 'low',
-                'suspicious_patterns': [],
-                'recent_upgrades_count': 0,
-                'requires_manual_review': False,
-                'recommendation': 'Normal upgrade pattern',
-                'error': str(e)
-            } 
-   
-    def can_create_invoice(self, user_id: str) -> Tuple[bool, Dict[str, Any]]:
-        """Check if user can create invoices based on subscription limits"""
-        try:
-            subscription_status = self.get_unified_subscription_status(user_id)
-            if not subscription_status:
-                return False, {
-                    'message': 'Unable to verify subscription status',
-                    'upgrade_required': True
-                }
-            
-            current_plan = subscription_status.get('subscription_plan', 'free')
-            plan_config = self.PLAN_CONFIGS.get(current_plan, self.PLAN_CONFIGS['free'])
-            
-            # Get current usage
-            usage_data = self.get_accurate_usage_counts(user_id)
-            usage_counts = usage_data.get('usage_counts', {})
-            current_invoices = usage_counts.get('invoices', {}).get('current_count', 0)
-            invoice_limit = plan_config['features']['invoices']
-            
-            if current_invoices >= invoice_limit:
-                return False, {
-                    'message': f'Invoice limit reached ({current_invoices}/{invoice_limit})',
-                    'current_usage': current_invoices,
-                    'limit': invoice_limit,
-                    'upgrade_required': True,
-                    'current_plan': current_plan
-                }
-            
-            return True, {
-                'message': 'Invoice creation allowed',
-                'current_usage': current_invoices,
-                'limit': invoice_limit,
-                'remaining': invoice_limit - current_invoices
-            }
-            
-        except Exception as e:
-            logger.error(f"Error checking invoice creation permission for user {user_id}: {str(e)}")
-            return False, {
-                'message': 'Error checking invoice creation permission',
-                'error': str(e),
-                'upgrade_required': True
-            }
+        return self._can_create(user_id, 'expenses')
     
-    def can_create_product(self, user_id: str) -> Tuple[bool, Dict[str, Any]]:
-        """Check if user can create products based on subscription limits"""
+    def _can_create(self, user_id: str, feature_type: str) -> Tuple[bool, Dict[str, Any]]:
+        """Tracked usage against the plan limit, from the cached entitlement snapshot"""
+        label = FEATURE_LABELS[feature_type].lower()
         try:
-            subscription_status = self.get_unified_subscription_status(user_id)
-            if not subscription_status:
-                return False, {
-                    'message': 'Unable to verify subscription status',
-                    'upgrade_required': True
-                }
-            
-            current_plan = subscription_status.get('subscription_plan', 'free')
-            plan_config = self.PLAN_CONFIGS.get(current_plan, self.PLAN_CONFIGS['free'])
-            
-            # Get current usage
-            usage_data = self.get_accurate_usage_counts(user_id)
-            usage_counts = usage_data.get('usage_counts', {})
-            current_products = usage_counts.get('products', {}).get('current_count', 0)
-            product_limit = plan_config['features']['products']
-            
-            if current_products >= product_limit:
-                return False, {
-                    'message': f'Product limit reached ({current_products}/{product_limit})',
-                    'current_usage': current_products,
-                    'limit': product_limit,
-                    'upgrade_required': True,
-                    'current_plan': current_plan
-                }
-            
-            return True, {
-                'message': 'Product creation allowed',
-                'current_usage': current_products,
-                'limit': product_limit,
-                'remaining': product_limit - current_products
-            }
-            
+            return self.get_entitlements(user_id).can_create(feature_type)
         except Exception as e:
-            logger.error(f"Error checking product creation permission for user {user_id}: {str(e)}")
+            logger.error(f"Error checking {label} creation permission for user {user_id}: {str(e)}")
             return False, {
-                'message': 'Error checking product creation permission',
+                'message': f'Error checking {label} creation permission',
                 'error': str(e),
                 'upgrade_required': True
             }
     
-    def can_create_sale(self, user_id: str) -> Tuple[bool, Dict[str, Any]]:
-        """Check if user can create sales based on subscription limits"""
-        try:
-            subscription_status = self.get_unified_subscription_status(user_id)
-            if not subscription_status:
-                return False, {
-                    'message': 'Unable to verify subscription status',
-                    'upgrade_required': True
-                }
-            
-            current_plan = subscription_status.get('subscription_plan', 'free')
-            plan_config = self.PLAN_CONFIGS.get(current_plan, self.PLAN_CONFIGS['free'])
-            
-            # Get current usage
-            usage_data = self.get_accurate_usage_counts(user_id)
-            usage_counts = usage_data.get('usage_counts', {})
-            current_sales = usage_counts.get('sales', {}).get('current_count', 0)
-            sales_limit = plan_config['features']['sales']
-            
-            if current_sales >= sales_limit:
-                return False, {
-                    'message': f'Sales limit reached ({current_sales}/{sales_limit})',
-                    'current_usage': current_sales,
-                    'limit': sales_limit,
-                    'upgrade_required': True,
-                    'current_plan': current_plan
-                }
-            
-            return True, {
-                'message': 'Sales creation allowed',
-                'current_usage': current_sales,
-                'limit': sales_limit,
-                'remaining': sales_limit - current_sales
-            }
-            
-        except Exception as e:
-            logger.error(f"Error checking sales creation permission for user {user_id}: {str(e)}")
-            return False, {
-                'message': 'Error checking sales creation permission',
-                'error': str(e),
-                'upgrade_required': True
-            }
-    
-    def can_create_expense(self, user_id: str) -> Tuple[bool, Dict[str, Any]]:
-        """Check if user can create expenses based on subscription limits"""
+    def get_usage_limits(self, user_id: str) -> Dict[str, Any]:
+        """Get current usage limits for user's subscription plan"""
         try:
-            subscription_status = self.get_unified_subscription_status(user_id)
-            if not subscription_status:
-                return False, {
-                    'message': 'Unable to verify subscription status',
-                    'upgrade_required': True
-                }
-            
-            current_plan = subscription_status.get('subscription_plan', 'free')
-            plan_config = self.PLAN_CONFIGS.get(current_plan, self.PLAN_CONFIGS['free'])
-            
-            # Get current usage
-            usage_data = self.get_accurate_usage_counts(user_id)
-            usage_counts = usage_data.get('usage_counts', {})
-            current_expenses = usage_counts.get('expenses', {}).get('current_count', 0)
-            expense_limit = plan_config['features']['expenses']
-            
-            if current_expenses >= expense_limit:
-                return False, {
-                    'message': f'Expense limit reached ({current_expenses}/{expense_limit})',
-                    'current_usage': current_expenses,
-                    'limit': expense_limit,
-                    'upgrade_required': True,
-                    'current_plan': current_plan
-                }
-            
-            return True, {
-                'message': 'Expense creation allowed',
-                'current_usage': current_expenses,
-                'limit': expense_limit,
-                'remaining': expense_limit - current_expenses
-            }
-            
+            return self.get_entitlements(user_id).usage_limits()
         except Exception as e:
-            logger.error(f"Error checking expense creation permission for user {user_id}: {str(e)}")
-            return False, {
-                'message': 'Error checking expense creation permission',
+            logger.error(f"Error getting usage limits for user {user_id}: {str(e)}")
+            return {
                 'error': str(e),
-                'upgrade_required': True
+                'plan': 'unknown',
+                'limits': {}
             }
 
     def _reset_usage_counters(self, user_id: str, plan_id: str) -> None:
@@ -1934,6 +1374,7 @@ class SubscriptionService:
                     }
                     self.supabase.table('feature_usage').insert(new_usage).execute()
             
+            entitlement_cache.invalidate(business_owner_id)
             logger.info(f"Reset usage counters for user {user_id} (business owner: {business_owner_id}) to {plan_id} plan limits")
             
         except Exception as e:
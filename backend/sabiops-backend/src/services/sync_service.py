@@ -0,0 +1,328 @@
+"""
+Delta Sync Service for SabiOps
+Serves per-owner change feeds and applies batches of queued offline operations
+"""
+
+import logging
+import uuid
+from datetime import datetime, timezone, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from .alert_state import parse_timestamp
+
+logger = logging.getLogger(__name__)
+
+
+class SyncService:
+    """Change feed over row_version (see migrations/012_sync_change_feed.sql) plus batched upload"""
+
+    SYNC_TABLES = ("products", "customers", "sales", "invoices", "expenses")
+    DEFAULT_LIMIT = 500
+    MAX_LIMIT = 2000
+    MAX_PUSH_OPERATIONS = 200
+    # How long a version must have existed before the feed serves it
+    SETTLE_SECONDS = 30
+
+    # Operations an offline client may queue, and the plan feature each create counts against
+    PUSH_ACTIONS = {
+        "customers": ("create", "update", "delete"),
+        "sales": ("create",),
+        "expenses": ("create",),
+    }
+    CREATE_FEATURES = {"sales": "sales", "expenses": "expenses"}
+
+    CUSTOMER_FIELDS = ("name", "email", "phone", "address", "business_name", "notes")
+
+    def __init__(self, supabase_client):
+        self.supabase = supabase_client
+
+    @staticmethod
+    def parse_cursor(value) -> int:
+        """Cursor is the highest row_version the client has seen; missing means full sync"""
+        if value in (None, ""):
+            return 0
+        cursor = int(value)
+        if cursor < 0:
+            raise ValueError("Cursor cannot be negative")
+        return cursor
+
+    def parse_tables(self, value: Optional[str]) -> List[str]:
+        if not value:
+            return list(self.SYNC_TABLES)
+        tables = [t.strip() for t in value.split(",") if t.strip()]
+        unknown = [t for t in tables if t not in self.SYNC_TABLES]
+        if unknown:
+            raise ValueError(f"Unsupported tables: {', '.join(unknown)}")
+        return list(dict.fromkeys(tables))
+
+    # ------------------------------------------------------------------
+    # Pull
+    # ------------------------------------------------------------------
+
+    def get_changes(self, owner_id: str, since: int = 0, tables: Optional[List[str]] = None,
+                    limit: int = DEFAULT_LIMIT) -> Dict:
+        """
+        Rows inserted, updated and deleted after `since`, at most `limit` per table.
+        When any table is truncated the cursor stops at the lowest version that
+        table reached, and newer rows from other tables are held back for the
+        next page, so paging never skips a change. Versions taken less than
+        SETTLE_SECONDS ago are held back too, and the cursor stops at the
+        newest settled version: a write still in flight may yet commit a
+        version below the unsettled ones, but not below a settled one.
+        """
+        tables = tables or list(self.SYNC_TABLES)
+        limit = max(1, min(int(limit), self.MAX_LIMIT))
+        settled = datetime.now(timezone.utc) - timedelta(seconds=self.SETTLE_SECONDS)
+
+        fetched = {}
+        truncated_at = []
+        held_at = []
+        for table in tables:
+            result = self.supabase.table(table).select("*").eq("owner_id", owner_id) \
+                .gt("row_version", since).order("row_version").limit(limit + 1).execute()
+            fetched[table] = self._settled_page(result.data or [], limit, settled, truncated_at, held_at)
+
+        tombstone_result = self.supabase.table("sync_tombstones").select("table_name, row_id, row_version, row_version_at") \
+            .eq("owner_id", owner_id).gt("row_version", since).in_("table_name", tables) \
+            .order("row_version").limit(limit + 1).execute()
+        tombstones = self._settled_page(tombstone_result.data or [], limit, settled, truncated_at, held_at)
+
+        versions = [row["row_version"] for rows in fetched.values() for row in rows]
+        versions.extend(t["row_version"] for t in tombstones)
+        has_more = bool(truncated_at)
+        ceilings = list(truncated_at)
+        if held_at:
+            # Only versions older than every unsettled one are known to have committed;
+            # paging stops there until they settle
+            settled_to = max((v for v in versions if v < min(held_at)), default=since)
+            has_more = any(v < settled_to for v in truncated_at)
+            ceilings.append(settled_to)
+        next_cursor = min(ceilings, default=max(versions, default=since))
+
+        changes = {table: {"inserted": [], "updated": [], "deleted": []} for table in tables}
+        for table, rows in fetched.items():
+            for row in rows:
+                if row["row_version"] > next_cursor:
+                    continue
+                created = row.get("created_version")
+                bucket = "inserted" if created is None or created > since else "updated"
+                changes[table][bucket].append(row)
+
+        for tombstone in tombstones:
+            if tombstone["row_version"] <= next_cursor and tombstone["table_name"] in changes:
+                changes[tombstone["table_name"]]["deleted"].append(tombstone["row_id"])
+
+        return {
+            "changes": changes,
+            "cursor": since,
+            "next_cursor": next_cursor,
+            "has_more": has_more,
+        }
+
+    @staticmethod
+    def _settled_page(rows: List[Dict], limit: int, settled: datetime,
+                      truncated_at: List[int], held_at: List[int]) -> List[Dict]:
+        """
+        Cut a row_version-ordered page at `limit` rows, recording the last
+        version in truncated_at, or before the first version stamped after
+        `settled`, recording that version in held_at.
+        """
+        truncated = len(rows) > limit
+        rows = rows[:limit]
+        for index, row in enumerate(rows):
+            stamped = row.get("row_version_at")
+            if stamped and parse_timestamp(stamped) >= settled:
+                held_at.append(row["row_version"])
+                return rows[:index]
+        if truncated:
+            truncated_at.append(rows[-1]["row_version"])
+        return rows
+
+    # ------------------------------------------------------------------
+    # Push
+    # ------------------------------------------------------------------
+
+    def apply_operations(self, owner_id: str, operations: List[Dict],
+                         allowances: Optional[Dict[str, Optional[int]]] = None) -> Dict:
+        """
+        Apply queued offline operations in order. Each operation is
+        {"op_id", "table", "action", "id"?, "data"?} and gets its own result, so
+        one bad record does not reject the rest of the queue.
+
+        `allowances` maps a plan feature to the number of creates still allowed
+        (None means unlimited); features missing from it are not capped.
+        """
+        allowances = dict(allowances or {})
+        results = []
+        created_counts: Dict[str, int] = {}
+
+        for index, operation in enumerate(operations):
+            op_id = operation.get("op_id") if isinstance(operation, dict) else None
+            result = {"op_id": op_id if op_id is not None else index, "success": False}
+            try:
+                # A replayed create returns what the first push wrote, without
+                # selling stock or counting usage a second time
+                record = self._find_created(owner_id, operation)
+                if record is not None:
+                    success, error = True, None
+                    result["replayed"] = True
+                else:
+                    success, error, record = self._apply_one(owner_id, operation, allowances)
+            except Exception as e:
+                logger.error(f"Sync operation {result['op_id']} failed: {str(e)}")
+                success, error, record = False, f"Database error: {str(e)}", None
+
+            result["success"] = success
+            if success:
+                result["record"] = record
+                feature = self.CREATE_FEATURES.get(operation.get("table"))
+                if operation.get("action") == "create" and feature and not result.get("replayed"):
+                    created_counts[feature] = created_counts.get(feature, 0) + 1
+                    if allowances.get(feature) is not None:
+                        allowances[feature] -= 1
+            else:
+                result["error"] = error
+            results.append(result)
+
+        applied = sum(1 for r in results if r["success"])
+        return {
+            "results": results,
+            "applied": applied,
+            "failed": len(results) - applied,
+            "created": created_counts,
+        }
+
+    def _find_created(self, owner_id: str, operation: Dict) -> Optional[Dict]:
+        """The record an earlier push of this create operation already wrote, if any"""
+        if not isinstance(operation, dict) or operation.get("action") != "create":
+            return None
+        table = operation.get("table")
+        data = operation.get("data")
+        if table not in self.PUSH_ACTIONS or not isinstance(data, dict):
+            return None
+        # Offline clients mint the id so later queued ops can reference the record
+        record_id = operation.get("id") or data.get("id")
+        if not record_id:
+            return None
+
+        existing = self.supabase.table(table).select("*").eq("id", record_id).eq("owner_id", owner_id).execute()
+        if existing.data:
+            return existing.data[0]
+        if table == "sales":
+            from src.utils.business_operations import BusinessOperationsManager
+
+            # create_sale_transaction mints its own sale ids; the client id is kept as the reference
+            existing = self.supabase.table("sales").select("*") \
+                .eq("reference_type", BusinessOperationsManager.OFFLINE_SALE_REFERENCE) \
+                .eq("reference_id", record_id).eq("owner_id", owner_id).execute()
+            if existing.data:
+                return existing.data[0]
+        return None
+
+    def _apply_one(self, owner_id: str, operation: Dict, allowances: Dict) -> Tuple[bool, Optional[str], Optional[Dict]]:
+        if not isinstance(operation, dict):
+            return False, "Operation must be an object", None
+
+        table = operation.get("table")
+        action = operation.get("action")
+        if action not in self.PUSH_ACTIONS.get(table, ()):
+            return False, f"Unsupported operation: {action} on {table}", None
+
+        feature = self.CREATE_FEATURES.get(table)
+        if action == "create" and feature and allowances.get(feature) is not None and allowances[feature] <= 0:
+            return False, f"Plan limit reached for {feature}", None
+
+        data = operation.get("data") or {}
+        if action != "delete" and not isinstance(data, dict):
+            return False, "Operation data must be an object", None
+
+        handler = getattr(self, f"_{action}_{table}")
+        if action == "create":
+            if operation.get("id"):
+                data = dict(data, id=operation["id"])
+            return handler(owner_id, data)
+        record_id = operation.get("id") or data.get("id")
+        if not record_id:
+            return False, "Record id is required", None
+        return handler(owner_id, record_id, data)
+
+    def _create_customers(self, owner_id: str, data: Dict):
+        name = (data.get("name") or "").strip()
+        if not name:
+            return False, "name is required", None
+        email = (data.get("email") or "").strip()
+        if email and "@" not in email:
+            return False, "Invalid email format", None
+
+        customer_id = data.get("id") or str(uuid.uuid4())
+        now = datetime.now(timezone.utc).isoformat()
+        record = {
+            "id": customer_id,
+            "owner_id": owner_id,
+            "name": name,
+            "email": email,
+            "phone": (data.get("phone") or "").strip(),
+            "address": (data.get("address") or "").strip(),
+            "business_name": (data.get("business_name") or "").strip(),
+            "notes": (data.get("notes") or "").strip(),
+            "purchase_history": [],
+            "interactions": [],
+            "total_purchases": 0,
+            "total_spent": 0,
+            "created_at": data.get("created_at") or now,
+            "updated_at": now,
+        }
+        result = self.supabase.table("customers").insert(record).execute()
+        if not result.data:
+            return False, "Failed to create customer", None
+        return True, None, result.data[0]
+
+    def _update_customers(self, owner_id: str, customer_id: str, data: Dict):
+        update_data = {}
+        for field in self.CUSTOMER_FIELDS:
+            if field in data:
+                update_data[field] = (data.get(field) or "").strip()
+        if "name" in update_data and not update_data["name"]:
+            return False, "Customer name cannot be empty", None
+        if update_data.get("email") and "@" not in update_data["email"]:
+            return False, "Invalid email format", None
+        if not update_data:
+            return False, "No fields to update", None
+
+        update_data["updated_at"] = datetime.now(timezone.utc).isoformat()
+        result = self.supabase.table("customers").update(update_data) \
+            .eq("id", customer_id).eq("owner_id", owner_id).execute()
+        if not result.data:
+            return False, "Customer not found", None
+        return True, None, result.data[0]
+
+    def _delete_customers(self, owner_id: str, customer_id: str, data: Dict):
+        # Deleting an already-deleted record is a replayed op, not an error
+        self.supabase.table("customers").delete().eq("id", customer_id).eq("owner_id", owner_id).execute()
+        return True, None, {"id": customer_id}
+
+    def _create_sales(self, owner_id: str, data: Dict):
+        from src.utils.business_operations import BusinessOperationsManager
+        return BusinessOperationsManager(self.supabase).process_sale_transaction(dict(data), owner_id)
+
+    def _create_expenses(self, owner_id: str, data: Dict):
+        from src.routes.expense import validate_expense_data
+        from src.utils.business_operations import BusinessOperationsManager
+
+        is_valid, error_message = validate_expense_data(data)
+        if not is_valid:
+            return False, error_message, None
+        return BusinessOperationsManager(self.supabase).process_expense_transaction(dict(data), owner_id)
+
+
+def record_sync_usage(user_id: str, created_counts: Dict[str, int]):
+    """Count pushed creates against the plan with one increment per feature"""
+    if not created_counts:
+        return
+    from src.services.subscription_service import SubscriptionService
+    subscription_service = SubscriptionService()
+    for feature, amount in created_counts.items():
+        try:
+            subscription_service.increment_usage_atomic(user_id, feature, amount=amount)
+        except Exception as e:
+            logger.warning(f"Failed to record sync usage for {feature}: {str(e)}")
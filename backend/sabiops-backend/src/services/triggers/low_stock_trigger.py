@@ -5,67 +5,87 @@ Monitors product inventory levels and sends notifications when stock is low
 
 import logging
 import asyncio
+from itertools import takewhile
 from datetime import datetime, timezone, timedelta
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 
 from ..notification_service import NotificationService
+from ..notification_digest import NotificationDigest
+from ..alert_state import AlertState, sent_since, parse_timestamp
+from ..stock_events import TriggerCursor
+from src.utils.keyset_scan import keyset_pages_async
 
 logger = logging.getLogger(__name__)
 
 class LowStockMonitor:
     """Monitors product stock levels and triggers notifications"""
     
+    # Different cooldown periods for different alert types
+    COOLDOWN_HOURS = {
+        'low_stock': 24,      # Once per day for low stock
+        'reorder_needed': 12, # Twice per day for reorder alerts
+        'out_of_stock': 6     # Every 6 hours for out of stock (more urgent)
+    }
+    
+    # Product ids per in_() query in check_products
+    CHECK_CHUNK = 200
+    # inventory_changes younger than this are consumed on the next run
+    CURSOR_SETTLE_SECONDS = 60
+    
     def __init__(self, supabase_client, notification_service: NotificationService = None):
         self.supabase = supabase_client
         self.notification_service = notification_service or NotificationService(supabase_client)
+        self.alert_state = AlertState(supabase_client)
         self.logger = logging.getLogger(__name__)
     
+    def _load_recent_alerts(self, product_ids: List[str] = None) -> Dict:
+        """Low stock alerts sent within the longest cooldown, in one query"""
+        since = datetime.now(timezone.utc) - timedelta(hours=max(self.COOLDOWN_HOURS.values()))
+        return self.alert_state.load('product', since, product_ids)
+    
     async def check_all_products(self) -> Dict[str, Any]:
         """Check all products for low stock conditions"""
         try:
             self.logger.info("Starting low stock check for all products...")
             
-            # Get all active products with their stock levels
-            products_result = self.supabase.table('products').select(
-                'id, owner_id, name, quantity, low_stock_threshold, reorder_level, active'
-            ).eq('active', True).execute()
+            products_checked = 0
+            recent_alerts = None
+            # Alerts go out together at the end: one digest per owner for a stock-out
+            digest = NotificationDigest()
+            
+            # Stream all active products a page at a time
+            async for products in keyset_pages_async(
+                self.supabase, 'products', 'id, owner_id, name, quantity, low_stock_threshold, reorder_level, active',
+                where=lambda query: query.eq('active', True)
+            ):
+                if recent_alerts is None:
+                    recent_alerts = await asyncio.to_thread(self._load_recent_alerts)
+                products_checked += len(products)
+                
+                for product in products:
+                    try:
+                        await self._check_product_stock(product, recent_alerts, digest)
+                    except Exception as e:
+                        self.logger.error(f"Error checking product {product.get('name', 'unknown')}: {str(e)}")
             
-            if not products_result.data:
+            if not products_checked:
                 self.logger.info("No active products found")
-                return {
-                    "status": "completed",
-                    "products_checked": 0,
-                    "notifications_sent": 0,
-                    "low_stock_products": []
-                }
             
-            products = products_result.data
-            self.logger.info(f"Checking {len(products)} active products for low stock...")
+            delivered = await self._deliver_digest(digest)
+            notifications_sent = len(delivered)
+            low_stock_products = [{
+                'id': product['id'],
+                'name': product['name'],
+                'quantity': product['quantity'],
+                'threshold': product['low_stock_threshold'],
+                'alert_type': alert_type
+            } for product, alert_type in delivered]
             
-            notifications_sent = 0
-            low_stock_products = []
-            
-            for product in products:
-                try:
-                    result = await self._check_product_stock(product)
-                    if result['notification_sent']:
-                        notifications_sent += 1
-                        low_stock_products.append({
-                            'id': product['id'],
-                            'name': product['name'],
-                            'quantity': product['quantity'],
-                            'threshold': product['low_stock_threshold'],
-                            'alert_type': result['alert_type']
-                        })
-                
-                except Exception as e:
-                    self.logger.error(f"Error checking product {product.get('name', 'unknown')}: {str(e)}")
-            
-            self.logger.info(f"Low stock check completed: {notifications_sent} notifications sent")
+            self.logger.info(f"Low stock check completed: {products_checked} products checked, {notifications_sent} notifications sent")
             
             return {
                 "status": "completed",
-                "products_checked": len(products),
+                "products_checked": products_checked,
                 "notifications_sent": notifications_sent,
                 "low_stock_products": low_stock_products
             }
@@ -79,8 +99,9 @@ class LowStockMonitor:
                 "notifications_sent": 0
             }
     
-    async def _check_product_stock(self, product: Dict[str, Any]) -> Dict[str, Any]:
-        """Check a single product's stock level and send notification if needed"""
+    async def _check_product_stock(self, product: Dict[str, Any], recent_alerts: Dict = None,
+                                   digest: NotificationDigest = None) -> Dict[str, Any]:
+        """Check a single product's stock level and send notification if needed (or add it to `digest`)"""
         try:
             product_id = product['id']
             owner_id = product['owner_id']
@@ -112,7 +133,9 @@ class LowStockMonitor:
                 }
             
             # Check if we should send notification (avoid spam)
-            should_send = await self._should_send_notification(product_id, owner_id, alert_type)
+            if recent_alerts is None:
+                recent_alerts = self._load_recent_alerts([product_id])
+            should_send = await self._should_send_notification(product_id, owner_id, alert_type, recent_alerts)
             
             if not should_send:
                 return {
@@ -121,6 +144,19 @@ class LowStockMonitor:
                     "reason": "Notification already sent recently"
                 }
             
+            if digest is not None:
+                digest.add(owner_id, self.notification_service.build_low_stock_alert(
+                    product_name=name,
+                    current_quantity=quantity,
+                    threshold=low_stock_threshold,
+                    product_id=product_id
+                ), (product, alert_type))
+                return {
+                    "notification_sent": False,
+                    "alert_type": alert_type,
+                    "reason": "Queued for digest"
+                }
+            
             # Send appropriate notification
             success = False
             notification_id = None
@@ -136,7 +172,7 @@ class LowStockMonitor:
             
             if success:
                 # Record the notification to prevent spam
-                await self._record_notification_sent(product_id, owner_id, alert_type, notification_id)
+                await self._record_notification_sent(product_id, owner_id, alert_type, notification_id, quantity)
                 
                 self.logger.info(f"Sent {alert_type} notification for product {name} (ID: {product_id})")
                 
@@ -161,54 +197,50 @@ class LowStockMonitor:
                 "reason": f"Error: {str(e)}"
             }
     
-    async def _should_send_notification(self, product_id: str, owner_id: str, alert_type: str) -> bool:
+    async def _should_send_notification(self, product_id: str, owner_id: str, alert_type: str, recent_alerts: Dict) -> bool:
         """Check if we should send a notification for this product"""
-        try:
-            # Different cooldown periods for different alert types
-            cooldown_hours = {
-                'low_stock': 24,      # Once per day for low stock
-                'reorder_needed': 12, # Twice per day for reorder alerts
-                'out_of_stock': 6     # Every 6 hours for out of stock (more urgent)
-            }
-            
-            hours_ago = cooldown_hours.get(alert_type, 24)
-            cutoff_time = datetime.now(timezone.utc) - timedelta(hours=hours_ago)
-            
-            # Check for recent notifications of the same type for this product
-            recent_notifications = self.supabase.table('notifications').select('id').eq(
-                'user_id', owner_id
-            ).eq('type', 'low_stock_alert').gte(
-                'created_at', cutoff_time.isoformat()
-            ).contains('data', {'product_id': product_id}).execute()
-            
-            if recent_notifications.data:
-                self.logger.debug(f"Skipping {alert_type} notification for product {product_id} - sent recently")
-                return False
-            
-            return True
-            
-        except Exception as e:
-            self.logger.error(f"Error checking notification history: {str(e)}")
-            # Default to sending if we can't check (better to send than miss critical alerts)
-            return True
+        hours_ago = self.COOLDOWN_HOURS.get(alert_type, 24)
+        cutoff_time = datetime.now(timezone.utc) - timedelta(hours=hours_ago)
+        
+        # Check for a recent low stock alert for this product
+        if sent_since(recent_alerts, product_id, 'low_stock_alert', cutoff_time):
+            self.logger.debug(f"Skipping {alert_type} notification for product {product_id} - sent recently")
+            return False
+        
+        return True
     
-    async def _record_notification_sent(self, product_id: str, owner_id: str, alert_type: str, notification_id: str) -> None:
-        """Record that we sent a notification (for analytics/tracking)"""
-        try:
-            # This could be expanded to include a separate tracking table
-            # For now, we rely on the notification record itself
-            self.logger.debug(f"Recorded {alert_type} notification for product {product_id}: {notification_id}")
-            
-        except Exception as e:
-            self.logger.error(f"Error recording notification: {str(e)}")
+    async def _deliver_digest(self, digest: NotificationDigest) -> List[Tuple[Dict[str, Any], str]]:
+        """Send the queued alerts and record them in one upsert; returns the delivered (product, alert_type)"""
+        delivered, failed = await digest.deliver(self.notification_service)
+        for product, alert_type in failed:
+            self.logger.error(f"Failed to send {alert_type} notification for product {product['name']}")
+        
+        await asyncio.to_thread(self.alert_state.record, 'product', [{
+            'entity_id': product['id'],
+            'alert_type': 'low_stock_alert',
+            'owner_id': product['owner_id'],
+            'value': product['quantity']
+        } for product, _ in delivered])
+        return delivered
+    
+    async def _record_notification_sent(self, product_id: str, owner_id: str, alert_type: str, notification_id: str,
+                                        quantity: int = None) -> None:
+        """Record that we sent a notification so the cooldown applies next cycle"""
+        await asyncio.to_thread(self.alert_state.record, 'product', [{
+            'entity_id': product_id,
+            'alert_type': 'low_stock_alert',
+            'owner_id': owner_id,
+            'value': quantity
+        }])
+        self.logger.debug(f"Recorded {alert_type} notification for product {product_id}: {notification_id}")
     
     async def check_specific_product(self, product_id: str) -> Dict[str, Any]:
         """Check a specific product for low stock (useful for real-time checks)"""
         try:
             # Get the specific product
-            product_result = self.supabase.table('products').select(
+            product_result = await asyncio.to_thread(self.supabase.table('products').select(
                 'id, owner_id, name, quantity, low_stock_threshold, reorder_level, active'
-            ).eq('id', product_id).eq('active', True).single().execute()
+            ).eq('id', product_id).eq('active', True).single().execute)
             
             if not product_result.data:
                 return {
@@ -237,47 +269,92 @@ class LowStockMonitor:
                 "notification_sent": False
             }
     
-    async def monitor_inventory_changes(self) -> Dict[str, Any]:
-        """Monitor recent inventory changes and check affected products"""
+    async def check_products(self, product_ids: List[str]) -> Dict[str, Any]:
+        """Check only the given products, a chunk of ids per query (event-driven checks)"""
+        product_ids = sorted(set(str(product_id) for product_id in product_ids))
+        products_checked = 0
+        notifications_sent = 0
+        digest = NotificationDigest()
+        
         try:
-            self.logger.info("Monitoring recent inventory changes...")
-            
-            # Get inventory changes from the last hour
-            one_hour_ago = datetime.now(timezone.utc) - timedelta(hours=1)
-            
-            changes_result = self.supabase.table('inventory_changes').select(
-                'product_id, new_quantity, change_type'
-            ).gte('created_at', one_hour_ago.isoformat()).execute()
+            for start in range(0, len(product_ids), self.CHECK_CHUNK):
+                chunk = product_ids[start:start + self.CHECK_CHUNK]
+                products = (await asyncio.to_thread(self.supabase.table('products').select(
+                    'id, owner_id, name, quantity, low_stock_threshold, reorder_level, active'
+                ).in_('id', chunk).eq('active', True).execute)).data or []
+                if not products:
+                    continue
+                
+                recent_alerts = await asyncio.to_thread(self._load_recent_alerts, [product['id'] for product in products])
+                products_checked += len(products)
+                for product in products:
+                    await self._check_product_stock(product, recent_alerts, digest)
             
-            if not changes_result.data:
-                self.logger.info("No recent inventory changes found")
-                return {
-                    "status": "completed",
-                    "changes_processed": 0,
-                    "notifications_sent": 0
-                }
+            notifications_sent = len(await self._deliver_digest(digest))
+            return {
+                "status": "completed",
+                "products_checked": products_checked,
+                "notifications_sent": notifications_sent
+            }
             
-            changes = changes_result.data
-            unique_product_ids = list(set(change['product_id'] for change in changes))
+        except Exception as e:
+            self.logger.error(f"Error checking products {product_ids[:5]}: {str(e)}")
+            return {
+                "status": "error",
+                "error": str(e),
+                "products_checked": products_checked,
+                "notifications_sent": notifications_sent
+            }
+    
+    async def monitor_inventory_changes(self) -> Dict[str, Any]:
+        """
+        Consume inventory_changes after the persisted cursor and check the products
+        whose stock went down. The run stops at the first change newer than
+        CURSOR_SETTLE_SECONDS, so a slow transaction cannot commit behind the cursor.
+        """
+        try:
+            self.logger.info("Monitoring inventory changes...")
             
-            self.logger.info(f"Found {len(changes)} inventory changes affecting {len(unique_product_ids)} products")
+            cursor = TriggerCursor(self.supabase, 'inventory_changes')
+            position = await asyncio.to_thread(cursor.get)
+            now = datetime.now(timezone.utc)
+            settled = now - timedelta(seconds=self.CURSOR_SETTLE_SECONDS)
+            # No stored position yet: start from the last hour, like the old time window
+            window_start = (now - timedelta(hours=1)).isoformat() if position is None else None
             
+            changes_processed = 0
+            products_checked = 0
             notifications_sent = 0
             
-            # Check each affected product
-            for product_id in unique_product_ids:
-                try:
-                    result = await self.check_specific_product(product_id)
-                    if result.get('notification_sent'):
-                        notifications_sent += 1
-                        
-                except Exception as e:
-                    self.logger.error(f"Error checking changed product {product_id}: {str(e)}")
+            async for page in keyset_pages_async(
+                self.supabase, 'inventory_changes', 'product_id, change_type, created_at',
+                where=(lambda query: query.gte('created_at', window_start)) if window_start else None,
+                key='change_seq', after=position
+            ):
+                changes = list(takewhile(lambda change: parse_timestamp(change['created_at']) < settled, page))
+                if not changes:
+                    break
+                
+                decreased = {change['product_id'] for change in changes if change.get('change_type') == 'decrease'}
+                result = await self.check_products(decreased)
+                if result['status'] != 'completed':
+                    # Leave the cursor where it is so these changes are retried
+                    break
+                
+                changes_processed += len(changes)
+                products_checked += result['products_checked']
+                notifications_sent += result['notifications_sent']
+                await asyncio.to_thread(cursor.advance, changes[-1]['change_seq'])
+                if len(changes) < len(page):
+                    break
+            
+            if not changes_processed:
+                self.logger.info("No new inventory changes found")
             
             return {
                 "status": "completed",
-                "changes_processed": len(changes),
-                "products_checked": len(unique_product_ids),
+                "changes_processed": changes_processed,
+                "products_checked": products_checked,
                 "notifications_sent": notifications_sent
             }
             
@@ -297,12 +374,12 @@ def create_low_stock_monitor(supabase_client) -> LowStockMonitor:
 
 # Function to run low stock check (for scheduled jobs)
 async def run_low_stock_check(supabase_client) -> Dict[str, Any]:
-    """Run a complete low stock check - useful for cron jobs"""
+    """Run a complete low stock check - the periodic reconciliation job"""
     monitor = create_low_stock_monitor(supabase_client)
     return await monitor.check_all_products()
 
 # Function to monitor inventory changes (for real-time triggers)
 async def monitor_inventory_changes(supabase_client) -> Dict[str, Any]:
-    """Monitor recent inventory changes - useful for real-time triggers"""
+    """Consume new inventory changes since the stored cursor"""
     monitor = create_low_stock_monitor(supabase_client)
     return await monitor.monitor_inventory_changes()
\ No newline at end of file
@@ -9,6 +9,8 @@ from datetime import datetime, timezone, timedelta, date
 from typing import List, Dict, Any, Optional
 
 from ..notification_service import NotificationService
+from ..alert_state import AlertState
+from src.utils.keyset_scan import keyset_pages_async
 
 logger = logging.getLogger(__name__)
 
@@ -18,11 +20,20 @@ class OverdueInvoiceMonitor:
     def __init__(self, supabase_client, notification_service: NotificationService = None):
         self.supabase = supabase_client
         self.notification_service = notification_service or NotificationService(supabase_client)
+        self.alert_state = AlertState(supabase_client)
         self.logger = logging.getLogger(__name__)
         
         # Alert intervals (days overdue)
         self.alert_intervals = [1, 7, 14, 30, 60, 90]
     
+    def _load_recent_alerts(self, invoice_ids: List[str] = None) -> Dict:
+        """
+        Overdue alerts from the last two days, in one query. An alert for
+        interval N is only due on day N, so an earlier alert for the same
+        interval cannot be older than that.
+        """
+        return self.alert_state.load('invoice', datetime.now(timezone.utc) - timedelta(days=2), invoice_ids)
+    
     async def check_all_overdue_invoices(self) -> Dict[str, Any]:
         """Check all invoices for overdue conditions"""
         try:
@@ -30,48 +41,46 @@ class OverdueInvoiceMonitor:
             
             today = date.today()
             
-            # Get all unpaid invoices that are past due date
-            invoices_result = self.supabase.table('invoices').select(
-                'id, owner_id, customer_name, invoice_number, total_amount, due_date, status, issue_date'
-            ).neq('status', 'paid').lt('due_date', today.isoformat()).execute()
-            
-            if not invoices_result.data:
-                self.logger.info("No overdue invoices found")
-                return {
-                    "status": "completed",
-                    "invoices_checked": 0,
-                    "notifications_sent": 0,
-                    "overdue_invoices": []
-                }
-            
-            invoices = invoices_result.data
-            self.logger.info(f"Checking {len(invoices)} overdue invoices...")
-            
+            invoices_checked = 0
             notifications_sent = 0
             overdue_invoices = []
-            
-            for invoice in invoices:
-                try:
-                    result = await self._check_invoice_overdue(invoice, today)
-                    if result['notification_sent']:
-                        notifications_sent += 1
-                        overdue_invoices.append({
-                            'id': invoice['id'],
-                            'invoice_number': invoice['invoice_number'],
-                            'customer_name': invoice['customer_name'],
-                            'amount': float(invoice['total_amount']),
-                            'days_overdue': result['days_overdue'],
-                            'alert_type': result['alert_type']
-                        })
+            recent_alerts = None
+            
+            # Stream all unpaid invoices that are past due date a page at a time
+            async for invoices in keyset_pages_async(
+                self.supabase, 'invoices',
+                'id, owner_id, customer_name, invoice_number, total_amount, due_date, status, issue_date',
+                where=lambda query: query.neq('status', 'paid').lt('due_date', today.isoformat())
+            ):
+                if recent_alerts is None:
+                    recent_alerts = await asyncio.to_thread(self._load_recent_alerts)
+                invoices_checked += len(invoices)
                 
-                except Exception as e:
-                    self.logger.error(f"Error checking invoice {invoice.get('invoice_number', 'unknown')}: {str(e)}")
+                for invoice in invoices:
+                    try:
+                        result = await self._check_invoice_overdue(invoice, today, recent_alerts)
+                        if result['notification_sent']:
+                            notifications_sent += 1
+                            overdue_invoices.append({
+                                'id': invoice['id'],
+                                'invoice_number': invoice['invoice_number'],
+                                'customer_name': invoice['customer_name'],
+                                'amount': float(invoice['total_amount']),
+                                'days_overdue': result['days_overdue'],
+                                'alert_type': result['alert_type']
+                            })
+                    
+                    except Exception as e:
+                        self.logger.error(f"Error checking invoice {invoice.get('invoice_number', 'unknown')}: {str(e)}")
+            
+            if not invoices_checked:
+                self.logger.info("No overdue invoices found")
             
-            self.logger.info(f"Overdue invoice check completed: {notifications_sent} notifications sent")
+            self.logger.info(f"Overdue invoice check completed: {invoices_checked} invoices checked, {notifications_sent} notifications sent")
             
             return {
                 "status": "completed",
-                "invoices_checked": len(invoices),
+                "invoices_checked": invoices_checked,
                 "notifications_sent": notifications_sent,
                 "overdue_invoices": overdue_invoices
             }
@@ -85,7 +94,7 @@ class OverdueInvoiceMonitor:
                 "notifications_sent": 0
             }
     
-    async def _check_invoice_overdue(self, invoice: Dict[str, Any], today: date) -> Dict[str, Any]:
+    async def _check_invoice_overdue(self, invoice: Dict[str, Any], today: date, recent_alerts: Dict = None) -> Dict[str, Any]:
         """Check a single invoice for overdue condition and send notification if needed"""
         try:
             invoice_id = invoice['id']
@@ -115,8 +124,10 @@ class OverdueInvoiceMonitor:
             alert_type = self._get_alert_type(days_overdue)
             
             # Check if we should send notification for this interval
+            if recent_alerts is None and days_overdue in self.alert_intervals:
+                recent_alerts = self._load_recent_alerts([invoice_id])
             should_send = await self._should_send_overdue_notification(
-                invoice_id, owner_id, days_overdue, alert_type
+                invoice_id, owner_id, days_overdue, alert_type, recent_alerts or {}
             )
             
             if not should_send:
@@ -188,35 +199,21 @@ class OverdueInvoiceMonitor:
         invoice_id: str, 
         owner_id: str, 
         days_overdue: int, 
-        alert_type: str
+        alert_type: str,
+        recent_alerts: Dict
     ) -> bool:
         """Check if we should send an overdue notification"""
-        try:
-            # Only send notifications at specific intervals
-            if days_overdue not in self.alert_intervals:
-                return False
-            
-            # Check if we've already sent a notification for this specific interval
-            recent_notifications = self.supabase.table('notifications').select(
-                'id, data, created_at'
-            ).eq('user_id', owner_id).eq('type', 'overdue_invoice').contains(
-                'data', {'invoice_id': invoice_id}
-            ).execute()
-            
-            if recent_notifications.data:
-                # Check if we've already sent an alert for this specific days_overdue value
-                for notification in recent_notifications.data:
-                    notification_data = notification.get('data', {})
-                    if notification_data.get('days_overdue') == days_overdue:
-                        self.logger.debug(f"Skipping overdue alert for invoice {invoice_id} - already sent for {days_overdue} days")
-                        return False
-            
-            return True
-            
-        except Exception as e:
-            self.logger.error(f"Error checking overdue notification history: {str(e)}")
-            # Default to sending if we can't check (better to send than miss)
-            return True
+        # Only send notifications at specific intervals
+        if days_overdue not in self.alert_intervals:
+            return False
+        
+        # Check if we've already sent a notification for this specific interval
+        last_alert = recent_alerts.get((invoice_id, 'overdue_invoice'))
+        if last_alert and last_alert.last_value == days_overdue:
+            self.logger.debug(f"Skipping overdue alert for invoice {invoice_id} - already sent for {days_overdue} days")
+            return False
+        
+        return True
     
     async def _record_overdue_notification(
         self, 
@@ -226,21 +223,22 @@ class OverdueInvoiceMonitor:
         alert_type: str, 
         notification_id: str
     ) -> None:
-        """Record that we sent an overdue notification"""
-        try:
-            # This could be expanded to include a separate tracking table
-            self.logger.debug(f"Recorded {alert_type} notification for invoice {invoice_id}: {notification_id}")
-            
-        except Exception as e:
-            self.logger.error(f"Error recording overdue notification: {str(e)}")
+        """Record that we sent an overdue notification so this interval is not repeated"""
+        await asyncio.to_thread(self.alert_state.record, 'invoice', [{
+            'entity_id': invoice_id,
+            'alert_type': 'overdue_invoice',
+            'owner_id': owner_id,
+            'value': days_overdue
+        }])
+        self.logger.debug(f"Recorded {alert_type} notification for invoice {invoice_id}: {notification_id}")
     
     async def check_specific_invoice(self, invoice_id: str) -> Dict[str, Any]:
         """Check a specific invoice for overdue condition"""
         try:
             # Get the specific invoice
-            invoice_result = self.supabase.table('invoices').select(
+            invoice_result = await asyncio.to_thread(self.supabase.table('invoices').select(
                 'id, owner_id, customer_name, invoice_number, total_amount, due_date, status, issue_date'
-            ).eq('id', invoice_id).neq('status', 'paid').single().execute()
+            ).eq('id', invoice_id).neq('status', 'paid').single().execute)
             
             if not invoice_result.data:
                 return {
@@ -277,9 +275,9 @@ class OverdueInvoiceMonitor:
             today = date.today()
             
             # Get all overdue invoices
-            invoices_result = self.supabase.table('invoices').select(
+            invoices_result = await asyncio.to_thread(self.supabase.table('invoices').select(
                 'id, owner_id, customer_name, invoice_number, total_amount, due_date, status'
-            ).neq('status', 'paid').lt('due_date', today.isoformat()).execute()
+            ).neq('status', 'paid').lt('due_date', today.isoformat()).execute)
             
             if not invoices_result.data:
                 return {
@@ -357,9 +355,9 @@ class OverdueInvoiceMonitor:
             today = date.today()
             
             # Get overdue invoices for this owner
-            invoices_result = self.supabase.table('invoices').select(
+            invoices_result = await asyncio.to_thread(self.supabase.table('invoices').select(
                 'id, customer_name, invoice_number, total_amount, due_date'
-            ).eq('owner_id', owner_id).neq('status', 'paid').lt('due_date', today.isoformat()).execute()
+            ).eq('owner_id', owner_id).neq('status', 'paid').lt('due_date', today.isoformat()).execute)
             
             if not invoices_result.data:
                 return {
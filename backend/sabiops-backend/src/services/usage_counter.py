@@ -0,0 +1,227 @@
+"""
+Usage Counter - atomic feature usage increments
+One increment_feature_usage_checked RPC adds to the owner's feature_usage row
+(creating it on first use), optionally refuses to pass the limit, mirrors the
+legacy users.current_month_* columns and returns the new count and limit.
+Without migration 020 the same happens with a compare-and-set update, so
+concurrent increments are retried rather than lost.
+
+UsageWriteBehind buffers increments that cannot decide a limit check and
+writes them as one RPC per owner and feature every few seconds.
+"""
+
+import logging
+import os
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Tuple
+
+from src.utils.db_errors import missing_function
+
+logger = logging.getLogger(__name__)
+
+# 0 disables the write-behind buffer
+WRITE_BEHIND_SECONDS = float(os.getenv('USAGE_WRITE_BEHIND_SECONDS', '0'))
+# Buffer only while the owner is at least this many items below the limit
+WRITE_BEHIND_HEADROOM = int(os.getenv('USAGE_WRITE_BEHIND_HEADROOM', '20'))
+
+LEGACY_USER_COLUMNS = {
+    'invoices': 'current_month_invoices',
+    'expenses': 'current_month_expenses'
+}
+
+
+class UsageCounter:
+    """
+    Increments feature usage counters for business owners.
+
+    increment() returns {'applied', 'current_count', 'limit_count',
+    'period_start', 'period_end'}; 'applied' is False only when
+    enforce_limit refused an increment that would pass the limit.
+    """
+
+    RPC_NAME = "increment_feature_usage_checked"
+    # Upper bound of the random pause after a lost compare-and-set
+    CAS_BACKOFF_SECONDS = 0.005
+
+    def __init__(self, max_attempts: int = 5):
+        self.max_attempts = max_attempts
+        self._rpc_available = True
+
+    def increment(self, supabase, owner_id: str, feature_type: str, amount: int = 1,
+                  limit: Optional[int] = None, enforce_limit: bool = False) -> Dict[str, Any]:
+        if self._rpc_available:
+            try:
+                result = supabase.rpc(self.RPC_NAME, {
+                    'p_user_id': owner_id,
+                    'p_feature_type': feature_type,
+                    'p_amount': amount,
+                    'p_limit': limit,
+                    'p_enforce_limit': enforce_limit
+                }).execute()
+            except Exception as e:
+                # A timeout may have committed; counting again through CAS would double it
+                if not missing_function(e):
+                    raise
+                logger.warning(f"{self.RPC_NAME} RPC not available, using conditional updates: {str(e)}")
+                self._rpc_available = False
+            else:
+                if isinstance(result.data, dict):
+                    return result.data
+                raise RuntimeError(f"{self.RPC_NAME} returned unexpected result {result.data!r}")
+
+        return self._increment_via_cas(supabase, owner_id, feature_type, amount, limit, enforce_limit)
+
+    def _increment_via_cas(self, supabase, owner_id: str, feature_type: str, amount: int,
+                           limit: Optional[int], enforce_limit: bool) -> Dict[str, Any]:
+        """Read the row, then update it only if current_count is still what was read"""
+        for _ in range(self.max_attempts):
+            now = datetime.now()
+            rows = supabase.table('feature_usage').select(
+                'id, current_count, limit_count, period_start, period_end'
+            ).eq('user_id', owner_id).eq('feature_type', feature_type).order(
+                'period_end', desc=True
+            ).limit(1).execute().data
+
+            if not rows:
+                supabase.table('feature_usage').insert({
+                    'user_id': owner_id,
+                    'feature_type': feature_type,
+                    'current_count': 0,
+                    'limit_count': limit or 0,
+                    'period_start': now.isoformat(),
+                    'period_end': (now + timedelta(days=30)).isoformat(),
+                    'created_at': now.isoformat(),
+                    'updated_at': now.isoformat()
+                }).execute()
+                continue
+
+            row = rows[0]
+            current = row.get('current_count') or 0
+            limit_count = limit if limit is not None else (row.get('limit_count') or 0)
+            outcome = {
+                'applied': False,
+                'current_count': current,
+                'limit_count': limit_count,
+                'period_start': row.get('period_start'),
+                'period_end': row.get('period_end')
+            }
+            if enforce_limit and amount > 0 and current + amount > limit_count:
+                return outcome
+
+            new_count = max(0, current + amount)
+            updated = supabase.table('feature_usage').update({
+                'current_count': new_count,
+                'limit_count': limit_count,
+                'updated_at': now.isoformat(),
+                'last_synced_at': now.isoformat(),
+                'sync_status': 'synced'
+            }).eq('id', row['id']).eq('current_count', current).execute().data
+            if not updated:
+                # Someone else incremented in between; read again after a random
+                # pause so writers racing on one row do not keep colliding
+                time.sleep(random.uniform(0, self.CAS_BACKOFF_SECONDS))
+                continue
+
+            column = LEGACY_USER_COLUMNS.get(feature_type)
+            if column:
+                supabase.table('users').update({column: new_count}).eq('id', owner_id).execute()
+            outcome.update(applied=True, current_count=new_count)
+            return outcome
+
+        raise RuntimeError(f"{feature_type} usage for {owner_id} kept changing; gave up after {self.max_attempts} attempts")
+
+
+class UsageWriteBehind:
+    """
+    In-process buffer of usage increments, flushed every interval_seconds as
+    one counter increment per (owner, feature). Only increments with plenty
+    of headroom below the limit are buffered (accepts()), so a lagging
+    database count cannot let another worker pass a limit; the cached
+    entitlement snapshot in this process is updated immediately by the
+    caller. Increments still buffered when a process dies are lost until
+    the next usage sync recounts the owner's records.
+    """
+
+    def __init__(self, counter: UsageCounter, interval_seconds: float = WRITE_BEHIND_SECONDS,
+                 headroom: int = WRITE_BEHIND_HEADROOM):
+        self.counter = counter
+        self.interval_seconds = interval_seconds
+        self.headroom = headroom
+        self._pending: Dict[Tuple[str, str], int] = {}
+        self._supabase = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.interval_seconds > 0
+
+    def pending(self, owner_id: str, feature_type: str) -> int:
+        with self._lock:
+            return self._pending.get((owner_id, feature_type), 0)
+
+    def accepts(self, owner_id: str, feature_type: str, current_count: int, limit: int) -> bool:
+        """Whether an increment is far enough from the limit to be written later"""
+        if not self.enabled:
+            return False
+        return limit - current_count - self.pending(owner_id, feature_type) > self.headroom
+
+    def add(self, supabase, owner_id: str, feature_type: str, amount: int = 1):
+        with self._lock:
+            key = (owner_id, feature_type)
+            self._pending[key] = self._pending.get(key, 0) + amount
+            self._supabase = supabase
+        self._ensure_started()
+
+    def flush(self) -> int:
+        """Write every buffered delta; failed ones go back into the buffer. Returns rows written."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            supabase = self._supabase
+
+        written = 0
+        for (owner_id, feature_type), amount in pending.items():
+            if not amount:
+                continue
+            try:
+                self.counter.increment(supabase, owner_id, feature_type, amount)
+                written += 1
+            except Exception as e:
+                logger.warning(f"Usage write-behind for {owner_id}/{feature_type} failed, will retry: {str(e)}")
+                with self._lock:
+                    key = (owner_id, feature_type)
+                    self._pending[key] = self._pending.get(key, 0) + amount
+        return written
+
+    def _ensure_started(self):
+        if self._pid == os.getpid() and self._thread and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._flush_loop, daemon=True, name="usage-write-behind")
+            self._pid = os.getpid()
+            self._thread.start()
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.interval_seconds):
+            self.flush()
+
+    def stop(self):
+        """Stop the flush thread and write what is left"""
+        self._stop.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=5)
+        self._thread = None
+        self.flush()
+
+
+# Global instances
+usage_counter = UsageCounter()
+usage_write_behind = UsageWriteBehind(usage_counter)
@@ -8,6 +8,9 @@ from typing import Dict, Optional, Tuple, Any, List
 import logging
 from flask import current_app
 
+from .entitlements import entitlement_cache
+from .usage_counter import usage_counter, usage_write_behind
+
 logger = logging.getLogger(__name__)
 
 class UsageService:
@@ -34,29 +37,34 @@ class UsageService:
                 # No usage record exists, create one
                 usage_data = self._initialize_usage_record(effective_user_id, feature_type)
             
-            current_count = usage_data['current_count']
-            limit_count = usage_data['limit_count']
-            
-            # Calculate usage percentage
-            usage_percentage = (current_count / limit_count * 100) if limit_count > 0 else 0
-            
-            return {
-                'user_id': user_id,
-                'effective_user_id': effective_user_id,
-                'feature_type': feature_type,
-                'current_count': current_count,
-                'limit_count': limit_count,
-                'usage_percentage': round(usage_percentage, 1),
-                'limit_reached': current_count >= limit_count,
-                'warning_threshold': usage_percentage >= 80,
-                'period_start': usage_data['period_start'],
-                'period_end': usage_data['period_end']
-            }
+            return self._usage_status(user_id, effective_user_id, feature_type, usage_data)
             
         except Exception as e:
             logger.error(f"Error checking usage limit for user {user_id}, feature {feature_type}: {str(e)}")
             raise
     
+    def _usage_status(self, user_id: str, effective_user_id: str, feature_type: str,
+                      usage_data: Dict[str, Any]) -> Dict[str, Any]:
+        """check_usage_limit result for a feature_usage row (or increment_feature_usage_checked result)"""
+        current_count = usage_data['current_count']
+        limit_count = usage_data['limit_count']
+        
+        # Calculate usage percentage
+        usage_percentage = (current_count / limit_count * 100) if limit_count > 0 else 0
+        
+        return {
+            'user_id': user_id,
+            'effective_user_id': effective_user_id,
+            'feature_type': feature_type,
+            'current_count': current_count,
+            'limit_count': limit_count,
+            'usage_percentage': round(usage_percentage, 1),
+            'limit_reached': current_count >= limit_count,
+            'warning_threshold': usage_percentage >= 80,
+            'period_start': usage_data.get('period_start'),
+            'period_end': usage_data.get('period_end')
+        }
+    
     def can_create_feature(self, user_id: str, feature_type: str) -> Tuple[bool, Dict[str, Any]]:
         """Check if user can create a new feature item"""
         try:
@@ -72,63 +80,39 @@ class UsageService:
             return True, {'error': str(e)}
     
     def increment_usage(self, user_id: str, feature_type: str) -> Dict[str, Any]:
-        """Increment usage counter for a feature"""
+        """
+        Count one created item against the business owner's limit. One atomic
+        increment-and-check (usage_counter) replaces read, update and the
+        users.current_month_* mirror; with the write-behind buffer enabled,
+        increments far from the limit are written later in batches.
+        """
         try:
             if feature_type not in self.FEATURE_TYPES:
                 raise ValueError(f"Invalid feature type: {feature_type}")
             
-            # Get effective user ID (for team members, use business owner)
-            effective_user_id = self._get_effective_user_id(user_id)
-            
-            # Try to call the database function first
-            try:
-                result = self.supabase.rpc('increment_usage_counter', {
-                    'p_user_id': effective_user_id,
-                    'p_feature_type': feature_type
-                }).execute()
-                
-                if result.data and result.data.get('success'):
-                    logger.info(f"Incremented {feature_type} usage for user {user_id} (effective: {effective_user_id})")
-                    return self.check_usage_limit(user_id, feature_type)
-                else:
-                    # Function returned error, fall back to manual increment
-                    logger.warning(f"Database function failed, using manual increment: {result.data}")
-            except Exception as rpc_error:
-                logger.warning(f"Database function not available, using manual increment: {str(rpc_error)}")
-            
-            # Manual increment fallback
-            usage_data = self._get_current_usage(effective_user_id, feature_type)
-            
-            if not usage_data:
-                # Initialize usage record if it doesn't exist
-                usage_data = self._initialize_usage_record(effective_user_id, feature_type)
-            
-            # Check if user has reached limit
-            if usage_data['current_count'] >= usage_data['limit_count']:
-                raise Exception(f"Usage limit reached for {feature_type}: {usage_data['current_count']}/{usage_data['limit_count']}")
-            
-            # Increment usage counter manually
-            new_count = usage_data['current_count'] + 1
-            
-            self.supabase.table('feature_usage').update({
-                'current_count': new_count,
-                'updated_at': datetime.now().isoformat()
-            }).eq('id', usage_data['id']).execute()
-            
-            # Also update user table for backward compatibility
-            if feature_type == 'invoices':
-                self.supabase.table('users').update({
-                    'current_month_invoices': new_count
-                }).eq('id', effective_user_id).execute()
-            elif feature_type == 'expenses':
-                self.supabase.table('users').update({
-                    'current_month_expenses': new_count
-                }).eq('id', effective_user_id).execute()
-            
-            logger.info(f"Manually incremented {feature_type} usage for user {user_id} (effective: {effective_user_id})")
-            
-            # Get updated usage status
-            return self.check_usage_limit(user_id, feature_type)
+            # Owner and limit come from the cached entitlement snapshot
+            entitlements = self._get_entitlements(user_id)
+            effective_user_id = entitlements.owner_id
+            limit = entitlements.limits.get(feature_type, 0)
+            current_count = entitlements.usage.get(feature_type, 0)
+            
+            if usage_write_behind.accepts(effective_user_id, feature_type, current_count, limit):
+                usage_write_behind.add(self.supabase, effective_user_id, feature_type, 1)
+                entitlement_cache.add_usage(effective_user_id, feature_type, 1)
+                return self._usage_status(user_id, effective_user_id, feature_type, {
+                    'current_count': current_count + 1,
+                    'limit_count': limit
+                })
+            
+            result = usage_counter.increment(
+                self.supabase, effective_user_id, feature_type, 1, limit=limit, enforce_limit=True
+            )
+            if not result['applied']:
+                raise Exception(f"Usage limit reached for {feature_type}: {result['current_count']}/{result['limit_count']}")
+            
+            entitlement_cache.add_usage(effective_user_id, feature_type, 1)
+            logger.info(f"Incremented {feature_type} usage for user {user_id} (effective: {effective_user_id})")
+            return self._usage_status(user_id, effective_user_id, feature_type, result)
             
         except Exception as e:
             logger.error(f"Error incrementing usage for user {user_id}, feature {feature_type}: {str(e)}")
@@ -140,37 +124,19 @@ class UsageService:
             if feature_type not in self.FEATURE_TYPES:
                 raise ValueError(f"Invalid feature type: {feature_type}")
             
-            # Get effective user ID (for team members, use business owner)
-            effective_user_id = self._get_effective_user_id(user_id)
-            
-            # Get current usage
-            usage_data = self._get_current_usage(effective_user_id, feature_type)
+            entitlements = self._get_entitlements(user_id)
+            effective_user_id = entitlements.owner_id
             
-            if not usage_data or usage_data['current_count'] <= 0:
-                logger.warning(f"Cannot decrement usage for user {user_id}, feature {feature_type}: no usage to decrement")
-                return self.check_usage_limit(user_id, feature_type)
-            
-            # Update usage count
-            new_count = max(0, usage_data['current_count'] - 1)
-            
-            self.supabase.table('feature_usage').update({
-                'current_count': new_count,
-                'updated_at': datetime.now().isoformat()
-            }).eq('id', usage_data['id']).execute()
-            
-            # Also update user table for backward compatibility
-            if feature_type == 'invoices':
-                self.supabase.table('users').update({
-                    'current_month_invoices': new_count
-                }).eq('id', effective_user_id).execute()
-            elif feature_type == 'expenses':
-                self.supabase.table('users').update({
-                    'current_month_expenses': new_count
-                }).eq('id', effective_user_id).execute()
+            # Never goes below zero; an unchanged count means there was nothing to decrement
+            result = usage_counter.increment(
+                self.supabase, effective_user_id, feature_type, -1,
+                limit=entitlements.limits.get(feature_type, 0)
+            )
+            entitlement_cache.add_usage(effective_user_id, feature_type, -1)
             
             logger.info(f"Decremented {feature_type} usage for user {user_id} (effective: {effective_user_id})")
             
-            return self.check_usage_limit(user_id, feature_type)
+            return self._usage_status(user_id, effective_user_id, feature_type, result)
             
         except Exception as e:
             logger.error(f"Error decrementing usage for user {user_id}, feature {feature_type}: {str(e)}")
@@ -274,6 +240,7 @@ class UsageService:
                 'updated_at': current_time.isoformat()
             }).eq('id', user_id).execute()
             
+            entitlement_cache.invalidate(user_id)
             logger.info(f"Reset usage counters for user {user_id} with plan {plan_id}")
             
             return {
@@ -318,6 +285,11 @@ class UsageService:
             logger.error(f"Error getting usage warnings for user {user_id}: {str(e)}")
             return []
     
+    def _get_entitlements(self, user_id: str):
+        """Business owner, plan limits and usage of the user's business (cached)"""
+        from src.services.subscription_service import SubscriptionService
+        return SubscriptionService().get_entitlements(user_id)
+    
     def _get_effective_user_id(self, user_id: str) -> str:
         """Get effective user ID (business owner for team members)"""
         try:
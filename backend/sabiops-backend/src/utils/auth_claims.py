@@ -0,0 +1,134 @@
+"""
+Auth Claims - signed entitlement claims carried in the access token
+Access tokens carry the user's owner_id and role and the business's plan,
+plan status and plan_expires_at, so get_user_context and the subscription
+decorators can authorize most requests without a database round trip.
+Claims are used only while they are current: anything that invalidates the
+user or owner in the entitlement cache after the token was signed sends the
+check back to the database. Access tokens are short-lived and renewed with
+fresh claims at /auth/refresh.
+"""
+
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+from flask import current_app, has_request_context
+from flask_jwt_extended import create_access_token, create_refresh_token, get_jwt, get_jwt_identity
+
+logger = logging.getLogger(__name__)
+
+VALID_ROLES = ('Owner', 'Admin', 'Salesperson')
+
+
+def _parse_time(value: str) -> Optional[datetime]:
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except (AttributeError, ValueError):
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def build_claims(user: Dict[str, Any], entitlements=None) -> Dict[str, Any]:
+    """Claims for a users row; plan claims come from the owner's entitlement snapshot when given"""
+    role = user.get('role')
+    claims = {
+        'owner_id': user['id'] if role == 'Owner' else user.get('owner_id'),
+        'role': role,
+        'claims_at': time.time()
+    }
+    if entitlements:
+        claims.update(
+            plan=entitlements.plan,
+            plan_status=entitlements.status,
+            plan_expires_at=entitlements.subscription_end_date
+        )
+    return claims
+
+
+def issue_tokens(user: Dict[str, Any], refresh: bool = True) -> Dict[str, str]:
+    """Access token (and refresh token) for a users row, with entitlement claims when available"""
+    entitlements = None
+    if current_app.config.get('SUPABASE'):
+        try:
+            from src.services.subscription_service import SubscriptionService
+            entitlements = SubscriptionService().get_entitlements(user['id'])
+        except Exception as e:
+            logger.warning(f"Issuing token for {user['id']} without plan claims: {e}")
+
+    tokens = {'access_token': create_access_token(identity=user['id'], additional_claims=build_claims(user, entitlements))}
+    if refresh:
+        tokens['refresh_token'] = create_refresh_token(identity=user['id'])
+    return tokens
+
+
+def issue_tokens_for(user_id: str, refresh: bool = False) -> Dict[str, str]:
+    """Re-issue tokens after the user's claims changed; raises ValueError for unknown or deactivated users"""
+    supabase = current_app.config.get('SUPABASE')
+    # limit(1), not single(): single() raises on a missing row instead of returning none
+    users = supabase.table('users').select('id, role, owner_id, active').eq('id', user_id).limit(1).execute().data
+    if not users:
+        raise ValueError("User not found")
+    user = users[0]
+    if not user.get('active', True):
+        raise ValueError("Account deactivated")
+    return issue_tokens(user, refresh=refresh)
+
+
+def current_claims(user_id: str) -> Optional[Dict[str, Any]]:
+    """This request's verified access token claims, if they belong to user_id and are still current"""
+    if not has_request_context():
+        return None
+    try:
+        claims = get_jwt()
+        identity = get_jwt_identity()
+    except RuntimeError:
+        # No token was verified for this request
+        return None
+    if identity != user_id or claims.get('type') != 'access' or 'claims_at' not in claims:
+        return None
+
+    from src.services.entitlements import entitlement_cache
+    if entitlement_cache.changed_at(user_id, claims.get('owner_id') or user_id) >= claims['claims_at']:
+        return None
+    return claims
+
+
+def claims_user_context(user_id: str):
+    """(owner_id, role) from current claims, or None"""
+    claims = current_claims(user_id)
+    if not claims or not claims.get('owner_id') or claims.get('role') not in VALID_ROLES:
+        return None
+    return claims['owner_id'], claims['role']
+
+
+def claims_subscription_status(user_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Entitlements.subscription_status() built from current claims, or None.
+    Claims that have run past plan_expires_at are not used; the database
+    decides whether the plan lapsed or was renewed meanwhile.
+    """
+    claims = current_claims(user_id)
+    if not claims or 'plan' not in claims:
+        return None
+
+    status = claims.get('plan_status')
+    remaining_days = -1
+    if status in ('active', 'trial'):
+        expires_at = _parse_time(claims.get('plan_expires_at'))
+        if not expires_at or expires_at <= datetime.now(timezone.utc):
+            return None
+        remaining_days = max(1, (expires_at - datetime.now(timezone.utc)).days)
+    elif status != 'free':
+        remaining_days = 0
+
+    from src.services.entitlements import Entitlements
+    return Entitlements(
+        owner_id=claims['owner_id'],
+        plan=claims['plan'],
+        status=status,
+        subscription_end_date=claims.get('plan_expires_at'),
+        trial_days_left=remaining_days if status == 'trial' else 0,
+        remaining_days=remaining_days
+    ).subscription_status()
@@ -87,6 +87,9 @@ class ErrorHandler:
 class BusinessOperationsManager:
     """Manages business operations with automatic data consistency"""
     
+    # reference_type of sales recorded from an offline client's create; reference_id holds the client's id
+    OFFLINE_SALE_REFERENCE = "offline_sale"
+    
     def __init__(self, supabase_client):
         self.supabase = supabase_client
     
@@ -249,6 +252,9 @@ class BusinessOperationsManager:
             total_cogs_aggregated = 0.0
             profit_from_sales_aggregated = 0.0
             
+            # Offline clients mint the sale id; the rows the RPC creates keep it as their reference
+            client_sale_id = sale_data.get("id")
+            
             sale_items = normalized_data.get('sale_items', [])
             if not sale_items:
                 logger.error(f"No sale items found after normalization - Data: {normalized_data}")
@@ -256,6 +262,7 @@ class BusinessOperationsManager:
 
             # Process each item in the sale with enhanced error handling
             processed_items = []
+            stock_changes = []
             last_sale_id = None
             
             logger.info(f"Processing {len(sale_items)} sale items for owner {owner_id}")
@@ -296,7 +303,9 @@ class BusinessOperationsManager:
                     # Fetch product details with error handling
                     logger.debug(f"Fetching product details for {product_id}")
                     try:
-                        product_result = self.supabase.table("products").select("name, cost_price").eq("id", product_id).single().execute()
+                        product_result = self.supabase.table("products").select(
+                            "name, cost_price, quantity, low_stock_threshold, reorder_level"
+                        ).eq("id", product_id).single().execute()
                         
                         if not product_result.data:
                             logger.error(f"Product not found: {product_id}")
@@ -407,6 +416,8 @@ class BusinessOperationsManager:
                         # Extract sale ID from result
                         if hasattr(result, 'data') and result.data:
                             last_sale_id = result.data
+                            if client_sale_id:
+                                self._tag_offline_sale(last_sale_id, client_sale_id, owner_id)
                         else:
                             last_sale_id = str(uuid.uuid4())  # Fallback ID
                         
@@ -416,6 +427,7 @@ class BusinessOperationsManager:
                             "sale_id": last_sale_id,
                             "amount": item_total_amount
                         })
+                        stock_changes.append(self._sale_stock_change(product_id, product, quantity))
                         
                         logger.info(f"Successfully processed sale item {item_index}: Product {product_id}, Amount {item_total_amount}")
                         
@@ -438,6 +450,7 @@ class BusinessOperationsManager:
                                 "sale_id": last_sale_id,
                                 "amount": item_total_amount
                             })
+                            stock_changes.append(self._sale_stock_change(product_id, product, quantity))
                             
                             logger.info(f"Successfully processed sale item {item_index} (despite client error): Product {product_id}, Amount {item_total_amount}")
                         else:
@@ -458,6 +471,16 @@ class BusinessOperationsManager:
             
             logger.info(f"Successfully processed {len(processed_items)} sale items. Total amount: {total_amount_aggregated}")
             
+            # Products this sale pushed below their threshold are checked now, not at the next scan
+            self._queue_low_stock_checks(stock_changes, owner_id)
+            self._publish_dashboard_delta(owner_id, {
+                "kind": "sale_recorded",
+                "sale_id": last_sale_id,
+                "amount": total_amount_aggregated,
+                "profit": profit_from_sales_aggregated,
+                "items": len(processed_items)
+            })
+            
             # Fetch the last created sale record for return
             try:
                 logger.debug(f"Fetching sale record for ID: {last_sale_id}")
@@ -518,14 +541,52 @@ class BusinessOperationsManager:
             logger.error(f"Returning categorized error - Code: {error_code.value}, Message: {user_message}")
             return False, f"Transaction processing error: {user_message}", None
     
+    def _tag_offline_sale(self, sale_id: str, client_sale_id: str, owner_id: str):
+        """Record the client's id on a sale so a replayed push finds it (see SyncService._find_created)"""
+        try:
+            self.supabase.table("sales").update({
+                "reference_id": client_sale_id,
+                "reference_type": self.OFFLINE_SALE_REFERENCE
+            }).eq("id", sale_id).eq("owner_id", owner_id).execute()
+        except Exception as e:
+            logger.warning(f"Could not tag sale {sale_id} with client id {client_sale_id}: {str(e)}")
+    
+    @staticmethod
+    def _sale_stock_change(product_id: str, product: Dict, quantity: int) -> Dict:
+        """Stock before and after create_sale_transaction took `quantity` units"""
+        old_quantity = int(product.get("quantity") or 0)
+        return {
+            "product_id": product_id,
+            "old_quantity": old_quantity,
+            "new_quantity": old_quantity - quantity,
+            "low_stock_threshold": product.get("low_stock_threshold"),
+            "reorder_level": product.get("reorder_level")
+        }
+    
+    def _queue_low_stock_checks(self, stock_changes: list, owner_id: str):
+        """Best effort: a missed event is picked up from inventory_changes"""
+        try:
+            from ..services.stock_events import emit_stock_changes
+            emit_stock_changes(owner_id, stock_changes)
+        except Exception as e:
+            logger.warning(f"Could not queue low stock checks: {str(e)}")
+    
+    def _publish_dashboard_delta(self, owner_id: str, delta: Dict):
+        """Best effort: connected dashboards apply the delta, others refresh over REST"""
+        try:
+            from ..services.realtime_events import publish
+            publish(self.supabase, [(owner_id, "dashboard", delta)])
+        except Exception as e:
+            logger.warning(f"Could not publish dashboard delta: {str(e)}")
+    
     def process_expense_transaction(self, expense_data: Dict, owner_id: str) -> Tuple[bool, Optional[str], Optional[Dict]]:
         """
         Process a complete expense transaction with transaction records
         Returns: (success, error_message, expense_record)
         """
         try:
-            # Create expense record
-            expense_id = str(uuid.uuid4())
+            # Create expense record; offline clients mint the id themselves
+            expense_id = expense_data.get("id") or str(uuid.uuid4())
             expense_record = {
                 "id": expense_id,
                 "owner_id": owner_id,
@@ -566,6 +627,12 @@ class BusinessOperationsManager:
                 # Don't rollback expense for transaction failure, just log warning
             
             logger.info(f"Expense transaction processed successfully: {expense_id}")
+            self._publish_dashboard_delta(owner_id, {
+                "kind": "expense_recorded",
+                "expense_id": expense_id,
+                "amount": float(expense_data["amount"]),
+                "category": expense_data["category"]
+            })
             return True, None, expense_result.data[0]
             
         except Exception as e:
@@ -0,0 +1,18 @@
+"""
+DB Errors - telling a missing database function apart from a failed call
+Code that prefers a Postgres function and falls back to PostgREST queries
+switches only when the function is not installed (PGRST202 from PostgREST,
+42883 from Postgres). A timeout or dropped connection may arrive after the
+function already committed, so repeating the work through the fallback
+could apply it twice; callers re-raise those.
+"""
+
+MISSING_FUNCTION_CODES = ('PGRST202', '42883')
+
+
+def missing_function(error: Exception) -> bool:
+    """Whether an rpc() error means the function does not exist"""
+    if getattr(error, 'code', None) in MISSING_FUNCTION_CODES:
+        return True
+    message = str(error)
+    return any(code in message for code in MISSING_FUNCTION_CODES) or 'Could not find the function' in message
@@ -3,8 +3,8 @@ import logging
 from typing import Dict, Optional, List, Union
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-import smtplib
 from dotenv import load_dotenv
+from .smtp_pool import get_smtp_pool
 
 logger = logging.getLogger(__name__)
 
@@ -47,7 +47,7 @@ def send_email(
         return False
 
     if not from_email:
-        from_email = DEFAULT_FROM_EMAIL
+        from_email = FROM_EMAIL
 
     if isinstance(to_emails, str):
         to_emails = [to_emails]
@@ -80,10 +80,10 @@ def send_email(
             msg.attach(part)
 
     try:
-        with smtplib.SMTP(SMTP_HOST, SMTP_PORT) as server:
-            server.starttls()
-            server.login(SMTP_USER, SMTP_PASS)
-            server.send_message(msg)
+        # Pooled session: no TCP+TLS+AUTH handshake per email
+        if not get_smtp_pool(SMTP_HOST, SMTP_PORT, SMTP_USER, SMTP_PASS).send(msg):
+            logger.error(f"Failed to send email to {', '.join(to_emails)}")
+            return False
         
         logger.info(f"Email sent successfully to {', '.join(to_emails)}")
         return True
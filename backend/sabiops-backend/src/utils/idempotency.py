@@ -0,0 +1,181 @@
+"""
+Idempotency keys for create endpoints
+Retried POSTs carrying the same Idempotency-Key header replay the first
+response instead of repeating stock, transaction and usage writes.
+
+The store lives in process memory. Under gunicorn that covers every retry
+the one worker process receives; on serverless (api/index.py on Vercel) each
+warm function instance has its own store, so a retry is only deduplicated
+when it lands on the instance that served the first attempt. Deduplicating
+across instances needs the keys kept in a shared table.
+"""
+
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from typing import Dict, Optional, Tuple
+
+from flask import jsonify, make_response, request
+from flask_jwt_extended import get_jwt_identity
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAY_HEADER = "Idempotent-Replayed"
+
+
+class _Entry:
+    """A stored response, or a placeholder for a request still running"""
+
+    __slots__ = ("fingerprint", "done", "response", "expires_at")
+
+    def __init__(self, fingerprint: str, expires_at: float):
+        self.fingerprint = fingerprint
+        self.done = threading.Event()
+        self.response: Optional[Tuple[bytes, int, Dict[str, str]]] = None
+        self.expires_at = expires_at
+
+
+class IdempotencyStore:
+    """Short-lived in-process map of (scope, key) -> response"""
+
+    def __init__(self, ttl_seconds: int = 3600, max_entries: int = 10000, wait_timeout: float = 30.0):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.wait_timeout = wait_timeout
+        self._entries: "OrderedDict[Tuple[str, str], _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def begin(self, scope: str, key: str, fingerprint: str) -> Tuple[bool, _Entry]:
+        """
+        Claim a key for a new request
+        Returns: (is_owner, entry) - is_owner is False when the key is already
+        completed or in flight, in which case the caller should wait/replay
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get((scope, key))
+            # A request still running keeps its key however long it takes
+            if entry and entry.done.is_set() and entry.expires_at <= now:
+                del self._entries[(scope, key)]
+                entry = None
+
+            if entry:
+                self._entries.move_to_end((scope, key))
+                return False, entry
+
+            entry = _Entry(fingerprint, now + self.ttl_seconds)
+            self._entries[(scope, key)] = entry
+            self._evict(now)
+            return True, entry
+
+    def complete(self, entry: _Entry, response) -> None:
+        """Store the response for replay and release waiting duplicates"""
+        entry.response = (response.get_data(), response.status_code, {"Content-Type": response.content_type})
+        entry.done.set()
+
+    def abandon(self, scope: str, key: str, entry: _Entry) -> None:
+        """Forget a key whose request failed so the client can retry it"""
+        with self._lock:
+            if self._entries.get((scope, key)) is entry:
+                del self._entries[(scope, key)]
+        entry.done.set()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def _evict(self, now: float) -> None:
+        # Drop expired entries from the oldest end, then cap the size. In-flight
+        # entries are skipped: evicting one would let a duplicate run the request again.
+        excess = len(self._entries) - self.max_entries
+        evicted = []
+        for entry_key, entry in self._entries.items():
+            if excess <= 0 and entry.expires_at > now:
+                break
+            if entry.done.is_set():
+                evicted.append(entry_key)
+                excess -= 1
+        for entry_key in evicted:
+            del self._entries[entry_key]
+
+
+idempotency_store = IdempotencyStore(
+    ttl_seconds=int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "3600")),
+    max_entries=int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", "10000"))
+)
+
+
+def _idempotency_error(message: str, status_code: int, headers: Optional[Dict[str, str]] = None):
+    return jsonify({
+        "success": False,
+        "error": message,
+        "message": message,
+        "toast": {
+            "type": "error",
+            "message": message,
+            "timeout": 4000
+        }
+    }), status_code, headers or {}
+
+
+def idempotent(f):
+    """
+    Replay the stored response for a repeated Idempotency-Key.
+
+    Keys are scoped to the authenticated user, so this must run after
+    @jwt_required(). Place it above the subscription decorators so a replay
+    does not repeat their usage checks. Requests without the header are
+    handled as before. Responses with a 5xx status are not stored, so the
+    client can retry them with the same key; duplicates that were waiting on
+    such a request get a 503 with Retry-After.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key:
+            return f(*args, **kwargs)
+
+        key = key.strip()
+        if not key or len(key) > 255:
+            return _idempotency_error(f"Invalid {IDEMPOTENCY_HEADER} header", 400)
+
+        scope = f"{get_jwt_identity()}:{request.method}:{request.path}"
+        fingerprint = hashlib.sha256(request.get_data() or b"").hexdigest()
+
+        is_owner, entry = idempotency_store.begin(scope, key, fingerprint)
+
+        if not is_owner:
+            if entry.fingerprint != fingerprint:
+                return _idempotency_error(f"{IDEMPOTENCY_HEADER} was already used with a different request body", 422)
+
+            if not entry.done.wait(idempotency_store.wait_timeout):
+                return _idempotency_error("A request with this idempotency key is still being processed", 409)
+            if entry.response is None:
+                # The first request failed and released the key
+                return _idempotency_error("The request with this idempotency key failed; please retry", 503,
+                                          {"Retry-After": "1"})
+
+            body, status_code, headers = entry.response
+            response = make_response(body, status_code, headers)
+            response.headers[REPLAY_HEADER] = "true"
+            logger.info(f"Replayed idempotent response for {request.path} (key={key})")
+            return response
+
+        try:
+            response = make_response(f(*args, **kwargs))
+        except Exception:
+            idempotency_store.abandon(scope, key, entry)
+            raise
+
+        if response.status_code >= 500:
+            idempotency_store.abandon(scope, key, entry)
+        else:
+            idempotency_store.complete(entry, response)
+        return response
+
+    return decorated_function
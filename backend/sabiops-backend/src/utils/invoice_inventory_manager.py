@@ -1,12 +1,14 @@
 import logging
 from typing import Dict, List
 from datetime import datetime, timezone
+from .stock_engine import StockEngine
 
 logger = logging.getLogger(__name__)
 
 class InvoiceInventoryManager:
     def __init__(self, supabase_client):
         self.supabase = supabase_client
+        self.stock_engine = StockEngine(supabase_client)
     
     def reserve_inventory(self, invoice_items: List[Dict], owner_id: str) -> bool:
         """
@@ -14,33 +16,21 @@ class InvoiceInventoryManager:
         Returns: Boolean indicating success
         """
         try:
-            for item in invoice_items:
-                product_id = item.get("product_id")
-                quantity = int(item.get("quantity", 0))
-                
-                if not product_id or quantity <= 0:
-                    continue
-                
-                # Get current product inventory
-                product_result = self.supabase.table("products").select("quantity").eq("id", product_id).eq("owner_id", owner_id).single().execute()
-                
-                if not product_result.data:
-                    logger.warning(f"Product {product_id} not found for inventory reservation")
+            availability = self.stock_engine.check_availability(invoice_items, owner_id)
+            
+            for line in availability["lines"]:
+                if not line["found"]:
+                    logger.warning(f"Product {line['product_id']} not found for inventory reservation")
                     continue
                 
-                product = product_result.data
-                current_qty = int(product.get("quantity", 0))
-                
                 # Check if enough inventory available
-                if current_qty < quantity:
-                    logger.warning(f"Insufficient inventory for product {product_id}: available={current_qty}, requested={quantity}")
+                if not line["sufficient"]:
+                    logger.warning(f"Insufficient inventory for product {line['product_id']}: available={line['available']}, requested={line['requested']}")
                     return False
                 
                 # For now, we'll just log the reservation without updating the database
                 # since reserved_quantity column doesn't exist
-                logger.info(f"Would reserve {quantity} units of product {product_id} (current: {current_qty})")
-                
-                logger.info(f"Reserved {quantity} units of product {product_id}")
+                logger.info(f"Reserved {line['requested']} units of product {line['product_id']} (current: {line['available']})")
             
             return True
             
@@ -60,25 +50,18 @@ class InvoiceInventoryManager:
                 "warnings": []
             }
             
-            for item in invoice_items:
-                product_id = item.get("product_id")
-                quantity = int(item.get("quantity", 0))
-                
-                if not product_id or quantity <= 0:
-                    continue
-                
-                # Get current product inventory
-                product_result = self.supabase.table("products").select("name, quantity").eq("id", product_id).eq("owner_id", owner_id).single().execute()
-                
-                if not product_result.data:
+            # One query for every product on the invoice
+            availability = self.stock_engine.check_availability(invoice_items, owner_id)
+            
+            for line in availability["lines"]:
+                if not line["found"]:
                     validation_result["valid"] = False
-                    validation_result["errors"].append(f"Product {product_id} not found")
+                    validation_result["errors"].append(f"Product {line['product_id']} not found")
                     continue
                 
-                product = product_result.data
-                product_name = product.get("name", f"Product {product_id}")
-                current_qty = int(product.get("quantity", 0))
-                available_qty = current_qty  # No reserved quantity tracking for now
+                product_name = line["name"] or f"Product {line['product_id']}"
+                available_qty = line["available"]  # No reserved quantity tracking for now
+                quantity = line["requested"]
                 
                 # Check if enough inventory available
                 if available_qty < quantity:
@@ -122,37 +105,20 @@ class InvoiceInventoryManager:
     def reduce_inventory_on_invoice_creation(self, invoice_items: List[Dict], owner_id: str) -> bool:
         """
         Reduce inventory immediately when invoice is created (like sales do)
-        This prevents overselling by committing products to the invoice
+        This prevents overselling by committing products to the invoice.
+        All lines are deducted together or not at all.
         """
         try:
-            for item in invoice_items:
-                product_id = item.get("product_id")
-                quantity = int(item.get("quantity", 0))
-                
-                if not product_id or quantity <= 0:
-                    continue
-                
-                # Get current product
-                product_result = self.supabase.table("products").select("quantity").eq("id", product_id).eq("owner_id", owner_id).single().execute()
-                
-                if not product_result.data:
-                    logger.warning(f"Product {product_id} not found for inventory reduction")
-                    continue
-                
-                product = product_result.data
-                current_qty = int(product.get("quantity", 0))
-                
-                # Reduce quantity immediately (like sales)
-                new_quantity = max(0, current_qty - quantity)
-                
-                # Update product quantity
-                self.supabase.table("products").update({
-                    "quantity": new_quantity,
-                    "updated_at": datetime.now(timezone.utc).isoformat()
-                }).eq("id", product_id).execute()
-                
-                logger.info(f"Reduced inventory on invoice creation - Product {product_id}: {current_qty} -> {new_quantity}")
+            result = self.stock_engine.deduct(invoice_items, owner_id, all_or_nothing=True)
+            
+            if not result["success"]:
+                logger.warning(f"Inventory not reduced on invoice creation: {result['message']}")
+                return False
             
+            for line in result["lines"]:
+                logger.info(f"Reduced inventory on invoice creation - Product {line['product_id']}: -{line['requested']} -> {line['remaining']}")
+            
+            self._queue_low_stock_checks(result["lines"], owner_id)
             return True
             
         except Exception as e:
@@ -165,38 +131,29 @@ class InvoiceInventoryManager:
         Returns: Boolean indicating success
         """
         try:
-            for item in invoice_items:
-                product_id = item.get("product_id")
-                quantity = int(item.get("quantity", 0))
-                
-                if not product_id or quantity <= 0:
-                    continue
-                
-                # Get current product inventory
-                product_result = self.supabase.table("products").select("quantity").eq("id", product_id).eq("owner_id", owner_id).single().execute()
-                
-                if not product_result.data:
-                    continue
-                
-                product = product_result.data
-                current_qty = int(product.get("quantity", 0))
-                
-                # Deduct from available quantity
-                new_qty = max(0, current_qty - quantity)
-                
-                self.supabase.table("products").update({
-                    "quantity": new_qty,
-                    "updated_at": datetime.now(timezone.utc).isoformat()
-                }).eq("id", product_id).execute()
-                
-                logger.info(f"Deducted {quantity} units of product {product_id}, new quantity: {new_qty}")
+            result = self.stock_engine.deduct(invoice_items, owner_id, all_or_nothing=False)
             
+            for line in result["lines"]:
+                if line["success"]:
+                    logger.info(f"Deducted {line['requested']} units of product {line['product_id']}, new quantity: {line['remaining']}")
+                else:
+                    logger.warning(f"Could not deduct {line['requested']} units of product {line['product_id']}: remaining={line['remaining']}")
+            
+            self._queue_low_stock_checks(result["lines"], owner_id)
             return True
             
         except Exception as e:
             logger.error(f"Error deducting inventory: {str(e)}")
             return False
     
+    def _queue_low_stock_checks(self, lines: List[Dict], owner_id: str):
+        """Hand the products this deduction touched to the low stock check"""
+        try:
+            from src.services.stock_events import emit_stock_changes, deduction_changes
+            emit_stock_changes(owner_id, deduction_changes(lines))
+        except Exception as e:
+            logger.warning(f"Could not queue low stock checks: {str(e)}")
+    
     def get_inventory_status(self, product_id: str, owner_id: str) -> Dict:
         """
         Get inventory status for a specific product
@@ -231,25 +188,20 @@ class InvoiceInventoryManager:
         """
         try:
             insufficient_items = []
+            availability = self.stock_engine.check_availability(invoice_items, owner_id)
             
-            for item in invoice_items:
-                product_id = item.get("product_id")
-                quantity = int(item.get("quantity", 0))
-                
-                if not product_id or quantity <= 0:
+            for line in availability["lines"]:
+                if line["sufficient"]:
                     continue
                 
-                inventory_status = self.get_inventory_status(product_id, owner_id)
-                available = inventory_status["available"]
-                
-                if available < quantity:
-                    insufficient_items.append({
-                        "product_id": product_id,
-                        "product_name": inventory_status["name"],
-                        "requested": quantity,
-                        "available": available,
-                        "shortage": quantity - available
-                    })
+                available = line["available"] or 0
+                insufficient_items.append({
+                    "product_id": line["product_id"],
+                    "product_name": line["name"] or "Unknown",
+                    "requested": line["requested"],
+                    "available": available,
+                    "shortage": line["requested"] - available
+                })
             
             if insufficient_items:
                 return {
@@ -289,34 +241,16 @@ class InvoiceInventoryManager:
                 logger.info(f"Inventory already updated for invoice {invoice_data.get('id')}")
                 return True
             
-            # Process each item (reduce inventory if not already done)
-            for item in items:
-                product_id = item.get("product_id")
-                quantity = int(item.get("quantity", 0))
-                
-                if not product_id or quantity <= 0:
-                    continue
-                
-                # Get current product
-                product_result = self.supabase.table("products").select("quantity").eq("id", product_id).eq("owner_id", owner_id).single().execute()
-                
-                if not product_result.data:
-                    logger.warning(f"Product {product_id} not found for inventory reduction")
-                    continue
-                
-                product = product_result.data
-                current_qty = int(product.get("quantity", 0))
-                
-                # Reduce quantity (if not already reduced)
-                new_quantity = max(0, current_qty - quantity)
-                
-                # Update product quantity
-                self.supabase.table("products").update({
-                    "quantity": new_quantity,
-                    "updated_at": datetime.now(timezone.utc).isoformat()
-                }).eq("id", product_id).execute()
-                
-                logger.info(f"Processed inventory for paid invoice - Product {product_id}: {current_qty} -> {new_quantity}")
+            # Reduce every line in one conditional decrement (if not already done)
+            result = self.stock_engine.deduct(items, owner_id, all_or_nothing=False)
+            
+            for line in result["lines"]:
+                if line["success"]:
+                    logger.info(f"Processed inventory for paid invoice - Product {line['product_id']}: -{line['requested']} -> {line['remaining']}")
+                else:
+                    logger.warning(f"Insufficient stock for paid invoice - Product {line['product_id']}: requested={line['requested']}, remaining={line['remaining']}")
+            
+            self._queue_low_stock_checks(result["lines"], owner_id)
             
             # Mark invoice as inventory updated
             self.supabase.table("invoices").update({
@@ -0,0 +1,120 @@
+"""
+Invoice Numbering - Atomic per-owner, per-day invoice number allocation
+Numbers come from one counter increment (allocate_invoice_numbers RPC) instead
+of counting the day's invoices and probing until a free number is found.
+"""
+
+import logging
+import os
+import threading
+import uuid
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from .db_errors import missing_function
+
+logger = logging.getLogger(__name__)
+
+
+class InvoiceNumberAllocator:
+    """
+    Hands out INV-YYYYMMDD-XXXX numbers, unique per owner and gap-tolerant.
+
+    With block_size > 1 each process reserves that many numbers at once and
+    serves them from memory, so only one invoice in every block_size touches
+    the database. Numbers left unused in a block (process restart, day change)
+    are skipped, never reissued.
+    """
+
+    RPC_NAME = "allocate_invoice_numbers"
+
+    def __init__(self, block_size: int = 1):
+        self.block_size = max(1, int(block_size))
+        self._blocks: Dict[Tuple[str, str], list] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def format_number(day: str, value: int) -> str:
+        return f"INV-{day}-{value:04d}"
+
+    def allocate(self, supabase, owner_id: str, now: Optional[datetime] = None) -> str:
+        """Next invoice number for the owner; RPC errors other than a missing function are raised"""
+        now = now or datetime.now()
+        day = now.strftime('%Y%m%d')
+        key = (str(owner_id), day)
+
+        try:
+            if self.block_size == 1:
+                value = self._reserve(supabase, owner_id, now.date().isoformat(), 1)
+            else:
+                value = self._next_from_block(supabase, owner_id, key, now)
+            return self.format_number(day, value)
+        except Exception as e:
+            # A failed call may already have advanced the counter; scanning then
+            # could hand out a number the counter also gives to someone else
+            if not missing_function(e):
+                raise
+            logger.warning(f"Invoice number RPC unavailable, falling back to scan: {str(e)}")
+
+        try:
+            return self._scan_for_number(supabase, owner_id, now)
+        except Exception as e:
+            logger.error(f"Invoice number fallback failed: {str(e)}")
+            return f"INV-{day}-{str(uuid.uuid4())[:8].upper()}"
+
+    def _next_from_block(self, supabase, owner_id: str, key: Tuple[str, str], now: datetime) -> int:
+        with self._lock:
+            # Only today's blocks are worth keeping
+            for stale in [k for k in self._blocks if k[1] != key[1]]:
+                del self._blocks[stale]
+            block = self._blocks.setdefault(key, [1, 0, threading.Lock()])
+
+        # Per-owner lock: one owner refilling a block does not stall the others
+        with block[2]:
+            if block[0] > block[1]:
+                first = self._reserve(supabase, owner_id, now.date().isoformat(), self.block_size)
+                block[0], block[1] = first, first + self.block_size - 1
+            value = block[0]
+            block[0] += 1
+            return value
+
+    def _reserve(self, supabase, owner_id: str, day: str, count: int) -> int:
+        result = supabase.rpc(self.RPC_NAME, {
+            'p_owner_id': owner_id,
+            'p_day': day,
+            'p_count': count
+        }).execute()
+
+        first = result.data
+        if isinstance(first, list):
+            first = first[0] if first else None
+        if isinstance(first, dict):
+            first = first.get(self.RPC_NAME)
+        if first is None:
+            raise ValueError("allocate_invoice_numbers returned no value")
+        return int(first)
+
+    def _scan_for_number(self, supabase, owner_id: str, now: datetime) -> str:
+        """Pre-migration path: count today's invoices, then probe for a free number"""
+        day = now.strftime('%Y%m%d')
+        prefix = f"INV-{day}-"
+
+        # Until migration 013 invoice_number is unique across all owners, so
+        # every owner's numbers for the day are taken
+        result = supabase.table("invoices").select("invoice_number") \
+            .like("invoice_number", f"{prefix}%").execute()
+        taken = {row.get("invoice_number") for row in (result.data or [])}
+
+        count = len(taken) + 1
+        while self.format_number(day, count) in taken:
+            count += 1
+        return self.format_number(day, count)
+
+    def reset(self):
+        with self._lock:
+            self._blocks.clear()
+
+
+invoice_number_allocator = InvoiceNumberAllocator(
+    block_size=int(os.getenv('INVOICE_NUMBER_BLOCK_SIZE', '1'))
+)
@@ -7,6 +7,7 @@ import logging
 from datetime import datetime, timezone
 from typing import Dict, List, Optional, Tuple, Any
 import uuid
+from .stock_engine import StockEngine
 
 logger = logging.getLogger(__name__)
 
@@ -267,39 +268,26 @@ class InvoiceStatusManager:
             if not items:
                 return {"success": True, "message": "No items to process"}
             
-            inventory_updates = []
-            
-            for item in items:
-                product_id = item.get("product_id")
-                quantity = item.get("quantity", 0)
-                
-                if product_id and quantity > 0:
-                    # Get current product inventory
-                    product_result = self.supabase.table("products").select("quantity, reserved_quantity").eq("id", product_id).single().execute()
-                    
-                    if product_result.data:
-                        current_qty = int(product_result.data.get("quantity", 0))
-                        reserved_qty = int(product_result.data.get("reserved_quantity", 0))
-                        
-                        # Deduct from available quantity
-                        new_qty = max(0, current_qty - quantity)
-                        # Also reduce reserved quantity if it exists
-                        new_reserved = max(0, reserved_qty - quantity)
-                        
-                        self.supabase.table("products").update({
-                            "quantity": new_qty,
-                            "reserved_quantity": new_reserved,
-                            "updated_at": datetime.now(timezone.utc).isoformat()
-                        }).eq("id", product_id).execute()
-                        
-                        inventory_updates.append({
-                            "product_id": product_id,
-                            "quantity_deducted": quantity,
-                            "new_quantity": new_qty
-                        })
+            # One conditional decrement for every line on the invoice. The goods
+            # have been paid for, so a line short on stock takes what is left
+            # (the product ends at 0) rather than being skipped. There is no
+            # reserved_quantity column (see InvoiceInventoryManager), so there
+            # is no reservation to release here.
+            result = StockEngine(self.supabase).deduct(items, invoice.get("owner_id"), all_or_nothing=False, clamp=True)
+            
+            inventory_updates = [
+                {
+                    "product_id": line["product_id"],
+                    "quantity_deducted": line.get("deducted", line["requested"]),
+                    "new_quantity": line["remaining"]
+                }
+                for line in result["lines"] if line["success"]
+            ]
             
             if inventory_updates:
                 logger.info(f"Inventory updated for {len(inventory_updates)} products on invoice payment")
+                from src.services.stock_events import emit_stock_changes, deduction_changes
+                emit_stock_changes(invoice.get("owner_id"), deduction_changes(result["lines"]))
             
             return {"success": True, "message": f"Inventory updated for {len(inventory_updates)} products"}
             
@@ -0,0 +1,73 @@
+"""
+Keyset Scan - bounded-memory sweeps over whole tables
+Pages through a table with "key > last ORDER BY key LIMIT n" and a projected
+column list, yielding one page at a time. A platform-wide sweep holds at most
+one page in memory, never trips PostgREST's max-rows cap and, unlike offset
+paging, neither skips nor repeats rows when the sweep itself updates them.
+"""
+
+import asyncio
+import logging
+import os
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PAGE_SIZE = int(os.getenv('KEYSET_PAGE_SIZE', '1000'))
+
+
+def keyset_pages(
+    supabase,
+    table: str,
+    columns: str,
+    where: Optional[Callable] = None,
+    key: str = 'id',
+    page_size: Optional[int] = None,
+    after: Any = None
+) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Yield pages of `table` rows ordered by `key`, which must be unique.
+
+    where: applies the sweep's filters to a select builder, e.g.
+           lambda query: query.eq('active', True)
+    after: resume after this key value
+    """
+    page_size = page_size or DEFAULT_PAGE_SIZE
+    projected = [column.strip() for column in columns.split(',')]
+    if key not in projected and '*' not in projected:
+        projected.append(key)
+    columns = ', '.join(projected)
+
+    last = after
+    pages = 0
+    while True:
+        query = supabase.table(table).select(columns)
+        if where:
+            query = where(query)
+        if last is not None:
+            query = query.gt(key, last)
+        page = query.order(key).limit(page_size).execute().data or []
+
+        # A short page is not proof of the end: PostgREST may cap pages below page_size
+        if not page:
+            logger.debug(f"Keyset scan of {table} finished after {pages} pages")
+            return
+        pages += 1
+        yield page
+        last = page[-1][key]
+
+
+async def keyset_pages_async(supabase, table: str, columns: str, **kwargs) -> AsyncIterator[List[Dict[str, Any]]]:
+    """keyset_pages for coroutines: each page is fetched on a worker thread, so the event loop stays free"""
+    pages = keyset_pages(supabase, table, columns, **kwargs)
+    while True:
+        page = await asyncio.to_thread(next, pages, None)
+        if page is None:
+            return
+        yield page
+
+
+def keyset_rows(supabase, table: str, columns: str, **kwargs) -> Iterator[Dict[str, Any]]:
+    """Row-at-a-time view of keyset_pages"""
+    for page in keyset_pages(supabase, table, columns, **kwargs):
+        yield from page
@@ -0,0 +1,225 @@
+"""
+SMTP Pool - Reusable authenticated SMTP sessions
+Each send used to open a TCP connection, run STARTTLS and log in. The pool keeps
+a few logged-in sessions open, reconnects when the server drops one, and can
+send a batch of messages over a single session.
+"""
+
+import logging
+import os
+import smtplib
+import threading
+import time
+from email.message import Message
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def _is_connection_error(error: Exception) -> bool:
+    """Dead-session errors; other SMTPExceptions (also OSErrors) mean the server rejected the message"""
+    if isinstance(error, (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError)):
+        return True
+    return isinstance(error, OSError) and not isinstance(error, smtplib.SMTPException)
+
+
+class RateLimiter:
+    """Token bucket allowing `rate` sends per second with bursts up to `rate`"""
+
+    def __init__(self, rate: float):
+        self.rate = float(rate)
+        self._tokens = self.rate
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.rate, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class _Session:
+    __slots__ = ("server", "opened_at", "last_used", "sent")
+
+    def __init__(self, server):
+        self.server = server
+        self.opened_at = self.last_used = time.monotonic()
+        self.sent = 0
+
+
+class SMTPConnectionPool:
+    """Bounded pool of logged-in SMTP sessions shared by every sender in the process"""
+
+    def __init__(self, host: str, port: int, username: Optional[str] = None, password: Optional[str] = None,
+                 use_tls: bool = True, pool_size: int = 2, max_idle_seconds: float = 60.0,
+                 max_messages_per_session: int = 100, rate_limit: float = 0, timeout: float = 30.0,
+                 connection_factory: Callable[..., smtplib.SMTP] = smtplib.SMTP):
+        self.host = host
+        self.port = int(port)
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.max_idle_seconds = max_idle_seconds
+        self.max_messages_per_session = max_messages_per_session
+        self.timeout = timeout
+        self.connection_factory = connection_factory
+        self.rate_limiter = RateLimiter(rate_limit) if rate_limit and rate_limit > 0 else None
+
+        self._slots = threading.BoundedSemaphore(max(1, int(pool_size)))
+        self._idle: List[_Session] = []
+        self._lock = threading.Lock()
+        self.stats = {"connections_opened": 0, "messages_sent": 0, "reconnects": 0}
+
+    # ------------------------------------------------------------------
+    # Sessions
+    # ------------------------------------------------------------------
+
+    def _open(self) -> _Session:
+        server = self.connection_factory(self.host, self.port, timeout=self.timeout)
+        try:
+            server.ehlo()
+            if self.use_tls:
+                server.starttls()
+                server.ehlo()
+            if self.username and self.password:
+                server.login(self.username, self.password)
+        except Exception:
+            self._quit(server)
+            raise
+        with self._lock:
+            self.stats["connections_opened"] += 1
+        return _Session(server)
+
+    @staticmethod
+    def _quit(server):
+        try:
+            server.quit()
+        except Exception:
+            try:
+                server.close()
+            except Exception:
+                pass
+
+    def _checkout(self) -> _Session:
+        """Reuse an idle session when it is still fresh, otherwise log in again"""
+        while True:
+            with self._lock:
+                session = self._idle.pop() if self._idle else None
+            if session is None:
+                return self._open()
+            if time.monotonic() - session.last_used > self.max_idle_seconds:
+                # Servers drop idle clients; a NOOP is cheaper than a failed send
+                try:
+                    session.server.noop()
+                except Exception:
+                    self._quit(session.server)
+                    continue
+            return session
+
+    def _checkin(self, session: _Session):
+        session.last_used = time.monotonic()
+        if session.sent >= self.max_messages_per_session:
+            self._quit(session.server)
+            return
+        with self._lock:
+            self._idle.append(session)
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for session in idle:
+            self._quit(session.server)
+
+    # ------------------------------------------------------------------
+    # Sending
+    # ------------------------------------------------------------------
+
+    def _send_on(self, session: _Session, message: Message, from_addr: Optional[str],
+                 to_addrs: Optional[List[str]]) -> Tuple[_Session, bool]:
+        """Send one message, reconnecting once if the session died. Returns (session, sent)."""
+        if self.rate_limiter:
+            self.rate_limiter.acquire()
+
+        for attempt in (1, 2):
+            if session is None:
+                session = self._open()
+            try:
+                session.server.send_message(message, from_addr=from_addr, to_addrs=to_addrs)
+                session.sent += 1
+                with self._lock:
+                    self.stats["messages_sent"] += 1
+                return session, True
+            except OSError as e:
+                if not _is_connection_error(e):
+                    # Rejected recipient or message; the session itself is still usable
+                    logger.error(f"SMTP server rejected message to {message.get('To')}: {str(e)}")
+                    return session, False
+                self._quit(session.server)
+                session = None
+                if attempt == 1:
+                    with self._lock:
+                        self.stats["reconnects"] += 1
+                    logger.warning(f"SMTP session lost ({str(e)}), reconnecting")
+                    continue
+                logger.error(f"SMTP send failed after reconnect: {str(e)}")
+        return session, False
+
+    def send(self, message: Message, from_addr: Optional[str] = None, to_addrs: Optional[List[str]] = None) -> bool:
+        return self.send_batch([(message, from_addr, to_addrs)])[0]
+
+    def send_batch(self, messages: List) -> List[bool]:
+        """
+        Send messages over one session. Items are Message objects or
+        (message, from_addr, to_addrs) tuples. Returns one success flag per item.
+        """
+        results = []
+        with self._slots:
+            session = None
+            try:
+                session = self._checkout()
+            except Exception as e:
+                logger.error(f"Could not open SMTP session to {self.host}:{self.port}: {str(e)}")
+
+            for item in messages:
+                message, from_addr, to_addrs = item if isinstance(item, tuple) else (item, None, None)
+                try:
+                    session, sent = self._send_on(session, message, from_addr, to_addrs)
+                except Exception as e:
+                    logger.error(f"SMTP send failed: {str(e)}")
+                    # The session may be mid-command; close it rather than leak the socket
+                    if session is not None:
+                        self._quit(session.server)
+                    session, sent = None, False
+                results.append(sent)
+
+            if session is not None:
+                self._checkin(session)
+        return results
+
+
+_pools: Dict[tuple, SMTPConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_smtp_pool(host: str, port: int, username: Optional[str] = None, password: Optional[str] = None) -> SMTPConnectionPool:
+    """Process-wide pool for these credentials, configured from SMTP_* environment variables"""
+    key = (host, int(port), username)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = SMTPConnectionPool(
+                host, port, username, password,
+                use_tls=os.getenv('SMTP_USE_TLS', 'true').lower() != 'false',
+                pool_size=int(os.getenv('SMTP_POOL_SIZE', '2')),
+                max_idle_seconds=float(os.getenv('SMTP_MAX_IDLE_SECONDS', '60')),
+                rate_limit=float(os.getenv('SMTP_RATE_LIMIT', '0')),
+            )
+            _pools[key] = pool
+        return pool
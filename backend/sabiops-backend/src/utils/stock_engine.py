@@ -0,0 +1,221 @@
+"""
+Stock Engine - Set-based inventory checks and atomic stock deduction
+Replaces per-line "read quantity, write quantity - n" with one conditional
+decrement for every line of a sale or invoice.
+"""
+
+import logging
+from datetime import datetime, timezone
+from typing import Dict, List, Iterable
+
+from .db_errors import missing_function
+
+logger = logging.getLogger(__name__)
+
+
+class StockEngine:
+    """Batched stock lookups and conditional (quantity >= n) decrements"""
+
+    RPC_NAME = "deduct_stock_batch"
+    MAX_CAS_RETRIES = 5
+
+    def __init__(self, supabase_client):
+        self.supabase = supabase_client
+
+    @staticmethod
+    def aggregate_lines(items: Iterable[Dict]) -> Dict[str, int]:
+        """
+        Collapse line items into {product_id: total_quantity}
+        Lines without a product or with a non-positive quantity are ignored
+        """
+        totals: Dict[str, int] = {}
+        for item in items or []:
+            product_id = item.get("product_id")
+            try:
+                quantity = int(float(item.get("quantity", 0) or 0))
+            except (TypeError, ValueError):
+                quantity = 0
+
+            if not product_id or quantity <= 0:
+                continue
+
+            product_id = str(product_id)
+            totals[product_id] = totals.get(product_id, 0) + quantity
+        return totals
+
+    def fetch_stock(self, product_ids: List[str], owner_id: str, columns: str = "id, name, quantity") -> Dict[str, Dict]:
+        """
+        Load stock for many products with a single in_() query
+        Returns: {product_id: product_row}
+        """
+        if not product_ids:
+            return {}
+
+        result = self.supabase.table("products").select(columns).in_("id", list(product_ids)).eq("owner_id", owner_id).execute()
+        return {str(row["id"]): row for row in (result.data or [])}
+
+    def check_availability(self, items: List[Dict], owner_id: str) -> Dict:
+        """
+        Check every line against current stock in one round trip
+        Returns: {"valid": bool, "lines": [{product_id, name, requested, available, sufficient}]}
+        """
+        totals = self.aggregate_lines(items)
+        stock = self.fetch_stock(list(totals.keys()), owner_id)
+
+        lines = []
+        for product_id, requested in totals.items():
+            product = stock.get(product_id)
+            available = int(product.get("quantity", 0) or 0) if product else None
+            lines.append({
+                "product_id": product_id,
+                "name": product.get("name") if product else None,
+                "requested": requested,
+                "available": available,
+                "found": product is not None,
+                "sufficient": available is not None and available >= requested
+            })
+
+        return {"valid": all(line["sufficient"] for line in lines), "lines": lines}
+
+    def deduct(self, items: List[Dict], owner_id: str, all_or_nothing: bool = True, clamp: bool = False) -> Dict:
+        """
+        Atomically decrement stock for all lines where quantity >= requested
+        Returns: {"success": bool, "message": str, "lines": [{product_id, requested, success, remaining}]}
+
+        With clamp (partial mode only) a line short on stock takes what is
+        left instead of failing; the product ends at 0 and the line's
+        "deducted" says how much was actually taken.
+        """
+        totals = self.aggregate_lines(items)
+        if not totals:
+            return {"success": True, "message": "No stock lines to process", "lines": []}
+
+        try:
+            lines = self._deduct_via_rpc(totals, owner_id, all_or_nothing)
+        except Exception as rpc_error:
+            # A timeout may have committed; deducting again through CAS would double it
+            if not missing_function(rpc_error):
+                raise
+            logger.warning(f"{self.RPC_NAME} RPC not available, using compare-and-swap updates: {str(rpc_error)}")
+            lines = self._deduct_via_cas(totals, owner_id, all_or_nothing)
+
+        if clamp and not all_or_nothing:
+            lines = [
+                self._clamp_to_zero(line, owner_id) if not line["success"] and line["remaining"] is not None else line
+                for line in lines
+            ]
+
+        failed = [line for line in lines if not line["success"]]
+        if failed:
+            message = f"Insufficient stock for {len(failed)} of {len(lines)} products"
+        else:
+            message = f"Stock deducted for {len(lines)} products"
+
+        return {"success": not failed, "message": message, "lines": lines}
+
+    def _deduct_via_rpc(self, totals: Dict[str, int], owner_id: str, all_or_nothing: bool) -> List[Dict]:
+        result = self.supabase.rpc(self.RPC_NAME, {
+            "p_owner_id": owner_id,
+            "p_items": [{"product_id": pid, "quantity": qty} for pid, qty in totals.items()],
+            "p_all_or_nothing": all_or_nothing
+        }).execute()
+
+        if not isinstance(result.data, list):
+            raise ValueError(f"Unexpected {self.RPC_NAME} response: {result.data}")
+
+        lines = []
+        for row in result.data:
+            remaining = row.get("remaining")
+            lines.append({
+                "product_id": str(row.get("product_id")),
+                "requested": int(row.get("requested", 0)),
+                "success": bool(row.get("success")),
+                "remaining": int(remaining) if remaining is not None else None
+            })
+        return lines
+
+    def _deduct_via_cas(self, totals: Dict[str, int], owner_id: str, all_or_nothing: bool) -> List[Dict]:
+        """
+        Fallback for databases without the RPC: one batched read, then a
+        conditional update per line guarded on the quantity that was read.
+        A lost race re-reads that product and retries instead of overwriting.
+        """
+        stock = self.fetch_stock(list(totals.keys()), owner_id, columns="id, quantity")
+        current = {pid: int(row.get("quantity", 0) or 0) for pid, row in stock.items()}
+
+        if all_or_nothing and any(current.get(pid, -1) < qty for pid, qty in totals.items()):
+            return [
+                {"product_id": pid, "requested": qty, "success": False, "remaining": current.get(pid)}
+                for pid, qty in totals.items()
+            ]
+
+        lines = []
+        applied = []
+        for product_id, requested in totals.items():
+            success, remaining = self._cas_adjust(product_id, owner_id, -requested, current.get(product_id))
+            lines.append({"product_id": product_id, "requested": requested, "success": success, "remaining": remaining})
+
+            if success:
+                applied.append((product_id, requested))
+            elif all_or_nothing:
+                break
+
+        if all_or_nothing and len(applied) != len(totals):
+            # Lost a race after the availability check; put back what was taken
+            for product_id, requested in applied:
+                self._cas_adjust(product_id, owner_id, requested, None)
+            return [
+                {"product_id": pid, "requested": qty, "success": False, "remaining": None}
+                for pid, qty in totals.items()
+            ]
+
+        return lines
+
+    def _clamp_to_zero(self, line: Dict, owner_id: str) -> Dict:
+        """Take up to the requested amount from a short line, guarded on the quantity last seen"""
+        product_id = line["product_id"]
+        quantity = line["remaining"]
+        for _ in range(self.MAX_CAS_RETRIES):
+            taken = max(0, min(quantity, line["requested"]))
+            result = self.supabase.table("products").update({
+                "quantity": quantity - taken,
+                "updated_at": datetime.now(timezone.utc).isoformat()
+            }).eq("id", product_id).eq("owner_id", owner_id).eq("quantity", quantity).execute()
+
+            if result.data:
+                return dict(line, success=True, remaining=quantity - taken, deducted=taken)
+
+            row = self.fetch_stock([product_id], owner_id, columns="id, quantity").get(product_id)
+            if not row:
+                break
+            quantity = int(row.get("quantity", 0) or 0)
+
+        logger.warning(f"Gave up clamping stock for product {product_id} after {self.MAX_CAS_RETRIES} conflicting updates")
+        return line
+
+    def _cas_adjust(self, product_id: str, owner_id: str, delta: int, known_quantity):
+        """Apply quantity += delta only if quantity is unchanged since it was read"""
+        quantity = known_quantity
+        for _ in range(self.MAX_CAS_RETRIES):
+            if quantity is None:
+                row = self.fetch_stock([product_id], owner_id, columns="id, quantity").get(product_id)
+                if not row:
+                    return False, None
+                quantity = int(row.get("quantity", 0) or 0)
+
+            new_quantity = quantity + delta
+            if new_quantity < 0:
+                return False, quantity
+
+            result = self.supabase.table("products").update({
+                "quantity": new_quantity,
+                "updated_at": datetime.now(timezone.utc).isoformat()
+            }).eq("id", product_id).eq("owner_id", owner_id).eq("quantity", quantity).execute()
+
+            if result.data:
+                return True, new_quantity
+
+            quantity = None
+
+        logger.warning(f"Gave up adjusting stock for product {product_id} after {self.MAX_CAS_RETRIES} conflicting updates")
+        return False, None
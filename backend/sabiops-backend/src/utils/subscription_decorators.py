@@ -10,6 +10,16 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+def get_entitlements(user_id: str):
+    """Plan, status, limits and usage of the user's business, cached (services/entitlements.py)"""
+    from src.services.subscription_service import SubscriptionService
+    return SubscriptionService().get_entitlements(user_id)
+
+def get_subscription_status(user_id: str) -> dict:
+    """From the access token's entitlement claims when current, else the entitlement snapshot"""
+    from src.utils.auth_claims import claims_subscription_status
+    return claims_subscription_status(user_id) or get_entitlements(user_id).subscription_status()
+
 def subscription_required(allowed_plans=None, allow_trial=True):
     """
     Decorator to require specific subscription plans for endpoint access
@@ -34,12 +44,8 @@ def subscription_required(allowed_plans=None, allow_trial=True):
                         'upgrade_required': True
                     }), 401
                 
-                # Get subscription service
-                from src.services.subscription_service import SubscriptionService
-                subscription_service = SubscriptionService()
-                
                 # Get user's subscription status
-                subscription_status = subscription_service.get_unified_subscription_status(user_id)
+                subscription_status = get_subscription_status(user_id)
                 
                 if not subscription_status:
                     return jsonify({
@@ -135,10 +141,7 @@ def check_analytics_access(user_id: str) -> dict:
     Returns access status and details
     """
     try:
-        from src.services.subscription_service import SubscriptionService
-        subscription_service = SubscriptionService()
-        
-        subscription_status = subscription_service.get_unified_subscription_status(user_id)
+        subscription_status = get_subscription_status(user_id)
         
         if not subscription_status:
             return {
@@ -212,11 +215,7 @@ def get_subscription_upgrade_info(user_id: str) -> dict:
     Get subscription upgrade information for analytics access
     """
     try:
-        from src.services.subscription_service import SubscriptionService
-        subscription_service = SubscriptionService()
-        
-        subscription_status = subscription_service.get_unified_subscription_status(user_id)
-        current_plan = subscription_status.get('subscription_plan', 'free') if subscription_status else 'free'
+        current_plan = get_entitlements(user_id).plan or 'free'
         
         # Define upgrade paths
         upgrade_options = []
@@ -275,12 +274,8 @@ def protected_invoice_creation(f):
                     'error': 'Authentication required'
                 }), 401
             
-            # Get subscription service
-            from src.services.subscription_service import SubscriptionService
-            subscription_service = SubscriptionService()
-            
-            # Check if user can create invoices
-            can_create, limit_info = subscription_service.can_create_invoice(user_id)
+            # Check if user can create invoices (a memory lookup while the snapshot is fresh)
+            can_create, limit_info = get_entitlements(user_id).can_create('invoices')
             
             if not can_create:
                 return jsonify({
@@ -326,26 +321,14 @@ def get_usage_status_for_response(user_id: str, feature_type: str = None) -> dic
     Get usage status information to include in API responses
     """
     try:
-        from src.services.subscription_service import SubscriptionService
-        subscription_service = SubscriptionService()
-        
-        subscription_status = subscription_service.get_unified_subscription_status(user_id)
-        
-        if not subscription_status:
-            return {
-                'usage_status': 'unknown',
-                'message': 'Unable to determine usage status'
-            }
-        
-        # Get current usage limits
-        usage_info = subscription_service.get_usage_limits(user_id)
+        entitlements = get_entitlements(user_id)
         
         return {
             'usage_status': 'active',
-            'current_plan': subscription_status.get('subscription_plan', 'free'),
-            'is_trial': subscription_status.get('is_trial', False),
-            'usage_limits': usage_info,
-            'upgrade_available': subscription_status.get('subscription_plan') == 'free'
+            'current_plan': entitlements.plan,
+            'is_trial': entitlements.is_trial,
+            'usage_limits': entitlements.usage_limits(),
+            'upgrade_available': entitlements.plan == 'free'
         }
         
     except Exception as e:
@@ -356,6 +339,26 @@ def get_usage_status_for_response(user_id: str, feature_type: str = None) -> dic
             'error': str(e)
         }
 
+# Features whose creation is capped by the plan
+LIMITED_FEATURES = ('products', 'sales', 'expenses', 'invoices')
+
+def get_remaining_allowance(user_id: str, feature_type: str):
+    """
+    How many more items of a feature the current plan allows, for batch creates
+    Returns: (allowed, remaining_or_None, limit_info) - remaining is None when unlimited
+    """
+    if feature_type not in LIMITED_FEATURES:
+        return True, None, {}
+
+    can_create, limit_info = get_entitlements(user_id).can_create(feature_type)
+    if not can_create:
+        return False, 0, limit_info
+
+    limit = limit_info.get('limit')
+    current = limit_info.get('current_usage', 0)
+    remaining = max(limit - current, 0) if limit is not None else None
+    return True, remaining, limit_info
+
 def protected_product_creation(f):
     """
     Decorator to protect product creation based on subscription limits
@@ -370,12 +373,8 @@ def protected_product_creation(f):
                     'error': 'Authentication required'
                 }), 401
             
-            # Get subscription service
-            from src.services.subscription_service import SubscriptionService
-            subscription_service = SubscriptionService()
-            
-            # Check if user can create products
-            can_create, limit_info = subscription_service.can_create_product(user_id)
+            # Check if user can create products (a memory lookup while the snapshot is fresh)
+            can_create, limit_info = get_entitlements(user_id).can_create('products')
             
             if not can_create:
                 return jsonify({
@@ -430,12 +429,8 @@ def protected_sales_creation(f):
                     'error': 'Authentication required'
                 }), 401
             
-            # Get subscription service
-            from src.services.subscription_service import SubscriptionService
-            subscription_service = SubscriptionService()
-            
-            # Check if user can create sales
-            can_create, limit_info = subscription_service.can_create_sale(user_id)
+            # Check if user can create sales (a memory lookup while the snapshot is fresh)
+            can_create, limit_info = get_entitlements(user_id).can_create('sales')
             
             if not can_create:
                 return jsonify({
@@ -490,12 +485,8 @@ def protected_expense_creation(f):
                     'error': 'Authentication required'
                 }), 401
             
-            # Get subscription service
-            from src.services.subscription_service import SubscriptionService
-            subscription_service = SubscriptionService()
-            
-            # Check if user can create expenses
-            can_create, limit_info = subscription_service.can_create_expense(user_id)
+            # Check if user can create expenses (a memory lookup while the snapshot is fresh)
+            can_create, limit_info = get_entitlements(user_id).can_create('expenses')
             
             if not can_create:
                 return jsonify({
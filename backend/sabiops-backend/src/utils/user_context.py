@@ -1,7 +1,13 @@
 from flask import current_app
+from .auth_claims import claims_user_context
 
 def get_user_context(user_id):
     """Gets the user's role and the effective owner_id for queries."""
+    # Current access token claims answer without a database round trip
+    context = claims_user_context(user_id)
+    if context:
+        return context
+
     supabase = current_app.config['SUPABASE']
     if not supabase:
         raise Exception("Database connection not available")
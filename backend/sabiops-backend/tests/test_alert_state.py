@@ -0,0 +1,305 @@
+"""
+Unit tests for set-based trigger deduplication (alert_state)
+Counts the queries a trigger cycle issues against an in-memory Supabase stand-in
+"""
+
+import unittest
+import asyncio
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timezone, timedelta, date
+from types import SimpleNamespace
+from unittest.mock import patch
+
+# Add the src directory to the path so we can import our modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from services import notification_service
+from services.notification_service import NotificationService, preferences_cache
+from services.alert_state import AlertState
+from services.business_trigger_manager import LowStockTrigger, OverdueInvoiceTrigger, UsageLimitTrigger
+
+
+class MemoryQuery:
+    def __init__(self, db, table):
+        self.db = db
+        self.table = table
+        self.operation = "select"
+        self.payload = None
+        self.conflict = None
+        self.filters = []
+        self.window = None
+        self.sort = None
+        self.cap = None
+        self.counted = None
+        self.one = False
+
+    def select(self, *args, count=None, **kwargs):
+        self.counted = count
+        return self
+
+    def insert(self, payload):
+        self.operation, self.payload = "insert", payload
+        return self
+
+    def update(self, payload):
+        self.operation, self.payload = "update", payload
+        return self
+
+    def delete(self):
+        self.operation = "delete"
+        return self
+
+    def upsert(self, payload, on_conflict='entity_type,entity_id,alert_type'):
+        self.operation, self.payload = "upsert", payload
+        self.conflict = on_conflict.split(',')
+        return self
+
+    def eq(self, column, value):
+        self.filters.append(lambda row: row.get(column) == value)
+        return self
+
+    def neq(self, column, value):
+        self.filters.append(lambda row: row.get(column) != value)
+        return self
+
+    def gt(self, column, value):
+        self.filters.append(lambda row: type(value)(row.get(column)) > value)
+        return self
+
+    def gte(self, column, value):
+        self.filters.append(lambda row: type(value)(row.get(column)) >= value)
+        return self
+
+    def lte(self, column, value):
+        self.filters.append(lambda row: type(value)(row.get(column)) <= value)
+        return self
+
+    def lt(self, column, value):
+        self.filters.append(lambda row: type(value)(row.get(column)) < value)
+        return self
+
+    def in_(self, column, values):
+        values = set(values)
+        self.filters.append(lambda row: row.get(column) in values)
+        return self
+
+    def filter(self, *args):
+        return self
+
+    def order(self, column, desc=False):
+        self.sort = (column, desc)
+        return self
+
+    def limit(self, count):
+        self.cap = count
+        return self
+
+    def range(self, start, end):
+        self.window = (start, end)
+        return self
+
+    def single(self):
+        self.one = True
+        return self
+
+    def execute(self):
+        self.db.record_call(self.table, self.operation)
+        if self.table in self.db.broken:
+            raise RuntimeError(f'relation "{self.table}" does not exist')
+        with self.db.lock:
+            rows = self.db.tables.setdefault(self.table, [])
+            if self.operation in ("insert", "upsert"):
+                return self._write(rows)
+            if self.operation in ("update", "delete"):
+                return self._modify(rows)
+            rows = list(rows)
+        return self._select(rows)
+
+    def _modify(self, rows):
+        matched = [row for row in rows if all(f(row) for f in self.filters)]
+        if self.operation == "delete":
+            rows[:] = [row for row in rows if row not in matched]
+        for row in matched:
+            row.update(self.payload or {})
+        return SimpleNamespace(data=[dict(row) for row in matched])
+
+    def _write(self, rows):
+        payload = self.payload if isinstance(self.payload, list) else [self.payload]
+        unique = self.db.unique.get(self.table)
+        if self.operation == "insert" and unique:
+            taken = {row.get(unique) for row in rows}
+            if any(p.get(unique) in taken for p in payload):
+                raise RuntimeError(f'duplicate key value violates unique constraint "{self.table}_pkey"')
+        serial = self.db.serial.get(self.table)
+        if self.operation == "insert" and serial:
+            for p in payload:
+                self.db.next_serial[self.table] = self.db.next_serial.get(self.table, 0) + 1
+                p.setdefault(serial, self.db.next_serial[self.table])
+        if self.operation == "upsert":
+            key = lambda row: tuple(row.get(column) for column in self.conflict)
+            keys = {key(p) for p in payload}
+            rows[:] = [r for r in rows if key(r) not in keys]
+        rows.extend(payload)
+        return SimpleNamespace(data=payload)
+
+    def _select(self, rows):
+        matched = [row for row in rows if all(f(row) for f in self.filters)]
+        total = len(matched) if self.counted else None
+        if self.sort:
+            column, desc = self.sort
+            matched.sort(key=lambda row: row.get(column), reverse=desc)
+        if self.window:
+            matched = matched[self.window[0]:self.window[1] + 1]
+        if self.cap is not None:
+            matched = matched[:self.cap]
+        if self.one:
+            return SimpleNamespace(data=matched[0] if matched else None, count=total)
+        return SimpleNamespace(data=matched, count=total)
+
+
+class MemorySupabase:
+    """In-memory tables; `latency` adds a fixed round trip to every call, like the real client"""
+
+    def __init__(self, latency=0.0, unique=None, serial=None, **tables):
+        self.tables = tables
+        self.latency = latency
+        self.unique = unique or {}
+        # {'table': 'column'}: inserts get the next integer, like BIGSERIAL
+        self.serial = serial or {}
+        self.next_serial = {}
+        self.queries = []
+        self.broken = set()
+        self.lock = threading.Lock()
+        self.active = 0
+        self.peak = 0
+
+    def record_call(self, table, operation):
+        with self.lock:
+            self.queries.append((table, operation))
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(self.latency)
+        with self.lock:
+            self.active -= 1
+
+    def table(self, name):
+        return MemoryQuery(self, name)
+
+    def rpc(self, name, params=None):
+        def execute():
+            raise RuntimeError(f"Could not find the function public.{name} in the schema cache")
+        return SimpleNamespace(execute=execute)
+
+    def count(self, table, operation="select"):
+        return self.queries.count((table, operation))
+
+
+def hours_ago(hours):
+    return (datetime.now(timezone.utc) - timedelta(hours=hours)).isoformat()
+
+
+class TestAlertStateDedup(unittest.TestCase):
+    """Test cases for trigger deduplication through alert_state"""
+
+    def setUp(self):
+        preferences_cache.clear()
+        self.addCleanup(preferences_cache.clear)
+        patcher = patch.object(notification_service, 'job_queue', SimpleNamespace(enqueue=lambda *a, **k: "job"))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def run_trigger(self, trigger_class, db):
+        return asyncio.run(trigger_class(NotificationService(db), db).check_and_trigger())
+
+    def test_low_stock_dedup_cost_does_not_depend_on_catalog_size(self):
+        products = [
+            {'id': f"p{i}", 'owner_id': f"o{i % 50}", 'name': f"Item {i}", 'quantity': 1,
+             'low_stock_threshold': 5, 'reorder_level': 0, 'active': True}
+            for i in range(3000)
+        ]
+        alert_state = [
+            {'entity_type': 'product', 'entity_id': 'p1', 'alert_type': 'low_stock_alert', 'last_sent_at': hours_ago(2)},
+            {'entity_type': 'product', 'entity_id': 'p2', 'alert_type': 'low_stock_alert', 'last_sent_at': hours_ago(30)},
+        ]
+        db = MemorySupabase(products=products, alert_state=alert_state)
+
+        result = self.run_trigger(LowStockTrigger, db)
+
+        self.assertEqual(result.notifications_sent, 2999)
+        self.assertEqual(db.count('alert_state'), 1)
+        # Alerts are digested per owner and recorded once, at the end of the cycle
+        self.assertEqual(db.count('alert_state', 'upsert'), 1)
+        self.assertEqual(db.count('notifications', 'insert'), 1)
+        self.assertEqual(len(db.tables['notifications']), 50)
+        self.assertEqual(db.count('notifications', 'select'), 0)
+        self.assertEqual(len(db.tables['alert_state']), 3000)
+
+        # The next cycle finds every product in the set and sends nothing; the
+        # read is paged by alerts sent, not by products checked
+        db.queries.clear()
+        self.assertEqual(self.run_trigger(LowStockTrigger, db).notifications_sent, 0)
+        self.assertEqual(db.count('alert_state'), 3000 // AlertState.PAGE_SIZE + 1)
+        self.assertEqual(db.count('notifications', 'insert'), 0)
+
+    def test_falls_back_to_one_windowed_notifications_query(self):
+        products = [
+            {'id': f"p{i}", 'owner_id': "o1", 'name': f"Item {i}", 'quantity': 0,
+             'low_stock_threshold': 5, 'reorder_level': 0, 'active': True}
+            for i in range(40)
+        ]
+        notifications = [
+            {'user_id': 'o1', 'type': 'low_stock_alert', 'data': {'product_id': 'p7'}, 'created_at': hours_ago(1)},
+            {'user_id': 'o1', 'type': 'low_stock_alert', 'data': {'product_id': 'p8'}, 'created_at': hours_ago(48)},
+        ]
+        db = MemorySupabase(products=products, notifications=notifications)
+        db.broken.add('alert_state')
+
+        result = self.run_trigger(LowStockTrigger, db)
+
+        self.assertEqual(result.notifications_sent, 39)
+        self.assertEqual(db.count('notifications', 'select'), 1)
+
+    def test_usage_warning_repeats_only_for_a_higher_threshold(self):
+        usage = [
+            {'id': 'f1', 'user_id': 'u1', 'feature_type': 'invoices', 'current_count': 9, 'limit_count': 10, 'usage_percentage': 90},
+            {'id': 'f2', 'user_id': 'u2', 'feature_type': 'invoices', 'current_count': 10, 'limit_count': 10, 'usage_percentage': 100},
+        ]
+        alert_state = [
+            {'entity_type': 'feature_usage', 'entity_id': f"{user}:invoices", 'alert_type': 'usage_limit_warning',
+             'last_sent_at': hours_ago(3), 'last_value': 85}
+            for user in ('u1', 'u2')
+        ]
+        db = MemorySupabase(user_feature_usage=usage, alert_state=alert_state)
+
+        result = self.run_trigger(UsageLimitTrigger, db)
+
+        self.assertEqual(result.notifications_sent, 1)
+        self.assertEqual([n['user_id'] for n in db.tables['notifications']], ['u2'])
+
+    def test_overdue_interval_is_sent_once(self):
+        due = (date.today() - timedelta(days=7)).isoformat()
+        invoices = [
+            {'id': f"i{i}", 'owner_id': 'o1', 'customer_name': 'Ada', 'invoice_number': f"INV-{i}",
+             'total_amount': 100, 'due_date': due, 'status': 'sent'}
+            for i in range(3)
+        ]
+        alert_state = [
+            {'entity_type': 'invoice', 'entity_id': 'i0', 'alert_type': 'overdue_invoice',
+             'last_sent_at': hours_ago(1), 'last_value': 7},
+            {'entity_type': 'invoice', 'entity_id': 'i1', 'alert_type': 'overdue_invoice',
+             'last_sent_at': hours_ago(1), 'last_value': 1},
+        ]
+        db = MemorySupabase(invoices=invoices, alert_state=alert_state)
+
+        result = self.run_trigger(OverdueInvoiceTrigger, db)
+
+        self.assertEqual(result.notifications_sent, 2)
+        sent = {n['data']['invoice_id'] for n in db.tables['notifications']}
+        self.assertEqual(sent, {'i1', 'i2'})
+
+
+if __name__ == '__main__':
+    unittest.main()
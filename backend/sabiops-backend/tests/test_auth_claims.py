@@ -0,0 +1,118 @@
+"""
+Unit tests for entitlement claims in access tokens
+Tokens are issued and verified by a real JWTManager; the database is the
+in-memory Supabase stand-in, so tests can count the round trips claims save
+"""
+
+import unittest
+import os
+import sys
+from datetime import datetime, timezone, timedelta
+
+from flask import Flask
+from flask_jwt_extended import JWTManager, create_access_token, verify_jwt_in_request
+
+# Add the src directory to the path so we can import our modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from src.services.entitlements import entitlement_cache
+from src.utils.auth_claims import build_claims, claims_subscription_status, issue_tokens_for
+from src.utils.subscription_decorators import get_subscription_status
+from src.utils.user_context import get_user_context
+from test_alert_state import MemorySupabase
+
+
+def in_days(days):
+    return (datetime.now(timezone.utc) + timedelta(days=days)).isoformat()
+
+
+class TestAuthClaims(unittest.TestCase):
+    """Test cases for issuing and trusting entitlement claims"""
+
+    def setUp(self):
+        entitlement_cache.clear()
+        self.addCleanup(entitlement_cache.clear)
+        self.db = MemorySupabase(
+            users=[
+                {'id': 'owner', 'role': 'Owner', 'owner_id': None, 'active': True,
+                 'subscription_plan': 'monthly', 'subscription_status': 'active',
+                 'subscription_end_date': in_days(10), 'trial_days_left': 0},
+                {'id': 'member', 'role': 'Salesperson', 'owner_id': 'owner', 'active': True,
+                 'subscription_plan': 'free', 'subscription_status': 'inactive',
+                 'subscription_end_date': None, 'trial_days_left': 0},
+            ],
+            feature_usage=[],
+        )
+        self.app = Flask(__name__)
+        self.app.config['JWT_SECRET_KEY'] = 'test-secret-key-of-at-least-32-bytes'
+        self.app.config['SUPABASE'] = self.db
+        JWTManager(self.app)
+
+    def issue(self, user_id):
+        with self.app.app_context():
+            return issue_tokens_for(user_id, refresh=True)
+
+    def request_as(self, token):
+        context = self.app.test_request_context(headers={'Authorization': f'Bearer {token}'})
+        context.push()
+        self.addCleanup(context.pop)
+        verify_jwt_in_request()
+
+    def test_member_is_authorized_from_claims_without_queries(self):
+        token = self.issue('member')['access_token']
+        self.request_as(token)
+        users_reads = self.db.count('users')
+
+        self.assertEqual(get_user_context('member'), ('owner', 'Salesperson'))
+        status = get_subscription_status('member')
+
+        self.assertEqual((status['subscription_plan'], status['unified_status']), ('monthly', 'active'))
+        self.assertTrue(status['is_active'])
+        self.assertEqual(self.db.count('users'), users_reads)
+        # Another user's identity is never answered from these claims
+        self.assertIsNone(claims_subscription_status('owner'))
+
+    def test_change_after_signing_sends_checks_to_the_database(self):
+        token = self.issue('member')['access_token']
+        self.request_as(token)
+        self.db.tables['users'][1]['role'] = 'Admin'
+        entitlement_cache.invalidate('member')
+        users_reads = self.db.count('users')
+
+        self.assertEqual(get_user_context('member'), ('owner', 'Admin'))
+        self.assertIsNone(claims_subscription_status('member'))
+        self.assertEqual(self.db.count('users'), users_reads + 1)
+
+        # A token issued after the change is trusted again
+        fresh = self.issue('member')['access_token']
+        users_reads = self.db.count('users')
+        self.request_as(fresh)
+        self.assertEqual(get_user_context('member'), ('owner', 'Admin'))
+        self.assertEqual(self.db.count('users'), users_reads)
+
+    def test_claims_past_plan_expiry_are_not_used(self):
+        with self.app.app_context():
+            claims = build_claims(self.db.tables['users'][0])
+            claims.update(plan='monthly', plan_status='active', plan_expires_at=in_days(-1))
+            token = create_access_token(identity='owner', additional_claims=claims)
+        self.request_as(token)
+
+        # Signed while active but lapsed since: the database decides
+        self.assertIsNone(claims_subscription_status('owner'))
+        self.assertEqual(get_subscription_status('owner')['unified_status'], 'active')
+
+    def test_deactivated_user_cannot_be_issued_tokens(self):
+        self.db.tables['users'][1]['active'] = False
+
+        with self.assertRaises(ValueError):
+            self.issue('member')
+
+
+    def test_deleted_user_cannot_be_issued_tokens(self):
+        with self.assertRaisesRegex(ValueError, 'User not found'):
+            self.issue('gone')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+"""
+Unit tests for concurrent, owner-partitioned business trigger cycles
+Uses the in-memory Supabase stand-in with a fixed per-call latency
+"""
+
+import unittest
+import asyncio
+import os
+import sys
+import time
+from datetime import date, timedelta
+from types import SimpleNamespace
+from unittest.mock import patch
+
+# Add the src directory to the path so we can import our modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from services import notification_service
+from services.notification_service import NotificationService, preferences_cache
+from services.business_trigger_manager import BusinessTriggerManager, LowStockTrigger
+from test_alert_state import MemorySupabase
+
+
+def make_products(count, owners):
+    return [
+        {'id': f"p{i}", 'owner_id': f"owner-{i % owners}", 'name': f"Item {i}", 'quantity': 1,
+         'low_stock_threshold': 5, 'reorder_level': 0, 'active': True}
+        for i in range(count)
+    ]
+
+
+class TestTriggerConcurrency(unittest.TestCase):
+    """Test cases for BaseTrigger.run_cycle and BusinessTriggerManager.run_all_triggers"""
+
+    def setUp(self):
+        preferences_cache.clear()
+        self.addCleanup(preferences_cache.clear)
+        patcher = patch.object(notification_service, 'job_queue', SimpleNamespace(enqueue=lambda *a, **k: "job"))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_batches_keep_each_owner_together(self):
+        trigger = LowStockTrigger(NotificationService(MemorySupabase()), MemorySupabase())
+        trigger.batch_size = 100
+        batches, owners = trigger._partition_by_owner(make_products(1000, owners=30))
+
+        self.assertEqual(owners, 30)
+        self.assertEqual(sum(len(batch) for batch in batches), 1000)
+        seen = {}
+        for index, batch in enumerate(batches):
+            for row in batch:
+                self.assertEqual(seen.setdefault(row['owner_id'], index), index)
+
+    def test_fifty_thousand_products_in_bounded_round_trips(self):
+        db = MemorySupabase(latency=0.02, products=make_products(50000, owners=2000))
+        trigger = LowStockTrigger(NotificationService(db), db, max_workers=8)
+        # Per-batch delivery, so the batches do their own round trips
+        trigger.digest_alerts = False
+
+        result = asyncio.run(trigger.check_and_trigger())
+
+        details = result.details
+        self.assertEqual(result.notifications_sent, 50000)
+        self.assertEqual(details['rows_scanned'], 50000)
+        self.assertEqual(details['total_low_stock_products'], 50000)
+        self.assertEqual(details['owners'], 2000)
+        self.assertFalse(details['budget_exhausted'])
+        self.assertGreater(details['duration_ms'], 0)
+        # One products query per page (plus the empty one that ends the scan)
+        self.assertEqual(details['pages'], 50)
+        self.assertEqual(db.count('products'), details['pages'] + 1)
+        # Each batch costs one write per table, however many products it holds
+        batches = details['batches']
+        self.assertLessEqual(batches, 2 * 50000 // trigger.batch_size)
+        for table, operation in (('notifications', 'insert'), ('realtime_events', 'insert'), ('alert_state', 'upsert')):
+            self.assertEqual(db.count(table, operation), batches)
+        # Batch workers never exceed the pool (plus the scan's own page query)
+        self.assertLessEqual(db.peak, 8 + 1)
+
+    def test_time_budget_leaves_remaining_batches_for_next_cycle(self):
+        db = MemorySupabase(latency=0.05, products=make_products(2000, owners=200))
+        trigger = LowStockTrigger(NotificationService(db), db, max_workers=1, time_budget_seconds=0.2)
+        trigger.batch_size = 100
+        trigger.digest_alerts = False
+
+        result = asyncio.run(trigger.check_and_trigger())
+
+        self.assertTrue(result.details['budget_exhausted'])
+        self.assertGreater(result.details['batches_skipped'], 0)
+        self.assertLess(result.notifications_sent, 2000)
+
+        # Alerts already sent are deduplicated, so the next cycle only picks up the rest
+        trigger.time_budget_seconds = 60
+        rest = asyncio.run(trigger.check_and_trigger())
+        self.assertEqual(result.notifications_sent + rest.notifications_sent, 2000)
+
+    def test_triggers_run_concurrently(self):
+        due = (date.today() - timedelta(days=1)).isoformat()
+        db = MemorySupabase(
+            latency=0.1,
+            products=make_products(10, owners=2),
+            invoices=[{'id': 'i1', 'owner_id': 'owner-1', 'customer_name': 'Ada', 'invoice_number': 'INV-1',
+                       'total_amount': 50, 'due_date': due, 'status': 'sent'}],
+            user_feature_usage=[{'id': 'f1', 'user_id': 'owner-1', 'feature_type': 'sales', 'current_count': 96,
+                                 'limit_count': 100, 'usage_percentage': 96}],
+        )
+        manager = BusinessTriggerManager(NotificationService(db), db)
+
+        started = time.perf_counter()
+        results = asyncio.run(manager.run_all_triggers())
+        elapsed = time.perf_counter() - started
+
+        self.assertEqual({name: r.notifications_sent for name, r in results.items()}, {
+            "Low Stock Monitor": 10, "Overdue Invoice Monitor": 1, "Usage Limit Monitor": 1
+        })
+        # Each trigger makes about five sequential round trips; run one after another that is 1.5s
+        self.assertLess(elapsed, 1.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
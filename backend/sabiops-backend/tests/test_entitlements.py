@@ -0,0 +1,123 @@
+"""
+Unit tests for the cached entitlement snapshot behind the subscription decorators
+Runs SubscriptionService against the in-memory Supabase stand-in inside a
+Flask app context
+"""
+
+import unittest
+import os
+import sys
+from datetime import datetime, timezone, timedelta
+from unittest.mock import patch
+
+from flask import Flask
+
+# Add the src directory to the path so we can import our modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from src.services.entitlements import entitlement_cache
+from src.services.subscription_service import SubscriptionService
+from src.utils import subscription_decorators
+from test_alert_state import MemorySupabase
+
+
+def in_days(days):
+    return (datetime.now(timezone.utc) + timedelta(days=days)).isoformat()
+
+
+class TestEntitlements(unittest.TestCase):
+    """Test cases for SubscriptionService.get_entitlements and the decorators using it"""
+
+    def setUp(self):
+        entitlement_cache.clear()
+        self.addCleanup(entitlement_cache.clear)
+        self.db = MemorySupabase(
+            users=[
+                {'id': 'owner', 'owner_id': None, 'subscription_plan': 'monthly', 'subscription_status': 'active',
+                 'subscription_end_date': in_days(10), 'trial_days_left': 0},
+                {'id': 'member', 'owner_id': 'owner', 'subscription_plan': 'free', 'subscription_status': 'inactive',
+                 'subscription_end_date': None, 'trial_days_left': 0},
+            ],
+            feature_usage=[
+                {'user_id': 'owner', 'feature_type': 'expenses', 'current_count': 499},
+                {'user_id': 'owner', 'feature_type': 'sales', 'current_count': 12},
+            ],
+        )
+        self.app = Flask(__name__)
+        self.app.config['SUPABASE'] = self.db
+        context = self.app.app_context()
+        context.push()
+        self.addCleanup(context.pop)
+
+    def test_snapshot_is_loaded_once_and_shared_by_team_members(self):
+        owner = SubscriptionService().get_entitlements('owner')
+
+        self.assertEqual((owner.plan, owner.status), ('monthly', 'active'))
+        self.assertEqual(owner.can_create('expenses')[1]['remaining'], 1)
+        self.assertEqual(owner.can_create('sales')[1]['limit'], 1500)
+
+        member = SubscriptionService().get_entitlements('member')
+        self.assertIs(member, owner)
+        SubscriptionService().get_entitlements('member')
+        # owner row, member row; the usage rows are read once
+        self.assertEqual(self.db.count('users'), 2)
+        self.assertEqual(self.db.count('feature_usage'), 1)
+
+    def test_usage_change_is_applied_in_place_and_upgrade_reloads(self):
+        service = SubscriptionService()
+        self.assertTrue(service.get_entitlements('owner').can_create('expenses')[0])
+
+        entitlement_cache.add_usage('owner', 'expenses', 1)
+        allowed, limit_info = service.get_entitlements('owner').can_create('expenses')
+        self.assertFalse(allowed)
+        self.assertEqual(limit_info['message'], 'Expense limit reached (500/500)')
+        self.assertEqual(self.db.count('feature_usage'), 1)
+
+        self.db.tables['users'][0]['subscription_plan'] = 'yearly'
+        entitlement_cache.invalidate('owner')
+        self.assertEqual(service.get_entitlements('member').plan, 'yearly')
+        self.assertEqual(self.db.count('feature_usage'), 2)
+        # Invalidating a team member drops the snapshot of the owner it maps to
+        entitlement_cache.invalidate('member')
+        self.assertIsNone(entitlement_cache.get('owner'))
+
+    def test_load_that_raced_an_invalidation_is_not_cached(self):
+        version = entitlement_cache.version('owner')
+        snapshot = SubscriptionService().get_entitlements('owner')
+        entitlement_cache.invalidate('owner')
+
+        self.assertFalse(entitlement_cache.set('owner', snapshot, version))
+        self.assertIsNone(entitlement_cache.get('owner'))
+
+    def test_creation_decorator_checks_limits_from_the_snapshot(self):
+        @subscription_decorators.protected_expense_creation
+        def create_expense():
+            return "created"
+
+        with self.app.test_request_context(), \
+                patch.object(subscription_decorators, 'get_jwt_identity', return_value='member'):
+            self.assertEqual(create_expense(), "created")
+            entitlement_cache.add_usage('owner', 'expenses', 1)
+            response, status = create_expense()
+
+        self.assertEqual(status, 403)
+        self.assertEqual(response.get_json()['limit_info']['current_usage'], 500)
+        self.assertEqual(self.db.count('users'), 2)
+
+    def test_failed_increment_is_flagged_not_retried(self):
+        service = SubscriptionService()
+        with patch('src.services.subscription_service.usage_counter.increment',
+                   side_effect=TimeoutError('read timed out')) as increment:
+            with self.assertRaises(Exception):
+                service.increment_usage_atomic('member', 'sales')
+
+        self.assertEqual(increment.call_count, 1)
+        sales = [row for row in self.db.tables['feature_usage'] if row['feature_type'] == 'sales']
+        self.assertEqual(sales[0]['sync_status'], 'out_of_sync')
+        self.assertEqual(sales[0]['current_count'], 12)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+"""
+Unit tests for the shared background event loop
+Covers loop reuse, timeouts, submissions from many threads and service
+coroutines overlapping their blocking Supabase calls
+"""
+
+import unittest
+import asyncio
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Add the src directory to the path so we can import our modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from services.event_loop import BackgroundLoop
+from services.notification_service import NotificationService, unread_count_cache
+from test_alert_state import MemorySupabase
+
+
+class TestBackgroundLoop(unittest.TestCase):
+    """Test cases for BackgroundLoop"""
+
+    def setUp(self):
+        self.bridge = BackgroundLoop(workers=8)
+        self.addCleanup(self.bridge.stop)
+
+    def test_every_call_reuses_one_loop(self):
+        async def current():
+            return asyncio.get_running_loop(), threading.current_thread()
+
+        first = self.bridge.run(current())
+        second = self.bridge.run(current())
+
+        self.assertIs(first[0], second[0])
+        self.assertIs(first[1], second[1])
+        self.assertIsNot(first[1], threading.current_thread())
+
+    def test_timeout_cancels_the_coroutine(self):
+        cancelled = threading.Event()
+
+        async def stuck():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        with self.assertRaises(TimeoutError):
+            self.bridge.run(stuck(), timeout=0.05)
+        self.assertTrue(cancelled.wait(1))
+        # The loop keeps serving after a timeout
+        self.assertEqual(self.bridge.run(asyncio.sleep(0, result='ok')), 'ok')
+
+    def test_errors_reach_the_caller(self):
+        async def fail():
+            raise ValueError('bad payload')
+
+        with self.assertRaises(ValueError):
+            self.bridge.run(fail())
+
+    def test_concurrent_callers_overlap(self):
+        async def wait_and_echo(value):
+            await asyncio.sleep(0.1)
+            return value
+
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=20) as pool:
+            results = list(pool.map(lambda i: self.bridge.run(wait_and_echo(i)), range(20)))
+
+        self.assertEqual(results, list(range(20)))
+        # Twenty 100ms waits share the loop instead of running back to back
+        self.assertLess(time.monotonic() - started, 1.0)
+
+    def test_run_from_the_loop_thread_is_refused(self):
+        async def nested():
+            return self.bridge.run(asyncio.sleep(0))
+
+        with self.assertRaises(RuntimeError):
+            self.bridge.run(nested())
+
+
+class TestServiceCallsOverlap(unittest.TestCase):
+    """Test cases for NotificationService coroutines on the bridge"""
+
+    def test_notifications_and_unread_count_overlap(self):
+        bridge = BackgroundLoop(workers=8)
+        self.addCleanup(bridge.stop)
+        unread_count_cache.clear()
+        self.addCleanup(unread_count_cache.clear)
+        db = MemorySupabase(latency=0.2, notifications=[
+            {'id': f"n{i}", 'user_id': 'u1', 'read': i % 2 == 0, 'created_at': f"2024-01-{i + 1:02d}"}
+            for i in range(6)
+        ], notification_unread_counts=[{'user_id': 'u1', 'unread_count': 3}])
+        service = NotificationService(db)
+
+        started = time.monotonic()
+        notifications, unread_count = bridge.gather(
+            service.get_user_notifications('u1', limit=10),
+            service.get_unread_count('u1')
+        )
+        elapsed = time.monotonic() - started
+
+        self.assertEqual(len(notifications), 6)
+        self.assertEqual(unread_count, 3)
+        self.assertLess(elapsed, 0.35)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,160 @@
+"""
+Unit tests for Idempotency-Key handling
+Tests replay of stored responses and waiting on in-flight duplicates
+"""
+
+import unittest
+import threading
+import time
+from types import SimpleNamespace
+from unittest.mock import patch
+import sys
+import os
+
+# Add the src directory to the path so we can import our modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from flask import Flask, jsonify
+from utils.idempotency import idempotent, idempotency_store, IdempotencyStore
+
+
+class TestIdempotentDecorator(unittest.TestCase):
+    """Test cases for the idempotent decorator"""
+
+    def setUp(self):
+        """Set up a tiny app with a counting create endpoint"""
+        idempotency_store.clear()
+        self.calls = 0
+        self.status_code = 201
+        self.delay = 0
+        self.app = Flask(__name__)
+
+        @self.app.route("/sales/", methods=["POST"])
+        @idempotent
+        def create_sale():
+            self.calls += 1
+            if self.delay:
+                time.sleep(self.delay)
+            return jsonify({"success": True, "data": {"sale_number": self.calls}}), self.status_code
+
+        self.client = self.app.test_client()
+        patcher = patch('utils.idempotency.get_jwt_identity', return_value="user-1")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _post(self, key=None, body=None):
+        headers = {"Idempotency-Key": key} if key else {}
+        return self.client.post("/sales/", json=body or {"amount": 100}, headers=headers)
+
+    def test_requests_without_key_are_not_deduplicated(self):
+        self._post()
+        self._post()
+        self.assertEqual(self.calls, 2)
+
+    def test_duplicate_key_replays_stored_response(self):
+        first = self._post("abc")
+        second = self._post("abc")
+
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(second.status_code, 201)
+        self.assertEqual(second.get_json(), first.get_json())
+        self.assertEqual(second.headers.get("Idempotent-Replayed"), "true")
+
+    def test_same_key_different_body_is_rejected(self):
+        self._post("abc", {"amount": 100})
+        response = self._post("abc", {"amount": 999})
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(self.calls, 1)
+
+    def test_server_errors_are_not_stored(self):
+        self.status_code = 500
+        self._post("abc")
+        self.status_code = 201
+        response = self._post("abc")
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.calls, 2)
+
+    def test_keys_are_scoped_per_user(self):
+        self._post("abc")
+        with patch('utils.idempotency.get_jwt_identity', return_value="user-2"):
+            self._post("abc")
+        self.assertEqual(self.calls, 2)
+
+    def test_concurrent_duplicates_wait_for_first_request(self):
+        self.delay = 0.2
+        responses = []
+
+        def send():
+            with self.app.test_client() as client:
+                responses.append(client.post("/sales/", json={"amount": 100}, headers={"Idempotency-Key": "race"}))
+
+        threads = [threading.Thread(target=send) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.calls, 1)
+        self.assertTrue(all(r.status_code == 201 for r in responses))
+        self.assertEqual(len({r.get_json()["data"]["sale_number"] for r in responses}), 1)
+
+    def test_duplicates_of_a_failed_request_are_told_to_retry(self):
+        self.delay = 0.2
+        self.status_code = 500
+        responses = []
+
+        def send():
+            with self.app.test_client() as client:
+                responses.append(client.post("/sales/", json={"amount": 100}, headers={"Idempotency-Key": "race"}))
+
+        threads = [threading.Thread(target=send) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.calls, 1)
+        retries = [r for r in responses if r.status_code == 503]
+        self.assertEqual(len(retries), 2)
+        self.assertTrue(all(r.headers.get("Retry-After") == "1" for r in retries))
+
+        self.status_code, self.delay = 201, 0
+        self.assertEqual(self._post("race").status_code, 201)
+
+
+class TestIdempotencyStore(unittest.TestCase):
+    """Test cases for IdempotencyStore expiry and size limits"""
+
+    def finish(self, store, entry):
+        store.complete(entry, SimpleNamespace(get_data=lambda: b"{}", status_code=201, content_type="application/json"))
+
+    def test_expired_entries_are_reclaimed(self):
+        store = IdempotencyStore(ttl_seconds=0)
+        is_owner, entry = store.begin("scope", "key", "fp")
+        self.assertTrue(is_owner)
+        # Still running: the key stays claimed past its expiry
+        self.assertFalse(store.begin("scope", "key", "fp")[0])
+        self.finish(store, entry)
+        is_owner, _ = store.begin("scope", "key", "fp")
+        self.assertTrue(is_owner)
+
+    def test_store_is_bounded(self):
+        store = IdempotencyStore(max_entries=3)
+        for i in range(10):
+            self.finish(store, store.begin("scope", f"key-{i}", "fp")[1])
+        self.assertEqual(len(store._entries), 3)
+
+    def test_in_flight_entries_are_never_evicted(self):
+        store = IdempotencyStore(max_entries=3)
+        store.begin("scope", "running", "fp")
+        for i in range(10):
+            self.finish(store, store.begin("scope", f"key-{i}", "fp")[1])
+
+        self.assertIn(("scope", "running"), store._entries)
+        self.assertFalse(store.begin("scope", "running", "fp")[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,229 @@
+"""
+Unit tests for the bulk Import Service
+Tests streaming parsing, batch validation, chunked writes and per-row errors
+"""
+
+import unittest
+import os
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+from unittest.mock import patch
+
+# Add the backend and src directories to the path so we can import our modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from services import import_service
+from services.import_service import ImportService, ImportJob, _coerce_column
+from services.job_queue import JobQueue
+
+
+class RecordingQuery:
+    def __init__(self, client, table):
+        self.client = client
+        self.table_name = table
+        self.action = "select"
+        self.payload = None
+
+    def select(self, *args, **kwargs):
+        return self
+
+    def eq(self, *args):
+        return self
+
+    def insert(self, payload):
+        self.action, self.payload = "insert", payload
+        return self
+
+    def upsert(self, payload):
+        self.action, self.payload = "upsert", payload
+        return self
+
+    def execute(self):
+        self.client.calls.append((self.table_name, self.action, self.payload))
+        if self.action == "select":
+            return SimpleNamespace(data=self.client.existing.get(self.table_name, []))
+        if self.client.fail_bulk and isinstance(self.payload, list) and len(self.payload) > 1:
+            raise Exception("bulk insert rejected")
+        if self.client.fail_row and not isinstance(self.payload, list) and self.client.fail_row(self.payload):
+            raise Exception("row rejected")
+        rows = self.payload if isinstance(self.payload, list) else [self.payload]
+        self.client.written.setdefault(self.table_name, []).extend(rows)
+        return SimpleNamespace(data=rows)
+
+
+class RecordingSupabase:
+    def __init__(self, existing=None):
+        self.existing = existing or {}
+        self.calls = []
+        self.written = {}
+        self.fail_bulk = False
+        self.fail_row = None
+
+    def table(self, name):
+        return RecordingQuery(self, name)
+
+    def writes(self, table):
+        return [c for c in self.calls if c[0] == table and c[1] in ("insert", "upsert")]
+
+
+class TestImportService(unittest.TestCase):
+    """Test cases for ImportService"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+
+    def _csv(self, text, name="data.csv"):
+        path = os.path.join(self.tmpdir.name, name)
+        with open(path, "w", encoding="utf-8") as handle:
+            handle.write(text)
+        return path
+
+    def _run(self, client, entity, path, mode="insert", allowance=None):
+        job = ImportJob("owner-1", "user-1", entity, os.path.basename(path), mode=mode)
+        return ImportService(client).run(job, path, allowance=allowance)
+
+    def test_coerce_column_reports_bad_indexes(self):
+        values, bad = _coerce_column(["1,200", "₦50", "abc", "", None], "float")
+        self.assertEqual(values, [1200.0, 50.0, None, None, None])
+        self.assertEqual(bad, [2])
+
+        values, bad = _coerce_column(["3", "2.0", "2.5"], "int")
+        self.assertEqual(values[:2], [3, 2])
+        self.assertEqual(bad, [2])
+
+    def test_products_import_reports_per_row_errors(self):
+        client = RecordingSupabase(existing={"products": [{"id": "p-old", "sku": "RICE-01"}]})
+        path = self._csv(
+            "Name,Price,Quantity,SKU,Category\n"
+            "Beans,1500,10,BEANS-01,Food & Beverages\n"
+            "Rice,2000,5,RICE-01,Food & Beverages\n"
+            "Garri,abc,5,,Food & Beverages\n"
+            "Yam,800,4,BEANS-01,Food & Beverages\n"
+            ",800,4,,\n"
+        )
+        job = self._run(client, "products", path)
+
+        self.assertEqual(job.status, "completed")
+        self.assertEqual(job.inserted, 1)
+        self.assertEqual(job.processed_rows, 5)
+        errors = {e["row"]: e["error"] for e in job.errors}
+        self.assertIn("already exists", errors[3])
+        self.assertIn("Invalid price", errors[4])
+        self.assertIn("Duplicate SKU in file", errors[5])
+        self.assertIn("Name is required", errors[6])
+
+    def test_products_upsert_mode_updates_existing_sku(self):
+        client = RecordingSupabase(existing={"products": [{"id": "p-old", "sku": "RICE-01"}]})
+        path = self._csv("name,price,quantity,sku\nRice,2500,8,rice-01\n")
+        job = self._run(client, "products", path, mode="upsert")
+
+        self.assertEqual(job.updated, 1)
+        (_, action, payload), = client.writes("products")
+        self.assertEqual(action, "upsert")
+        self.assertEqual(payload[0]["id"], "p-old")
+        self.assertNotIn("created_at", payload[0])
+
+    def test_ten_thousand_rows_in_chunked_bulk_writes(self):
+        rows = "\n".join(f"Item {i},{100 + i},{i % 50},SKU-{i}" for i in range(10000))
+        path = self._csv("name,price,quantity,sku\n" + rows + "\n")
+        client = RecordingSupabase()
+
+        started = time.perf_counter()
+        job = self._run(client, "products", path)
+        elapsed = time.perf_counter() - started
+
+        self.assertEqual(job.inserted, 10000)
+        self.assertEqual(job.error_count, 0)
+        self.assertEqual(len(client.writes("products")), 10000 // ImportService.CHUNK_SIZE)
+        self.assertEqual(job.to_dict()["progress"], 100.0)
+        self.assertLess(elapsed, 10)
+
+    def test_allowance_caps_new_rows(self):
+        path = self._csv("name\nAda\nBola\nChidi\n")
+        job = self._run(RecordingSupabase(), "customers", path, allowance=2)
+        self.assertEqual(job.inserted, 2)
+        self.assertIn("Plan limit reached", job.errors[0]["error"])
+
+    def test_failed_bulk_write_falls_back_to_rows(self):
+        client = RecordingSupabase()
+        client.fail_bulk = True
+        client.fail_row = lambda record: record["name"] == "Bola"
+        path = self._csv("name,email\nAda,ada@example.com\nBola,bola@example.com\nChidi,\n")
+        job = self._run(client, "customers", path)
+
+        self.assertEqual(job.inserted, 2)
+        self.assertEqual(job.errors, [{"row": 3, "error": "Database error: row rejected"}])
+
+    def test_rows_rejected_by_the_database_leave_allowance_for_later_chunks(self):
+        client = RecordingSupabase()
+        client.fail_bulk = True
+        client.fail_row = lambda record: record["name"] == "Bola"
+        path = self._csv("name\nAda\nBola\nChidi\nDayo\n")
+
+        with patch.object(ImportService, "CHUNK_SIZE", 2):
+            job = self._run(client, "customers", path, allowance=3)
+
+        self.assertEqual(job.inserted, 3)
+        self.assertEqual([e["row"] for e in job.errors], [3])
+
+    def test_expenses_create_matching_transactions_in_one_insert(self):
+        client = RecordingSupabase()
+        path = self._csv(
+            "category,amount,date,description\n"
+            "Rent,50000,2024-01-01,January rent\n"
+            "Utilities,7000,2024-01-02,\n"
+            "Not A Category,100,2024-01-03,\n"
+        )
+        job = self._run(client, "expenses", path)
+
+        self.assertEqual(job.inserted, 2)
+        self.assertEqual(len(client.writes("transactions")), 1)
+        expense_ids = {e["id"] for e in client.written["expenses"]}
+        self.assertEqual({t["reference_id"] for t in client.written["transactions"]}, expense_ids)
+
+    def test_sales_resolve_products_from_one_prefetch(self):
+        client = RecordingSupabase(existing={"products": [
+            {"id": "p1", "name": "Rice", "sku": "RICE-01", "cost_price": 1000}
+        ]})
+        path = self._csv("sku,quantity,unit_price\nrice-01,2,1500\n")
+        job = self._run(client, "sales", path)
+
+        self.assertEqual(job.inserted, 1)
+        sale = client.written["sales"][0]
+        self.assertEqual(sale["product_id"], "p1")
+        self.assertEqual(sale["total_amount"], 3000)
+        self.assertEqual(sale["gross_profit"], 1000)
+        self.assertEqual(sum(1 for c in client.calls if c[1] == "select"), 1)
+
+    def test_queued_import_keeps_its_status_in_the_job_store(self):
+        queue = JobQueue(os.path.join(self.tmpdir.name, "jobs.sqlite3"), base_delay=0)
+        queue.ensure_started = lambda: None
+        queue.register(import_service.IMPORT_JOB_KIND, import_service._run_import_job)
+        client = RecordingSupabase()
+        path = self._csv("name,price,quantity\nBeans,1500,10\n,800,4\n")
+        job = ImportJob("owner-1", "user-1", "products", "data.csv")
+
+        with patch.object(import_service, "job_queue", queue), \
+                patch.object(import_service, "get_job_supabase", return_value=client), \
+                patch.object(import_service, "_record_usage"):
+            import_service.queue_import(job, path)
+            self.assertEqual(import_service.get_import(job.id, "owner-1")["status"], "queued")
+            self.assertEqual(queue.run_pending(), 1)
+
+            status = import_service.get_import(job.id, "owner-1")
+            listed = import_service.list_owner_imports("owner-1")
+            self.assertIsNone(import_service.get_import(job.id, "owner-2"))
+
+        self.assertEqual((status["status"], status["inserted"], status["error_count"]), ("completed", 1, 1))
+        self.assertEqual(status["errors"][0]["row"], 3)
+        self.assertEqual([j["job_id"] for j in listed], [job.id])
+        self.assertNotIn("errors", listed[0])
+        self.assertFalse(os.path.exists(path))
+
+
+if __name__ == '__main__':
+    unittest.main()
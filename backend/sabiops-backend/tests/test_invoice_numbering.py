@@ -0,0 +1,164 @@
+"""
+Unit tests for the invoice number allocator
+Tests uniqueness under parallel invoice creation, block reservation and fallback
+"""
+
+import unittest
+import os
+import sys
+import threading
+from datetime import datetime
+from types import SimpleNamespace
+
+# Add the src directory to the path so we can import our modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from utils.invoice_numbering import InvoiceNumberAllocator
+
+
+class FakeCounterRpc:
+    def __init__(self, client, params):
+        self.client = client
+        self.params = params
+
+    def execute(self):
+        if self.client.rpc_missing:
+            raise Exception("Could not find the function public.allocate_invoice_numbers")
+        if self.client.rpc_error:
+            raise self.client.rpc_error
+        # The UPDATE ... RETURNING runs as one statement, modelled by the lock
+        with self.client.lock:
+            key = (self.params["p_owner_id"], self.params["p_day"])
+            last = self.client.counters.get(key, 0) + self.params["p_count"]
+            self.client.counters[key] = last
+            self.client.rpc_calls += 1
+        return SimpleNamespace(data=last - self.params["p_count"] + 1)
+
+
+class FakeInvoicesQuery:
+    def __init__(self, client):
+        self.client = client
+        self.filters = {}
+
+    def select(self, *args):
+        return self
+
+    def eq(self, column, value):
+        self.filters[column] = value
+        return self
+
+    def like(self, column, pattern):
+        self.prefix = pattern.rstrip("%")
+        return self
+
+    def execute(self):
+        rows = [
+            {"invoice_number": number} for owner, number in self.client.invoices
+            if owner == self.filters.get("owner_id", owner) and number.startswith(self.prefix)
+        ]
+        return SimpleNamespace(data=rows)
+
+
+class FakeSupabase:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.rpc_calls = 0
+        self.rpc_missing = False
+        self.rpc_error = None
+        self.invoices = []
+
+    def rpc(self, name, params):
+        return FakeCounterRpc(self, params)
+
+    def table(self, name):
+        return FakeInvoicesQuery(self)
+
+
+class TestInvoiceNumberAllocator(unittest.TestCase):
+    """Test cases for InvoiceNumberAllocator"""
+
+    def setUp(self):
+        self.client = FakeSupabase()
+        self.now = datetime(2024, 3, 5, 10, 0, 0)
+
+    def _create_in_parallel(self, allocator, owners, per_thread=25, threads=16):
+        numbers = []
+        numbers_lock = threading.Lock()
+        start = threading.Barrier(threads)
+
+        def create_invoices(thread_index):
+            owner = owners[thread_index % len(owners)]
+            start.wait()
+            for _ in range(per_thread):
+                number = allocator.allocate(self.client, owner, now=self.now)
+                with numbers_lock:
+                    numbers.append((owner, number))
+
+        workers = [threading.Thread(target=create_invoices, args=(i,)) for i in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return numbers
+
+    def test_parallel_creates_never_share_a_number(self):
+        allocator = InvoiceNumberAllocator()
+        numbers = self._create_in_parallel(allocator, ["owner-1", "owner-2"])
+
+        self.assertEqual(len(numbers), 16 * 25)
+        self.assertEqual(len(set(numbers)), len(numbers))
+        owner_one = sorted(n for o, n in numbers if o == "owner-1")
+        self.assertEqual(owner_one[0], "INV-20240305-0001")
+        self.assertEqual(owner_one[-1], "INV-20240305-0200")
+        self.assertEqual(self.client.rpc_calls, len(numbers))
+
+    def test_block_reservation_cuts_database_calls(self):
+        allocator = InvoiceNumberAllocator(block_size=20)
+        numbers = self._create_in_parallel(allocator, ["owner-1"])
+
+        self.assertEqual(len(set(numbers)), len(numbers))
+        self.assertEqual(self.client.rpc_calls, len(numbers) // 20)
+
+    def test_separate_workers_get_disjoint_blocks(self):
+        worker_a = InvoiceNumberAllocator(block_size=10)
+        worker_b = InvoiceNumberAllocator(block_size=10)
+
+        first_a = worker_a.allocate(self.client, "owner-1", now=self.now)
+        first_b = worker_b.allocate(self.client, "owner-1", now=self.now)
+        second_a = worker_a.allocate(self.client, "owner-1", now=self.now)
+
+        self.assertEqual(first_a, "INV-20240305-0001")
+        self.assertEqual(first_b, "INV-20240305-0011")
+        self.assertEqual(second_a, "INV-20240305-0002")
+
+    def test_counter_restarts_each_day(self):
+        allocator = InvoiceNumberAllocator(block_size=5)
+        allocator.allocate(self.client, "owner-1", now=self.now)
+        next_day = allocator.allocate(self.client, "owner-1", now=datetime(2024, 3, 6, 9, 0, 0))
+        self.assertEqual(next_day, "INV-20240306-0001")
+
+    def test_falls_back_to_scan_without_rpc(self):
+        self.client.rpc_missing = True
+        self.client.invoices = [
+            ("owner-1", "INV-20240305-0001"),
+            ("owner-1", "INV-20240305-0003"),
+            ("owner-2", "INV-20240305-0002"),
+        ]
+        number = InvoiceNumberAllocator().allocate(self.client, "owner-1", now=self.now)
+        self.assertEqual(number, "INV-20240305-0004")
+
+    def test_fallback_skips_numbers_other_owners_hold(self):
+        self.client.rpc_missing = True
+        self.client.invoices = [("owner-2", "INV-20240305-0001")]
+        number = InvoiceNumberAllocator().allocate(self.client, "owner-1", now=self.now)
+        self.assertEqual(number, "INV-20240305-0002")
+
+    def test_failed_rpc_call_is_raised_not_scanned(self):
+        self.client.rpc_error = TimeoutError("read timed out")
+        with self.assertRaises(TimeoutError):
+            InvoiceNumberAllocator().allocate(self.client, "owner-1", now=self.now)
+
+
+if __name__ == '__main__':
+    unittest.main()
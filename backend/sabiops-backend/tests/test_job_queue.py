@@ -0,0 +1,151 @@
+"""
+Unit tests for the durable Job Queue
+Tests persistence, retries with backoff, dead-lettering and worker threads
+"""
+
+import unittest
+import os
+import sys
+import tempfile
+import threading
+import time
+
+# Add the src directory to the path so we can import our modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from services.job_queue import JobQueue, JobFailed
+
+
+class TestJobQueue(unittest.TestCase):
+    """Test cases for JobQueue"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.db_path = os.path.join(self.tmpdir.name, "jobs.sqlite3")
+        self.queue = self._queue()
+
+    def _queue(self, **kwargs):
+        queue = JobQueue(self.db_path, workers=2, base_delay=0, poll_interval=0.05, **kwargs)
+        # Tests drain with run_pending unless they start workers explicitly
+        queue.ensure_started = lambda: None
+        self.addCleanup(queue.stop)
+        return queue
+
+    def test_successful_job_records_result(self):
+        self.queue.register("math.add", lambda payload: payload["a"] + payload["b"])
+        job_id = self.queue.enqueue("math.add", {"a": 2, "b": 3}, owner_id="owner-1")
+
+        self.assertEqual(self.queue.get(job_id)["status"], "queued")
+        self.assertEqual(self.queue.run_pending(), 1)
+
+        job = self.queue.get(job_id)
+        self.assertEqual(job["status"], "succeeded")
+        self.assertEqual(job["result"], 5)
+        self.assertEqual(job["attempts"], 1)
+        self.assertIsNone(self.queue.get(job_id, owner_id="owner-2"))
+
+    def test_failures_retry_then_dead_letter(self):
+        calls = []
+
+        def flaky(payload):
+            calls.append(payload)
+            raise JobFailed("smtp down")
+
+        self.queue.register("email.send", flaky)
+        job_id = self.queue.enqueue("email.send", {"to": "a@example.com"}, max_attempts=3)
+
+        for _ in range(3):
+            self.queue.run_pending()
+
+        job = self.queue.get(job_id)
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(job["status"], "dead")
+        self.assertIn("smtp down", job["last_error"])
+        self.assertEqual(self.queue.list_jobs(status="dead")[0]["id"], job_id)
+
+        self.queue.register("email.send", lambda payload: "ok")
+        self.assertTrue(self.queue.retry(job_id))
+        self.queue.run_pending()
+        self.assertEqual(self.queue.get(job_id)["status"], "succeeded")
+
+    def test_backoff_delays_the_next_attempt(self):
+        queue = self._queue()
+        queue.base_delay = 60
+        queue.register("push.send", lambda payload: (_ for _ in ()).throw(RuntimeError("fcm 503")))
+        job_id = queue.enqueue("push.send", {})
+
+        queue.run_pending()
+        job = queue.get(job_id)
+        self.assertEqual(job["status"], "queued")
+        self.assertGreater(job["run_at"], time.time() + 30)
+        self.assertEqual(queue.run_pending(), 0)
+
+    def test_jobs_survive_restart_and_expired_leases_are_reclaimed(self):
+        self.queue.register("report.build", lambda payload: "built")
+        job_id = self.queue.enqueue("report.build", {})
+
+        # Worker claims the job, then the process dies before finishing
+        self.queue.lease_seconds = -1
+        self.assertIsNotNone(self.queue._claim("worker-0"))
+
+        restarted = self._queue()
+        restarted.register("report.build", lambda payload: "built")
+        self.assertEqual(restarted.run_pending(), 1)
+        job = restarted.get(job_id)
+        self.assertEqual(job["status"], "succeeded")
+        self.assertEqual(job["attempts"], 2)
+
+    def test_jobs_without_a_handler_wait(self):
+        job_id = self.queue.enqueue("unknown.kind", {})
+        self.assertEqual(self.queue.run_pending(), 0)
+        self.assertEqual(self.queue.get(job_id)["status"], "queued")
+
+    def test_worker_threads_run_each_job_once(self):
+        queue = JobQueue(self.db_path, workers=4, base_delay=0, poll_interval=0.02)
+        self.addCleanup(queue.stop)
+        seen = []
+        lock = threading.Lock()
+
+        def record(payload):
+            with lock:
+                seen.append(payload["n"])
+
+        queue.register("count", record)
+        job_ids = [queue.enqueue("count", {"n": n}) for n in range(50)]
+
+        deadline = time.time() + 10
+        while time.time() < deadline and len(seen) < 50:
+            time.sleep(0.02)
+
+        self.assertEqual(sorted(seen), list(range(50)))
+        self.assertTrue(all(queue.get(j)["status"] == "succeeded" for j in job_ids))
+
+    def test_inline_job_runs_before_enqueue_returns(self):
+        self.queue.register("email.send", lambda payload: "sent")
+        self.queue.enqueue("email.send", {"to": "b@example.com"})
+        job_id = self.queue.enqueue("email.send", {"to": "a@example.com"}, run_inline=True)
+
+        self.assertEqual(self.queue.get(job_id)["status"], "succeeded")
+        # Only the inline job ran; the other still waits for a worker
+        self.assertEqual([j["status"] for j in self.queue.list_jobs(status="queued")], ["queued"])
+
+    def test_idle_worker_purges_old_succeeded_jobs(self):
+        self.queue.register("report.build", lambda payload: "built")
+        old_id = self.queue.enqueue("report.build", {})
+        self.queue.run_pending()
+        self.queue.retention_seconds = 0
+        new_id = self.queue.enqueue("report.build", {})
+
+        self.queue._purge_if_due()
+        self.assertIsNone(self.queue.get(old_id))
+        self.assertEqual(self.queue.get(new_id)["status"], "queued")
+
+        # Not again until the interval has passed
+        self.queue.run_pending()
+        self.queue._purge_if_due()
+        self.assertIsNotNone(self.queue.get(new_id))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+"""
+Unit tests for keyset-paginated table sweeps
+"""
+
+import unittest
+import os
+import sys
+
+# Add the src directory to the path so we can import our modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from utils.keyset_scan import keyset_pages, keyset_rows
+from test_alert_state import MemoryQuery, MemorySupabase
+
+
+class CappedQuery(MemoryQuery):
+    """Mimics PostgREST's max-rows setting and records projections"""
+
+    def select(self, columns='*', *args, **kwargs):
+        self.db.projections.append(columns)
+        return self
+
+    def limit(self, count):
+        return super().limit(min(count, self.db.max_rows))
+
+
+class CappedSupabase(MemorySupabase):
+    def __init__(self, max_rows=10 ** 9, **tables):
+        super().__init__(**tables)
+        self.max_rows = max_rows
+        self.projections = []
+
+    def table(self, name):
+        return CappedQuery(self, name)
+
+
+def make_users(count):
+    return [{'id': f"u{i:05d}", 'subscription_plan': 'weekly'} for i in range(count)]
+
+
+class TestKeysetScan(unittest.TestCase):
+    """Test cases for keyset_pages and keyset_rows"""
+
+    def test_pages_are_bounded_and_cover_every_row_once(self):
+        db = CappedSupabase(users=make_users(2500))
+
+        pages = list(keyset_pages(db, 'users', 'id', page_size=1000))
+
+        self.assertEqual([len(page) for page in pages], [1000, 1000, 500])
+        ids = [row['id'] for page in pages for row in page]
+        self.assertEqual(ids, sorted(row['id'] for row in db.tables['users']))
+        # Three pages and the empty page that ends the sweep
+        self.assertEqual(db.count('users'), 4)
+
+    def test_server_cap_below_page_size_still_scans_everything(self):
+        db = CappedSupabase(max_rows=300, users=make_users(1000))
+
+        rows = list(keyset_rows(db, 'users', 'id', page_size=1000))
+
+        self.assertEqual(len(rows), 1000)
+        self.assertEqual(len({row['id'] for row in rows}), 1000)
+
+    def test_updates_during_sweep_neither_skip_nor_repeat_rows(self):
+        db = CappedSupabase(users=make_users(1000))
+        seen = []
+
+        for page in keyset_pages(db, 'users', 'id', where=lambda q: q.neq('subscription_plan', 'free'), page_size=100):
+            for row in page:
+                seen.append(row['id'])
+                # Downgrading takes the row out of the filter, which shifts offset paging
+                next(user for user in db.tables['users'] if user['id'] == row['id'])['subscription_plan'] = 'free'
+
+        self.assertEqual(len(seen), 1000)
+        self.assertEqual(len(set(seen)), 1000)
+
+    def test_projection_includes_the_key_and_resumes_after(self):
+        db = CappedSupabase(products=[{'id': i, 'name': f"Item {i}"} for i in range(1, 51)])
+
+        rows = list(keyset_rows(db, 'products', 'name', page_size=20, after=10))
+
+        self.assertEqual(db.projections[0], 'name, id')
+        self.assertEqual([row['id'] for row in rows], list(range(11, 51)))
+
+
+if __name__ == '__main__':
+    unittest.main()
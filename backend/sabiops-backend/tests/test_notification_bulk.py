@@ -0,0 +1,165 @@
+"""
+Unit tests for bulk notification creation
+Counts the queries issued against a recording Supabase stand-in
+"""
+
+import unittest
+import asyncio
+import os
+import sys
+from types import SimpleNamespace
+from unittest.mock import patch
+
+# Add the src directory to the path so we can import our modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from services import notification_service
+from services.notification_service import (
+    NotificationService, NotificationData, NotificationType, preferences_cache
+)
+
+
+class RecordingQuery:
+    def __init__(self, client, table):
+        self.client = client
+        self.table = table
+        self.operation = "select"
+        self.payload = None
+        self.filters = {}
+
+    def select(self, *args):
+        return self
+
+    def insert(self, payload):
+        self.operation, self.payload = "insert", payload
+        return self
+
+    def in_(self, column, values):
+        self.filters[column] = set(values)
+        return self
+
+    def eq(self, column, value):
+        self.filters[column] = {value}
+        return self
+
+    def execute(self):
+        self.client.queries.append((self.table, self.operation))
+        if self.operation == "insert":
+            rows = self.payload if isinstance(self.payload, list) else [self.payload]
+            if self.table == "notifications":
+                self.client.inserted.extend(rows)
+            return SimpleNamespace(data=rows)
+        rows = [
+            row for row in self.client.preferences
+            if all(row[column] in values for column, values in self.filters.items())
+        ]
+        return SimpleNamespace(data=rows)
+
+
+class RecordingSupabase:
+    def __init__(self, preferences=None):
+        self.preferences = preferences or []
+        self.queries = []
+        self.inserted = []
+
+    def table(self, name):
+        return RecordingQuery(self, name)
+
+
+class RecordingJobQueue:
+    def __init__(self):
+        self.jobs = []
+
+    def enqueue(self, kind, payload, owner_id=None, max_attempts=5, delay=0):
+        self.jobs.append((kind, payload))
+        return f"job-{len(self.jobs)}"
+
+
+def expiry_notice(days):
+    return NotificationData(
+        title="Subscription Expiring Soon",
+        message=f"Your subscription expires in {days} days.",
+        type=NotificationType.SUBSCRIPTION_EXPIRY,
+        data={'days_remaining': days},
+    )
+
+
+class TestCreateNotificationsBulk(unittest.TestCase):
+    """Test cases for NotificationService.create_notifications_bulk"""
+
+    def setUp(self):
+        preferences_cache.clear()
+        self.addCleanup(preferences_cache.clear)
+        self.jobs = RecordingJobQueue()
+        patcher = patch.object(notification_service, 'job_queue', self.jobs)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def make_service(self, client):
+        service = NotificationService(client)
+        service.firebase_available = True
+        return service
+
+    def test_thousand_users_cost_one_insert_one_lookup_and_one_push_job(self):
+        muted = {
+            'user_id': 'user-3', 'notification_type': 'subscription_expiry',
+            'enabled': True, 'push_enabled': False,
+        }
+        client = RecordingSupabase(preferences=[muted])
+        service = self.make_service(client)
+        pairs = [(f"user-{i}", expiry_notice(i % 7)) for i in range(1000)]
+
+        ids = asyncio.run(service.create_notifications_bulk(pairs))
+
+        self.assertEqual(len(ids), 1000)
+        self.assertTrue(all(ids))
+        self.assertEqual(client.queries.count(('notifications', 'insert')), 1000 // NotificationService.BULK_INSERT_CHUNK)
+        self.assertEqual(client.queries.count(('user_notification_preferences', 'select')), 1)
+        self.assertEqual([row['id'] for row in client.inserted], ids)
+
+        self.assertEqual(len(self.jobs.jobs), 1)
+        kind, payload = self.jobs.jobs[0]
+        self.assertEqual(kind, "notification.push_batch")
+        pushed = [delivery['user_id'] for delivery in payload['deliveries']]
+        self.assertEqual(len(pushed), 999)
+        self.assertNotIn('user-3', pushed)
+        self.assertEqual(payload['deliveries'][0]['data']['notification_id'], ids[0])
+
+    def test_preferences_are_cached_between_runs(self):
+        client = RecordingSupabase()
+        service = self.make_service(client)
+        pairs = [(f"user-{i}", expiry_notice(3)) for i in range(10)]
+
+        asyncio.run(service.create_notifications_bulk(pairs))
+        asyncio.run(service.create_notifications_bulk(pairs))
+        asyncio.run(service.create_notification('user-4', expiry_notice(3)))
+
+        self.assertEqual(client.queries.count(('user_notification_preferences', 'select')), 1)
+
+        preferences_cache.invalidate('user-4')
+        asyncio.run(service.create_notification('user-4', expiry_notice(3)))
+        self.assertEqual(client.queries.count(('user_notification_preferences', 'select')), 2)
+
+    def test_quiet_hours_strings_are_parsed(self):
+        all_day = {
+            'user_id': 'user-1', 'notification_type': 'low_stock_alert', 'enabled': True,
+            'push_enabled': True, 'quiet_hours_start': '00:00:00', 'quiet_hours_end': '23:59:59',
+        }
+        service = self.make_service(RecordingSupabase(preferences=[all_day]))
+        notice = service.build_low_stock_alert("Rice", 1, 5, "p1")
+
+        ids = asyncio.run(service.create_notifications_bulk([('user-1', notice), ('user-2', notice)]))
+
+        self.assertTrue(all(ids))
+        deliveries = self.jobs.jobs[0][1]['deliveries']
+        self.assertEqual([delivery['user_id'] for delivery in deliveries], ['user-2'])
+
+    def test_empty_input_issues_no_queries(self):
+        client = RecordingSupabase()
+        self.assertEqual(asyncio.run(self.make_service(client).create_notifications_bulk([])), [])
+        self.assertEqual(client.queries, [])
+        self.assertEqual(self.jobs.jobs, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
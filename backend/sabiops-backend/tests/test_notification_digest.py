@@ -0,0 +1,102 @@
+"""
+Unit tests for notification digests
+Bursts of alerts per owner and type are delivered as one summary notification
+"""
+
+import unittest
+import asyncio
+import os
+import sys
+from unittest.mock import patch
+
+# Add the src directory to the path so we can import our modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from services import notification_service
+from services.notification_service import NotificationService, preferences_cache
+from services.notification_digest import build_digest
+from services.business_trigger_manager import LowStockTrigger
+from services.triggers.low_stock_trigger import LowStockMonitor
+from test_alert_state import MemorySupabase
+from test_stock_events import RecordingQueue
+
+
+def make_products(count, owner_id='o1', start=0, quantity=1):
+    return [
+        {'id': f"p{i}", 'owner_id': owner_id, 'name': f"Item {i}", 'quantity': quantity,
+         'low_stock_threshold': 5, 'reorder_level': 0, 'active': True}
+        for i in range(start, start + count)
+    ]
+
+
+class TestNotificationDigest(unittest.TestCase):
+    """Test cases for digest delivery from the low stock triggers"""
+
+    def setUp(self):
+        preferences_cache.clear()
+        self.addCleanup(preferences_cache.clear)
+        self.queue = RecordingQueue()
+        patcher = patch.object(notification_service, 'job_queue', self.queue)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def run_trigger(self, db):
+        service = NotificationService(db)
+        service.firebase_available = True
+        return asyncio.run(LowStockTrigger(service, db).check_and_trigger())
+
+    def test_stock_out_is_one_notification_and_one_push_per_owner(self):
+        db = MemorySupabase(products=make_products(80) + make_products(1, owner_id='o2', start=80))
+
+        result = self.run_trigger(db)
+
+        self.assertEqual(result.notifications_sent, 81)
+        self.assertEqual(db.count('notifications', 'insert'), 1)
+        by_user = {n['user_id']: n for n in db.tables['notifications']}
+        self.assertEqual(len(db.tables['notifications']), 2)
+        digest = by_user['o1']
+        self.assertEqual(digest['title'], "80 products are running low")
+        self.assertEqual(digest['data']['count'], 80)
+        self.assertEqual(len(digest['data']['items']), 80)
+        self.assertEqual(by_user['o2']['data']['product_id'], 'p80')
+        # Every product is still deduplicated on its own
+        self.assertEqual(len(db.tables['alert_state']), 81)
+
+        (kind, payload), = self.queue.jobs
+        self.assertEqual(kind, "notification.push_batch")
+        self.assertEqual(len(payload['deliveries']), 2)
+        self.assertNotIn('items', payload['deliveries'][0]['data'])
+
+    def test_digested_products_are_deduplicated_without_alert_state(self):
+        db = MemorySupabase(products=make_products(10))
+        db.broken.add('alert_state')
+
+        self.assertEqual(self.run_trigger(db).notifications_sent, 10)
+        self.assertEqual(self.run_trigger(db).notifications_sent, 0)
+        self.assertEqual(len(db.tables['notifications']), 1)
+
+    def test_event_driven_check_digests_the_products_it_touches(self):
+        db = MemorySupabase(products=make_products(30))
+
+        result = asyncio.run(LowStockMonitor(db).check_products([f"p{i}" for i in range(30)]))
+
+        self.assertEqual(result['notifications_sent'], 30)
+        self.assertEqual(len(db.tables['notifications']), 1)
+        self.assertEqual(db.count('alert_state', 'upsert'), 1)
+
+    def test_digest_names_a_few_items_and_keeps_the_highest_priority(self):
+        alerts = [
+            NotificationService.build_low_stock_alert(f"Item {i}", quantity, 5, f"p{i}")
+            for i, quantity in enumerate([3, 0, 4, 2])
+        ]
+
+        digest = build_digest(alerts[0].type, alerts)
+
+        self.assertEqual(digest.message, "'Item 0', 'Item 1', 'Item 2' and 1 more")
+        self.assertEqual(digest.priority, "high")
+        self.assertEqual(digest.navigation_url, "/inventory")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,180 @@
+"""
+Unit tests for the bulk product update path
+Tests that N product updates cost one read and one write of only the sent fields
+"""
+
+import unittest
+import os
+import sys
+from types import SimpleNamespace
+from unittest.mock import patch
+
+# Add the backend directory to the path so we can import our modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.routes import product
+from src.routes.product import apply_bulk_product_updates
+
+
+class FakeProductsTable:
+    def __init__(self, client):
+        self.client = client
+        self.filters = {}
+        self.in_filters = {}
+        self.payload = None
+
+    def select(self, columns="*"):
+        return self
+
+    def eq(self, column, value):
+        self.filters[column] = value
+        return self
+
+    def in_(self, column, values):
+        self.in_filters[column] = set(values)
+        return self
+
+    def update(self, fields):
+        self.payload = fields
+        return self
+
+    def execute(self):
+        matches = [
+            row for row in self.client.rows.values()
+            if all(row.get(k) == v for k, v in self.filters.items())
+            and all(row.get(k) in v for k, v in self.in_filters.items())
+        ]
+        if self.payload is not None:
+            self.client.calls.append(("update", len(matches)))
+            for row in matches:
+                row.update(self.payload)
+        else:
+            self.client.calls.append(("select", tuple(self.in_filters)))
+        return SimpleNamespace(data=[dict(row) for row in matches])
+
+
+class FakeSupabase:
+    """Answers bulk_update_products like migration 023 would"""
+
+    def __init__(self, rows):
+        self.rows = {row["id"]: dict(row) for row in rows}
+        self.calls = []
+        self.items = []
+
+    def table(self, name):
+        return FakeProductsTable(self)
+
+    def rpc(self, name, params):
+        self.calls.append(("rpc", len(params["p_updates"])))
+        self.items.extend(params["p_updates"])
+        written = []
+        for item in params["p_updates"]:
+            row = self.rows.get(item["id"])
+            if row and row["owner_id"] == params["p_owner_id"]:
+                row.update(item)
+                written.append(dict(row))
+        return SimpleNamespace(execute=lambda: SimpleNamespace(data=written))
+
+
+class NoRpcSupabase(FakeSupabase):
+    """A database without migration 023"""
+
+    def rpc(self, name, params):
+        raise RuntimeError(f"Could not find the function public.{name} in the schema cache")
+
+
+class TestBulkProductUpdate(unittest.TestCase):
+    """Test cases for apply_bulk_product_updates"""
+
+    def setUp(self):
+        self.addCleanup(setattr, product, "_bulk_update_rpc_available", True)
+        self.stock_changes = []
+        patcher = patch.object(product, "emit_stock_changes", lambda owner_id, changes: self.stock_changes.extend(changes))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.owner_id = "owner-1"
+        self.rows = [
+            {"id": f"p{i}", "owner_id": self.owner_id, "name": f"Item {i}", "price": 100.0,
+             "cost_price": 50.0, "quantity": 10, "low_stock_threshold": 5, "sku": f"SKU-{i}", "active": True}
+            for i in range(500)
+        ]
+        self.rows.append({"id": "other", "owner_id": "owner-2", "name": "Theirs", "price": 1.0, "sku": "X", "active": True})
+        self.client = FakeSupabase(self.rows)
+
+    def test_five_hundred_updates_cost_two_calls(self):
+        updates = [{"id": f"p{i}", "price": 150 + i, "low_stock_threshold": 3} for i in range(500)]
+        results, updated = apply_bulk_product_updates(self.client, self.owner_id, updates)
+
+        self.assertEqual(len(updated), 500)
+        self.assertTrue(all(r["success"] for r in results))
+        self.assertEqual([c[0] for c in self.client.calls], ["select", "rpc"])
+        self.assertEqual(self.client.rows["p7"]["price"], 157.0)
+        self.assertEqual(self.client.rows["p7"]["name"], "Item 7")
+        # Only the fields that were sent are written
+        self.assertEqual(set(self.client.items[7]), {"id", "price", "low_stock_threshold"})
+
+    def test_stock_sold_after_the_read_is_not_overwritten(self):
+        select = FakeProductsTable.execute
+
+        def sell_after_read(table):
+            result = select(table)
+            if table.payload is None:
+                self.client.rows["p1"]["quantity"] = 4
+            return result
+
+        with patch.object(FakeProductsTable, "execute", sell_after_read):
+            results, _ = apply_bulk_product_updates(self.client, self.owner_id, [
+                {"id": "p1", "price": 120, "quantity": 10},
+                {"id": "p2", "quantity": 2},
+            ])
+
+        self.assertTrue(all(r["success"] for r in results))
+        # p1's quantity did not change in the request, so the sale's deduction stands
+        self.assertEqual(self.client.rows["p1"]["quantity"], 4)
+        self.assertEqual(self.client.rows["p2"]["quantity"], 2)
+        self.assertEqual([(c["product_id"], c["old_quantity"], c["new_quantity"]) for c in self.stock_changes],
+                         [("p2", 10, 2)])
+
+    def test_without_the_rpc_shared_changes_are_one_update(self):
+        self.client = NoRpcSupabase(self.rows)
+        updates = [{"id": f"p{i}", "active": False} for i in range(300)] + [{"id": "p400", "price": 90}]
+
+        results, updated = apply_bulk_product_updates(self.client, self.owner_id, updates)
+
+        self.assertTrue(all(r["success"] for r in results))
+        self.assertEqual(len(updated), 301)
+        self.assertEqual(self.client.calls, [("select", ("id",)), ("update", 300), ("update", 1)])
+        self.assertFalse(self.client.rows["p299"]["active"])
+        self.assertEqual((self.client.rows["p400"]["price"], self.client.rows["p400"]["quantity"]), (90.0, 10))
+
+    def test_per_item_results_for_invalid_and_foreign_products(self):
+        updates = [
+            {"id": "p1", "price": 200},
+            {"id": "p2", "price": -5},
+            {"id": "other", "price": 10},
+            {"price": 10},
+        ]
+        results, updated = apply_bulk_product_updates(self.client, self.owner_id, updates)
+
+        self.assertEqual([r["success"] for r in results], [True, False, False, False])
+        self.assertIn("Price must be greater than 0", results[1]["error"])
+        self.assertIn("not found", results[2]["error"])
+        self.assertEqual(self.client.rows["other"]["price"], 1.0)
+        self.assertEqual(len(updated), 1)
+
+    def test_sku_conflicts_are_rejected(self):
+        updates = [
+            {"id": "p1", "sku": "SKU-2"},
+            {"id": "p3", "sku": "NEW-1"},
+            {"id": "p4", "sku": "NEW-1"},
+        ]
+        results, _ = apply_bulk_product_updates(self.client, self.owner_id, updates)
+
+        self.assertIn("already exists", results[0]["error"])
+        self.assertTrue(results[1]["success"])
+        self.assertIn("used by another product", results[2]["error"])
+        self.assertEqual(self.client.rows["p1"]["sku"], "SKU-1")
+
+
+if __name__ == '__main__':
+    unittest.main()
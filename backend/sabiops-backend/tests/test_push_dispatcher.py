@@ -0,0 +1,149 @@
+"""
+Unit tests for the batched Push Dispatcher
+Uses a stubbed FCM transport in place of messaging.send_each_for_multicast
+"""
+
+import unittest
+import os
+import sys
+import threading
+import time
+from types import SimpleNamespace
+
+# Add the src directory to the path so we can import our modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from firebase_admin import messaging
+from services.firebase_service import send_multicast_notification, MULTICAST_LIMIT
+from services.push_dispatcher import PushDispatcher
+
+
+class StubTransport:
+    """Records multicast calls; tokens starting with 'dead' are unregistered, 'flaky' fail transiently"""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = []
+        self.active = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, message):
+        with self.lock:
+            self.calls.append(message)
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(self.latency)
+        responses = []
+        for token in message.tokens:
+            if token.startswith("dead"):
+                responses.append(SimpleNamespace(success=False, exception=messaging.UnregisteredError("gone")))
+            elif token.startswith("flaky"):
+                responses.append(SimpleNamespace(success=False, exception=RuntimeError("unavailable")))
+            else:
+                responses.append(SimpleNamespace(success=True, exception=None))
+        with self.lock:
+            self.active -= 1
+        return SimpleNamespace(responses=responses)
+
+
+class FakeSubscriptions:
+    def __init__(self, client):
+        self.client = client
+        self.payload = None
+        self.in_filters = {}
+
+    def select(self, *args):
+        return self
+
+    def update(self, payload):
+        self.payload = payload
+        return self
+
+    def in_(self, column, values):
+        self.in_filters[column] = list(values)
+        return self
+
+    def eq(self, *args):
+        return self
+
+    def execute(self):
+        if self.payload is None:
+            self.client.calls.append("select")
+            users = set(self.in_filters["user_id"])
+            return SimpleNamespace(data=[r for r in self.client.rows if r["user_id"] in users])
+        self.client.calls.append(("update", tuple(self.payload), tuple(self.in_filters["id"])))
+        return SimpleNamespace(data=[])
+
+
+class FakeSupabase:
+    def __init__(self, rows):
+        self.rows = rows
+        self.calls = []
+
+    def table(self, name):
+        return FakeSubscriptions(self)
+
+    def updates(self, field):
+        return [ids for call in self.calls if call != "select" and field in call[1] for ids in [call[2]]]
+
+
+class TestPushDispatcher(unittest.TestCase):
+    """Test cases for PushDispatcher and send_multicast_notification"""
+
+    def test_one_multicast_and_one_update_per_user_batch(self):
+        rows = [{"id": f"t{i}", "user_id": "u1", "fcm_token": f"tok-{i}"} for i in range(5)]
+        client = FakeSupabase(rows)
+        transport = StubTransport()
+
+        reached = PushDispatcher(client, transport=transport).send_to_user("u1", "Low stock", "Rice is low", {"qty": 2})
+
+        self.assertEqual(reached, 5)
+        self.assertEqual(len(transport.calls), 1)
+        self.assertEqual(transport.calls[0].data, {"qty": "2"})
+        self.assertEqual(client.calls[0], "select")
+        self.assertEqual(client.updates("last_used_at"), [tuple(f"t{i}" for i in range(5))])
+
+    def test_dead_tokens_deactivated_in_bulk_and_transient_failures_kept(self):
+        rows = [
+            {"id": "a", "user_id": "u1", "fcm_token": "ok-1"},
+            {"id": "b", "user_id": "u1", "fcm_token": "dead-1"},
+            {"id": "c", "user_id": "u2", "fcm_token": "dead-2"},
+            {"id": "d", "user_id": "u2", "fcm_token": "flaky-1"},
+        ]
+        client = FakeSupabase(rows)
+        sent = PushDispatcher(client, transport=StubTransport()).send_to_users([
+            {"user_id": "u1", "title": "t", "body": "b"},
+            {"user_id": "u2", "title": "t", "body": "b"},
+            {"user_id": "u3", "title": "t", "body": "b"},
+        ])
+
+        self.assertEqual(sent, {"u1": 1, "u2": 0, "u3": 0})
+        self.assertEqual(client.updates("active"), [("b", "c")])
+        self.assertEqual(client.updates("last_used_at"), [("a",)])
+        self.assertEqual(client.calls.count("select"), 1)
+
+    def test_fan_out_is_concurrent_but_bounded(self):
+        rows = [{"id": f"t{i}", "user_id": f"u{i}", "fcm_token": f"tok-{i}"} for i in range(12)]
+        transport = StubTransport(latency=0.05)
+        dispatcher = PushDispatcher(FakeSupabase(rows), transport=transport, max_workers=4)
+
+        started = time.perf_counter()
+        sent = dispatcher.send_to_users([{"user_id": f"u{i}", "title": "t", "body": "b"} for i in range(12)])
+        elapsed = time.perf_counter() - started
+
+        self.assertEqual(sum(sent.values()), 12)
+        self.assertEqual(transport.peak, 4)
+        self.assertLess(elapsed, 12 * 0.05 * 0.6)
+
+    def test_multicast_chunks_at_fcm_limit(self):
+        transport = StubTransport()
+        tokens = [f"tok-{i}" for i in range(MULTICAST_LIMIT + 20)]
+        results = send_multicast_notification(tokens, "t", "b", transport=transport)
+
+        self.assertEqual([len(c.tokens) for c in transport.calls], [MULTICAST_LIMIT, 20])
+        self.assertTrue(all(success for _, success, _ in results))
+
+
+if __name__ == '__main__':
+    unittest.main()
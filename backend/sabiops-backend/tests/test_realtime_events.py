@@ -0,0 +1,119 @@
+"""
+Unit tests for the realtime event fan-out behind the SSE stream
+The poller is driven by hand (autostart=False) against the in-memory
+Supabase stand-in
+"""
+
+import unittest
+import os
+import sys
+from unittest.mock import patch
+
+# Add the src directory to the path so we can import our modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from services import realtime_events
+from services.realtime_events import RealtimeHub, Subscription, format_sse, publish
+from services.notification_service import unread_count_cache
+from test_alert_state import MemorySupabase
+
+
+def event_db(**tables):
+    return MemorySupabase(serial={'realtime_events': 'id'}, realtime_events=[], **tables)
+
+
+class TestRealtimeHub(unittest.TestCase):
+    """Test cases for RealtimeHub polling, fan-out and resume"""
+
+    def setUp(self):
+        self.db = event_db()
+        self.hub = RealtimeHub(autostart=False)
+
+    def test_events_reach_only_their_connections(self):
+        owner = self.hub.subscribe(self.db, ['u1', 'o1'])
+        other = self.hub.subscribe(self.db, ['u2'])
+        self.hub.poll_once()
+
+        publish(self.db, [
+            ('u1', 'notification', {'id': 'n1'}),
+            ('o1', 'dashboard', {'kind': 'sale_recorded', 'amount': 2500.0}),
+            ('u2', 'notification', {'id': 'n2'}),
+            ('u3', 'notification', {'id': 'n3'}),
+        ])
+        self.assertEqual(self.hub.poll_once(), 3)
+
+        events, overflowed = owner.take(0)
+        self.assertEqual([event['event'] for event in events], ['notification', 'dashboard'])
+        self.assertFalse(overflowed)
+        self.assertEqual([event['data']['id'] for event in other.take(0)[0]], ['n2'])
+        # Already delivered ids are not sent again
+        self.assertEqual(self.hub.poll_once(), 0)
+
+    def test_late_commit_behind_the_watermark_is_delivered(self):
+        subscription = self.hub.subscribe(self.db, ['u1'])
+        self.hub.poll_once()
+
+        # Id 2 commits before id 1
+        self.db.tables['realtime_events'].append({'id': 2, 'user_id': 'u1', 'event': 'notification', 'data': {}})
+        self.hub.poll_once()
+        self.db.tables['realtime_events'].append({'id': 1, 'user_id': 'u1', 'event': 'notification', 'data': {}})
+        self.hub.poll_once()
+        self.hub.poll_once()
+
+        self.assertEqual(sorted(event['id'] for event in subscription.take(0)[0]), [1, 2])
+
+    def test_resume_replays_missed_events_for_the_user(self):
+        publish(self.db, [('u1', 'notification', {'n': i}) for i in range(4)] + [('u2', 'notification', {})])
+
+        subscription = self.hub.subscribe(self.db, ['u1'], last_event_id=2)
+
+        self.assertEqual([event['id'] for event in subscription.take(0)[0]], [3, 4])
+
+    def test_slow_connection_is_told_to_resync(self):
+        subscription = Subscription({'u1'}, limit=5)
+        for i in range(8):
+            subscription.put({'id': i + 1, 'user_id': 'u1', 'event': 'notification', 'data': {}})
+
+        events, overflowed = subscription.take(0)
+
+        self.assertTrue(overflowed)
+        self.assertLessEqual(len(events), 5)
+
+    def test_without_the_event_table_delivery_stays_in_process(self):
+        self.db.broken.add('realtime_events')
+        subscription = self.hub.subscribe(self.db, ['u1'])
+
+        with patch.object(realtime_events, 'realtime_hub', self.hub):
+            self.assertEqual(publish(self.db, [('u1', 'dashboard', {'kind': 'expense_recorded'})]), 1)
+
+        self.assertEqual(subscription.take(0)[0][0]['data'], {'kind': 'expense_recorded'})
+
+
+class TestEventStream(unittest.TestCase):
+    """Test cases for the SSE body"""
+
+    def setUp(self):
+        unread_count_cache.clear()
+        self.addCleanup(unread_count_cache.clear)
+
+    def test_stream_sends_count_events_and_heartbeats(self):
+        db = event_db(notification_unread_counts=[{'user_id': 'u1', 'unread_count': 4}])
+        hub = RealtimeHub(autostart=False)
+        body = hub.stream(db, 'u1', ['o1'], heartbeat_seconds=0.01, max_seconds=0.2)
+
+        self.assertTrue(next(body).startswith('retry:'))
+        self.assertEqual(next(body), format_sse('unread_count', {'unread_count': 4}))
+
+        hub.dispatch([{'id': 7, 'user_id': 'u1', 'event': 'notification', 'data': {'title': 'Low stock'}}])
+        db.tables['notification_unread_counts'][0]['unread_count'] = 5
+        self.assertEqual(next(body), 'id: 7\nevent: notification\ndata: {"title":"Low stock"}\n\n')
+        self.assertEqual(next(body), format_sse('unread_count', {'unread_count': 5}))
+        self.assertEqual(next(body), ': keepalive\n\n')
+
+        body.close()
+        self.assertEqual(hub.connection_count(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+"""
+Unit tests for the batched retention purge
+Runs against the in-memory Supabase stand-in, whose rpc() always fails, so
+the backend archive-then-delete path is the one exercised
+"""
+
+import unittest
+import asyncio
+import os
+import sys
+
+# Add the src directory to the path so we can import our modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from services.notification_service import NotificationService
+from services.retention import RetentionService
+from test_alert_state import MemorySupabase, hours_ago
+
+
+def notification(i, user_id='u1', read=True, days=60, type='low_stock'):
+    return {'id': f'n{i}', 'user_id': user_id, 'type': type, 'read': read, 'created_at': hours_ago(days * 24)}
+
+
+class TestRetentionService(unittest.TestCase):
+    """Test cases for RetentionService"""
+
+    def retention(self, db, **kwargs):
+        return RetentionService(db, batch_size=kwargs.pop('batch_size', 10), pause_seconds=0, **kwargs)
+
+    def test_old_notifications_are_archived_then_deleted_in_batches(self):
+        old = [notification(i) for i in range(25)]
+        recent = [notification(100, days=5), notification(101, read=False, days=60)]
+        db = MemorySupabase(notifications=old + recent, notification_archive=[])
+
+        deleted = self.retention(db).purge_notifications(read_days=30, unread_days=90)
+
+        self.assertEqual(deleted, 25)
+        self.assertEqual(sorted(row['id'] for row in db.tables['notifications']), ['n100', 'n101'])
+        # Three batches of at most 10, each one summarised before it is deleted
+        self.assertEqual(db.count('notifications', 'delete'), 3)
+        self.assertEqual(sum(row['notification_count'] for row in db.tables['notification_archive']), 25)
+        self.assertEqual({row['notification_type'] for row in db.tables['notification_archive']}, {'low_stock'})
+
+    def test_failed_archive_deletes_nothing(self):
+        db = MemorySupabase(notifications=[notification(i) for i in range(5)])
+        db.broken.add('notification_archive')
+
+        with self.assertRaises(RuntimeError):
+            self.retention(db).purge_notifications(read_days=30, unread_days=30)
+
+        self.assertEqual(len(db.tables['notifications']), 5)
+        self.assertEqual(db.count('notifications', 'delete'), 0)
+
+    def test_cleanup_route_method_purges_through_retention(self):
+        db = MemorySupabase(notifications=[notification(i, read=i % 2 == 0) for i in range(6)]
+                            + [notification(9, days=1)])
+
+        count = asyncio.run(NotificationService(db).cleanup_old_notifications(30))
+
+        self.assertEqual(count, 6)
+        self.assertEqual([n['id'] for n in db.tables['notifications']], ['n9'])
+        self.assertEqual(sum(row['notification_count'] for row in db.tables['notification_archive']), 6)
+
+    def test_user_scoped_purge_leaves_other_users_alone(self):
+        db = MemorySupabase(notifications=[notification(1), notification(2, user_id='u2')], notification_archive=[])
+
+        self.assertEqual(self.retention(db).purge_notifications(30, 30, user_id='u1'), 1)
+        self.assertEqual([row['user_id'] for row in db.tables['notifications']], ['u2'])
+
+    def test_run_prunes_dead_devices_and_expired_tokens(self):
+        db = MemorySupabase(
+            notifications=[], notification_archive=[], realtime_events=[],
+            push_subscriptions=[
+                {'id': 'd1', 'active': False, 'last_used_at': hours_ago(40 * 24)},
+                {'id': 'd2', 'active': True, 'last_used_at': hours_ago(200 * 24)},
+                {'id': 'd3', 'active': True, 'last_used_at': hours_ago(40 * 24)},
+                {'id': 'd4', 'active': False, 'last_used_at': hours_ago(2 * 24)},
+            ],
+            email_verification_tokens=[{'id': 't1', 'expires_at': hours_ago(10 * 24)}],
+            password_reset_tokens=[{'id': 't2', 'expires_at': hours_ago(1)}],
+        )
+        db.broken.add('realtime_events')
+
+        result = self.retention(db).run()
+
+        self.assertEqual(sorted(row['id'] for row in db.tables['push_subscriptions']), ['d3', 'd4'])
+        self.assertEqual(db.tables['email_verification_tokens'], [])
+        self.assertEqual(len(db.tables['password_reset_tokens']), 1)
+        self.assertEqual(result['deleted']['push_subscriptions'], 2)
+        self.assertEqual(result['rows_processed'], 3)
+        # One failing table does not stop the rest
+        self.assertIn('realtime_events', result['errors'])
+        self.assertFalse(result['budget_spent'])
+
+
+if __name__ == '__main__':
+    unittest.main()
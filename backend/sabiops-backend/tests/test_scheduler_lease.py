@@ -0,0 +1,112 @@
+"""
+Unit tests for scheduler leader leases and job run history
+Several scheduler instances share one in-memory Supabase stand-in, like
+worker processes sharing the database
+"""
+
+import unittest
+import os
+import sys
+from datetime import datetime, timezone, timedelta
+
+# Add the src directory to the path so we can import our modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from services.scheduler_lease import SchedulerLease, JobRunHistory
+from services.subscription_monitor import SubscriptionMonitor
+from test_alert_state import MemorySupabase
+
+
+def shared_db():
+    return MemorySupabase(unique={'scheduler_leases': 'name'}, scheduler_leases=[], job_runs=[])
+
+
+class TestSchedulerLease(unittest.TestCase):
+    """Test cases for SchedulerLease"""
+
+    def test_one_holder_at_a_time(self):
+        db = shared_db()
+        leases = [SchedulerLease(db, 'nightly', ttl_seconds=60, holder=f"worker-{i}") for i in range(4)]
+
+        held = [lease.acquire() for lease in leases]
+
+        self.assertEqual(held, [True, False, False, False])
+        self.assertEqual([lease.is_leader for lease in leases], held)
+        # Renewal keeps the same leader
+        self.assertTrue(leases[0].acquire())
+        self.assertFalse(leases[1].acquire())
+        self.assertEqual(len(db.tables['scheduler_leases']), 1)
+
+    def test_expired_lease_is_taken_over(self):
+        db = shared_db()
+        leader, follower = (SchedulerLease(db, 'nightly', ttl_seconds=60, holder=h) for h in ('a', 'b'))
+        leader.acquire()
+
+        # The leader stopped heartbeating long enough for the lease to lapse
+        past = (datetime.now(timezone.utc) - timedelta(seconds=1)).isoformat()
+        db.tables['scheduler_leases'][0]['expires_at'] = past
+
+        self.assertTrue(follower.acquire())
+        self.assertFalse(leader.acquire())
+        self.assertFalse(leader.is_leader)
+        self.assertEqual(db.tables['scheduler_leases'][0]['holder'], 'b')
+
+    def test_release_hands_over_immediately(self):
+        db = shared_db()
+        leader, follower = (SchedulerLease(db, 'nightly', ttl_seconds=60, holder=h) for h in ('a', 'b'))
+        leader.acquire()
+
+        leader.release()
+
+        self.assertFalse(leader.is_leader)
+        self.assertTrue(follower.acquire())
+
+    def test_runs_without_a_lease_table(self):
+        db = MemorySupabase()
+        db.broken.add('scheduler_leases')
+
+        self.assertTrue(SchedulerLease(db, 'nightly', holder='a').acquire())
+
+
+class TestLeaderOnlyJobs(unittest.TestCase):
+    """Test cases for leader-only monitoring passes across several instances"""
+
+    def test_only_the_leader_runs_and_records_the_pass(self):
+        soon = (datetime.now(timezone.utc) + timedelta(days=3)).isoformat()
+        db = shared_db()
+        db.tables['user_subscriptions'] = [
+            {'id': f"s{i}", 'user_id': f"u{i}", 'status': 'active', 'end_date': soon, 'plan_id': 'monthly'}
+            for i in range(5)
+        ]
+        monitors = [SubscriptionMonitor(db) for _ in range(3)]
+        for monitor in monitors:
+            monitor.lease.acquire()
+        monitors[0]._send_notifications = lambda notifications: None
+
+        ran = [monitor.run_once() for monitor in monitors]
+
+        self.assertEqual(ran, [True, False, False])
+        runs = db.tables['job_runs']
+        self.assertEqual(len(runs), 1)
+        self.assertEqual(runs[0]['job_name'], 'subscription_monitor')
+        self.assertEqual(runs[0]['status'], 'succeeded')
+        self.assertEqual(runs[0]['rows_processed'], 5)
+        self.assertEqual(runs[0]['details'], {'expired': 0, 'expiring_soon': 5})
+        self.assertEqual(runs[0]['holder'], monitors[0].lease.holder)
+        self.assertGreaterEqual(runs[0]['duration_ms'], 0)
+
+    def test_failed_run_is_recorded(self):
+        db = shared_db()
+        history = JobRunHistory(db, holder='a')
+
+        with self.assertRaises(RuntimeError):
+            with history.track('usage_limits'):
+                raise RuntimeError('usage table unavailable')
+
+        run = db.tables['job_runs'][0]
+        self.assertEqual((run['status'], run['error']), ('failed', 'usage table unavailable'))
+
+
+if __name__ == '__main__':
+    unittest.main()
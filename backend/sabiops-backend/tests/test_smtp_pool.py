@@ -0,0 +1,208 @@
+"""
+Unit tests for the pooled SMTP transport
+Runs against a local SMTP stand-in that charges a fixed handshake cost per
+connection, the way TCP+TLS+AUTH does against a real provider.
+"""
+
+import unittest
+import os
+import sys
+import smtplib
+import socketserver
+import threading
+import time
+from email.mime.text import MIMEText
+from unittest.mock import Mock
+
+# Add the src directory to the path so we can import our modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from utils.smtp_pool import SMTPConnectionPool, RateLimiter
+
+
+class LocalSMTPServer(socketserver.ThreadingTCPServer):
+    """Minimal SMTP stand-in: records messages, logins and connections"""
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, handshake_delay=0.0, drop_after=None):
+        super().__init__(("127.0.0.1", 0), SMTPHandler)
+        self.handshake_delay = handshake_delay
+        self.drop_after = drop_after
+        self.messages = []
+        self.connections = 0
+        self.logins = 0
+        self.lock = threading.Lock()
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write((line + "\r\n").encode())
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+        time.sleep(server.handshake_delay)
+        self.reply("220 localhost ready")
+        sent_here = 0
+        recipients = []
+
+        while True:
+            raw = self.rfile.readline()
+            if not raw:
+                return
+            command = raw.decode().strip()
+            verb = command.split(" ", 1)[0].upper()
+
+            if verb == "EHLO":
+                self.reply("250-localhost")
+                self.reply("250 AUTH PLAIN")
+            elif verb == "HELO":
+                self.reply("250 localhost")
+            elif verb == "AUTH":
+                time.sleep(server.handshake_delay)
+                with server.lock:
+                    server.logins += 1
+                self.reply("235 Authenticated")
+            elif verb == "MAIL":
+                recipients = []
+                self.reply("250 OK")
+            elif verb == "RCPT":
+                address = command.split(":", 1)[1].strip("<> ")
+                if address.startswith("reject"):
+                    self.reply("550 No such user")
+                else:
+                    recipients.append(address)
+                    self.reply("250 OK")
+            elif verb == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                body = []
+                while True:
+                    line = self.rfile.readline()
+                    if line in (b".\r\n", b""):
+                        break
+                    body.append(line)
+                with server.lock:
+                    server.messages.append((recipients, b"".join(body)))
+                self.reply("250 Queued")
+                sent_here += 1
+                if server.drop_after and sent_here >= server.drop_after:
+                    return
+            elif verb in ("RSET", "NOOP"):
+                self.reply("250 OK")
+            elif verb == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Not implemented")
+
+
+def make_message(n, to="customer@example.com"):
+    message = MIMEText(f"Invoice reminder {n}")
+    message["Subject"] = f"Reminder {n}"
+    message["From"] = "billing@example.com"
+    message["To"] = to
+    return message
+
+
+class TestSMTPConnectionPool(unittest.TestCase):
+    """Test cases for SMTPConnectionPool"""
+
+    def start_server(self, **kwargs):
+        server = LocalSMTPServer(**kwargs)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server
+
+    def make_pool(self, server, **kwargs):
+        pool = SMTPConnectionPool("127.0.0.1", server.port, "user", "secret", use_tls=False, **kwargs)
+        self.addCleanup(pool.close)
+        return pool
+
+    def test_sequential_sends_reuse_one_login(self):
+        server = self.start_server()
+        pool = self.make_pool(server)
+
+        results = [pool.send(make_message(i)) for i in range(20)]
+
+        self.assertTrue(all(results))
+        self.assertEqual(len(server.messages), 20)
+        self.assertEqual(server.connections, 1)
+        self.assertEqual(server.logins, 1)
+
+    def test_batch_reconnects_when_server_drops_session(self):
+        server = self.start_server(drop_after=3)
+        pool = self.make_pool(server)
+
+        results = pool.send_batch([make_message(i) for i in range(7)])
+
+        self.assertEqual(results, [True] * 7)
+        self.assertEqual(len(server.messages), 7)
+        self.assertGreaterEqual(pool.stats["reconnects"], 2)
+
+    def test_rejected_recipient_does_not_drop_the_session(self):
+        server = self.start_server()
+        pool = self.make_pool(server)
+
+        results = pool.send_batch([
+            make_message(1), make_message(2, to="reject@example.com"), make_message(3)
+        ])
+
+        self.assertEqual(results, [True, False, True])
+        self.assertEqual(server.connections, 1)
+
+    def test_unexpected_error_closes_the_session(self):
+        servers = []
+
+        def connect(*args, **kwargs):
+            server = Mock()
+            server.send_message.side_effect = ValueError("bad message") if not servers else None
+            servers.append(server)
+            return server
+
+        pool = SMTPConnectionPool("127.0.0.1", 25, "user", "secret", use_tls=False, connection_factory=connect)
+
+        results = pool.send_batch([make_message(1), make_message(2)])
+
+        self.assertEqual(results, [False, True])
+        servers[0].quit.assert_called_once()
+        self.assertEqual(len(servers), 2)
+
+    def test_rate_limit_spaces_sends(self):
+        limiter = RateLimiter(rate=20)
+        started = time.perf_counter()
+        for _ in range(30):
+            limiter.acquire()
+        # 20 burst tokens, then 10 more at 20/s
+        self.assertGreater(time.perf_counter() - started, 0.4)
+
+    def test_pooled_throughput_beats_login_per_email(self):
+        server = self.start_server(handshake_delay=0.01)
+        count = 20
+
+        started = time.perf_counter()
+        for i in range(count):
+            with smtplib.SMTP("127.0.0.1", server.port, timeout=5) as smtp:
+                smtp.login("user", "secret")
+                smtp.send_message(make_message(i))
+        per_email_rate = count / (time.perf_counter() - started)
+
+        pool = self.make_pool(server)
+        started = time.perf_counter()
+        self.assertTrue(all(pool.send_batch([make_message(i) for i in range(count)])))
+        pooled_rate = count / (time.perf_counter() - started)
+
+        self.assertEqual(len(server.messages), count * 2)
+        self.assertGreater(pooled_rate, per_email_rate * 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
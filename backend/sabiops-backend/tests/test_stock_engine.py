@@ -0,0 +1,293 @@
+"""
+Unit tests for the Stock Engine
+Tests batched availability checks, atomic deduction and concurrent sales
+"""
+
+import unittest
+import threading
+from types import SimpleNamespace
+from unittest.mock import Mock, patch
+import sys
+import os
+
+# Add the backend directory to the path so we can import our modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.utils.stock_engine import StockEngine
+from src.utils.invoice_inventory_manager import InvoiceInventoryManager
+from src.utils.invoice_status_manager import InvoiceStatusManager
+
+
+class FakeProductsQuery:
+    """Minimal PostgREST query builder over an in-memory products table"""
+
+    def __init__(self, store):
+        self.store = store
+        self.filters = []
+        self.in_filter = None
+        self.payload = None
+
+    def select(self, columns="*"):
+        return self
+
+    def update(self, payload):
+        self.payload = payload
+        return self
+
+    def eq(self, column, value):
+        self.filters.append((column, value))
+        return self
+
+    def in_(self, column, values):
+        self.in_filter = (column, set(values))
+        return self
+
+    def _matches(self, row):
+        if self.in_filter and row.get(self.in_filter[0]) not in self.in_filter[1]:
+            return False
+        return all(row.get(column) == value for column, value in self.filters)
+
+    def execute(self):
+        with self.store.lock:
+            self.store.round_trips += 1
+            rows = [row for row in self.store.products.values() if self._matches(row)]
+            if self.payload is not None:
+                for row in rows:
+                    row.update(self.payload)
+            return SimpleNamespace(data=[dict(row) for row in rows])
+
+
+class FakeStockStore:
+    """In-memory supabase stand-in whose RPC behaves like deduct_stock_batch"""
+
+    def __init__(self, products, rpc_available=True):
+        self.products = {p["id"]: dict(p) for p in products}
+        self.lock = threading.Lock()
+        self.round_trips = 0
+        self.rpc_available = rpc_available
+
+    def table(self, name):
+        return FakeProductsQuery(self)
+
+    def rpc(self, name, params):
+        if not self.rpc_available:
+            raise Exception(f"Could not find the function public.{name}")
+        return SimpleNamespace(execute=lambda: self._deduct(params))
+
+    def _deduct(self, params):
+        with self.lock:
+            self.round_trips += 1
+            owner_id = params["p_owner_id"]
+            lines = params["p_items"]
+            owned = {
+                line["product_id"]: self.products.get(line["product_id"])
+                for line in lines
+            }
+            owned = {pid: row for pid, row in owned.items() if row and row["owner_id"] == owner_id}
+            ok = {
+                line["product_id"]: line["product_id"] in owned and owned[line["product_id"]]["quantity"] >= line["quantity"]
+                for line in lines
+            }
+            if params["p_all_or_nothing"] and not all(ok.values()):
+                ok = {pid: False for pid in ok}
+
+            rows = []
+            for line in lines:
+                pid = line["product_id"]
+                if ok[pid]:
+                    owned[pid]["quantity"] -= line["quantity"]
+                rows.append({
+                    "product_id": pid,
+                    "requested": line["quantity"],
+                    "success": ok[pid],
+                    "remaining": owned[pid]["quantity"] if pid in owned else None
+                })
+            return SimpleNamespace(data=rows)
+
+
+class TestStockEngine(unittest.TestCase):
+    """Test cases for StockEngine"""
+
+    def setUp(self):
+        """Set up test fixtures"""
+        self.owner_id = "owner-1"
+        self.store = FakeStockStore([
+            {"id": "p1", "owner_id": self.owner_id, "name": "Rice", "quantity": 10},
+            {"id": "p2", "owner_id": self.owner_id, "name": "Beans", "quantity": 3},
+            {"id": "p3", "owner_id": "someone-else", "name": "Oil", "quantity": 50},
+        ])
+        self.engine = StockEngine(self.store)
+
+    def test_aggregate_lines_sums_duplicates_and_skips_invalid(self):
+        """Duplicate products are summed; empty or non-positive lines dropped"""
+        totals = StockEngine.aggregate_lines([
+            {"product_id": "p1", "quantity": 2},
+            {"product_id": "p1", "quantity": "3.0"},
+            {"product_id": None, "quantity": 4},
+            {"product_id": "p2", "quantity": 0},
+        ])
+        self.assertEqual(totals, {"p1": 5})
+
+    def test_check_availability_uses_one_query(self):
+        """Availability for every line is read with a single in_() query"""
+        result = self.engine.check_availability(
+            [{"product_id": "p1", "quantity": 4}, {"product_id": "p2", "quantity": 5}],
+            self.owner_id
+        )
+        self.assertFalse(result["valid"])
+        self.assertEqual(self.store.round_trips, 1)
+        by_id = {line["product_id"]: line for line in result["lines"]}
+        self.assertTrue(by_id["p1"]["sufficient"])
+        self.assertFalse(by_id["p2"]["sufficient"])
+
+    def test_deduct_all_or_nothing_leaves_stock_untouched_on_shortage(self):
+        """A single short line aborts the whole batch"""
+        result = self.engine.deduct(
+            [{"product_id": "p1", "quantity": 4}, {"product_id": "p2", "quantity": 5}],
+            self.owner_id
+        )
+        self.assertFalse(result["success"])
+        self.assertEqual(self.store.products["p1"]["quantity"], 10)
+        self.assertEqual(self.store.products["p2"]["quantity"], 3)
+
+    def test_deduct_partial_reports_per_line_results(self):
+        """Partial mode applies what it can and reports remaining stock"""
+        result = self.engine.deduct(
+            [{"product_id": "p1", "quantity": 4}, {"product_id": "p2", "quantity": 5}],
+            self.owner_id,
+            all_or_nothing=False
+        )
+        by_id = {line["product_id"]: line for line in result["lines"]}
+        self.assertTrue(by_id["p1"]["success"])
+        self.assertEqual(by_id["p1"]["remaining"], 6)
+        self.assertFalse(by_id["p2"]["success"])
+        self.assertEqual(by_id["p2"]["remaining"], 3)
+
+    def test_deduct_ignores_other_owners_products(self):
+        """Products owned by another business are never decremented"""
+        result = self.engine.deduct([{"product_id": "p3", "quantity": 1}], self.owner_id)
+        self.assertFalse(result["success"])
+        self.assertEqual(self.store.products["p3"]["quantity"], 50)
+
+    def test_cas_fallback_when_rpc_missing(self):
+        """Without the RPC the engine still deducts with guarded updates"""
+        self.store.rpc_available = False
+        result = self.engine.deduct(
+            [{"product_id": "p1", "quantity": 4}, {"product_id": "p2", "quantity": 3}],
+            self.owner_id
+        )
+        self.assertTrue(result["success"])
+        self.assertEqual(self.store.products["p1"]["quantity"], 6)
+        self.assertEqual(self.store.products["p2"]["quantity"], 0)
+
+    def test_failed_rpc_is_not_repeated_through_cas(self):
+        """A timeout may have committed, so it is raised rather than deducted again"""
+        self.store.rpc = Mock(side_effect=TimeoutError("read timed out"))
+        with self.assertRaises(TimeoutError):
+            self.engine.deduct([{"product_id": "p1", "quantity": 4}], self.owner_id)
+        self.assertEqual(self.store.products["p1"]["quantity"], 10)
+        self.assertEqual(self.store.round_trips, 0)
+
+    def _run_concurrent_sales(self, cashiers):
+        results = []
+        start = threading.Barrier(cashiers)
+
+        def sell():
+            start.wait()
+            results.append(self.engine.deduct([{"product_id": "p1", "quantity": 1}], self.owner_id))
+
+        threads = [threading.Thread(target=sell) for _ in range(cashiers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_concurrent_sales_never_oversell(self):
+        """Twenty cashiers racing for ten units sell exactly ten"""
+        results = self._run_concurrent_sales(20)
+        self.assertEqual(sum(1 for r in results if r["success"]), 10)
+        self.assertEqual(self.store.products["p1"]["quantity"], 0)
+
+    def test_concurrent_sales_never_oversell_with_cas_fallback(self):
+        """The compare-and-swap fallback does not lose updates either"""
+        self.store.rpc_available = False
+        self.engine.MAX_CAS_RETRIES = 50
+        results = self._run_concurrent_sales(20)
+        self.assertEqual(sum(1 for r in results if r["success"]), 10)
+        self.assertEqual(self.store.products["p1"]["quantity"], 0)
+
+    def test_deduct_throughput_benchmark(self):
+        """A 500-line invoice is one round trip, however many lines it has"""
+        products = [{"id": f"b{i}", "owner_id": self.owner_id, "name": f"Item {i}", "quantity": 10_000} for i in range(500)]
+        store = FakeStockStore(products)
+        engine = StockEngine(store)
+        items = [{"product_id": p["id"], "quantity": 1} for p in products]
+
+        iterations = 50
+        for _ in range(iterations):
+            self.assertTrue(engine.deduct(items, self.owner_id)["success"])
+
+        self.assertEqual(store.round_trips, iterations)
+        self.assertEqual(store.products["b0"]["quantity"], 10_000 - iterations)
+
+
+class TestInvoiceInventoryManagerBatching(unittest.TestCase):
+    """InvoiceInventoryManager delegates to the stock engine"""
+
+    def setUp(self):
+        self.owner_id = "owner-1"
+        self.store = FakeStockStore([
+            {"id": "p1", "owner_id": self.owner_id, "name": "Rice", "quantity": 10},
+            {"id": "p2", "owner_id": self.owner_id, "name": "Beans", "quantity": 3},
+        ])
+        self.manager = InvoiceInventoryManager(self.store)
+        self.items = [{"product_id": "p1", "quantity": 2.0}, {"product_id": "p2", "quantity": 3.0}]
+
+    def test_validate_stock_availability_single_query(self):
+        result = self.manager.validate_stock_availability(self.items, self.owner_id)
+        self.assertTrue(result["valid"])
+        self.assertEqual(self.store.round_trips, 1)
+
+    def test_reduce_inventory_on_invoice_creation_is_one_call(self):
+        self.assertTrue(self.manager.reduce_inventory_on_invoice_creation(self.items, self.owner_id))
+        self.assertEqual(self.store.round_trips, 1)
+        self.assertEqual(self.store.products["p1"]["quantity"], 8)
+        self.assertEqual(self.store.products["p2"]["quantity"], 0)
+
+    def test_reduce_inventory_refuses_to_oversell(self):
+        items = self.items + [{"product_id": "p2", "quantity": 1}]
+        self.assertFalse(self.manager.reduce_inventory_on_invoice_creation(items, self.owner_id))
+        self.assertEqual(self.store.products["p1"]["quantity"], 10)
+
+    def test_process_invoice_payment_skips_already_updated(self):
+        self.store.rpc = Mock()
+        invoice = {"id": "inv-1", "items": self.items, "inventory_updated": True}
+        self.assertTrue(self.manager.process_invoice_payment(invoice, self.owner_id))
+        self.store.rpc.assert_not_called()
+
+    def test_paid_invoice_queues_low_stock_check(self):
+        queue = Mock()
+        invoice = {"id": "inv-1", "owner_id": self.owner_id, "items": self.items}
+
+        with patch("src.services.stock_events.job_queue", queue):
+            result = InvoiceStatusManager(self.store)._handle_inventory_on_payment(invoice)
+
+        self.assertTrue(result["success"])
+        (kind, payload), kwargs = queue.enqueue.call_args
+        self.assertEqual((payload, kwargs["owner_id"]), ({"product_ids": ["p1", "p2"]}, self.owner_id))
+
+    def test_paid_invoice_takes_what_is_left_of_short_lines(self):
+        items = [{"product_id": "p1", "quantity": 2}, {"product_id": "p2", "quantity": 5}]
+        invoice = {"id": "inv-1", "owner_id": self.owner_id, "items": items}
+
+        with patch("src.services.stock_events.job_queue", Mock()):
+            result = InvoiceStatusManager(self.store)._handle_inventory_on_payment(invoice)
+
+        self.assertEqual(result["message"], "Inventory updated for 2 products")
+        self.assertEqual(self.store.products["p1"]["quantity"], 8)
+        self.assertEqual(self.store.products["p2"]["quantity"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,153 @@
+"""
+Unit tests for event-driven low stock detection
+Covers threshold-crossing events and the inventory_changes watermark cursor
+"""
+
+import unittest
+import asyncio
+import os
+import sys
+from datetime import datetime, timezone, timedelta
+from types import SimpleNamespace
+from unittest.mock import patch
+
+# Add the src directory to the path so we can import our modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from services import notification_service, stock_events
+from services.notification_service import preferences_cache
+from services.stock_events import crossed_low_stock, emit_stock_changes, LOW_STOCK_CHECK_JOB
+from services.triggers.low_stock_trigger import LowStockMonitor
+from test_alert_state import MemorySupabase
+
+
+class RecordingQueue:
+    def __init__(self):
+        self.jobs = []
+
+    def enqueue(self, kind, payload=None, **kwargs):
+        self.jobs.append((kind, payload))
+        return "job"
+
+
+def seconds_ago(seconds):
+    return (datetime.now(timezone.utc) - timedelta(seconds=seconds)).isoformat()
+
+
+def make_products(count, quantity=1):
+    return [
+        {'id': f"p{i}", 'owner_id': 'o1', 'name': f"Item {i}", 'quantity': quantity,
+         'low_stock_threshold': 5, 'reorder_level': 0, 'active': True}
+        for i in range(count)
+    ]
+
+
+def make_changes(product_ids, start_seq, age_seconds=600, change_type='decrease'):
+    return [
+        {'change_seq': start_seq + i, 'product_id': product_id, 'change_type': change_type,
+         'created_at': seconds_ago(age_seconds)}
+        for i, product_id in enumerate(product_ids)
+    ]
+
+
+class TestThresholdCrossing(unittest.TestCase):
+    """Test cases for crossed_low_stock and emit_stock_changes"""
+
+    def test_only_changes_into_a_worse_band_cross(self):
+        change = lambda old, new, **extra: {'product_id': 'p1', 'old_quantity': old, 'new_quantity': new,
+                                            'low_stock_threshold': 5, **extra}
+
+        self.assertTrue(crossed_low_stock(change(8, 5)))
+        self.assertTrue(crossed_low_stock(change(3, 0)))
+        self.assertTrue(crossed_low_stock(change(4, 2, reorder_level=2)))
+        self.assertFalse(crossed_low_stock(change(4, 3)))
+        self.assertFalse(crossed_low_stock(change(20, 6)))
+        self.assertFalse(crossed_low_stock(change(2, 9)))
+        # Without a threshold any decrease is handed to the check
+        self.assertTrue(crossed_low_stock({'product_id': 'p1', 'old_quantity': 20, 'new_quantity': 19}))
+
+    def test_one_job_for_the_crossing_products(self):
+        queue = RecordingQueue()
+        changes = [
+            {'product_id': 'p1', 'old_quantity': 10, 'new_quantity': 4, 'low_stock_threshold': 5},
+            {'product_id': 'p2', 'old_quantity': 50, 'new_quantity': 40, 'low_stock_threshold': 5},
+            {'product_id': 'p3', 'old_quantity': 1, 'new_quantity': 0, 'low_stock_threshold': 5},
+        ]
+
+        with patch.object(stock_events, 'job_queue', queue):
+            queued = emit_stock_changes('o1', changes)
+            emit_stock_changes('o1', changes[1:2])
+
+        self.assertEqual(queued, ['p1', 'p3'])
+        self.assertEqual(queue.jobs, [(LOW_STOCK_CHECK_JOB, {'product_ids': ['p1', 'p3']})])
+
+
+class TestInventoryChangeCursor(unittest.TestCase):
+    """Test cases for LowStockMonitor.check_products and monitor_inventory_changes"""
+
+    def setUp(self):
+        preferences_cache.clear()
+        self.addCleanup(preferences_cache.clear)
+        patcher = patch.object(notification_service, 'job_queue', SimpleNamespace(enqueue=lambda *a, **k: "job"))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def monitor(self, db):
+        return asyncio.run(LowStockMonitor(db).monitor_inventory_changes())
+
+    def test_check_products_reads_only_touched_products(self):
+        products = make_products(400)
+        products[0]['quantity'] = 50
+        db = MemorySupabase(products=products)
+        monitor = LowStockMonitor(db)
+
+        result = asyncio.run(monitor.check_products([f"p{i}" for i in range(250)]))
+
+        self.assertEqual(result['products_checked'], 250)
+        self.assertEqual(result['notifications_sent'], 249)
+        # Two chunks of ids, one products query each
+        self.assertEqual(db.count('products'), 2)
+
+    def test_cursor_consumes_each_change_once(self):
+        db = MemorySupabase(products=make_products(30), inventory_changes=make_changes(
+            [f"p{i}" for i in range(10)], start_seq=1
+        ))
+
+        first = self.monitor(db)
+        self.assertEqual(first['changes_processed'], 10)
+        self.assertEqual(first['notifications_sent'], 10)
+        self.assertEqual(db.tables['trigger_cursors'][0]['position'], 10)
+
+        # New changes: an increase, then one still settling ahead of an older-looking one
+        db.tables['inventory_changes'] += make_changes([f"p{i}" for i in range(10, 15)], start_seq=11)
+        db.tables['inventory_changes'] += make_changes(['p21'], start_seq=16, change_type='increase')
+        db.tables['inventory_changes'] += make_changes(['p20'], start_seq=17, age_seconds=5)
+        db.tables['inventory_changes'] += make_changes(['p22'], start_seq=18)
+
+        second = self.monitor(db)
+        self.assertEqual(second['changes_processed'], 6)
+        self.assertEqual(second['notifications_sent'], 5)
+        self.assertEqual(db.tables['trigger_cursors'][0]['position'], 16)
+
+        # The cursor waits at the settling change instead of skipping past it
+        self.assertEqual(self.monitor(db)['changes_processed'], 0)
+        for change in db.tables['inventory_changes']:
+            change['created_at'] = seconds_ago(600)
+        third = self.monitor(db)
+        self.assertEqual(third['changes_processed'], 2)
+        self.assertEqual(db.tables['trigger_cursors'][0]['position'], 18)
+
+    def test_starts_from_the_last_hour_without_a_cursor(self):
+        changes = make_changes(['p0'], start_seq=1, age_seconds=3 * 3600) + make_changes(['p1'], start_seq=2)
+        db = MemorySupabase(products=make_products(2), inventory_changes=changes)
+        db.broken.add('trigger_cursors')
+
+        result = self.monitor(db)
+
+        self.assertEqual(result['changes_processed'], 1)
+        self.assertEqual([n['data']['product_id'] for n in db.tables['notifications']], ['p1'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,138 @@
+"""
+Unit tests for the set-based subscription expiry pass
+The in-memory Supabase stand-in has no RPCs, so the bulk-update fallback
+runs unless a test answers run_subscription_expiry itself
+"""
+
+import unittest
+import os
+import sys
+from datetime import datetime, timezone, timedelta
+from types import SimpleNamespace
+from unittest.mock import Mock, patch
+
+# Add the src directory to the path so we can import our modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from src.services import notification_service
+from src.services.entitlements import Entitlements, entitlement_cache
+from src.services.notification_service import preferences_cache
+from src.services.subscription_expiry import MAX_TRIAL_DAYS, SubscriptionExpiry
+from test_alert_state import MemorySupabase
+from test_stock_events import RecordingQueue
+
+
+def in_days(days):
+    return (datetime.now(timezone.utc) + timedelta(days=days)).isoformat()
+
+
+def user(user_id, plan, status, end_days, trial_days_left=0, owner_id=None):
+    return {'id': user_id, 'owner_id': owner_id, 'subscription_plan': plan, 'subscription_status': status,
+            'subscription_end_date': in_days(end_days) if end_days is not None else None,
+            'trial_days_left': trial_days_left, 'current_month_invoices': 4}
+
+
+def build_db(lapsed=2):
+    users = [user(f'lapsed{n}', 'monthly', 'active', -1) for n in range(lapsed)] + [
+        user('member', 'monthly', 'active', -1, owner_id='lapsed0'),
+        user('paying', 'yearly', 'active', 200),
+        user('free', 'free', 'inactive', None),
+        user('trial3', 'weekly', 'trial', 2.5, trial_days_left=7),
+        user('trial6', 'weekly', 'trial', 5.5, trial_days_left=6),
+    ]
+    usage = [{'id': f'{row["id"]}-{feature}', 'user_id': row['id'], 'feature_type': feature, 'current_count': 9,
+              'limit_count': 450} for row in users for feature in ('invoices', 'sales')]
+    return MemorySupabase(users=users, feature_usage=usage)
+
+
+class RpcSupabase(MemorySupabase):
+    """Answers run_subscription_expiry with fixed rows"""
+
+    def rpc(self, name, params=None):
+        self.record_call(name, 'rpc')
+        rows = [
+            {'user_id': 'lapsed0', 'owner_id': None, 'event': 'expired', 'days_left': 0},
+            {'user_id': 'trial1', 'owner_id': None, 'event': 'trial', 'days_left': 1},
+        ]
+        return SimpleNamespace(execute=lambda: SimpleNamespace(data=rows))
+
+
+class TestSubscriptionExpiry(unittest.TestCase):
+    """Test cases for SubscriptionExpiry"""
+
+    def setUp(self):
+        entitlement_cache.clear()
+        self.addCleanup(entitlement_cache.clear)
+        preferences_cache.clear()
+        self.addCleanup(preferences_cache.clear)
+        self.queue = RecordingQueue()
+        patcher = patch.object(notification_service, 'job_queue', self.queue)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_fallback_downgrades_resets_and_counts_down_in_bulk(self):
+        db = build_db()
+
+        result = SubscriptionExpiry(db).run()
+
+        # trial6 already shows 6 days left and is not rewritten
+        self.assertEqual((result['expired'], result['trial_updates'], result['notified']), (3, 1, 4))
+        users = {row['id']: row for row in db.tables['users']}
+        self.assertEqual((users['lapsed0']['subscription_plan'], users['lapsed0']['current_month_invoices']), ('free', 0))
+        self.assertEqual(users['member']['subscription_plan'], 'free')
+        self.assertEqual(users['paying']['subscription_plan'], 'yearly')
+        self.assertEqual((users['trial3']['trial_days_left'], users['trial6']['trial_days_left']), (3, 6))
+        usage = {row['id']: row for row in db.tables['feature_usage']}
+        self.assertEqual((usage['lapsed1-invoices']['current_count'], usage['lapsed1-invoices']['limit_count']), (0, 5))
+        self.assertEqual(usage['paying-invoices']['current_count'], 9)
+        # Only the three expiries and the 3-day trial are told, in one insert
+        self.assertEqual(sorted(n['user_id'] for n in db.tables['notifications']),
+                         ['lapsed0', 'lapsed1', 'member', 'trial3'])
+        self.assertEqual(db.count('notifications', 'insert'), 1)
+
+    def test_statement_count_does_not_depend_on_user_count(self):
+        small, large = build_db(lapsed=2), build_db(lapsed=50)
+
+        SubscriptionExpiry(small).run()
+        SubscriptionExpiry(large).run()
+
+        writes = lambda db: [query for query in db.queries if query[1] != 'select']
+        self.assertEqual(writes(small), writes(large))
+        self.assertEqual(large.count('users', 'update'), 1 + MAX_TRIAL_DAYS)
+
+    def test_second_run_changes_nothing(self):
+        db = build_db()
+        SubscriptionExpiry(db).run()
+
+        result = SubscriptionExpiry(db).run()
+
+        self.assertEqual(result['rows_processed'], 0)
+        self.assertEqual(len(db.tables['notifications']), 4)
+
+    def test_rpc_is_one_statement_and_drops_cached_snapshots(self):
+        db = RpcSupabase(users=[])
+        entitlement_cache.set('lapsed0', Entitlements('lapsed0', 'monthly', 'active', None, 0, 10), 0)
+
+        result = SubscriptionExpiry(db).run()
+
+        self.assertEqual(result['rows_processed'], 2)
+        self.assertEqual(db.queries[0], ('run_subscription_expiry', 'rpc'))
+        self.assertEqual(db.count('users', 'update'), 0)
+        self.assertIsNone(entitlement_cache.get('lapsed0'))
+
+
+    def test_failed_rpc_is_not_repeated_as_bulk_updates(self):
+        db = build_db()
+        db.rpc = Mock(side_effect=TimeoutError('read timed out'))
+        expiry = SubscriptionExpiry(db)
+
+        with self.assertRaises(TimeoutError):
+            expiry.run()
+
+        self.assertEqual(db.count('users', 'update'), 0)
+        self.assertTrue(expiry._rpc_available)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,267 @@
+"""
+Unit tests for the delta Sync Service
+Tests cursor paging over row_version, tombstones and batched offline pushes
+"""
+
+import unittest
+import os
+import sys
+from datetime import datetime, timezone, timedelta
+from types import SimpleNamespace
+
+# Add the backend and src directories to the path so we can import our modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from services.sync_service import SyncService
+
+
+class FeedQuery:
+    def __init__(self, client, table):
+        self.client = client
+        self.table_name = table
+        self.filters = []
+        self.row_limit = None
+        self.action = "select"
+        self.payload = None
+
+    def select(self, *args, **kwargs):
+        return self
+
+    def eq(self, column, value):
+        self.filters.append(lambda row: row.get(column) == value)
+        return self
+
+    def gt(self, column, value):
+        self.filters.append(lambda row: row.get(column) is not None and row[column] > value)
+        return self
+
+    def in_(self, column, values):
+        values = set(values)
+        self.filters.append(lambda row: row.get(column) in values)
+        return self
+
+    def order(self, column, desc=False):
+        self.order_by = column
+        return self
+
+    def limit(self, count):
+        self.row_limit = count
+        return self
+
+    def insert(self, payload):
+        self.action, self.payload = "insert", payload
+        return self
+
+    def update(self, payload):
+        self.action, self.payload = "update", payload
+        return self
+
+    def delete(self):
+        self.action = "delete"
+        return self
+
+    def execute(self):
+        rows = self.client.tables.setdefault(self.table_name, [])
+        self.client.calls.append((self.table_name, self.action))
+        matches = [row for row in rows if all(f(row) for f in self.filters)]
+
+        if self.action == "insert":
+            row = self.client.stamp(dict(self.payload), created=True)
+            rows.append(row)
+            return SimpleNamespace(data=[dict(row)])
+        if self.action == "update":
+            for row in matches:
+                row.update(self.payload)
+                self.client.stamp(row)
+            return SimpleNamespace(data=[dict(r) for r in matches])
+        if self.action == "delete":
+            for row in matches:
+                rows.remove(row)
+                self.client.tables.setdefault("sync_tombstones", []).append({
+                    "owner_id": row["owner_id"], "table_name": self.table_name,
+                    "row_id": row["id"], "row_version": self.client.next_version()
+                })
+            return SimpleNamespace(data=matches)
+
+        matches.sort(key=lambda row: row.get("row_version", 0))
+        if self.row_limit is not None:
+            matches = matches[:self.row_limit]
+        return SimpleNamespace(data=[dict(r) for r in matches])
+
+
+class FeedSupabase:
+    """Mimics the stamp_sync_version / record_sync_tombstone triggers"""
+
+    def __init__(self):
+        self.tables = {}
+        self.calls = []
+        self.version = 0
+        # Versions are taken well before the feed reads them unless a test says otherwise
+        self.clock = datetime.now(timezone.utc) - timedelta(hours=1)
+
+    def next_version(self):
+        self.version += 1
+        return self.version
+
+    def stamp(self, row, created=False):
+        row["row_version"] = self.next_version()
+        row["row_version_at"] = self.clock.isoformat()
+        if created:
+            row["created_version"] = row["row_version"]
+        return row
+
+    def seed(self, table, row):
+        row.setdefault("owner_id", "owner-1")
+        self.tables.setdefault(table, []).append(self.stamp(row, created=True))
+
+    def table(self, name):
+        return FeedQuery(self, name)
+
+
+class TestSyncChanges(unittest.TestCase):
+    """Test cases for SyncService.get_changes"""
+
+    def setUp(self):
+        self.client = FeedSupabase()
+        self.service = SyncService(self.client)
+
+    def test_classifies_inserted_updated_and_deleted_since_cursor(self):
+        self.client.seed("customers", {"id": "c1", "name": "Ada"})
+        self.client.seed("customers", {"id": "c2", "name": "Bola"})
+        self.client.seed("customers", {"id": "theirs", "name": "X", "owner_id": "owner-2"})
+        cursor = self.service.get_changes("owner-1", 0, ["customers"])["next_cursor"]
+
+        self.client.table("customers").update({"name": "Ada O."}).eq("id", "c1").execute()
+        self.client.table("customers").delete().eq("id", "c2").execute()
+        self.client.seed("customers", {"id": "c3", "name": "Chidi"})
+
+        feed = self.service.get_changes("owner-1", cursor, ["customers"])
+        changes = feed["changes"]["customers"]
+        self.assertEqual([r["id"] for r in changes["inserted"]], ["c3"])
+        self.assertEqual([r["name"] for r in changes["updated"]], ["Ada O."])
+        self.assertEqual(changes["deleted"], ["c2"])
+        self.assertFalse(feed["has_more"])
+
+        empty = self.service.get_changes("owner-1", feed["next_cursor"], ["customers"])
+        self.assertEqual(empty["changes"]["customers"], {"inserted": [], "updated": [], "deleted": []})
+        self.assertEqual(empty["next_cursor"], feed["next_cursor"])
+
+    def test_paging_across_tables_never_skips_a_change(self):
+        for i in range(7):
+            self.client.seed("products", {"id": f"p{i}"})
+            self.client.seed("sales", {"id": f"s{i}"})
+
+        seen, cursor, pages = set(), 0, 0
+        while True:
+            feed = self.service.get_changes("owner-1", cursor, ["products", "sales"], limit=3)
+            for table_changes in feed["changes"].values():
+                seen.update(r["id"] for r in table_changes["inserted"] + table_changes["updated"])
+            cursor, pages = feed["next_cursor"], pages + 1
+            if not feed["has_more"]:
+                break
+
+        self.assertEqual(seen, {f"p{i}" for i in range(7)} | {f"s{i}" for i in range(7)})
+        self.assertGreater(pages, 2)
+
+    def test_version_committed_out_of_order_is_not_skipped(self):
+        self.client.seed("products", {"id": "p1"})
+        # A slow sale takes version 2 but has not committed yet
+        slow_version = self.client.next_version()
+        self.client.clock = datetime.now(timezone.utc)
+        self.client.seed("products", {"id": "p3"})
+
+        feed = self.service.get_changes("owner-1", 0, ["products", "sales"])
+
+        self.assertEqual([r["id"] for r in feed["changes"]["products"]["inserted"]], ["p1"])
+        self.assertEqual(feed["next_cursor"], 1)
+        self.assertFalse(feed["has_more"])
+
+        self.client.tables.setdefault("sales", []).append({
+            "id": "s2", "owner_id": "owner-1", "row_version": slow_version, "created_version": slow_version,
+            "row_version_at": self.client.clock.isoformat()
+        })
+        # Once the window has passed both versions are served
+        settled = (self.client.clock - timedelta(seconds=SyncService.SETTLE_SECONDS)).isoformat()
+        for row in self.client.tables["products"] + self.client.tables["sales"]:
+            row["row_version_at"] = settled
+
+        feed = self.service.get_changes("owner-1", feed["next_cursor"], ["products", "sales"])
+
+        self.assertEqual([r["id"] for r in feed["changes"]["sales"]["inserted"]], ["s2"])
+        self.assertEqual([r["id"] for r in feed["changes"]["products"]["inserted"]], ["p3"])
+        self.assertEqual(feed["next_cursor"], 3)
+
+    def test_rejects_unknown_tables_and_bad_cursors(self):
+        with self.assertRaises(ValueError):
+            self.service.parse_tables("products,users")
+        with self.assertRaises(ValueError):
+            self.service.parse_cursor("-1")
+        self.assertEqual(self.service.parse_tables(None), list(SyncService.SYNC_TABLES))
+
+
+class TestSyncPush(unittest.TestCase):
+    """Test cases for SyncService.apply_operations"""
+
+    def setUp(self):
+        self.client = FeedSupabase()
+        self.service = SyncService(self.client)
+
+    def test_applies_each_operation_with_its_own_result(self):
+        operations = [
+            {"op_id": "a", "table": "customers", "action": "create", "data": {"id": "c-new", "name": "Ada"}},
+            {"op_id": "b", "table": "customers", "action": "update", "id": "c-new", "data": {"phone": "0801"}},
+            {"op_id": "c", "table": "customers", "action": "create", "data": {"name": ""}},
+            {"op_id": "d", "table": "invoices", "action": "create", "data": {}},
+            {"op_id": "e", "table": "customers", "action": "delete", "id": "c-new"},
+        ]
+        result = self.service.apply_operations("owner-1", operations)
+
+        self.assertEqual([r["success"] for r in result["results"]], [True, True, False, False, True])
+        self.assertEqual(result["results"][1]["record"]["phone"], "0801")
+        self.assertIn("Unsupported operation", result["results"][3]["error"])
+        self.assertEqual(self.client.tables["sync_tombstones"][0]["row_id"], "c-new")
+
+    def test_replayed_create_returns_existing_record(self):
+        operation = {"op_id": "a", "table": "customers", "action": "create", "data": {"id": "c-1", "name": "Ada"}}
+        self.service.apply_operations("owner-1", [operation])
+        result = self.service.apply_operations("owner-1", [operation])
+
+        self.assertTrue(result["results"][0]["success"])
+        self.assertEqual(len(self.client.tables["customers"]), 1)
+
+    def test_replayed_sale_is_not_recorded_or_counted_twice(self):
+        self.client.tables.setdefault("sales", []).append({
+            "id": "rpc-sale", "owner_id": "owner-1",
+            "reference_type": "offline_sale", "reference_id": "client-sale"
+        })
+        self.client.tables.setdefault("expenses", []).append({"id": "client-expense", "owner_id": "owner-1"})
+        calls = []
+        self.service._create_sales = lambda owner_id, data: calls.append(data) or (True, None, data)
+        self.service._create_expenses = lambda owner_id, data: calls.append(data) or (True, None, data)
+        operations = [
+            {"op_id": "a", "table": "sales", "action": "create", "data": {"id": "client-sale"}},
+            {"op_id": "b", "table": "expenses", "action": "create", "id": "client-expense", "data": {}},
+        ]
+        result = self.service.apply_operations("owner-1", operations, allowances={"sales": 0})
+
+        self.assertEqual([r["record"]["id"] for r in result["results"]], ["rpc-sale", "client-expense"])
+        self.assertTrue(all(r["replayed"] for r in result["results"]))
+        self.assertEqual(calls, [])
+        self.assertEqual(result["created"], {})
+
+    def test_allowance_caps_creates_per_feature(self):
+        self.service._create_expenses = lambda owner_id, data: (True, None, {"id": data["description"]})
+        operations = [
+            {"op_id": i, "table": "expenses", "action": "create", "data": {"description": f"e{i}"}}
+            for i in range(3)
+        ]
+        result = self.service.apply_operations("owner-1", operations, allowances={"expenses": 2})
+
+        self.assertEqual([r["success"] for r in result["results"]], [True, True, False])
+        self.assertIn("Plan limit reached", result["results"][2]["error"])
+        self.assertEqual(result["created"], {"expenses": 2})
+
+
+if __name__ == '__main__':
+    unittest.main()
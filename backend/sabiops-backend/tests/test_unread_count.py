@@ -0,0 +1,86 @@
+"""
+Unit tests for the counter-backed unread notification count
+The poll reads one counter row, is cached between polls and is invalidated
+by the service's own writes
+"""
+
+import unittest
+import asyncio
+import os
+import sys
+from types import SimpleNamespace
+from unittest.mock import patch
+
+# Add the src directory to the path so we can import our modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from services import notification_service
+from services.notification_service import NotificationService, unread_count_cache
+from test_alert_state import MemorySupabase
+
+
+def unread_notifications(user_id, count):
+    return [{'id': f"{user_id}-n{i}", 'user_id': user_id, 'read': False} for i in range(count)]
+
+
+class TestUnreadCount(unittest.TestCase):
+    """Test cases for NotificationService.get_unread_count"""
+
+    def setUp(self):
+        unread_count_cache.clear()
+        self.addCleanup(unread_count_cache.clear)
+        self.addCleanup(setattr, NotificationService, 'unread_counters_available', True)
+        patcher = patch.object(notification_service, 'job_queue', SimpleNamespace(enqueue=lambda *a, **k: "job"))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_poll_reads_the_counter_row_once_per_ttl(self):
+        db = MemorySupabase(
+            notifications=unread_notifications('u1', 50),
+            notification_unread_counts=[{'user_id': 'u1', 'unread_count': 50}]
+        )
+        service = NotificationService(db)
+
+        counts = [asyncio.run(service.get_unread_count('u1')) for _ in range(5)]
+
+        self.assertEqual(counts, [50] * 5)
+        self.assertEqual(db.count('notification_unread_counts'), 1)
+        self.assertEqual(db.count('notifications'), 0)
+        # Users without a counter row have nothing unread
+        self.assertEqual(asyncio.run(service.get_unread_count('u2')), 0)
+
+    def test_marking_read_invalidates_the_cached_count(self):
+        db = MemorySupabase(
+            notifications=unread_notifications('u1', 3),
+            notification_unread_counts=[{'user_id': 'u1', 'unread_count': 3}]
+        )
+        service = NotificationService(db)
+        self.assertEqual(asyncio.run(service.get_unread_count('u1')), 3)
+
+        asyncio.run(service.mark_notification_read('u1-n0', 'u1'))
+        # The database trigger maintains the counter
+        db.tables['notification_unread_counts'][0]['unread_count'] = 2
+        self.assertEqual(asyncio.run(service.get_unread_count('u1')), 2)
+
+        asyncio.run(service.mark_all_notifications_read('u1'))
+        db.tables['notification_unread_counts'][0]['unread_count'] = 0
+        self.assertEqual(asyncio.run(service.get_unread_count('u1')), 0)
+        self.assertEqual(db.count('notification_unread_counts'), 3)
+
+    def test_counts_without_fetching_rows_before_migration(self):
+        db = MemorySupabase(notifications=unread_notifications('u1', 400) + unread_notifications('u2', 2))
+        db.broken.add('notification_unread_counts')
+        service = NotificationService(db)
+
+        self.assertEqual(asyncio.run(service.get_unread_count('u1')), 400)
+        unread_count_cache.clear()
+        self.assertEqual(asyncio.run(service.get_unread_count('u2')), 2)
+
+        # The missing table is only probed once
+        self.assertEqual(db.count('notification_unread_counts'), 1)
+        self.assertEqual(db.count('notifications'), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
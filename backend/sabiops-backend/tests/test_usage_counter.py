@@ -0,0 +1,168 @@
+"""
+Unit tests for atomic usage counters
+The in-memory Supabase stand-in has no RPCs, so the compare-and-set fallback
+is what runs concurrently here; its latency makes interleavings likely
+"""
+
+import unittest
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone, timedelta
+from types import SimpleNamespace
+from unittest.mock import Mock
+
+from flask import Flask
+
+# Add the src directory to the path so we can import our modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from src.services.entitlements import entitlement_cache
+from src.services.usage_counter import UsageCounter, UsageWriteBehind
+from src.services.usage_service import UsageService
+from test_alert_state import MemorySupabase
+
+
+def usage_row(count, limit, feature_type='sales', user_id='owner'):
+    return {'id': f'{user_id}-{feature_type}', 'user_id': user_id, 'feature_type': feature_type,
+            'current_count': count, 'limit_count': limit,
+            'period_end': (datetime.now(timezone.utc) + timedelta(days=20)).isoformat()}
+
+
+class RpcClient:
+    """Answers increment_feature_usage_checked like migration 020 would"""
+
+    def __init__(self):
+        self.calls = []
+
+    def rpc(self, name, params):
+        self.calls.append((name, params))
+        data = {'applied': True, 'current_count': 8, 'limit_count': params['p_limit'],
+                'period_start': None, 'period_end': None}
+        return SimpleNamespace(execute=lambda: SimpleNamespace(data=data))
+
+
+class TestUsageCounter(unittest.TestCase):
+    """Test cases for UsageCounter and UsageWriteBehind"""
+
+    def test_concurrent_increments_are_not_lost(self):
+        db = MemorySupabase(latency=0.001, feature_usage=[usage_row(0, 1000)])
+        counter = UsageCounter(max_attempts=100)
+
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            results = list(pool.map(lambda _: counter.increment(db, 'owner', 'sales'), range(200)))
+
+        self.assertEqual(db.tables['feature_usage'][0]['current_count'], 200)
+        self.assertEqual(sorted(r['current_count'] for r in results), list(range(1, 201)))
+
+    def test_concurrent_checked_increments_stop_at_the_limit(self):
+        db = MemorySupabase(latency=0.001, feature_usage=[usage_row(0, 10)])
+        counter = UsageCounter(max_attempts=100)
+
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            results = list(pool.map(
+                lambda _: counter.increment(db, 'owner', 'sales', limit=10, enforce_limit=True), range(40)
+            ))
+
+        self.assertEqual(sum(r['applied'] for r in results), 10)
+        self.assertEqual(db.tables['feature_usage'][0]['current_count'], 10)
+
+    def test_first_use_creates_the_row_and_mirrors_legacy_columns(self):
+        db = MemorySupabase(serial={'feature_usage': 'id'}, feature_usage=[],
+                            users=[{'id': 'owner', 'current_month_invoices': 0}])
+
+        result = UsageCounter().increment(db, 'owner', 'invoices', 2, limit=450)
+
+        self.assertEqual((result['current_count'], result['limit_count']), (2, 450))
+        self.assertEqual(len(db.tables['feature_usage']), 1)
+        self.assertEqual(db.tables['users'][0]['current_month_invoices'], 2)
+
+    def test_rpc_is_one_round_trip(self):
+        client = RpcClient()
+
+        result = UsageCounter().increment(client, 'owner', 'sales', limit=1500, enforce_limit=True)
+
+        self.assertEqual(result['current_count'], 8)
+        (name, params), = client.calls
+        self.assertEqual(name, 'increment_feature_usage_checked')
+        self.assertTrue(params['p_enforce_limit'])
+
+    def test_failed_rpc_is_not_counted_again(self):
+        db = MemorySupabase(feature_usage=[usage_row(3, 100)])
+        db.rpc = Mock(side_effect=TimeoutError('read timed out'))
+        counter = UsageCounter()
+
+        with self.assertRaises(TimeoutError):
+            counter.increment(db, 'owner', 'sales')
+
+        # The RPC may have committed, so nothing is written here and it is tried again next time
+        self.assertEqual(db.count('feature_usage', 'update'), 0)
+        self.assertTrue(counter._rpc_available)
+
+    def test_write_behind_batches_per_owner_and_feature(self):
+        db = MemorySupabase(feature_usage=[usage_row(5, 1000), usage_row(0, 1000, user_id='other')])
+        buffer = UsageWriteBehind(UsageCounter(), interval_seconds=3600, headroom=20)
+        self.addCleanup(buffer.stop)
+
+        for _ in range(30):
+            buffer.add(db, 'owner', 'sales')
+        buffer.add(db, 'other', 'sales', 4)
+        self.assertEqual(db.count('feature_usage', 'update'), 0)
+
+        self.assertEqual(buffer.flush(), 2)
+        self.assertEqual(db.count('feature_usage', 'update'), 2)
+        self.assertEqual([row['current_count'] for row in db.tables['feature_usage']], [35, 4])
+        # Near the limit increments are written straight through
+        self.assertTrue(buffer.accepts('owner', 'sales', 35, 1000))
+        self.assertFalse(buffer.accepts('owner', 'sales', 985, 1000))
+
+
+class TestUsageServiceIncrement(unittest.TestCase):
+    """Test cases for UsageService increments going through the counter"""
+
+    def setUp(self):
+        entitlement_cache.clear()
+        self.addCleanup(entitlement_cache.clear)
+        self.db = MemorySupabase(
+            users=[{'id': 'owner', 'owner_id': None, 'subscription_plan': 'free', 'subscription_status': 'inactive',
+                    'subscription_end_date': None, 'trial_days_left': 0, 'current_month_expenses': 19}],
+            feature_usage=[usage_row(19, 20, feature_type='expenses')],
+        )
+        self.app = Flask(__name__)
+        self.app.config['SUPABASE'] = self.db
+        context = self.app.app_context()
+        context.push()
+        self.addCleanup(context.pop)
+
+    def test_increment_is_checked_and_updates_the_cached_snapshot(self):
+        service = UsageService()
+        service._get_entitlements('owner')
+        reads = len(self.db.queries)
+
+        status = service.increment_usage('owner', 'expenses')
+
+        self.assertEqual((status['current_count'], status['limit_count']), (20, 20))
+        self.assertTrue(status['limit_reached'])
+        self.assertEqual(self.db.tables['users'][0]['current_month_expenses'], 20)
+        # Row read, conditional update and legacy mirror; no owner lookup or re-read
+        self.assertEqual(self.db.queries[reads:], [
+            ('feature_usage', 'select'), ('feature_usage', 'update'), ('users', 'update')
+        ])
+        self.assertEqual(entitlement_cache.get('owner').usage['expenses'], 20)
+
+        with self.assertRaises(Exception):
+            service.increment_usage('owner', 'expenses')
+        self.assertEqual(self.db.tables['feature_usage'][0]['current_count'], 20)
+
+    def test_decrement_never_goes_below_zero(self):
+        self.db.tables['feature_usage'][0]['current_count'] = 0
+
+        status = UsageService().decrement_usage('owner', 'expenses')
+
+        self.assertEqual(status['current_count'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,138 @@
+"""
+Unit tests for the one-call owner usage status
+The in-memory Supabase stand-in has no RPCs, so the per-table fallback runs
+unless a test answers get_owner_usage_status itself
+"""
+
+import unittest
+import os
+import sys
+from types import SimpleNamespace
+
+from flask import Flask
+
+# Add the src directory to the path so we can import our modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from src.services.entitlements import entitlement_cache
+from src.services.subscription_service import SubscriptionService
+from test_alert_state import MemorySupabase
+
+
+class RpcSupabase(MemorySupabase):
+    """Answers get_owner_usage_status like migration 021 would"""
+
+    def rpc(self, name, params=None):
+        self.record_call(name, 'rpc')
+        owner_id = params['p_owner_id']
+        data = {}
+        for feature_type in ('invoices', 'expenses', 'sales', 'products'):
+            row = next((r for r in self.tables['feature_usage']
+                        if r['user_id'] == owner_id and r['feature_type'] == feature_type), None)
+            data[feature_type] = {
+                'tracked': row is not None,
+                'current_count': row['current_count'] if row else 0,
+                'actual_count': sum(1 for r in self.tables.get(feature_type, []) if r['owner_id'] == owner_id),
+                'period_start': None, 'period_end': None, 'sync_status': None, 'last_synced_at': None
+            }
+        return SimpleNamespace(execute=lambda: SimpleNamespace(data=data))
+
+
+def build_db(db_class=MemorySupabase):
+    return db_class(
+        users=[
+            {'id': 'owner', 'owner_id': None, 'subscription_plan': 'monthly', 'subscription_status': 'active',
+             'subscription_end_date': None, 'trial_days_left': 0},
+            {'id': 'member', 'owner_id': 'owner', 'subscription_plan': 'free', 'subscription_status': 'inactive',
+             'subscription_end_date': None, 'trial_days_left': 0},
+        ],
+        feature_usage=[
+            {'id': 'u1', 'user_id': 'owner', 'feature_type': 'invoices', 'current_count': 3, 'limit_count': 5,
+             'period_end': '2026-11-01T00:00:00'},
+        ],
+        invoices=[{'id': f'i{n}', 'owner_id': 'owner'} for n in range(4)],
+        expenses=[],
+        sales=[{'id': 's1', 'owner_id': 'owner'}, {'id': 's2', 'owner_id': 'other'}],
+        products=[],
+    )
+
+
+class TestUsageStatus(unittest.TestCase):
+    """Test cases for SubscriptionService.get_usage_status and its callers"""
+
+    def setUp(self):
+        entitlement_cache.clear()
+        self.addCleanup(entitlement_cache.clear)
+        self.addCleanup(setattr, SubscriptionService, '_usage_status_rpc_available', True)
+        self.app = Flask(__name__)
+        context = self.app.app_context()
+        context.push()
+        self.addCleanup(context.pop)
+
+    def use(self, db):
+        self.app.config['SUPABASE'] = db
+        return db
+
+    def test_rpc_returns_every_feature_in_one_round_trip(self):
+        db = self.use(build_db(RpcSupabase))
+        service = SubscriptionService()
+        service.get_entitlements('member')
+        before = len(db.queries)
+
+        status = service.get_usage_status('member')
+
+        self.assertEqual(db.queries[before:], [('get_owner_usage_status', 'rpc')])
+        self.assertEqual(set(status), {'invoices', 'expenses', 'sales', 'products'})
+        invoices = status['invoices']
+        # Plan limit, not the stale limit stored on the usage row
+        self.assertEqual((invoices['current_count'], invoices['actual_count'], invoices['limit_count']), (3, 4, 450))
+        self.assertEqual(status['sales']['actual_count'], 1)
+        self.assertFalse(status['sales']['tracked'])
+
+    def test_status_is_cached_until_usage_or_plan_changes(self):
+        db = self.use(build_db())
+        service = SubscriptionService()
+
+        service.get_usage_status('owner')
+        reads = len(db.queries)
+        self.assertEqual(service.get_accurate_usage_counts('member')['actual_counts']['invoices'], 4)
+        # Member resolves to the owner's cached report after one users read
+        self.assertEqual(db.queries[reads:], [('users', 'select')])
+
+        entitlement_cache.add_usage('owner', 'sales', 1)
+        reads = len(db.queries)
+        service.get_usage_status('owner')
+        # Recounted; the entitlement snapshot itself stays cached
+        self.assertEqual(db.queries[reads:], [('feature_usage', 'select')] + [
+            (table, 'select') for table in ('invoices', 'expenses', 'sales', 'products')
+        ])
+
+    def test_duplicated_checks_read_the_snapshot(self):
+        db = self.use(build_db())
+        service = SubscriptionService()
+
+        allowed, info = service.can_create_invoice('member')
+        limits = service.get_usage_limits('owner')
+
+        self.assertTrue(allowed)
+        self.assertEqual((info['current_usage'], info['limit'], info['remaining']), (3, 450, 447))
+        self.assertEqual(limits['limits']['invoices']['current'], 3)
+        # No actual-count queries for permission checks
+        self.assertEqual(db.count('invoices'), 0)
+
+    def test_sync_reads_through_the_cache_and_fixes_the_owner_row(self):
+        db = self.use(build_db())
+        service = SubscriptionService()
+        service.get_usage_status('owner')
+
+        result = service.sync_usage_counts('member')
+
+        self.assertEqual(result['total_synced'], 1)
+        self.assertEqual(db.tables['feature_usage'][0]['current_count'], 4)
+        self.assertTrue(service.validate_usage_consistency('owner')['is_consistent'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -6,6 +6,7 @@ import { NotificationCenter } from '../notifications/NotificationCenter';
 import NotificationBell from '../notifications/NotificationBell';
 import { Sheet, SheetContent, SheetTrigger, SheetClose } from '../ui/sheet';
 import FirebaseService from '../../services/FirebaseService';
+import { get } from '../../services/api';
 import UpgradePromptCard from '../subscription/UpgradePromptCard';
 import {
   Menu,
@@ -57,24 +58,15 @@ const FixedModernHeader = () => {
     
     try {
       setSubscriptionLoading(true);
-      const response = await fetch('/api/subscription/unified-status', {
-        headers: {
-          'Authorization': `Bearer ${localStorage.getItem('token')}`,
-          'Content-Type': 'application/json'
-        }
-      });
+      // Through the api client so an expired access token is refreshed
+      const response = await get('/subscription/unified-status');
+      const data = response.data;
+      setSubscriptionStatus(data.data || data);
       
-      if (response.ok) {
-        const data = await response.json();
-        setSubscriptionStatus(data.data || data);
-        
-        // Show upgrade prompt if user has 3 days or less and is owner
-        const remainingDays = data.data?.remaining_days || 0;
-        if (isOwner && remainingDays <= 3 && remainingDays > 0) {
-          setShowUpgradePrompt(true);
-        }
-      } else {
-        console.error('Failed to fetch subscription status');
+      // Show upgrade prompt if user has 3 days or less and is owner
+      const remainingDays = data.data?.remaining_days || 0;
+      if (isOwner && remainingDays <= 3 && remainingDays > 0) {
+        setShowUpgradePrompt(true);
       }
     } catch (error) {
       console.error('Error fetching subscription status:', error);
@@ -6,6 +6,7 @@ import { Badge } from '../ui/badge';
 import { Crown, Users, DollarSign, Calendar, Copy, Check, AlertCircle } from 'lucide-react';
 import { useAuth } from '../../contexts/AuthContext';
 import { toast } from 'react-hot-toast';
+import { get, post } from '../../services/api';
 
 const ReferralSystem = () => {
   const { user, role } = useAuth();
@@ -25,30 +26,13 @@ const ReferralSystem = () => {
   const fetchReferralData = async () => {
     try {
       setLoading(true);
-      const response = await fetch('/api/referrals/stats', {
-        headers: {
-          'Authorization': `Bearer ${localStorage.getItem('token')}`
-        }
-      });
-      
-      if (response.ok) {
-        const contentType = response.headers.get('content-type');
-        if (contentType && contentType.includes('application/json')) {
-          const data = await response.json();
-          setReferralData(data);
-        } else {
-          console.warn('Referral API returned non-JSON response');
-          // Set default/mock data
-          setReferralData({
-            referral_code: user?.referral_code || 'REF123',
-            total_referrals: 0,
-            total_earnings: 0,
-            pending_earnings: 0,
-            available_earnings: 0
-          });
-        }
+      // Through the api client so an expired access token is refreshed
+      const response = await get('/referrals/stats');
+      const data = response.data;
+      if (data && typeof data === 'object') {
+        setReferralData(data);
       } else {
-        console.warn('Referral API not available');
+        console.warn('Referral API returned non-JSON response');
         // Set default/mock data
         setReferralData({
           referral_code: user?.referral_code || 'REF123',
@@ -87,23 +71,11 @@ const ReferralSystem = () => {
 
   const requestWithdrawal = async () => {
     try {
-      const response = await fetch('/api/referrals/withdraw', {
-        method: 'POST',
-        headers: {
-          'Authorization': `Bearer ${localStorage.getItem('token')}`,
-          'Content-Type': 'application/json'
-        }
-      });
-      
-      if (response.ok) {
-        toast.success('Withdrawal request submitted successfully!');
-        fetchReferralData();
-      } else {
-        const error = await response.json();
-        toast.error(error.message || 'Withdrawal request failed');
-      }
+      await post('/referrals/withdraw');
+      toast.success('Withdrawal request submitted successfully!');
+      fetchReferralData();
     } catch (error) {
-      toast.error('Failed to process withdrawal request');
+      toast.error(error.response?.data?.message || 'Failed to process withdrawal request');
     }
   };
 
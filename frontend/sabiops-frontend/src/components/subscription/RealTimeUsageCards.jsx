@@ -4,6 +4,7 @@ import { Button } from '../ui/button';
 import { Progress } from '../ui/progress';
 import { useAuth } from '../../contexts/AuthContext';
 import { useNavigate } from 'react-router-dom';
+import { get } from '../../services/api';
 import {
   Crown,
   FileText,
@@ -59,32 +60,18 @@ const RealTimeUsageCards = ({ className = "" }) => {
       setLoading(true);
       setError(null);
 
-      // Fetch both usage status and subscription status
+      // Fetch both usage status and subscription status; the api client refreshes an expired token
       const [usageResponse, subscriptionResponse] = await Promise.all([
-        fetch('/api/subscription/usage-status', {
-          headers: {
-            'Authorization': `Bearer ${localStorage.getItem('token')}`,
-            'Content-Type': 'application/json'
-          }
-        }),
-        fetch('/api/subscription/unified-status', {
-          headers: {
-            'Authorization': `Bearer ${localStorage.getItem('token')}`,
-            'Content-Type': 'application/json'
-          }
-        })
+        get('/subscription/usage-status'),
+        get('/subscription/unified-status')
       ]);
 
-      if (usageResponse.ok && subscriptionResponse.ok) {
-        const usageData = await usageResponse.json();
-        const subscriptionData = await subscriptionResponse.json();
-        
-        setUsageData(usageData.data || usageData);
-        setSubscriptionStatus(subscriptionData.data || subscriptionData);
-        setLastUpdated(new Date());
-      } else {
-        throw new Error('Failed to fetch usage data');
-      }
+      const usageData = usageResponse.data;
+      const subscriptionData = subscriptionResponse.data;
+      
+      setUsageData(usageData.data || usageData);
+      setSubscriptionStatus(subscriptionData.data || subscriptionData);
+      setLastUpdated(new Date());
     } catch (err) {
       console.error('Error fetching usage data:', err);
       setError(err.message);
@@ -4,6 +4,7 @@ import { Button } from '../ui/button';
 import { AlertCircle, CheckCircle, Clock, RefreshCw } from 'lucide-react';
 import subscriptionService from '../../services/subscriptionService';
 import subscriptionMonitor from '../../services/subscriptionMonitor';
+import { post } from '../../services/api';
 
 const SubscriptionTrackingTest = () => {
   const [subscriptionData, setSubscriptionData] = useState(null);
@@ -76,19 +77,10 @@ const SubscriptionTrackingTest = () => {
   const createTestSubscription = async (days) => {
     setLoading(true);
     try {
-      const response = await fetch('/api/test/subscription/create-test-subscription', {
-        method: 'POST',
-        headers: {
-          'Content-Type': 'application/json',
-          'Authorization': `Bearer ${localStorage.getItem('token')}`
-        },
-        body: JSON.stringify({
-          plan_id: 'weekly',
-          days_from_now: days
-        })
+      const { data: result } = await post('/test/subscription/create-test-subscription', {
+        plan_id: 'weekly',
+        days_from_now: days
       });
-
-      const result = await response.json();
       if (result.success) {
         addTestResult('test_subscription', `Test subscription created with ${days} days remaining`, result.data);
         // Refresh status
@@ -106,18 +98,9 @@ const SubscriptionTrackingTest = () => {
   const simulateDayPassage = async (days) => {
     setLoading(true);
     try {
-      const response = await fetch('/api/test/subscription/simulate-day-passage', {
-        method: 'POST',
-        headers: {
-          'Content-Type': 'application/json',
-          'Authorization': `Bearer ${localStorage.getItem('token')}`
-        },
-        body: JSON.stringify({
-          days_to_subtract: days
-        })
+      const { data: result } = await post('/test/subscription/simulate-day-passage', {
+        days_to_subtract: days
       });
-
-      const result = await response.json();
       if (result.success) {
         addTestResult('simulation', `Simulated ${days} days passage. New remaining: ${result.data.simulation.days_remaining}`, result.data);
         // Refresh status
@@ -135,15 +118,7 @@ const SubscriptionTrackingTest = () => {
   const testExpiration = async () => {
     setLoading(true);
     try {
-      const response = await fetch('/api/test/subscription/test-expiration', {
-        method: 'POST',
-        headers: {
-          'Content-Type': 'application/json',
-          'Authorization': `Bearer ${localStorage.getItem('token')}`
-        }
-      });
-
-      const result = await response.json();
+      const { data: result } = await post('/test/subscription/test-expiration');
       if (result.success) {
         addTestResult('expiration', `Expiration test completed. Status: ${result.data.current_status.unified_status}`, result.data);
         // Refresh status
@@ -161,15 +136,7 @@ const SubscriptionTrackingTest = () => {
   const resetToFree = async () => {
     setLoading(true);
     try {
-      const response = await fetch('/api/test/subscription/reset-to-free', {
-        method: 'POST',
-        headers: {
-          'Content-Type': 'application/json',
-          'Authorization': `Bearer ${localStorage.getItem('token')}`
-        }
-      });
-
-      const result = await response.json();
+      const { data: result } = await post('/test/subscription/reset-to-free');
       if (result.success) {
         addTestResult('reset', 'Reset to free plan completed', result.data);
         // Refresh status
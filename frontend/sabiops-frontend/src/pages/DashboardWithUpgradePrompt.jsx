@@ -10,6 +10,7 @@ import UpgradePromptCard from '../components/subscription/UpgradePromptCard';
 import UnifiedSubscriptionStatus from '../components/subscription/UnifiedSubscriptionStatus';
 import { Card, CardContent } from '../components/ui/card';
 import { Crown, RefreshCw } from 'lucide-react';
+import { get } from '../services/api';
 
 const DashboardWithUpgradePrompt = () => {
   const { user, isOwner } = useAuth();
@@ -24,22 +25,15 @@ const DashboardWithUpgradePrompt = () => {
     
     try {
       setLoading(true);
-      const response = await fetch('/api/subscription/unified-status', {
-        headers: {
-          'Authorization': `Bearer ${localStorage.getItem('token')}`,
-          'Content-Type': 'application/json'
-        }
-      });
+      // Through the api client so an expired access token is refreshed
+      const response = await get('/subscription/unified-status');
+      const data = response.data;
+      setSubscriptionStatus(data.data || data);
       
-      if (response.ok) {
-        const data = await response.json();
-        setSubscriptionStatus(data.data || data);
-        
-        // Show upgrade prompt if user has 3 days or less and is owner
-        const remainingDays = data.data?.remaining_days || 0;
-        if (isOwner && remainingDays <= 3 && remainingDays > 0) {
-          setShowUpgradePrompt(true);
-        }
+      // Show upgrade prompt if user has 3 days or less and is owner
+      const remainingDays = data.data?.remaining_days || 0;
+      if (isOwner && remainingDays <= 3 && remainingDays > 0) {
+        setShowUpgradePrompt(true);
       }
     } catch (error) {
       console.error('Error fetching subscription status:', error);
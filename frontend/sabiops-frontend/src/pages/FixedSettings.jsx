@@ -11,6 +11,7 @@ import { Label } from '../components/ui/label';
 import { Separator } from '../components/ui/separator';
 import { Badge } from '../components/ui/badge';
 import { useToast } from '../components/ui/use-toast';
+import { get, put } from '../services/api';
 import {
   User,
   Building2,
@@ -68,17 +69,10 @@ const FixedSettings = () => {
     
     try {
       setSubscriptionLoading(true);
-      const response = await fetch('/api/subscription/unified-status', {
-        headers: {
-          'Authorization': `Bearer ${localStorage.getItem('token')}`,
-          'Content-Type': 'application/json'
-        }
-      });
-      
-      if (response.ok) {
-        const data = await response.json();
-        setSubscriptionData(data.data || data);
-      }
+      // Through the api client so an expired access token is refreshed
+      const response = await get('/subscription/unified-status');
+      const data = response.data;
+      setSubscriptionData(data.data || data);
     } catch (error) {
       console.error('Error fetching subscription data:', error);
     } finally {
@@ -105,24 +99,12 @@ const FixedSettings = () => {
     setSaving(true);
 
     try {
-      const response = await fetch('/api/user/profile', {
-        method: 'PUT',
-        headers: {
-          'Authorization': `Bearer ${localStorage.getItem('token')}`,
-          'Content-Type': 'application/json'
-        },
-        body: JSON.stringify(formData)
+      await put('/user/profile', formData);
+      toast({
+        title: "Profile Updated",
+        description: "Your profile has been successfully updated.",
+        variant: "success"
       });
-
-      if (response.ok) {
-        toast({
-          title: "Profile Updated",
-          description: "Your profile has been successfully updated.",
-          variant: "success"
-        });
-      } else {
-        throw new Error('Failed to update profile');
-      }
     } catch (error) {
       toast({
         title: "Update Failed",
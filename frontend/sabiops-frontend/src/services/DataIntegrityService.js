@@ -1,18 +1,8 @@
 import { handleApiError, showToast } from '../utils/errorHandling';
+import { post } from './api';
 
+// Requests go through the api client, which adds the token and refreshes it when it expires
 class DataIntegrityService {
-  constructor() {
-    this.baseUrl = process.env.REACT_APP_API_URL || 'http://localhost:5000';
-  }
-
-  // Get authorization headers
-  getHeaders() {
-    const token = localStorage.getItem('token');
-    return {
-      'Content-Type': 'application/json',
-      'Authorization': `Bearer ${token}`
-    };
-  }
 
   // Run all data integrity checks
   async runAllChecks() {
@@ -30,16 +20,7 @@ class DataIntegrityService {
       
       for (const check of checks) {
         try {
-          const response = await fetch(`${this.baseUrl}/api/data-integrity/${check}`, {
-            method: 'POST',
-            headers: this.getHeaders()
-          });
-
-          const data = await response.json();
-          
-          if (!response.ok) {
-            throw new Error(data.message || `Failed to run ${check}`);
-          }
+          const { data } = await post(`/data-integrity/${check}`);
 
           results.push({
             id: check,
@@ -68,16 +49,7 @@ class DataIntegrityService {
   // Run individual check
   async runSingleCheck(checkId) {
     try {
-      const response = await fetch(`${this.baseUrl}/api/data-integrity/${checkId}`, {
-        method: 'POST',
-        headers: this.getHeaders()
-      });
-
-      const data = await response.json();
-      
-      if (!response.ok) {
-        throw new Error(data.message || `Failed to run ${checkId}`);
-      }
+      const { data } = await post(`/data-integrity/${checkId}`);
 
       return {
         id: checkId,
@@ -119,21 +91,11 @@ class DataIntegrityService {
 
       // This would typically be handled by the backend trigger
       // But we can add a manual check here for immediate UI updates
-      const response = await fetch(`${this.baseUrl}/api/data-integrity/inventory-sync`, {
-        method: 'POST',
-        headers: this.getHeaders(),
-        body: JSON.stringify({
-          product_id: saleData.product_id,
-          quantity_sold: saleData.quantity
-        })
+      const { data } = await post('/data-integrity/inventory-sync', {
+        product_id: saleData.product_id,
+        quantity_sold: saleData.quantity
       });
-
-      if (!response.ok) {
-        const data = await response.json();
-        throw new Error(data.message || 'Failed to update inventory');
-      }
-
-      return await response.json();
+      return data;
     } catch (error) {
       console.error('Inventory update error:', error);
       // Don't throw error here as it's a background operation
@@ -144,22 +106,12 @@ class DataIntegrityService {
   // Ensure transaction record exists for sale/expense
   async ensureTransactionRecord(recordType, recordId, recordData) {
     try {
-      const response = await fetch(`${this.baseUrl}/api/data-integrity/transaction-integrity`, {
-        method: 'POST',
-        headers: this.getHeaders(),
-        body: JSON.stringify({
-          record_type: recordType,
-          record_id: recordId,
-          record_data: recordData
-        })
+      const { data } = await post('/data-integrity/transaction-integrity', {
+        record_type: recordType,
+        record_id: recordId,
+        record_data: recordData
       });
-
-      if (!response.ok) {
-        const data = await response.json();
-        throw new Error(data.message || 'Failed to ensure transaction record');
-      }
-
-      return await response.json();
+      return data;
     } catch (error) {
       console.error('Transaction record error:', error);
       return null;
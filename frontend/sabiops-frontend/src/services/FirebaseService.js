@@ -296,26 +296,18 @@ class FirebaseService {
     try {
       console.log('FirebaseService: Sending notification to user:', userId);
 
-      const response = await fetch('/api/notifications/send', {
-        method: 'POST',
-        headers: {
-          'Content-Type': 'application/json',
-          'Authorization': `Bearer ${localStorage.getItem('token')}`
-        },
-        body: JSON.stringify({
-          user_id: userId,
-          title: title,
-          body: body,
-          data: data,
-          type: data.type || 'info'
-        })
-      });
+      // Import API service so an expired access token is refreshed
+      const { post } = await import('./api.js');
 
-      if (!response.ok) {
-        throw new Error('Failed to send notification');
-      }
+      const response = await post('/notifications/send', {
+        user_id: userId,
+        title: title,
+        body: body,
+        data: data,
+        type: data.type || 'info'
+      });
 
-      const result = await response.json();
+      const result = response.data;
       console.log('FirebaseService: Notification sent successfully:', result);
       return result;
 
@@ -349,17 +341,9 @@ class FirebaseService {
    */
   static async markAsRead(notificationId) {
     try {
-      const response = await fetch(`/api/notifications/${notificationId}/read`, {
-        method: 'PUT',
-        headers: {
-          'Authorization': `Bearer ${localStorage.getItem('token')}`
-        }
-      });
-
-      if (!response.ok) {
-        throw new Error('Failed to mark notification as read');
-      }
+      const { put } = await import('./api.js');
 
+      await put(`/notifications/${notificationId}/read`);
       return true;
 
     } catch (error) {
@@ -373,17 +357,9 @@ class FirebaseService {
    */
   static async markAllAsRead() {
     try {
-      const response = await fetch('/api/notifications/mark-all-read', {
-        method: 'PUT',
-        headers: {
-          'Authorization': `Bearer ${localStorage.getItem('token')}`
-        }
-      });
-
-      if (!response.ok) {
-        throw new Error('Failed to mark all notifications as read');
-      }
+      const { put } = await import('./api.js');
 
+      await put('/notifications/mark-all-read');
       return true;
 
     } catch (error) {
@@ -415,26 +391,17 @@ class FirebaseService {
    */
   static async createBusinessNotification(type, title, body, actionUrl = null, data = {}) {
     try {
-      const response = await fetch('/api/notifications/create', {
-        method: 'POST',
-        headers: {
-          'Content-Type': 'application/json',
-          'Authorization': `Bearer ${localStorage.getItem('token')}`
-        },
-        body: JSON.stringify({
-          type: type,
-          title: title,
-          body: body,
-          action_url: actionUrl,
-          data: data
-        })
-      });
+      const { post } = await import('./api.js');
 
-      if (!response.ok) {
-        throw new Error('Failed to create notification');
-      }
+      const response = await post('/notifications/create', {
+        type: type,
+        title: title,
+        body: body,
+        action_url: actionUrl,
+        data: data
+      });
 
-      const result = await response.json();
+      const result = response.data;
       console.log('FirebaseService: Business notification created:', result);
       return result;
 
@@ -450,15 +417,9 @@ class FirebaseService {
   static async cleanup() {
     try {
       if (this.currentToken) {
-        await fetch('/api/notifications/unregister-token', {
-          method: 'POST',
-          headers: {
-            'Content-Type': 'application/json',
-            'Authorization': `Bearer ${localStorage.getItem('token')}`
-          },
-          body: JSON.stringify({
-            fcm_token: this.currentToken
-          })
+        const { post } = await import('./api.js');
+        await post('/notifications/unregister-token', {
+          fcm_token: this.currentToken
         });
       }
 
@@ -31,9 +31,43 @@ api.interceptors.request.use(
   }
 );
 
+// Access tokens are short-lived; a single refresh request is shared by concurrent 401s
+// from this client and apiClient
+let refreshPromise = null;
+
+export async function refreshAccessToken() {
+  const refreshToken = localStorage.getItem('refresh_token');
+  if (!refreshToken) {
+    return null;
+  }
+  if (!refreshPromise) {
+    // Plain axios so the request interceptor does not swap in the expired access token
+    refreshPromise = axios.post(`${getBaseURL()}/auth/refresh`, null, {
+      headers: { Authorization: `Bearer ${refreshToken}` },
+    })
+      .then((response) => {
+        const token = response.data?.data?.access_token;
+        if (token) {
+          setAuthToken(token);
+        }
+        return token || null;
+      })
+      .catch(() => null)
+      .finally(() => {
+        refreshPromise = null;
+      });
+  }
+  return refreshPromise;
+}
+
 // Response interceptor for error handling
 api.interceptors.response.use(
   (response) => {
+    // Login and email confirmation return a refresh token next to the access token
+    const refreshToken = response.data?.data?.refresh_token;
+    if (refreshToken) {
+      localStorage.setItem('refresh_token', refreshToken);
+    }
     return response;
   },
   async (error) => {
@@ -43,25 +77,16 @@ api.interceptors.response.use(
       originalRequest._retry = true;
       
       // Token expired or invalid
-      console.log('[DEBUG] 401 error detected, attempting to handle authentication');
+      console.log('[DEBUG] 401 error detected, attempting to refresh the access token');
       
-      // Try to verify token first
-      try {
-        const token = localStorage.getItem('token');
-        if (token) {
-          // If we have a token, try to verify it
-          const verifyResponse = await api.post('/auth/verify-token');
-          if (verifyResponse.data.success) {
-            // Token is still valid, retry the original request
-            return api.request(originalRequest);
-          }
-        }
-      } catch (verifyError) {
-        console.log('[DEBUG] Token verification failed, clearing token');
+      const token = await refreshAccessToken();
+      if (token) {
+        originalRequest.headers.Authorization = `Bearer ${token}`;
+        return api.request(originalRequest);
       }
       
-      // Clear invalid token
-      localStorage.removeItem('token');
+      // Clear invalid tokens
+      removeAuthToken();
       
       // Only redirect if not already on /login
       if (window.location.pathname !== '/login') {
@@ -85,6 +110,7 @@ export function setAuthToken(token) {
 
 export function removeAuthToken() {
   localStorage.removeItem('token');
+  localStorage.removeItem('refresh_token');
 }
 
 // Authentication endpoints
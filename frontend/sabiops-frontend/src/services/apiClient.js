@@ -11,7 +11,7 @@ import axios from 'axios';
 import { toastService } from './ToastService';
 
 // Import existing API configuration
-import { getAuthToken } from './api';
+import { getAuthToken, refreshAccessToken, removeAuthToken } from './api';
 
 // Determine the correct base URL based on environment (same logic as existing api.js)
 const getBaseURL = () => {
@@ -121,10 +121,20 @@ apiClient.interceptors.response.use(
 
     return response;
   },
-  (error) => {
+  async (error) => {
     // Handle response errors with automatic toast notifications
     const originalRequest = error.config;
     
+    // Expired access token: refresh once and replay the request
+    if (error.response?.status === 401 && originalRequest && !originalRequest._retry) {
+      originalRequest._retry = true;
+      const token = await refreshAccessToken();
+      if (token) {
+        originalRequest.headers.Authorization = `Bearer ${token}`;
+        return apiClient.request(originalRequest);
+      }
+    }
+    
     // Extract timing information
     const duration = originalRequest.metadata ? 
       Date.now() - originalRequest.metadata.startTime : 0;
@@ -240,9 +250,11 @@ apiClient.interceptors.response.use(
           break;
         
         case 401:
-          // Don't show toast for auth errors - let existing auth handler manage redirect
-          localStorage.removeItem('token');
-          window.location.href = '/login';
+          // The refresh token was rejected too; don't show a toast, just sign in again
+          removeAuthToken();
+          if (window.location.pathname !== '/login') {
+            window.location.href = '/login';
+          }
           break;
         
         case 403: